@@ -6,14 +6,20 @@ import os
 import sys
 import time
 import json
+import hashlib
 import argparse
 import logging
+import threading
+import subprocess
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Agregar el directorio actual al path
 sys.path.append(str(Path(__file__).parent))
 
+from config import settings
+from services.advanced_image_processor import create_image_processor
 from services.batch_processor import BatchProcessor
 from services.metrics_calculator import MetricsCalculator
 
@@ -24,12 +30,128 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Configuración que cambia el resultado del procesamiento (invalida los resultados guardados)
+VERSION_SETTINGS = (
+    'FAST_MODE', 'OCR_CONFIG', 'LAYOUT_MODEL_CONFIG', 'SKIMAGE_CONFIG', 'OCR_TARGET_MAX_SIDE',
+    'TILED_MIN_PIXELS', 'TILE_MAX_PIXELS', 'TILE_OVERLAP',
+    'DESKEW_ENABLED', 'DESKEW_MAX_SIDE', 'DESKEW_MAX_ANGLE', 'DESKEW_MIN_ANGLE',
+    'DESKEW_OSD_ENABLED', 'DESKEW_OSD_MIN_CONFIDENCE',
+    'NUMERIC_ZONE_OCR_ENABLED', 'VENDOR_TEMPLATES_ENABLED', 'VENDOR_TEMPLATE_MIN_FIELDS',
+    'DUPLICATE_DETECTION_ENABLED', 'DUPLICATE_MAX_DISTANCE', 'DUPLICATE_REUSE_PARSE',
+)
+
+def _git_output(*args: str) -> str:
+    """Salida de un comando git en el directorio del proyecto ("" si git no está disponible)"""
+    try:
+        completed = subprocess.run(
+            ['git', *args], cwd=Path(__file__).parent, capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return ""
+    return completed.stdout if completed.returncode == 0 else ""
+
+def code_version() -> str:
+    """
+    Versión del código y la configuración que produce los resultados
+    
+    Combina el commit actual, los cambios sin commitear y los valores de VERSION_SETTINGS;
+    si cualquiera cambia, los resultados guardados dejan de reutilizarse.
+    """
+    version = {
+        'commit': _git_output('rev-parse', 'HEAD').strip(),
+        'diff': hashlib.sha1(_git_output('diff', 'HEAD').encode('utf-8')).hexdigest(),
+        'settings': {name: getattr(settings, name, None) for name in VERSION_SETTINGS}
+    }
+    encoded = json.dumps(version, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+class DocumentResultStore:
+    """
+    Almacén persistente de resultados por documento (formato JSON Lines)
+    
+    Cada línea guarda el resultado de un documento junto con su huella
+    (tamaño + fecha de modificación) y la versión del código que lo produjo.
+    Si el benchmark se interrumpe, los documentos ya procesados con la misma
+    versión se recuperan del archivo y no se vuelven a procesar.
+    """
+    
+    def __init__(self, store_file: str, version: str = ""):
+        self.store_file = store_file
+        self.version = version
+        self._lock = threading.Lock()
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._load()
+    
+    def _load(self):
+        """Carga los resultados existentes (ignora líneas corruptas de una escritura interrumpida)"""
+        if not os.path.exists(self.store_file):
+            return
+        
+        with open(self.store_file, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                    self._results[entry['key']] = entry
+                except (json.JSONDecodeError, KeyError):
+                    logger.warning(f"Línea {line_number} inválida en {self.store_file}, se ignora")
+
+        # Cerrar una última línea incompleta para que las nuevas entradas empiecen en línea propia
+        with open(self.store_file, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+
+        logger.info(f"Resultados previos cargados: {len(self._results)} documentos")
+    
+    @staticmethod
+    def fingerprint(file_path: str) -> str:
+        """Huella del archivo para invalidar resultados si el documento cambió"""
+        stat = os.stat(file_path)
+        return f"{stat.st_size}-{int(stat.st_mtime)}"
+    
+    def get(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """Obtiene el resultado guardado de un documento si sigue vigente"""
+        entry = self._results.get(os.path.basename(file_path))
+        if (entry and entry.get('fingerprint') == self.fingerprint(file_path)
+                and entry.get('version', "") == self.version):
+            return entry['result']
+        return None
+    
+    def put(self, file_path: str, result: Dict[str, Any]):
+        """Guarda el resultado de un documento y lo persiste inmediatamente"""
+        entry = {
+            'key': os.path.basename(file_path),
+            'fingerprint': self.fingerprint(file_path),
+            'version': self.version,
+            'result': result
+        }
+        with self._lock:
+            self._results[entry['key']] = entry
+            with open(self.store_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+    
+    def __len__(self) -> int:
+        return len(self._results)
+
 class DatasetBenchmark:
     """Clase para hacer benchmark con dataset de facturas (imagen + JSON)"""
     
     def __init__(self, max_workers: int = 4):
-        self.batch_processor = BatchProcessor(max_workers=max_workers)
+        self.max_workers = max_workers
+        # Plantillas e índice de duplicados en memoria: el resultado no depende de ejecuciones anteriores
+        image_processor = create_image_processor(vendor_templates_db_path=":memory:",
+                                                 duplicate_index_db_path=":memory:")
+        self.batch_processor = BatchProcessor(max_workers=max_workers, image_processor=image_processor)
         self.metrics_calculator = MetricsCalculator()
+        # Segundos desde el inicio del pool hasta que terminó cada documento procesado en esta ejecución
+        self.completion_times: Dict[str, float] = {}
     
     def load_dataset_ground_truth(self, dataset_directory: str) -> Dict[str, Dict[str, Any]]:
         """
@@ -158,17 +280,128 @@ class DatasetBenchmark:
         
         return sorted(image_paths)
     
+    def process_documents(self,
+                          file_paths: List[str],
+                          ground_truth_data: Dict[str, Dict[str, Any]],
+                          store: DocumentResultStore) -> Dict[str, Dict[str, Any]]:
+        """
+        Procesa cada documento una sola vez, reutilizando los resultados del almacén
+        
+        Args:
+            file_paths: Documentos a procesar
+            ground_truth_data: Ground truth por nombre de archivo
+            store: Almacén persistente de resultados por documento
+            
+        Returns:
+            Diccionario ruta -> resultado individual
+        """
+        results = {}
+        pending = []
+        self.completion_times = {}
+        
+        for path in file_paths:
+            cached = store.get(path)
+            if cached is not None:
+                results[path] = cached
+            else:
+                pending.append(path)
+        
+        logger.info(f"Documentos reutilizados: {len(results)}, pendientes: {len(pending)}")
+        
+        if not pending:
+            return results
+        
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            future_to_path = {
+                executor.submit(self.batch_processor._process_single_file, path, ground_truth_data): path
+                for path in pending
+            }
+            
+            for completed, future in enumerate(as_completed(future_to_path), 1):
+                path = future_to_path[future]
+                self.completion_times[path] = time.perf_counter() - started
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Error procesando {path}: {e}")
+                    result = {
+                        'file_path': path,
+                        'filename': os.path.basename(path),
+                        'success': False,
+                        'error': str(e),
+                        'processing_time': 0.0
+                    }
+                
+                # Persistir inmediatamente para poder reanudar tras una caída
+                store.put(path, result)
+                results[path] = result
+                logger.info(f"[{completed}/{len(pending)}] {os.path.basename(path)} procesado")
+        
+        return results
+    
+    def build_batch_view(self, batch_files: List[str], document_results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Construye el resultado de un lote a partir de los resultados por documento
+        
+        Los documentos se envían al pool en orden y los lotes son prefijos de esa lista,
+        así que el tiempo real de un lote es el momento en que terminó su último
+        documento. Si alguno se reutilizó del almacén no hay tiempo real: se usa la
+        suma de los tiempos individuales repartida entre los workers y el lote queda
+        marcado con time_estimated (compare_benchmarks.py no compara su throughput).
+        
+        Args:
+            batch_files: Documentos que forman el lote
+            document_results: Resultados por documento
+            
+        Returns:
+            Resultado del lote con la misma estructura que BatchProcessor.process_batch
+        """
+        results = [document_results[path] for path in batch_files]
+        processing_times = [r['processing_time'] for r in results]
+        successful_count = sum(1 for r in results if r['success'])
+        
+        time_estimated = not all(path in self.completion_times for path in batch_files)
+        if time_estimated:
+            parallelism = max(1, min(self.max_workers, len(results)))
+            total_time = sum(processing_times) / parallelism
+        else:
+            total_time = max((self.completion_times[path] for path in batch_files), default=0.0)
+        
+        return {
+            'batch_info': {
+                'total_files': len(results),
+                'successful_files': successful_count,
+                'failed_files': len(results) - successful_count,
+                'total_processing_time': total_time,
+                'time_estimated': time_estimated,
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            },
+            'performance_metrics': self.batch_processor._calculate_batch_metrics(results, processing_times, total_time),
+            'individual_results': results
+        }
+    
     def run_dataset_benchmark(self, 
                              dataset_directory: str,
                              batch_sizes: List[int] = [10, 20, 30, 50],
-                             output_dir: str = "benchmark_results") -> Dict[str, Any]:
+                             output_dir: str = "benchmark_results",
+                             resume: bool = True,
+                             store_file: Optional[str] = None) -> Dict[str, Any]:
         """
         Ejecuta benchmark completo con el dataset de facturas
         
+        Cada documento se procesa una única vez y se guarda en un almacén persistente;
+        los lotes se derivan de esos resultados. Con resume=True una ejecución
+        interrumpida continúa desde los documentos ya procesados con la misma versión
+        del código; al terminar, el almacén se archiva para que la próxima ejecución
+        mida todo de nuevo.
+        
         Args:
             dataset_directory: Directorio del dataset con imágenes y JSONs
             batch_sizes: Tamaños de lote a probar
             output_dir: Directorio para guardar resultados
+            resume: Si continuar una ejecución interrumpida con los resultados guardados
+            store_file: Archivo del almacén por documento (por defecto en output_dir)
             
         Returns:
             Resultados del benchmark
@@ -188,28 +421,38 @@ class DatasetBenchmark:
         
         logger.info(f"Imágenes encontradas: {len(test_files)}")
         
-        # Ejecutar benchmarks para diferentes tamaños de lote
-        benchmark_results = {}
-        
+        valid_batch_sizes = []
         for batch_size in batch_sizes:
             if batch_size > len(test_files):
                 logger.warning(f"[WARNING] Tamaño de lote {batch_size} mayor que archivos disponibles ({len(test_files)})")
                 continue
+            valid_batch_sizes.append(batch_size)
+        
+        # Almacén persistente por documento
+        store_file = store_file or os.path.join(output_dir, "dataset_document_results.jsonl")
+        if not resume and os.path.exists(store_file):
+            os.remove(store_file)
+        store = DocumentResultStore(store_file, version=code_version())
+        
+        # Procesar una sola vez la unión de todos los lotes (el prefijo más largo)
+        required_files = test_files[:max(valid_batch_sizes)] if valid_batch_sizes else []
+        start_time = time.time()
+        document_results = self.process_documents(required_files, ground_truth_data, store)
+        logger.info(f"Documentos procesados en {time.time() - start_time:.2f}s")
+        
+        # Derivar los resultados de cada tamaño de lote
+        benchmark_results = {}
+        
+        for batch_size in valid_batch_sizes:
+            logger.info(f"Generando resultados para lote de {batch_size} archivos")
             
-            logger.info(f"Ejecutando benchmark con lote de {batch_size} archivos")
-            
-            # Seleccionar archivos para este lote
-            batch_files = test_files[:batch_size]
+            batch_result = self.build_batch_view(test_files[:batch_size], document_results)
+            batch_time = batch_result['batch_info']['total_processing_time']
             
-            # Procesar lote
-            start_time = time.time()
-            batch_result = self.batch_processor.process_batch(
-                file_paths=batch_files,
-                ground_truth_data=ground_truth_data,
-                save_results=True,
-                results_file=os.path.join(output_dir, f"dataset_batch_{batch_size}_results.json")
+            self.batch_processor._save_results(
+                batch_result,
+                os.path.join(output_dir, f"dataset_batch_{batch_size}_results.json")
             )
-            batch_time = time.time() - start_time
             
             # Generar reporte
             report = self.batch_processor.generate_performance_report(batch_result)
@@ -242,6 +485,10 @@ class DatasetBenchmark:
         with open(results_file, 'w', encoding='utf-8') as f:
             json.dump(benchmark_results, f, indent=2, ensure_ascii=False, default=str)
         
+        # La ejecución terminó: archivar el almacén para no reportar sus resultados como nuevos
+        if os.path.exists(store_file):
+            os.replace(store_file, f"{store_file}.completed")
+        
         logger.info(f"Benchmark del dataset completado. Resultados guardados en {output_dir}")
         
         return benchmark_results
@@ -264,7 +511,8 @@ Total de archivos en dataset: {len(self.find_dataset_images(dataset_directory))}
         
         for batch_size, result in benchmark_results.items():
             perf = result['batch_result']['performance_metrics']
-            report += f"{batch_size:<8} {perf['throughput']:<10.2f} {result['total_time']:<12.2f} {perf['success_rate']*100:<12.1f} {perf['avg_confidence_score']:<12.3f}\n"
+            estimated = " (estimado)" if result['batch_result']['batch_info'].get('time_estimated') else ""
+            report += f"{batch_size:<8} {perf['throughput']:<10.2f} {result['total_time']:<12.2f} {perf['success_rate']*100:<12.1f} {perf['avg_confidence_score']:<12.3f}{estimated}\n"
         
         # Análisis de tendencias
         report += "\nANÁLISIS DE TENDENCIAS:\n"
@@ -336,6 +584,10 @@ def main():
                        help='Directorio para guardar resultados')
     parser.add_argument('--max-workers', type=int, default=4,
                        help='Número máximo de workers para procesamiento paralelo')
+    parser.add_argument('--no-resume', action='store_true',
+                       help='Descartar los resultados de una ejecución interrumpida y procesar todo de nuevo')
+    parser.add_argument('--store-file', default=None,
+                       help='Archivo JSONL con resultados por documento (por defecto en --output-dir)')
     
     args = parser.parse_args()
     
@@ -352,7 +604,9 @@ def main():
         results = benchmark.run_dataset_benchmark(
             dataset_directory=args.dataset_dir,
             batch_sizes=args.batch_sizes,
-            output_dir=args.output_dir
+            output_dir=args.output_dir,
+            resume=not args.no_resume,
+            store_file=args.store_file
         )
         
         logger.info("[SUCCESS] Benchmark del dataset completado exitosamente")
@@ -0,0 +1,311 @@
+"""
+Benchmark por etapas del pipeline de OCR
+
+Mide por separado cada etapa del procesamiento (render de PDF, carga de imagen,
+preprocesamiento, layout, OCR por región, OCR de página completa, parsing de
+facturas y métricas) sobre un directorio de documentos, con warmup y repeticiones.
+Reporta p50/p95 y memoria pico por etapa y guarda un JSON comparable entre corridas.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import logging
+import platform
+import tracemalloc
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable
+
+import numpy as np
+
+# Agregar el directorio actual al path
+sys.path.append(str(Path(__file__).parent))
+
+from config import settings
+from services.advanced_image_processor import AdvancedImageProcessor
+from services.image_loader import open_grayscale
+from services.metrics_calculator import MetricsCalculator
+from utils.stats_utils import summarize, format_bytes
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+STAGES = [
+    'pdf_render',
+    'image_load',
+    'preprocessing',
+    'layout',
+    'region_ocr',
+    'full_page_ocr',
+    'invoice_parsing',
+    'metrics'
+]
+
+DOCUMENT_EXTENSIONS = ['.pdf', '.png', '.jpg', '.jpeg']
+
+class StageBenchmark:
+    """Benchmark de las etapas de AdvancedImageProcessor sobre un conjunto de documentos"""
+
+    def __init__(self, processor: Optional[AdvancedImageProcessor] = None):
+        self.processor = processor or AdvancedImageProcessor()
+        self.metrics_calculator = MetricsCalculator()
+
+    def find_documents(self, input_dir: str, limit: Optional[int] = None) -> List[str]:
+        """Buscar documentos soportados en el directorio"""
+        documents = sorted(
+            str(p) for p in Path(input_dir).iterdir()
+            if p.is_file() and p.suffix.lower() in DOCUMENT_EXTENSIONS
+        )
+        return documents[:limit] if limit else documents
+
+    def load_ground_truth(self, input_dir: str) -> Dict[str, Dict[str, Any]]:
+        """Cargar el ground truth del dataset (imagen + JSON) si existe"""
+        if not any(Path(input_dir).glob("*.json")):
+            return {}
+
+        from benchmark_dataset import DatasetBenchmark
+        return DatasetBenchmark(max_workers=1).load_dataset_ground_truth(input_dir)
+
+    def _measure(self, stage: str, func: Callable[[], Any], timings: Dict[str, Dict[str, float]], track_memory: bool) -> Any:
+        """Ejecutar una etapa midiendo tiempo y, opcionalmente, memoria pico"""
+        if track_memory:
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+
+        sample = {'seconds': elapsed}
+        if track_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            sample['peak_memory_bytes'] = max(0, peak - baseline)
+
+        timings[stage] = sample
+        return result
+
+    def run_document(self, document_path: str,
+                     ground_truth: Optional[Dict[str, Any]] = None,
+                     track_memory: bool = False) -> Dict[str, Dict[str, float]]:
+        """
+        Ejecutar todas las etapas sobre un documento
+
+        Args:
+            document_path: Ruta al documento (imagen o PDF)
+            ground_truth: Ground truth del documento para la etapa de métricas
+            track_memory: Si medir memoria pico con tracemalloc (agrega overhead)
+
+        Returns:
+            Diccionario etapa -> {'seconds', 'peak_memory_bytes'}
+        """
+        timings: Dict[str, Dict[str, float]] = {}
+        if document_path.lower().endswith('.pdf'):
+            # Los PDF se renderizan en grises en memoria, como en process_image
+            page = self._measure(
+                'pdf_render', lambda: self.processor.render_pdf_page(document_path), timings, track_memory
+            )
+            processed = self._measure(
+                'preprocessing', lambda: self.processor.preprocess_page(page), timings, track_memory
+            )
+        else:
+            self._measure(
+                'image_load', lambda: np.array(open_grayscale(document_path, settings.OCR_TARGET_MAX_SIDE)),
+                timings, track_memory
+            )
+            processed = self._measure(
+                'preprocessing', lambda: self.processor.preprocess_image_advanced(document_path), timings, track_memory
+            )
+
+        layout_elements = self._measure(
+            'layout', lambda: self.processor.detect_layout(processed), timings, track_memory
+        )
+
+        region_elements = [e for e in layout_elements if e["type"] in ["Text", "Title", "List", "Table"]]
+        self._measure(
+            'region_ocr',
+            lambda: [self.processor.extract_text_from_region(processed, e["bbox"]) for e in region_elements],
+            timings, track_memory
+        )
+
+        full_bbox = [0, 0, processed.shape[1], processed.shape[0]]
+        full_text, _ = self._measure(
+            'full_page_ocr', lambda: self.processor.extract_text_from_region(processed, full_bbox), timings, track_memory
+        )
+
+        invoice_data = self._measure(
+            'invoice_parsing', lambda: self.processor.invoice_parser.parse_multiple_invoices(full_text), timings, track_memory
+        )
+
+        invoices = invoice_data.get('invoices', [])
+        extracted_fields = invoices[0].get('extracted_fields', {}) if invoices else {}
+
+        def compute_metrics():
+            if ground_truth:
+                return self.metrics_calculator.calculate_comprehensive_metrics(
+                    extracted_fields=extracted_fields,
+                    ground_truth=ground_truth,
+                    extracted_text=full_text,
+                    ground_truth_text=ground_truth.get('raw_text', ''),
+                    processing_time=sum(t['seconds'] for t in timings.values())
+                )
+            return self.metrics_calculator.calculate_confidence_score(extracted_fields)
+
+        self._measure('metrics', compute_metrics, timings, track_memory)
+
+        return timings
+
+    def run(self, input_dir: str, warmup: int = 1, repetitions: int = 3,
+            track_memory: bool = True, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Ejecutar el benchmark por etapas sobre un directorio
+
+        Args:
+            input_dir: Directorio con documentos
+            warmup: Iteraciones de calentamiento descartadas (por documento)
+            repetitions: Repeticiones medidas por documento
+            track_memory: Si hacer una pasada adicional midiendo memoria pico
+            limit: Número máximo de documentos
+
+        Returns:
+            Resultados del benchmark en formato serializable
+        """
+        documents = self.find_documents(input_dir, limit)
+        if not documents:
+            raise ValueError(f"No se encontraron documentos en {input_dir}")
+
+        ground_truth = self.load_ground_truth(input_dir)
+        logger.info(f"Documentos: {len(documents)}, warmup: {warmup}, repeticiones: {repetitions}")
+
+        per_document: Dict[str, Dict[str, Any]] = {}
+        stage_seconds: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        stage_memory: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+
+        for document in documents:
+            filename = os.path.basename(document)
+            document_gt = ground_truth.get(filename)
+            logger.info(f"Midiendo etapas de {filename}")
+
+            for _ in range(warmup):
+                self.run_document(document, document_gt)
+
+            document_samples = {stage: [] for stage in STAGES}
+            for _ in range(repetitions):
+                timings = self.run_document(document, document_gt)
+                for stage, sample in timings.items():
+                    document_samples[stage].append(sample['seconds'])
+                    stage_seconds[stage].append(sample['seconds'])
+
+            # Pasada separada para memoria: tracemalloc distorsiona los tiempos
+            document_memory = {}
+            if track_memory:
+                tracemalloc.start()
+                try:
+                    timings = self.run_document(document, document_gt, track_memory=True)
+                finally:
+                    tracemalloc.stop()
+                for stage, sample in timings.items():
+                    document_memory[stage] = sample['peak_memory_bytes']
+                    stage_memory[stage].append(sample['peak_memory_bytes'])
+
+            per_document[filename] = {
+                'seconds': {stage: values for stage, values in document_samples.items() if values},
+                'peak_memory_bytes': document_memory
+            }
+
+        stages_summary = {}
+        for stage in STAGES:
+            if not stage_seconds[stage]:
+                continue
+            stages_summary[stage] = {
+                'seconds': summarize(stage_seconds[stage]),
+                'peak_memory_bytes': summarize(stage_memory[stage]) if stage_memory[stage] else None
+            }
+
+        return {
+            'run_info': {
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'input_dir': input_dir,
+                'documents': len(documents),
+                'warmup': warmup,
+                'repetitions': repetitions,
+                'track_memory': track_memory,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'ocr_config': settings.OCR_CONFIG,
+                'skimage_config': settings.SKIMAGE_CONFIG
+            },
+            'stages': stages_summary,
+            'documents': per_document
+        }
+
+    def generate_report(self, results: Dict[str, Any]) -> str:
+        """Generar reporte de texto con p50/p95 y memoria pico por etapa"""
+        info = results['run_info']
+        report = f"""
+=== BENCHMARK POR ETAPAS DEL PIPELINE DE OCR ===
+Fecha: {info['timestamp']}
+Documentos: {info['documents']} | Warmup: {info['warmup']} | Repeticiones: {info['repetitions']}
+
+"""
+        report += f"{'Etapa':<18} {'p50 (s)':<10} {'p95 (s)':<10} {'Media (s)':<10} {'Mem. pico p95':<14}\n"
+        report += "-" * 66 + "\n"
+
+        total_p50 = 0.0
+        for stage, summary in results['stages'].items():
+            seconds = summary['seconds']
+            memory = summary['peak_memory_bytes']
+            memory_text = format_bytes(memory['p95']) if memory else "-"
+            total_p50 += seconds['p50']
+            report += f"{stage:<18} {seconds['p50']:<10.3f} {seconds['p95']:<10.3f} {seconds['mean']:<10.3f} {memory_text:<14}\n"
+
+        report += "-" * 66 + "\n"
+        report += f"{'Total (p50)':<18} {total_p50:<10.3f}\n"
+        return report
+
+def main():
+    """Función principal del script"""
+    parser = argparse.ArgumentParser(description='Benchmark por etapas del pipeline de OCR')
+    parser.add_argument('--input-dir', required=True, help='Directorio con documentos (imágenes/PDFs)')
+    parser.add_argument('--warmup', type=int, default=1, help='Iteraciones de calentamiento por documento')
+    parser.add_argument('--repetitions', type=int, default=3, help='Repeticiones medidas por documento')
+    parser.add_argument('--limit', type=int, default=None, help='Número máximo de documentos')
+    parser.add_argument('--no-memory', action='store_true', help='No medir memoria pico (evita la pasada extra)')
+    parser.add_argument('--output', default='benchmark_results/stage_benchmark.json',
+                        help='Archivo JSON de salida')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_dir):
+        logger.error(f"El directorio no existe: {args.input_dir}")
+        sys.exit(1)
+
+    benchmark = StageBenchmark()
+
+    try:
+        results = benchmark.run(
+            input_dir=args.input_dir,
+            warmup=args.warmup,
+            repetitions=args.repetitions,
+            track_memory=not args.no_memory,
+            limit=args.limit
+        )
+    except Exception as e:
+        logger.error(f"[ERROR] Error ejecutando benchmark por etapas: {e}")
+        sys.exit(1)
+
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False, default=str)
+
+    print(benchmark.generate_report(results))
+    logger.info(f"Resultados guardados en {args.output}")
+
+if __name__ == "__main__":
+    main()
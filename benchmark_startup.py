@@ -0,0 +1,158 @@
+"""
+Benchmark del tiempo de arranque de la API
+
+Importa `main` en procesos nuevos con `python -X importtime` y reporta el tiempo
+total (p50/p95) y los módulos de primer nivel que más tardan en importarse.
+Con --budget-ms termina con código 1 si la mediana supera el presupuesto, para
+usarlo en CI y detectar imports pesados que vuelvan al camino de arranque.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import logging
+import platform
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+# Agregar el directorio actual al path
+sys.path.append(str(Path(__file__).parent))
+
+from utils.stats_utils import summarize
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+REPO_DIR = Path(__file__).parent.resolve()
+
+# Módulos que no deben importarse al arrancar (se cargan en el precalentamiento)
+DEFERRED_MODULES = ['pytesseract', 'pandas', 'skimage', 'pdf2image', 'layoutparser', 'detectron2', 'torch']
+
+CHECK_SCRIPT = (
+    "import sys, json, main; "
+    f"print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))"
+)
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """
+    Tiempo propio (microsegundos) por paquete de primer nivel a partir de la
+    salida de `-X importtime`
+
+    Las líneas tienen el formato `import time: self | cumulative | módulo`. Se suma
+    el tiempo propio (sin los imports anidados) de cada módulo a su paquete raíz, de
+    modo que el costo de, por ejemplo, pydantic no queda contado dentro de fastapi.
+    """
+    totals: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # Encabezado
+        package = parts[2].strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + int(parts[0])
+    return totals
+
+def run_once(workdir: str) -> Tuple[float, Dict[str, int], List[str]]:
+    """Importar main en un proceso nuevo; devuelve (segundos, tiempo propio por paquete, módulos diferidos cargados)"""
+    env = dict(os.environ, PYTHONPATH=str(REPO_DIR))
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHECK_SCRIPT],
+        cwd=workdir, env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else "import main falló")
+    loaded = json.loads(completed.stdout.strip().splitlines()[-1])
+    return elapsed, parse_importtime(completed.stderr), loaded
+
+def run(repetitions: int, top: int) -> Dict[str, Any]:
+    """Ejecutar las repeticiones y resumir los resultados"""
+    seconds = []
+    modules: Dict[str, List[float]] = {}
+    loaded: List[str] = []
+    # Directorio de trabajo temporal: main crea los directorios de uploads y del outbox
+    with tempfile.TemporaryDirectory() as workdir:
+        for i in range(repetitions):
+            elapsed, totals, loaded = run_once(workdir)
+            seconds.append(elapsed)
+            for package, micros in totals.items():
+                modules.setdefault(package, []).append(micros / 1e6)
+            logger.info(f"Repetición {i + 1}/{repetitions}: {elapsed:.3f}s")
+
+    ranking = sorted(modules.items(), key=lambda item: summarize(item[1])['p50'], reverse=True)
+    return {
+        'run_info': {
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'repetitions': repetitions,
+            'python': platform.python_version(),
+            'platform': platform.platform()
+        },
+        'seconds': summarize(seconds),
+        'top_modules': {package: summarize(values)['p50'] for package, values in ranking[:top]},
+        'deferred_modules_loaded': loaded
+    }
+
+def generate_report(results: Dict[str, Any], budget_ms: float = None) -> str:
+    """Generar reporte de texto con el tiempo de arranque y los imports más costosos"""
+    info = results['run_info']
+    seconds = results['seconds']
+    report = f"""
+=== BENCHMARK DE ARRANQUE (import main) ===
+Fecha: {info['timestamp']}
+Repeticiones: {info['repetitions']} | Python {info['python']}
+
+Tiempo total: p50 {seconds['p50'] * 1000:.0f} ms | p95 {seconds['p95'] * 1000:.0f} ms | máx {seconds['max'] * 1000:.0f} ms
+"""
+    if budget_ms is not None:
+        report += f"Presupuesto: {budget_ms:.0f} ms -> {'OK' if seconds['p50'] * 1000 <= budget_ms else 'EXCEDIDO'}\n"
+
+    report += f"\n{'Módulo':<28} {'Propio p50 (ms)':<20}\n"
+    report += "-" * 48 + "\n"
+    for package, value in results['top_modules'].items():
+        report += f"{package:<28} {value * 1000:<20.1f}\n"
+
+    if results['deferred_modules_loaded']:
+        report += f"\n[WARN] Módulos diferidos importados al arrancar: {', '.join(results['deferred_modules_loaded'])}\n"
+    return report
+
+def main():
+    """Función principal del script"""
+    parser = argparse.ArgumentParser(description='Benchmark del tiempo de arranque de la API')
+    parser.add_argument('--repetitions', type=int, default=5, help='Procesos nuevos a medir')
+    parser.add_argument('--top', type=int, default=15, help='Módulos a mostrar en el ranking')
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='Presupuesto para la mediana; si se excede, termina con código 1')
+    parser.add_argument('--output', default='benchmark_results/startup_benchmark.json',
+                        help='Archivo JSON de salida')
+
+    args = parser.parse_args()
+
+    try:
+        results = run(args.repetitions, args.top)
+    except Exception as e:
+        logger.error(f"[ERROR] Error midiendo el arranque: {e}")
+        sys.exit(1)
+
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(dict(results, budget_ms=args.budget_ms), f, indent=2, ensure_ascii=False)
+
+    print(generate_report(results, args.budget_ms))
+    logger.info(f"Resultados guardados en {args.output}")
+
+    if args.budget_ms is not None and results['seconds']['p50'] * 1000 > args.budget_ms:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+"""
+Comparador de corridas de benchmark (gate de regresión de rendimiento)
+
+Carga dos conjuntos de resultados (anterior vs nuevo), calcula las diferencias
+de throughput, percentiles de latencia y precisión, aplica pruebas de
+significancia estadística sobre corridas repetidas y termina con código
+distinto de cero si el rendimiento empeora más allá de los umbrales.
+
+Formatos soportados:
+- Resultados de BatchProcessor / benchmark_dataset.py (dataset_batch_*_results.json)
+- Resultados consolidados de benchmark_dataset.py (dataset_benchmark_results.json)
+- Resultados de benchmark_stages.py (stage_benchmark.json)
+- Resultados de load_test.py (load_test.json)
+
+Cada tipo de corrida (lotes, etapas, load test) mide cosas distintas, así que se
+compara por separado: anterior contra nuevo dentro de cada tipo. Los lotes de una
+misma ejecución de benchmark_dataset.py son prefijos de los mismos documentos;
+de cada ejecución se toma solo el lote más grande para no contar las mismas
+mediciones como réplicas independientes.
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+# Agregar el directorio actual al path
+sys.path.append(str(Path(__file__).parent))
+
+from utils.stats_utils import percentile
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+EXIT_OK = 0
+EXIT_REGRESSION = 1
+EXIT_INPUT_ERROR = 2
+
+# benchmark_dataset.py guarda cada lote (dataset_batch_N_results.json) y también el consolidado
+CONSOLIDATED_RESULTS = "dataset_benchmark_results.json"
+BATCH_RESULTS_PREFIX = "dataset_batch_"
+
+class BenchmarkComparator:
+    """Compara dos conjuntos de corridas de benchmark y detecta regresiones"""
+
+    def __init__(self,
+                 max_throughput_drop: float = 0.10,
+                 max_latency_increase: float = 0.10,
+                 max_accuracy_drop: Optional[float] = None,
+                 alpha: float = 0.05):
+        """
+        Args:
+            max_throughput_drop: Caída relativa de throughput tolerada (0.10 = 10%)
+            max_latency_increase: Aumento relativo de latencia p50/p95 tolerado
+            max_accuracy_drop: Caída absoluta de precisión de campos tolerada (None = solo reportar)
+            alpha: Nivel de significancia para las pruebas estadísticas
+        """
+        self.max_throughput_drop = max_throughput_drop
+        self.max_latency_increase = max_latency_increase
+        self.max_accuracy_drop = max_accuracy_drop
+        self.alpha = alpha
+
+    def load_runs(self, paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        Cargar corridas desde archivos o directorios
+
+        Args:
+            paths: Archivos JSON o directorios con resultados; cada uno se toma como
+                una ejecución (sus lotes se reducen al más grande)
+
+        Returns:
+            Lista de corridas normalizadas
+        """
+        runs = []
+        for path in paths:
+            if os.path.isdir(path):
+                files = sorted(str(p) for p in Path(path).glob("*.json"))
+                # El consolidado repite los lotes de los archivos por lote
+                if any(Path(f).name.startswith(BATCH_RESULTS_PREFIX) for f in files):
+                    files = [f for f in files if Path(f).name != CONSOLIDATED_RESULTS]
+            else:
+                files = [path]
+
+            path_runs = []
+            for file_path in files:
+                try:
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    logger.warning(f"No se pudo leer {file_path}: {e}")
+                    continue
+
+                loaded = self._normalize(data, file_path)
+                if not loaded:
+                    logger.warning(f"Formato de resultados no reconocido: {file_path}")
+                path_runs.extend(loaded)
+
+            runs.extend(self._largest_batch(path_runs, path))
+
+        return runs
+
+    @staticmethod
+    def _largest_batch(runs: List[Dict[str, Any]], path: str) -> List[Dict[str, Any]]:
+        """Quedarse con el lote más grande de una ejecución (los demás son prefijos de sus documentos)"""
+        batches = [r for r in runs if r['kind'] == 'batch']
+        if len(batches) <= 1:
+            return runs
+        largest = max(batches, key=lambda r: r['documents'])
+        logger.info(f"{path}: {len(batches)} lotes de la misma ejecución, se usa {largest['source']}")
+        return [r for r in runs if r['kind'] != 'batch' or r is largest]
+
+    @staticmethod
+    def group_by_kind(runs: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Corridas agrupadas por tipo (batch, stages, load_test)"""
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for run in runs:
+            groups.setdefault(run['kind'], []).append(run)
+        return groups
+
+    def _normalize(self, data: Any, source: str) -> List[Dict[str, Any]]:
+        """Convertir cualquiera de los formatos soportados a corridas normalizadas"""
+        if not isinstance(data, dict):
+            return []
+
+        if 'performance_metrics' in data and 'individual_results' in data:
+            return [self._normalize_batch(data, source)]
+
+        if 'stages' in data and 'documents' in data:
+            return [self._normalize_stages(data, source)]
+
+        if 'summary' in data and isinstance(data.get('requests'), list):
+            return [self._normalize_load_test(data, source)]
+
+        # dataset_benchmark_results.json: {tamaño_lote: {'batch_result': ...}}
+        runs = []
+        for key, value in data.items():
+            if isinstance(value, dict) and isinstance(value.get('batch_result'), dict):
+                runs.append(self._normalize_batch(value['batch_result'], f"{source}#{key}"))
+        return runs
+
+    def _normalize_batch(self, batch_result: Dict[str, Any], source: str) -> Dict[str, Any]:
+        """Normalizar un resultado de BatchProcessor"""
+        performance = batch_result.get('performance_metrics', {})
+        individual = batch_result.get('individual_results', [])
+        accuracy = performance.get('accuracy_metrics') or {}
+
+        # El throughput de un lote con tiempo estimado (documentos reutilizados) no se compara
+        estimated = batch_result.get('batch_info', {}).get('time_estimated', False)
+
+        return {
+            'source': source,
+            'kind': 'batch',
+            'documents': len(individual),
+            'throughput': None if estimated else performance.get('throughput'),
+            'latencies': [r['processing_time'] for r in individual if r.get('success') and r.get('processing_time')],
+            'success_rate': performance.get('success_rate'),
+            'field_accuracy': accuracy.get('avg_field_accuracy'),
+            'cer': accuracy.get('avg_cer'),
+            'wer': accuracy.get('avg_wer'),
+            'stages': {}
+        }
+
+    def _normalize_stages(self, data: Dict[str, Any], source: str) -> Dict[str, Any]:
+        """Normalizar un resultado de benchmark_stages.py"""
+        stages: Dict[str, List[float]] = {}
+        document_totals: List[float] = []
+
+        for document in data.get('documents', {}).values():
+            seconds = document.get('seconds', {})
+            for stage, values in seconds.items():
+                stages.setdefault(stage, []).extend(values)
+
+            # Latencia total por repetición = suma de etapas de esa repetición
+            repetitions = min((len(v) for v in seconds.values()), default=0)
+            for i in range(repetitions):
+                document_totals.append(sum(values[i] for values in seconds.values()))
+
+        total_time = sum(document_totals)
+        return {
+            'source': source,
+            'kind': 'stages',
+            'throughput': len(document_totals) / total_time if total_time > 0 else None,
+            'latencies': document_totals,
+            'success_rate': None,
+            'field_accuracy': None,
+            'cer': None,
+            'wer': None,
+            'stages': stages
+        }
+
+    def _normalize_load_test(self, data: Dict[str, Any], source: str) -> Dict[str, Any]:
+        """Normalizar un resultado de load_test.py"""
+        summary = data.get('summary', {})
+        stages: Dict[str, List[float]] = {}
+        for sample in data.get('requests', []):
+            for stage, seconds in sample.get('server_timings', {}).items():
+                stages.setdefault(stage, []).append(seconds)
+
+        error_rate = summary.get('error_rate')
+        return {
+            'source': source,
+            'kind': 'load_test',
+            'throughput': summary.get('throughput_rps'),
+            'latencies': [s['latency'] for s in data.get('requests', []) if s.get('ok')],
+            'success_rate': 1.0 - error_rate if error_rate is not None else None,
+            'field_accuracy': None,
+            'cer': None,
+            'wer': None,
+            'stages': stages
+        }
+
+    @staticmethod
+    def _relative_change(old: float, new: float) -> Optional[float]:
+        """Cambio relativo (new - old) / old"""
+        if old is None or new is None or old == 0:
+            return None
+        return (new - old) / old
+
+    @staticmethod
+    def _mean(values: List[float]) -> Optional[float]:
+        values = [v for v in values if v is not None]
+        return sum(values) / len(values) if values else None
+
+    def _latency_test(self, old: List[float], new: List[float]) -> Optional[float]:
+        """Prueba de Mann-Whitney (una cola: latencias nuevas mayores). Retorna p-valor"""
+        if len(old) < 3 or len(new) < 3:
+            return None
+        from scipy import stats
+        return float(stats.mannwhitneyu(new, old, alternative='greater').pvalue)
+
+    def _throughput_test(self, old: List[float], new: List[float]) -> Optional[float]:
+        """Prueba t de Welch (una cola: throughput nuevo menor). Retorna p-valor"""
+        if len(old) < 2 or len(new) < 2:
+            return None
+        if len(set(old)) == 1 and len(set(new)) == 1:
+            return 0.0 if new[0] < old[0] else 1.0
+        from scipy import stats
+        return float(stats.ttest_ind(new, old, equal_var=False, alternative='less').pvalue)
+
+    def _is_regression(self, change: Optional[float], limit: float, p_value: Optional[float]) -> bool:
+        """Regresión = supera el umbral y es significativa (o no hay muestras suficientes para probarlo)"""
+        if change is None or change <= limit:
+            return False
+        return p_value is None or p_value < self.alpha
+
+    def _compare_latencies(self, name: str, old: List[float], new: List[float]) -> Dict[str, Any]:
+        """Comparar percentiles de una muestra de latencias"""
+        p_value = self._latency_test(old, new)
+        comparison = {'name': name, 'p_value': p_value, 'old_samples': len(old), 'new_samples': len(new)}
+
+        regression = False
+        for q in (50, 95):
+            old_value = percentile(old, q)
+            new_value = percentile(new, q)
+            change = self._relative_change(old_value, new_value)
+            comparison[f'p{q}'] = {'old': old_value, 'new': new_value, 'change': change}
+            regression = regression or self._is_regression(change, self.max_latency_increase, p_value)
+
+        comparison['regression'] = regression
+        return comparison
+
+    def compare(self, old_runs: List[Dict[str, Any]], new_runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Comparar dos conjuntos de corridas
+
+        Args:
+            old_runs: Corridas de referencia
+            new_runs: Corridas nuevas (todas del mismo tipo que las de referencia)
+
+        Returns:
+            Diccionario con las diferencias, p-valores y regresiones detectadas
+
+        Raises:
+            ValueError: Si se mezclan tipos de corrida (ver group_by_kind)
+        """
+        kinds = sorted({r['kind'] for r in old_runs + new_runs})
+        if len(kinds) > 1:
+            raise ValueError(f"No se pueden comparar corridas de distinto tipo: {', '.join(kinds)}")
+        regressions = []
+
+        # Throughput (una muestra por corrida)
+        old_throughput = [r['throughput'] for r in old_runs if r['throughput']]
+        new_throughput = [r['throughput'] for r in new_runs if r['throughput']]
+        old_mean = self._mean(old_throughput)
+        new_mean = self._mean(new_throughput)
+        drop = -self._relative_change(old_mean, new_mean) if old_mean and new_mean else None
+        throughput_p = self._throughput_test(old_throughput, new_throughput)
+        throughput = {
+            'old': old_mean,
+            'new': new_mean,
+            'change': self._relative_change(old_mean, new_mean),
+            'p_value': throughput_p,
+            'old_runs': len(old_throughput),
+            'new_runs': len(new_throughput),
+            'regression': self._is_regression(drop, self.max_throughput_drop, throughput_p)
+        }
+        if throughput['regression']:
+            regressions.append(f"Throughput cayó {drop:.1%} (límite {self.max_throughput_drop:.0%})")
+
+        # Latencia por documento (muestras agrupadas de todas las corridas)
+        latency = self._compare_latencies(
+            'total',
+            [v for r in old_runs for v in r['latencies']],
+            [v for r in new_runs for v in r['latencies']]
+        )
+        if latency['regression']:
+            regressions.append(
+                f"Latencia aumentó (p50 {latency['p50']['change']:+.1%}, p95 {latency['p95']['change']:+.1%}, "
+                f"límite {self.max_latency_increase:.0%})"
+            )
+
+        # Latencia por etapa (benchmark_stages.py y tiempos del servidor en load_test.py)
+        stage_names = sorted({s for r in old_runs + new_runs for s in r['stages']})
+        stages = {}
+        for stage in stage_names:
+            old_values = [v for r in old_runs for v in r['stages'].get(stage, [])]
+            new_values = [v for r in new_runs for v in r['stages'].get(stage, [])]
+            if not old_values or not new_values:
+                continue
+            stages[stage] = self._compare_latencies(stage, old_values, new_values)
+            if stages[stage]['regression']:
+                regressions.append(f"Etapa '{stage}' más lenta (p95 {stages[stage]['p95']['change']:+.1%})")
+
+        # Precisión
+        accuracy = {}
+        for metric in ('field_accuracy', 'cer', 'wer', 'success_rate'):
+            old_value = self._mean([r[metric] for r in old_runs])
+            new_value = self._mean([r[metric] for r in new_runs])
+            if old_value is None or new_value is None:
+                continue
+            accuracy[metric] = {'old': old_value, 'new': new_value, 'delta': new_value - old_value}
+
+        field_delta = accuracy.get('field_accuracy', {}).get('delta')
+        if self.max_accuracy_drop is not None and field_delta is not None and -field_delta > self.max_accuracy_drop:
+            regressions.append(f"Precisión de campos cayó {-field_delta:.3f} (límite {self.max_accuracy_drop:.3f})")
+
+        return {
+            'kind': kinds[0] if kinds else None,
+            'thresholds': {
+                'max_throughput_drop': self.max_throughput_drop,
+                'max_latency_increase': self.max_latency_increase,
+                'max_accuracy_drop': self.max_accuracy_drop,
+                'alpha': self.alpha
+            },
+            'old_sources': [r['source'] for r in old_runs],
+            'new_sources': [r['source'] for r in new_runs],
+            'throughput': throughput,
+            'latency': latency,
+            'stages': stages,
+            'accuracy': accuracy,
+            'regressions': regressions,
+            'passed': not regressions
+        }
+
+    def generate_report(self, comparison: Dict[str, Any]) -> str:
+        """Generar reporte de texto de la comparación"""
+        def fmt_change(change):
+            return f"{change:+.1%}" if change is not None else "n/a"
+
+        def fmt_p(p_value):
+            return f"{p_value:.4f}" if p_value is not None else "sin prueba"
+
+        throughput = comparison['throughput']
+        latency = comparison['latency']
+
+        report = f"""
+=== COMPARACIÓN DE BENCHMARKS ({comparison['kind']}) ===
+Corridas anteriores: {len(comparison['old_sources'])}
+Corridas nuevas: {len(comparison['new_sources'])}
+
+THROUGHPUT (docs/seg):
+- Anterior: {throughput['old'] or 0:.3f} | Nuevo: {throughput['new'] or 0:.3f} | Cambio: {fmt_change(throughput['change'])} | p-valor: {fmt_p(throughput['p_value'])}
+
+LATENCIA POR DOCUMENTO (s):
+- p50: {latency['p50']['old']:.3f} -> {latency['p50']['new']:.3f} ({fmt_change(latency['p50']['change'])})
+- p95: {latency['p95']['old']:.3f} -> {latency['p95']['new']:.3f} ({fmt_change(latency['p95']['change'])})
+- p-valor (Mann-Whitney): {fmt_p(latency['p_value'])}
+"""
+
+        if comparison['stages']:
+            report += "\nLATENCIA POR ETAPA (p95, s):\n"
+            for stage, data in comparison['stages'].items():
+                marker = " <-- REGRESIÓN" if data['regression'] else ""
+                report += (f"- {stage:<18} {data['p95']['old']:.3f} -> {data['p95']['new']:.3f} "
+                           f"({fmt_change(data['p95']['change'])}, p={fmt_p(data['p_value'])}){marker}\n")
+
+        if comparison['accuracy']:
+            report += "\nPRECISIÓN:\n"
+            for metric, data in comparison['accuracy'].items():
+                report += f"- {metric}: {data['old']:.3f} -> {data['new']:.3f} ({data['delta']:+.3f})\n"
+
+        report += "\nRESULTADO: "
+        if comparison['passed']:
+            report += "OK - sin regresiones de rendimiento\n"
+        else:
+            report += "REGRESIÓN DETECTADA\n"
+            for regression in comparison['regressions']:
+                report += f"  • {regression}\n"
+
+        return report
+
+def main():
+    """Función principal del script"""
+    parser = argparse.ArgumentParser(description='Comparar corridas de benchmark y detectar regresiones')
+    parser.add_argument('--old', nargs='+', required=True, help='Resultados de referencia (archivos o directorios)')
+    parser.add_argument('--new', nargs='+', required=True, help='Resultados nuevos (archivos o directorios)')
+    parser.add_argument('--max-throughput-drop', type=float, default=0.10,
+                        help='Caída relativa de throughput tolerada (default: 0.10)')
+    parser.add_argument('--max-latency-increase', type=float, default=0.10,
+                        help='Aumento relativo de latencia p50/p95 tolerado (default: 0.10)')
+    parser.add_argument('--max-accuracy-drop', type=float, default=None,
+                        help='Caída absoluta de precisión de campos tolerada (por defecto solo se reporta)')
+    parser.add_argument('--alpha', type=float, default=0.05, help='Nivel de significancia (default: 0.05)')
+    parser.add_argument('--output', default=None, help='Guardar la comparación en JSON')
+
+    args = parser.parse_args()
+
+    comparator = BenchmarkComparator(
+        max_throughput_drop=args.max_throughput_drop,
+        max_latency_increase=args.max_latency_increase,
+        max_accuracy_drop=args.max_accuracy_drop,
+        alpha=args.alpha
+    )
+
+    old_runs = comparator.load_runs(args.old)
+    new_runs = comparator.load_runs(args.new)
+    if not old_runs or not new_runs:
+        logger.error("No se encontraron resultados válidos para comparar")
+        sys.exit(EXIT_INPUT_ERROR)
+
+    old_groups = comparator.group_by_kind(old_runs)
+    new_groups = comparator.group_by_kind(new_runs)
+    for kind in sorted(set(old_groups) ^ set(new_groups)):
+        logger.warning(f"Corridas de tipo '{kind}' en un solo lado, no se comparan")
+    kinds = sorted(set(old_groups) & set(new_groups))
+    if not kinds:
+        logger.error("No hay corridas del mismo tipo para comparar")
+        sys.exit(EXIT_INPUT_ERROR)
+
+    comparisons = {kind: comparator.compare(old_groups[kind], new_groups[kind]) for kind in kinds}
+    for comparison in comparisons.values():
+        print(comparator.generate_report(comparison))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(comparisons, f, indent=2, ensure_ascii=False)
+        logger.info(f"Comparación guardada en {args.output}")
+
+    passed = all(comparison['passed'] for comparison in comparisons.values())
+    sys.exit(EXIT_OK if passed else EXIT_REGRESSION)
+
+if __name__ == "__main__":
+    main()
@@ -73,6 +73,65 @@ class Settings:
         "use_simple_preprocessing": True   # Usar preprocesamiento simple
     }
     
+    # Facturas duplicadas (reescaneadas o refotografiadas) detectadas por hash perceptual
+    DUPLICATE_DETECTION_ENABLED = os.getenv("DUPLICATE_DETECTION_ENABLED", "True").lower() == "true"
+    DUPLICATE_INDEX_DB_PATH = os.getenv("DUPLICATE_INDEX_DB_PATH", os.path.join("duplicate_index", "documents.db"))
+    DUPLICATE_MAX_DISTANCE = int(os.getenv("DUPLICATE_MAX_DISTANCE", 4))  # Bits distintos (de 64) en dHash y pHash
+    DUPLICATE_INDEX_MAX_ENTRIES = int(os.getenv("DUPLICATE_INDEX_MAX_ENTRIES", 50000))
+    # Tras verificar total, número de comprobante, punto de venta y fecha en sus zonas
+    DUPLICATE_REUSE_PARSE = os.getenv("DUPLICATE_REUSE_PARSE", "False").lower() == "true"
+    
+    # Resolución objetivo del OCR: los JPEG más grandes se decodifican reducidos (1/2, 1/4, 1/8) sin bajar de este lado
+    OCR_TARGET_MAX_SIDE = int(os.getenv("OCR_TARGET_MAX_SIDE", 3508))  # A4 a 300 DPI; 0 = resolución original
+    
+    # Imágenes muy grandes: preprocesamiento y OCR por franjas horizontales solapadas
+    TILED_MIN_PIXELS = int(os.getenv("TILED_MIN_PIXELS", 30_000_000))  # Por encima se procesa por franjas
+    TILE_MAX_PIXELS = int(os.getenv("TILE_MAX_PIXELS", 8_000_000))  # Píxeles por franja (define su alto)
+    TILE_OVERLAP = int(os.getenv("TILE_OVERLAP", 160))  # Filas compartidas entre franjas vecinas (> alto de un renglón)
+    
+    # Corrección de orientación (OSD) e inclinación (perfil de proyección) antes del layout y del OCR
+    DESKEW_ENABLED = os.getenv("DESKEW_ENABLED", "True").lower() == "true"
+    DESKEW_MAX_SIDE = int(os.getenv("DESKEW_MAX_SIDE", 1200))  # Lado mayor de la copia reducida donde se estima
+    DESKEW_MAX_ANGLE = float(os.getenv("DESKEW_MAX_ANGLE", 15.0))  # grados
+    DESKEW_MIN_ANGLE = float(os.getenv("DESKEW_MIN_ANGLE", 0.3))  # Inclinaciones menores no se corrigen
+    DESKEW_OSD_ENABLED = os.getenv("DESKEW_OSD_ENABLED", "True").lower() == "true"
+    DESKEW_OSD_MIN_CONFIDENCE = float(os.getenv("DESKEW_OSD_MIN_CONFIDENCE", 2.0))
+    
+    # Profiler bajo demanda (header X-Profile o POST /admin/profiling/arm)
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "False").lower() == "true"
+    PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+    PROFILING_MAX_BYTES = int(os.getenv("PROFILING_MAX_BYTES", 100 * 1024 * 1024))  # 100MB
+    PROFILING_SAMPLE_INTERVAL = float(os.getenv("PROFILING_SAMPLE_INTERVAL", 0.005))  # segundos
+    # Se exige en X-Admin-Token y en X-Profile; sin token los endpoints /admin responden 503 y X-Profile no tiene efecto
+    PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+    
+    # Pool de hilos para OCR (process_image no bloquea el event loop)
+    OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+    OCR_MAX_WAITING = int(os.getenv("OCR_MAX_WAITING", os.cpu_count() or 1))  # En espera antes de que /ready responda 503
+    
+    # Monitor de salud en segundo plano (/health y /ready leen el estado cacheado)
+    HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", 30.0))  # segundos
+    HEALTH_MIN_FREE_DISK_MB = int(os.getenv("HEALTH_MIN_FREE_DISK_MB", 500))
+    
+    # Outbox persistente para los envíos a la API externa
+    OUTBOX_DB_PATH = os.getenv("OUTBOX_DB_PATH", os.path.join("outbox", "outbox.db"))
+    OUTBOX_DIR = os.getenv("OUTBOX_DIR", os.path.join("outbox", "files"))
+    OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", 4))  # Envíos simultáneos
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 10))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+    OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", 2.0))  # segundos
+    OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", 300.0))  # segundos
+    OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", 7))  # Entregados que se conservan
+    
+    # Plantillas de layout por proveedor (CUIT): OCR solo de las regiones de los campos
+    VENDOR_TEMPLATES_ENABLED = os.getenv("VENDOR_TEMPLATES_ENABLED", "True").lower() == "true"
+    VENDOR_TEMPLATES_DB_PATH = os.getenv("VENDOR_TEMPLATES_DB_PATH", os.path.join("vendor_templates", "templates.db"))
+    VENDOR_TEMPLATE_MIN_FIELDS = int(os.getenv("VENDOR_TEMPLATE_MIN_FIELDS", 4))  # Campos ubicados para guardar una plantilla
+    
+    # Zonas numéricas (CUIT, fecha, importes) releídas con lista blanca de dígitos
+    NUMERIC_ZONE_OCR_ENABLED = os.getenv("NUMERIC_ZONE_OCR_ENABLED", "True").lower() == "true"
+    NUMERIC_OCR_CACHE_SIZE = int(os.getenv("NUMERIC_OCR_CACHE_SIZE", 2048))  # Zonas cacheadas por contenido
+    
     # Configuración de OCR (optimizada para máxima detección)
     OCR_CONFIG = {
         "lang": "spa+eng",  # Español + inglés como fallback
@@ -11,6 +11,16 @@ EXTERNAL_API_CONFIG = {
     "timeout": 30,
     "retry_attempts": 3,
     "retry_delay": 1.0,
+    # Cliente HTTP persistente (pool de conexiones con keep-alive)
+    "connect_timeout": 5.0,
+    "pool_timeout": 5.0,
+    "health_timeout": 5.0,
+    "max_connections": int(os.getenv("FACTURAS_API_MAX_CONNECTIONS", 20)),
+    "max_keepalive_connections": int(os.getenv("FACTURAS_API_MAX_KEEPALIVE", 10)),
+    "keepalive_expiry": 30.0,
+    "http2": os.getenv("FACTURAS_API_HTTP2", "False").lower() == "true",  # Requiere el paquete h2
+    # Envío del archivo: hex (JSON original), o multipart / raw (binario, cuerpo + headers X-*) si la API los acepta
+    "transfer_mode": os.getenv("FACTURAS_API_TRANSFER_MODE", "hex"),
     "headers": {
         "Content-Type": "application/json",
         "User-Agent": "FacturaProcessor/1.0"
@@ -4,77 +4,339 @@ Cliente para comunicarse con la API externa de gestión de facturas
 import httpx
 import os
 import asyncio
-from typing import Dict, Any, Optional
+import time
+from collections import deque
+from contextlib import ExitStack
+from typing import Dict, Any, Optional, Callable
 import logging
 
+from config_external import EXTERNAL_API_CONFIG
+from services.telemetry import EXTERNAL_API_REQUEST_DURATION, EXTERNAL_API_BYTES_SENT
+from utils.stats_utils import summarize
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Modos de transferencia del archivo a la API externa
+TRANSFER_MODES = ("multipart", "raw", "hex")
+
+# Respuestas que indican que la API externa no acepta el modo de transferencia
+UNSUPPORTED_TRANSFER_STATUS = {415}
+# Respuestas a un envío binario que se reintentan en hex: una API que solo lee el JSON
+# original suele responder 400/422 (cuerpo inválido) en lugar de 415
+TRANSFER_FALLBACK_STATUS = UNSUPPORTED_TRANSFER_STATUS | {400, 422}
+
+# Tamaño de los bloques leídos del disco en modo raw
+RAW_CHUNK_SIZE = 256 * 1024
+
 class FacturasAPIClient:
-    def __init__(self):
-        self.base_url = "http://127.0.0.1:8000"
-        self.endpoint = "/api/gestion/facturas/cargar-imagenes/"
-        self.timeout = 30.0
-        self.retry_attempts = 3
-        self.retry_delay = 1.0  # segundos
-    
-    async def enviar_factura(self, datos_factura: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            config: Configuración del cliente (por defecto EXTERNAL_API_CONFIG)
+        """
+        config = config or EXTERNAL_API_CONFIG
+        self.config = config
+        self.base_url = config.get("base_url", "http://127.0.0.1:8000")
+        self.endpoint = config.get("endpoint", "/api/gestion/facturas/cargar-imagenes/")
+        self.timeout = float(config.get("timeout", 30.0))
+        self.retry_attempts = int(config.get("retry_attempts", 3))
+        self.retry_delay = float(config.get("retry_delay", 1.0))  # segundos
+        self.health_timeout = float(config.get("health_timeout", 5.0))
+        self.transfer_mode = config.get("transfer_mode", "hex")
+        if self.transfer_mode not in TRANSFER_MODES:
+            logger.warning(f"Modo de transferencia desconocido '{self.transfer_mode}', usando hex")
+            self.transfer_mode = "hex"
+        
+        # Cliente HTTP persistente: se crea en el arranque de la app (o en el primer uso)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stats = {
+            "requests": 0,
+            "errors": 0,
+            "new_connections": 0,
+            "bytes_sent": {},
+            "transfer_fallbacks": 0,
+            "latencies": {}
+        }
+    
+    def _build_client(self) -> httpx.AsyncClient:
+        """Crear el cliente con pool de conexiones, keep-alive y timeouts de la configuración"""
+        config = self.config
+        limits = httpx.Limits(
+            max_connections=config.get("max_connections", 20),
+            max_keepalive_connections=config.get("max_keepalive_connections", 10),
+            keepalive_expiry=config.get("keepalive_expiry", 30.0)
+        )
+        timeout = httpx.Timeout(
+            self.timeout,
+            connect=config.get("connect_timeout", 5.0),
+            pool=config.get("pool_timeout", 5.0)
+        )
+        
+        http2 = bool(config.get("http2", False))
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 habilitado pero el paquete 'h2' no está instalado. Usando HTTP/1.1")
+                http2 = False
+        
+        headers = {k: v for k, v in config.get("headers", {}).items() if k.lower() != "content-type"}
+        return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2, headers=headers)
+    
+    async def start(self):
+        """Crear el cliente persistente (llamar en el arranque de la aplicación)"""
+        loop = asyncio.get_running_loop()
+        # Las conexiones del pool quedan ligadas al event loop donde se crearon
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = self._build_client()
+            self._client_loop = loop
+            logger.info(f"Cliente HTTP persistente creado para {self.base_url}")
+    
+    async def close(self):
+        """Cerrar el cliente y sus conexiones (llamar al apagar la aplicación)"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("Cliente HTTP de API externa cerrado")
+        self._client = None
+        self._client_loop = None
+    
+    async def _get_client(self) -> httpx.AsyncClient:
+        await self.start()
+        return self._client
+    
+    async def _trace(self, event_name: str, info: Dict[str, Any]):
+        """Extensión 'trace' de httpcore: cuenta las conexiones TCP nuevas"""
+        if event_name == "connection.connect_tcp.complete":
+            self._stats["new_connections"] += 1
+    
+    async def _request(self, method: str, url: str, operation: str, **kwargs) -> httpx.Response:
+        """Ejecutar un request con el cliente persistente registrando latencia y reutilización"""
+        client = await self._get_client()
+        extensions = dict(kwargs.pop("extensions", {}), trace=self._trace)
+        request = client.build_request(method, url, extensions=extensions, **kwargs)
+        
+        # Bytes del cuerpo (httpx calcula el Content-Length de multipart sin leer el archivo)
+        content_length = int(request.headers.get("Content-Length", 0))
+        if content_length:
+            self._stats["bytes_sent"][operation] = self._stats["bytes_sent"].get(operation, 0) + content_length
+            EXTERNAL_API_BYTES_SENT.inc(operation, amount=content_length)
+        
+        self._stats["requests"] += 1
+        start = time.perf_counter()
+        try:
+            response = await client.send(request)
+        except httpx.TimeoutException:
+            self._record(operation, "timeout", time.perf_counter() - start)
+            raise
+        except Exception:
+            self._record(operation, "error", time.perf_counter() - start)
+            raise
+        
+        outcome = "success" if response.status_code < 400 else f"http_{response.status_code}"
+        self._record(operation, outcome, time.perf_counter() - start)
+        return response
+    
+    def _record(self, operation: str, outcome: str, elapsed: float):
+        EXTERNAL_API_REQUEST_DURATION.observe(elapsed, operation, outcome)
+        if outcome != "success":
+            self._stats["errors"] += 1
+        latencies = self._stats["latencies"].setdefault(operation, deque(maxlen=1000))
+        latencies.append(elapsed)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Estadísticas del cliente: requests, conexiones nuevas vs reutilizadas y latencia
+        
+        Returns:
+            Diccionario con los contadores y un resumen de latencia por operación
+        """
+        requests = self._stats["requests"]
+        new_connections = self._stats["new_connections"]
+        reused = max(0, requests - new_connections)
+        return {
+            "client_active": self._client is not None and not self._client.is_closed,
+            "http2": bool(self.config.get("http2", False)),
+            "requests": requests,
+            "errors": self._stats["errors"],
+            "new_connections": new_connections,
+            "reused_connections": reused,
+            "connection_reuse_rate": reused / requests if requests else 0.0,
+            "transfer_mode": self.transfer_mode,
+            "transfer_fallbacks": self._stats["transfer_fallbacks"],
+            "bytes_sent": dict(self._stats["bytes_sent"]),
+            "latency": {op: summarize(values) for op, values in self._stats["latencies"].items()}
+        }
+    
+    async def enviar_factura(self, datos_factura: Dict[str, Any],
+                             attempts: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """
         Enviar datos de factura procesada a la API externa
         
         Args:
             datos_factura: Diccionario con los datos de la factura procesada
+            attempts: Intentos de envío (por defecto retry_attempts)
             
         Returns:
             Respuesta de la API externa o None si hay error
         """
-        headers = {
-            "Content-Type": "application/json",
-            "User-Agent": "FacturaProcessor/1.0"
-        }
+        headers = self._auth_headers({"Content-Type": "application/json"})
+        return await self._post_with_retries(
+            "enviar_factura", lambda stack: {"json": datos_factura, "headers": headers}, attempts
+        )
+    
+    async def enviar_archivo(self, file_path: str, filename: str, content_type: str,
+                             metadata: Optional[Dict[str, Any]] = None,
+                             transfer_mode: Optional[str] = None,
+                             attempts: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Enviar un archivo a la API externa sin cargarlo completo en memoria
+        
+        Args:
+            file_path: Ruta del archivo a enviar
+            filename: Nombre con el que se informa el archivo
+            content_type: Tipo de contenido del archivo
+            metadata: Campos adicionales (callback_url, status_url, ...)
+            transfer_mode: 'hex' (JSON con el archivo en hexadecimal, formato original),
+                'multipart' o 'raw' (cuerpo binario con metadatos en headers X-*); por defecto
+                el de la configuración (FACTURAS_API_TRANSFER_MODE, hex si no se define)
+            attempts: Intentos de envío (por defecto retry_attempts; el outbox usa 1 y
+                aplica su propio backoff)
+            
+        Returns:
+            Respuesta de la API externa o diccionario con el error
+        """
+        mode = transfer_mode or self.transfer_mode
+        metadata = metadata or {}
+        size = os.path.getsize(file_path)
+        
+        if mode == "multipart":
+            def make_request(stack: ExitStack) -> Dict[str, Any]:
+                file_obj = stack.enter_context(open(file_path, 'rb'))
+                data = {key: str(value) for key, value in metadata.items()}
+                data["size"] = str(size)
+                return {
+                    "files": {"imagen": (filename, file_obj, content_type)},
+                    "data": data,
+                    "headers": self._auth_headers({})
+                }
+        elif mode == "raw":
+            def make_request(stack: ExitStack) -> Dict[str, Any]:
+                headers = self._auth_headers({
+                    "Content-Type": content_type,
+                    "Content-Length": str(size),
+                    "X-Filename": filename,
+                    "X-File-Size": str(size)
+                })
+                for key, value in metadata.items():
+                    headers[f"X-{key.replace('_', '-').title()}"] = str(value)
+                return {"content": self._iter_file(file_path), "headers": headers}
+        else:
+            return await self.enviar_factura(self._hex_payload(file_path, filename, content_type, size, metadata), attempts)
+        
+        logger.info(f"Enviando archivo a API externa en modo {mode} ({size} bytes)")
+        result = await self._post_with_retries(f"enviar_archivo_{mode}", make_request, attempts)
         
-        # Si hay API key configurada, agregar autenticación
+        status_code = result.get("status_code") if isinstance(result, dict) else None
+        if status_code in TRANSFER_FALLBACK_STATUS:
+            # La API externa no acepta el modo binario: usar el formato hex compatible
+            logger.warning(f"API externa rechazó el modo {mode} (HTTP {status_code}), reintentando en modo hex")
+            self._stats["transfer_fallbacks"] += 1
+            result = await self.enviar_factura(self._hex_payload(file_path, filename, content_type, size, metadata), attempts)
+            # Un 400/422 puede ser un error de los datos: el modo se cambia solo si hex funcionó
+            hex_accepted = not (isinstance(result, dict) and "error" in result)
+            if transfer_mode is None and (status_code in UNSUPPORTED_TRANSFER_STATUS or hex_accepted):
+                self.transfer_mode = "hex"
+        
+        return result
+    
+    @staticmethod
+    def _hex_payload(file_path: str, filename: str, content_type: str, size: int,
+                     metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Cuerpo JSON original: el archivo como string hexadecimal"""
+        with open(file_path, 'rb') as file_to_send:
+            file_data = file_to_send.read()
+        return {
+            "imagen": {
+                "filename": filename,
+                "content_type": content_type,
+                "data": file_data.hex(),  # Archivo como hex string
+                "size": size
+            },
+            **metadata
+        }
+    
+    @staticmethod
+    async def _iter_file(file_path: str):
+        """Leer el archivo en bloques para enviarlo como cuerpo del request"""
+        with open(file_path, 'rb') as file_obj:
+            while True:
+                chunk = file_obj.read(RAW_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    
+    @staticmethod
+    def _auth_headers(headers: Dict[str, str]) -> Dict[str, str]:
+        """Agregar User-Agent y, si hay API key configurada, autenticación"""
+        headers = dict(headers, **{"User-Agent": "FacturaProcessor/1.0"})
         api_key = os.getenv("FACTURAS_API_KEY")
         if api_key:
             headers["Authorization"] = f"Bearer {api_key}"
+        return headers
+    
+    async def _post_with_retries(self, operation: str,
+                                 make_request: Callable[[ExitStack], Dict[str, Any]],
+                                 attempts: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        POST al endpoint de facturas con reintentos
         
-        for attempt in range(self.retry_attempts):
+        Args:
+            operation: Nombre de la operación para métricas
+            make_request: Arma los argumentos del request en cada intento (los archivos
+                abiertos se registran en el ExitStack y se cierran al terminar el intento)
+            attempts: Cantidad de intentos (por defecto retry_attempts)
+        """
+        attempts = attempts or self.retry_attempts
+        for attempt in range(attempts):
             try:
-                async with httpx.AsyncClient() as client:
-                    logger.info(f"Enviando factura a API externa (intento {attempt + 1}/{self.retry_attempts})")
-                    
-                    response = await client.post(
+                logger.info(f"Enviando factura a API externa (intento {attempt + 1}/{attempts})")
+                
+                with ExitStack() as stack:
+                    response = await self._request(
+                        "POST",
                         f"{self.base_url}{self.endpoint}",
-                        json=datos_factura,
-                        headers=headers,
-                        timeout=self.timeout
+                        operation,
+                        **make_request(stack)
                     )
-                    
-                    response.raise_for_status()
-                    logger.info("Factura enviada exitosamente a API externa")
-                    return response.json()
+                
+                response.raise_for_status()
+                logger.info("Factura enviada exitosamente a API externa")
+                return response.json()
                     
             except httpx.TimeoutException:
                 logger.warning(f"Timeout al comunicarse con API de facturas (intento {attempt + 1})")
-                if attempt < self.retry_attempts - 1:
+                if attempt < attempts - 1:
                     await asyncio.sleep(self.retry_delay * (attempt + 1))
                     continue
                 return {"error": "Timeout al comunicarse con API externa"}
                 
             except httpx.HTTPStatusError as e:
                 logger.error(f"Error HTTP {e.response.status_code}: {e.response.text}")
-                if attempt < self.retry_attempts - 1:
+                if attempt < attempts - 1 and e.response.status_code not in TRANSFER_FALLBACK_STATUS:
                     await asyncio.sleep(self.retry_delay * (attempt + 1))
                     continue
                 return {
                     "error": f"Error HTTP {e.response.status_code}",
+                    "status_code": e.response.status_code,
                     "details": e.response.text
                 }
                 
             except Exception as e:
                 logger.error(f"Error inesperado: {e}")
-                if attempt < self.retry_attempts - 1:
+                if attempt < attempts - 1:
                     await asyncio.sleep(self.retry_delay * (attempt + 1))
                     continue
                 return {"error": f"Error inesperado: {str(e)}"}
@@ -89,13 +351,11 @@ class FacturasAPIClient:
             True si está disponible, False en caso contrario
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/health",
-                    timeout=5.0
-                )
-                return response.status_code == 200
-        except:
+            response = await self._request(
+                "GET", f"{self.base_url}/health", "health", timeout=self.health_timeout
+            )
+            return response.status_code == 200
+        except Exception:
             return False
     
     def configurar_url(self, nueva_url: str):
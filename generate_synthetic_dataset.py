@@ -0,0 +1,458 @@
+"""
+Generador de facturas argentinas sintéticas para pruebas de carga y escalabilidad
+
+Renderiza facturas con PIL y escribe, para cada documento, la imagen y su JSON
+de ground truth con el formato que espera benchmark_dataset.py (factura_N.png +
+factura_N.json). Además genera ground_truth.json con el esquema de
+ejemplo_ground_truth.json (nombre de archivo -> campos).
+
+Variaciones soportadas: cantidad de items, tipos A/B/C, ruido, inclinación,
+resolución y páginas con varias facturas.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Agregar el directorio actual al path
+sys.path.append(str(Path(__file__).parent))
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Datos de ejemplo para armar facturas realistas
+EMPRESAS = [
+    "Soluciones Integrales SRL", "Global Network SA", "Tecnologia del Sur SRL",
+    "Distribuidora Pampeana SA", "Servicios Andinos SRL", "Consultora Rioplatense SA",
+    "Logistica Patagonica SRL", "Insumos del Litoral SA", "Grupo Cordillera SRL",
+    "Comercial Cuyo SA"
+]
+CLIENTES = [
+    "Juan Perez", "Maria Gonzalez", "Carlos Rodriguez", "Ana Martinez", "Lucia Fernandez",
+    "Diego Lopez", "Sofia Romero", "Martin Alvarez", "Valentina Torres", "Pablo Sosa"
+]
+CALLES = ["Av. Corrientes", "Calle Montevideo", "Av. Santa Fe", "San Martin", "Belgrano", "Av. Rivadavia"]
+PRODUCTOS = [
+    "Servicio de consultoria", "Licencia software", "Soporte tecnico", "Analisis de datos",
+    "Mantenimiento preventivo", "Capacitacion", "Desarrollo web", "Auditoria contable",
+    "Hosting anual", "Diseno grafico", "Instalacion de red", "Asesoramiento legal"
+]
+CONDICIONES_IVA = {
+    'A': ["Responsable Inscripto"],
+    'B': ["Consumidor Final", "Exento", "Monotributista"],
+    'C': ["Consumidor Final", "Responsable Inscripto", "Exento"]
+}
+CONDICIONES_VENTA = ["Contado", "Crédito", "Transferencia", "Efectivo", "Tarjeta"]
+BONIFICACIONES = [0, 0, 0, 5, 10, 14, 15, 19, 20]
+
+# Tamaño A4 en puntos (1/72 pulgada)
+PAGE_WIDTH_PT = 595
+PAGE_HEIGHT_PT = 842
+
+FONT_CANDIDATES = [
+    "DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+    "/Library/Fonts/Arial.ttf"
+]
+
+def format_amount(value: float) -> str:
+    """Formatear un importe al estilo argentino (12.960,00)"""
+    return f"{value:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+def cuit_check_digit(base: str) -> int:
+    """Calcular el dígito verificador de un CUIT"""
+    weights = [5, 4, 3, 2, 7, 6, 5, 4, 3, 2]
+    total = sum(int(d) * w for d, w in zip(base, weights))
+    remainder = 11 - (total % 11)
+    if remainder == 11:
+        return 0
+    if remainder == 10:
+        return 9
+    return remainder
+
+class SyntheticInvoiceFactory:
+    """Genera los datos (ground truth) de facturas sintéticas"""
+
+    def __init__(self, rng: random.Random, min_items: int = 1, max_items: int = 8):
+        self.rng = rng
+        self.min_items = min_items
+        self.max_items = max_items
+
+    def _cuit(self, prefix: str) -> str:
+        base = prefix + f"{self.rng.randint(0, 99999999):08d}"
+        return f"{base[:2]}-{base[2:]}-{cuit_check_digit(base)}"
+
+    def create(self, tipo_factura: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Crear los datos de una factura
+
+        Args:
+            tipo_factura: Tipo A, B o C (aleatorio si no se indica)
+
+        Returns:
+            Diccionario con el esquema de ground truth del dataset
+        """
+        rng = self.rng
+        tipo = tipo_factura or rng.choice(['A', 'B', 'C'])
+
+        items = []
+        subtotal = 0.0
+        for codigo in range(1, rng.randint(self.min_items, self.max_items) + 1):
+            cantidad = rng.randint(1, 10)
+            precio = round(rng.uniform(500, 20000), 2)
+            bonificacion = rng.choice(BONIFICACIONES)
+            importe_bonificacion = round(cantidad * precio * bonificacion / 100, 2)
+            item_subtotal = round(cantidad * precio - importe_bonificacion, 2)
+            subtotal += item_subtotal
+            items.append({
+                'codigo': str(codigo),
+                'descripcion': rng.choice(PRODUCTOS),
+                'cantidad': str(cantidad),
+                'unidad_medida': 'unidad',
+                'precio_unitario': format_amount(precio),
+                'bonificacion': f"{bonificacion}%",
+                'importe_bonificacion': format_amount(importe_bonificacion),
+                'subtotal': format_amount(item_subtotal)
+            })
+
+        subtotal = round(subtotal, 2)
+        iva = round(subtotal * 0.21, 2) if tipo == 'A' else 0.0
+        percepcion = round(subtotal * rng.choice([0, 0.015, 0.03]), 2)
+        otros_tributos = round(rng.choice([0, 0, rng.uniform(100, 1500)]), 2)
+        importe_total = round(subtotal + iva + percepcion + otros_tributos, 2)
+
+        fecha = f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(2023, 2025)}"
+
+        return {
+            'tipo_factura': tipo,
+            'razon_social_emisor': rng.choice(EMPRESAS),
+            'cuit_emisor': self._cuit(rng.choice(['30', '33'])),
+            'domicilio_emisor': f"{rng.choice(CALLES)} {rng.randint(100, 5000)}",
+            'razon_social_receptor': rng.choice(CLIENTES),
+            'cuit_receptor': self._cuit(rng.choice(['20', '23', '27'])),
+            'domicilio_receptor': f"{rng.choice(CALLES)} {rng.randint(100, 5000)}",
+            'condicion_iva_receptor': rng.choice(CONDICIONES_IVA[tipo]),
+            'condicion_venta': rng.choice(CONDICIONES_VENTA),
+            'fecha_emision': fecha,
+            'punto_venta': f"{rng.randint(1, 20):05d}",
+            'numero_factura': f"{rng.randint(1, 99999999):08d}",
+            'subtotal': format_amount(subtotal),
+            'iva': format_amount(iva),
+            'percepcion_iibb': format_amount(percepcion),
+            'otros_tributos': format_amount(otros_tributos),
+            'importe_total': format_amount(importe_total),
+            'cae': ''.join(str(rng.randint(0, 9)) for _ in range(14)),
+            'items': items
+        }
+
+class InvoiceRenderer:
+    """Dibuja facturas con PIL siguiendo el formato de comprobantes AFIP"""
+
+    def __init__(self, dpi: int = 150):
+        self.dpi = dpi
+        self.scale = dpi / 72.0
+        self._fonts: Dict[int, ImageFont.ImageFont] = {}
+
+    def _font(self, size_pt: int) -> ImageFont.ImageFont:
+        size_px = max(8, int(size_pt * self.scale))
+        if size_px not in self._fonts:
+            font = None
+            for candidate in FONT_CANDIDATES:
+                try:
+                    font = ImageFont.truetype(candidate, size_px)
+                    break
+                except OSError:
+                    continue
+            self._fonts[size_px] = font or ImageFont.load_default(size=size_px)
+        return self._fonts[size_px]
+
+    def _text(self, draw: ImageDraw.ImageDraw, x: float, y: float, text: str, size: int = 8, bold: bool = False):
+        draw.text(
+            (int(x * self.scale), int(y * self.scale)), text, fill=0, font=self._font(size),
+            stroke_width=1 if bold and self.dpi >= 150 else 0, stroke_fill=0
+        )
+
+    def _line(self, draw: ImageDraw.ImageDraw, x1: float, y1: float, x2: float, y2: float):
+        draw.line(
+            [(int(x1 * self.scale), int(y1 * self.scale)), (int(x2 * self.scale), int(y2 * self.scale))],
+            fill=0, width=max(1, int(self.scale))
+        )
+
+    def render(self, invoice: Dict[str, Any]) -> Image.Image:
+        """
+        Renderizar una factura en una página A4 en escala de grises
+
+        Args:
+            invoice: Datos de la factura (ver SyntheticInvoiceFactory.create)
+
+        Returns:
+            Imagen PIL en modo 'L'
+        """
+        width = int(PAGE_WIDTH_PT * self.scale)
+        height = int(PAGE_HEIGHT_PT * self.scale)
+        image = Image.new('L', (width, height), 255)
+        draw = ImageDraw.Draw(image)
+
+        # Encabezado
+        self._text(draw, 250, 20, "ORIGINAL", 12, bold=True)
+        self._line(draw, 30, 40, 565, 40)
+        self._text(draw, 285, 48, invoice['tipo_factura'], 22, bold=True)
+        self._text(draw, 40, 50, invoice['razon_social_emisor'], 12, bold=True)
+        self._text(draw, 40, 75, f"Razón Social: {invoice['razon_social_emisor']}", 8)
+        self._text(draw, 40, 88, f"Domicilio Comercial: {invoice['domicilio_emisor']}", 8)
+        self._text(draw, 40, 101, "Condición frente al IVA: Responsable Inscripto", 8)
+
+        self._text(draw, 340, 50, "FACTURA", 14, bold=True)
+        self._text(draw, 340, 72, f"Punto de Venta: {invoice['punto_venta']}   Comp. Nro: {invoice['numero_factura']}", 8)
+        self._text(draw, 340, 85, f"Fecha de Emisión: {invoice['fecha_emision']}", 8)
+        self._text(draw, 340, 98, f"CUIT: {invoice['cuit_emisor']}", 8)
+        self._text(draw, 340, 111, "Ingresos Brutos: Exento", 8)
+        self._line(draw, 30, 128, 565, 128)
+
+        # Datos del comprador
+        self._text(draw, 40, 136, f"DNI: {invoice['cuit_receptor']}", 8)
+        self._text(draw, 200, 136, f"Apellido y Nombre / Razón Social: {invoice['razon_social_receptor']}", 8)
+        self._text(draw, 40, 150, f"Condición frente al IVA: {invoice['condicion_iva_receptor']}", 8)
+        self._text(draw, 300, 150, f"Domicilio: {invoice['domicilio_receptor']}", 8)
+        self._text(draw, 40, 164, f"Condición de venta: {invoice['condicion_venta']}", 8)
+        self._line(draw, 30, 180, 565, 180)
+
+        # Tabla de items
+        columns = [35, 80, 250, 300, 350, 420, 460, 510]
+        headers = ["Código", "Producto / Servicio", "Cantidad", "U. medida", "Precio Unit.", "% Bonif", "Imp. Bonif.", "Subtotal"]
+        for x, header in zip(columns, headers):
+            self._text(draw, x, 186, header, 7, bold=True)
+        self._line(draw, 30, 198, 565, 198)
+
+        y = 204
+        for item in invoice['items']:
+            values = [
+                item['codigo'], item['descripcion'], item['cantidad'], item['unidad_medida'],
+                item['precio_unitario'], item['bonificacion'], item['importe_bonificacion'], item['subtotal']
+            ]
+            for x, value in zip(columns, values):
+                self._text(draw, x, y, value, 7)
+            y += 14
+
+        # Totales
+        totals_y = max(y + 20, 600)
+        self._line(draw, 30, totals_y - 8, 565, totals_y - 8)
+        totals = [("Subtotal", invoice['subtotal'])]
+        if invoice['tipo_factura'] == 'A':
+            totals.append(("IVA 21%", invoice['iva']))
+        totals.extend([
+            ("Percepción IIBB", invoice['percepcion_iibb']),
+            ("Importe Otros Tributos", invoice['otros_tributos']),
+            ("Importe Total", invoice['importe_total'])
+        ])
+        for label, value in totals:
+            self._text(draw, 360, totals_y, f"{label}: $ {value}", 9, bold=label == "Importe Total")
+            totals_y += 16
+
+        # Pie con CAE
+        self._line(draw, 30, 790, 565, 790)
+        self._text(draw, 40, 798, "Comprobante Autorizado", 8, bold=True)
+        self._text(draw, 340, 798, f"CAE N°: {invoice['cae']}", 8)
+        self._text(draw, 340, 811, f"Fecha de Vto. de CAE: {invoice['fecha_emision']}", 8)
+        self._text(draw, 270, 824, "Pág. 1/1", 7)
+
+        return image
+
+def degrade(image: Image.Image, rng: random.Random, noise: float, max_skew: float) -> Image.Image:
+    """
+    Aplicar ruido de escaneo e inclinación a una imagen
+
+    Args:
+        image: Imagen en modo 'L'
+        rng: Generador aleatorio
+        noise: Desvío estándar del ruido gaussiano (0-255); también controla sal y pimienta
+        max_skew: Inclinación máxima en grados (positiva o negativa)
+    """
+    if max_skew > 0:
+        angle = rng.uniform(-max_skew, max_skew)
+        image = image.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+
+    if noise > 0:
+        np_rng = np.random.default_rng(rng.randint(0, 2**32 - 1))
+        array = np.asarray(image, dtype=np.float32)
+        array = array + np_rng.standard_normal(array.shape, dtype=np.float32) * noise
+        salt_pepper = np_rng.random(array.shape, dtype=np.float32)
+        amount = min(0.02, noise / 2000.0)
+        array[salt_pepper < amount / 2] = 0
+        array[salt_pepper > 1 - amount / 2] = 255
+        image = Image.fromarray(np.clip(array, 0, 255).astype(np.uint8))
+
+    return image
+
+def ground_truth_entry(invoice: Dict[str, Any]) -> Dict[str, Any]:
+    """Convertir los datos de una factura al esquema de ejemplo_ground_truth.json"""
+    return {
+        'tipo_factura': invoice['tipo_factura'],
+        'razon_social_vendedor': invoice['razon_social_emisor'],
+        'cuit_vendedor': invoice['cuit_emisor'],
+        'razon_social_comprador': invoice['razon_social_receptor'],
+        'cuit_comprador': invoice['cuit_receptor'],
+        'condicion_iva_comprador': invoice['condicion_iva_receptor'],
+        'condicion_venta': invoice['condicion_venta'],
+        'fecha_emision': invoice['fecha_emision'],
+        'subtotal': invoice['subtotal'],
+        'importe_total': invoice['importe_total'],
+        'iva': invoice['iva'],
+        'deuda_impositiva': invoice['percepcion_iibb'],
+        'numero_factura': invoice['numero_factura'],
+        'punto_venta': invoice['punto_venta'],
+        'items': invoice['items']
+    }
+
+def generate_document(index: int, options: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Generar un documento (imagen + JSON) de forma determinística a partir de la semilla
+
+    Args:
+        index: Número de documento (1..N)
+        options: Opciones de generación (ver main)
+
+    Returns:
+        Tupla (nombre de la imagen, entrada de ground truth consolidado)
+    """
+    rng = random.Random(options['seed'] * 1_000_003 + index)
+    factory = SyntheticInvoiceFactory(rng, options['min_items'], options['max_items'])
+    dpi = rng.choice(options['dpis'])
+    renderer = InvoiceRenderer(dpi)
+
+    invoices_per_page = 2 if rng.random() < options['multi_invoice_ratio'] else 1
+    invoices = [factory.create(rng.choice(options['types'])) for _ in range(invoices_per_page)]
+    pages = [renderer.render(invoice) for invoice in invoices]
+
+    if len(pages) == 1:
+        page = pages[0]
+    else:
+        page = Image.new('L', (pages[0].width, sum(p.height for p in pages)), 255)
+        offset = 0
+        for p in pages:
+            page.paste(p, (0, offset))
+            offset += p.height
+
+    page = degrade(page, rng, options['noise'] * rng.random(), options['max_skew'])
+
+    base_name = f"factura_{index}"
+    extension = options['image_format']
+    image_name = f"{base_name}.{extension}"
+    output_dir = options['output_dir']
+
+    if extension == 'jpg':
+        page.save(os.path.join(output_dir, image_name), 'JPEG', quality=options['jpeg_quality'], dpi=(dpi, dpi))
+    else:
+        # Compresión mínima: con ruido el PNG casi no se reduce y el encode domina el tiempo
+        page.save(os.path.join(output_dir, image_name), 'PNG', dpi=(dpi, dpi), compress_level=1)
+
+    # JSON del dataset: los campos de nivel superior corresponden a la primera factura
+    dataset_json = dict(invoices[0])
+    dataset_json['dpi'] = dpi
+    if len(invoices) > 1:
+        dataset_json['facturas'] = invoices
+    with open(os.path.join(output_dir, f"{base_name}.json"), 'w', encoding='utf-8') as f:
+        json.dump(dataset_json, f, indent=2, ensure_ascii=False)
+
+    entry = ground_truth_entry(invoices[0])
+    if len(invoices) > 1:
+        entry['facturas'] = [ground_truth_entry(invoice) for invoice in invoices]
+    return image_name, entry
+
+def generate_dataset(output_dir: str, count: int, options: Dict[str, Any], workers: int = 1) -> Dict[str, Dict[str, Any]]:
+    """
+    Generar un dataset completo
+
+    Args:
+        output_dir: Directorio de salida
+        count: Cantidad de documentos
+        options: Opciones de generación
+        workers: Procesos en paralelo
+
+    Returns:
+        Ground truth consolidado (nombre de archivo -> campos)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    options = dict(options, output_dir=output_dir)
+    ground_truth: Dict[str, Dict[str, Any]] = {}
+
+    start_time = time.time()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for image_name, entry in executor.map(generate_document, range(1, count + 1),
+                                                  [options] * count, chunksize=16):
+                ground_truth[image_name] = entry
+    else:
+        for index in range(1, count + 1):
+            image_name, entry = generate_document(index, options)
+            ground_truth[image_name] = entry
+            if index % 100 == 0:
+                logger.info(f"Generados {index}/{count} documentos")
+
+    with open(os.path.join(output_dir, "ground_truth.json"), 'w', encoding='utf-8') as f:
+        json.dump(ground_truth, f, indent=2, ensure_ascii=False)
+
+    elapsed = time.time() - start_time
+    logger.info(f"Dataset generado: {count} documentos en {elapsed:.1f}s ({count / max(elapsed, 1e-9):.1f} docs/seg)")
+    return ground_truth
+
+def main():
+    """Función principal del script"""
+    parser = argparse.ArgumentParser(description='Generar facturas sintéticas (imagen + JSON) para benchmarks')
+    parser.add_argument('--output-dir', default='synthetic_dataset', help='Directorio de salida')
+    parser.add_argument('--count', type=int, default=100, help='Cantidad de documentos')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla para resultados reproducibles')
+    parser.add_argument('--min-items', type=int, default=1, help='Mínimo de items por factura')
+    parser.add_argument('--max-items', type=int, default=8, help='Máximo de items por factura')
+    parser.add_argument('--types', nargs='+', default=['A', 'B', 'C'], choices=['A', 'B', 'C'],
+                        help='Tipos de factura a generar')
+    parser.add_argument('--dpi', nargs='+', type=int, default=[150, 200, 300],
+                        help='Resoluciones posibles (se elige una por documento)')
+    parser.add_argument('--noise', type=float, default=12.0,
+                        help='Ruido gaussiano máximo (0 = sin ruido)')
+    parser.add_argument('--max-skew', type=float, default=2.0,
+                        help='Inclinación máxima en grados (0 = sin inclinación)')
+    parser.add_argument('--multi-invoice-ratio', type=float, default=0.1,
+                        help='Proporción de páginas con dos facturas')
+    parser.add_argument('--format', choices=['png', 'jpg'], default='png', help='Formato de imagen')
+    parser.add_argument('--jpeg-quality', type=int, default=85, help='Calidad JPEG')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Procesos en paralelo')
+
+    args = parser.parse_args()
+
+    if args.min_items < 1 or args.max_items < args.min_items:
+        logger.error("Rango de items inválido")
+        sys.exit(1)
+
+    options = {
+        'seed': args.seed,
+        'min_items': args.min_items,
+        'max_items': args.max_items,
+        'types': args.types,
+        'dpis': args.dpi,
+        'noise': args.noise,
+        'max_skew': args.max_skew,
+        'multi_invoice_ratio': args.multi_invoice_ratio,
+        'image_format': args.format,
+        'jpeg_quality': args.jpeg_quality
+    }
+
+    generate_dataset(args.output_dir, args.count, options, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+"""
+Generador de carga HTTP para los endpoints de la API
+
+Envía documentos a /process-image, /process-invoice y /process-multiple-images
+con una mezcla configurable, a concurrencia fija (lazo cerrado) o a una tasa
+objetivo de requests por segundo (lazo abierto). Registra histogramas de
+latencia, tasa de errores y los tiempos reportados por el servidor.
+
+Con --asgi la API se ejecuta en el mismo proceso (httpx.ASGITransport), sin red,
+dentro de su lifespan (arranque y apagado como con uvicorn).
+"""
+import os
+import sys
+import time
+import json
+import random
+import asyncio
+import argparse
+import logging
+import mimetypes
+import platform
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+import httpx
+
+# Agregar el directorio actual al path
+sys.path.append(str(Path(__file__).parent))
+
+from utils.stats_utils import summarize, histogram
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = {
+    'process-image': '/process-image',
+    'process-invoice': '/process-invoice',
+    'process-multiple-images': '/process-multiple-images'
+}
+
+DEFAULT_MIX = {'process-image': 0.5, 'process-invoice': 0.3, 'process-multiple-images': 0.2}
+
+# Límites superiores (segundos) de los buckets del histograma de latencia
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0]
+
+DOCUMENT_EXTENSIONS = ['.pdf', '.png', '.jpg', '.jpeg']
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """
+    Interpretar una mezcla de endpoints del tipo 'process-image=0.7,process-invoice=0.3'
+
+    Returns:
+        Diccionario endpoint -> peso normalizado
+    """
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Endpoint desconocido en la mezcla: {name}")
+        mix[name] = float(weight) if weight else 1.0
+
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("La mezcla debe tener al menos un peso positivo")
+    return {name: weight / total for name, weight in mix.items()}
+
+def load_documents(input_dir: str, limit: Optional[int] = None) -> List[Tuple[str, bytes, str]]:
+    """Cargar en memoria los documentos a enviar (nombre, contenido, content-type)"""
+    paths = sorted(
+        p for p in Path(input_dir).iterdir()
+        if p.is_file() and p.suffix.lower() in DOCUMENT_EXTENSIONS
+    )
+    if limit:
+        paths = paths[:limit]
+
+    documents = []
+    for path in paths:
+        content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        documents.append((path.name, path.read_bytes(), content_type))
+    return documents
+
+class LoadTester:
+    """Generador de carga asíncrono basado en httpx"""
+
+    def __init__(self, documents: List[Tuple[str, bytes, str]],
+                 mix: Optional[Dict[str, float]] = None,
+                 base_url: str = "http://localhost:8000",
+                 app: Any = None,
+                 timeout: float = 300.0,
+                 files_per_request: int = 3,
+                 seed: int = 42,
+                 server_timings: bool = True):
+        """
+        Args:
+            documents: Documentos (nombre, contenido, content-type)
+            mix: Pesos por endpoint (ver DEFAULT_MIX)
+            base_url: URL de la API (ignorada en modo ASGI salvo como host)
+            app: Aplicación ASGI para ejecutar en proceso; None = HTTP real
+            timeout: Timeout por request en segundos
+            files_per_request: Archivos por request en /process-multiple-images
+            seed: Semilla para que la secuencia de requests sea reproducible
+            server_timings: Pedir al servidor los tiempos por etapa (?timings=true)
+        """
+        if not documents:
+            raise ValueError("No hay documentos para enviar")
+
+        self.documents = documents
+        self.mix = mix or DEFAULT_MIX
+        self.base_url = base_url
+        self.app = app
+        self.timeout = timeout
+        self.files_per_request = max(1, min(files_per_request, 10))
+        self.rng = random.Random(seed)
+        self.params: Dict[str, str] = {'timings': 'true'} if server_timings else {}
+
+    def _client(self) -> httpx.AsyncClient:
+        """Crear el cliente HTTP (o ASGI en proceso)"""
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        if self.app is not None:
+            return httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=self.app), base_url=self.base_url, timeout=self.timeout
+            )
+        return httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits)
+
+    @asynccontextmanager
+    async def _session(self):
+        """
+        Cliente para una corrida; en modo ASGI la corrida va dentro del lifespan de la app
+
+        ASGITransport no envía los eventos de lifespan: sin esto no se ejecutarían los
+        handlers de arranque y apagado (pool del cliente externo, outbox, precalentamiento).
+        """
+        if self.app is None:
+            async with self._client() as client:
+                yield client
+            return
+        async with self.app.router.lifespan_context(self.app):
+            async with self._client() as client:
+                yield client
+
+    def _next_request(self) -> Tuple[str, List[Tuple[str, Tuple[str, bytes, str]]]]:
+        """Elegir endpoint y archivos para el próximo request según la mezcla"""
+        endpoint = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+
+        if endpoint == 'process-multiple-images':
+            chosen = [self.rng.choice(self.documents) for _ in range(self.files_per_request)]
+            return endpoint, [('files', document) for document in chosen]
+
+        return endpoint, [('file', self.rng.choice(self.documents))]
+
+    @staticmethod
+    def _server_timings(payload: Any) -> Tuple[Optional[float], Dict[str, float]]:
+        """Extraer processing_time y metadata.timings de la respuesta (si existen)"""
+        if not isinstance(payload, dict):
+            return None, {}
+
+        def merge(target: Dict[str, float], timings: Any):
+            if isinstance(timings, dict):
+                for stage, seconds in timings.items():
+                    if isinstance(seconds, (int, float)):
+                        target[stage] = target.get(stage, 0.0) + seconds
+
+        timings: Dict[str, float] = {}
+        processing_time = payload.get('processing_time')
+        merge(timings, (payload.get('metadata') or {}).get('timings'))
+
+        # /process-multiple-images: sumar los tiempos de cada archivo
+        results = payload.get('results')
+        if isinstance(results, list):
+            per_file = [r.get('processing_time') for r in results if isinstance(r, dict)]
+            per_file = [t for t in per_file if isinstance(t, (int, float))]
+            if processing_time is None and per_file:
+                processing_time = sum(per_file)
+            for r in results:
+                if isinstance(r, dict):
+                    merge(timings, (r.get('metadata') or {}).get('timings'))
+
+        return processing_time, timings
+
+    async def _send(self, client: httpx.AsyncClient) -> Dict[str, Any]:
+        """Enviar un request y registrar la muestra"""
+        endpoint, files = self._next_request()
+        sample: Dict[str, Any] = {'endpoint': endpoint, 'files': len(files)}
+
+        start = time.perf_counter()
+        try:
+            response = await client.post(ENDPOINTS[endpoint], files=files, params=self.params)
+            sample['latency'] = time.perf_counter() - start
+            sample['status'] = response.status_code
+            sample['ok'] = response.status_code < 400
+            sample['bytes'] = len(response.content)
+
+            if sample['ok']:
+                processing_time, timings = self._server_timings(response.json())
+                sample['server_processing_time'] = processing_time
+                if timings:
+                    sample['server_timings'] = timings
+            else:
+                sample['error'] = response.text[:200]
+        except Exception as e:
+            sample['latency'] = time.perf_counter() - start
+            sample['status'] = None
+            sample['ok'] = False
+            sample['error'] = f"{type(e).__name__}: {e}"
+
+        return sample
+
+    async def run_concurrency(self, concurrency: int, duration: Optional[float] = None,
+                              total_requests: Optional[int] = None) -> Tuple[List[Dict[str, Any]], float]:
+        """
+        Lazo cerrado: `concurrency` clientes enviando requests uno detrás de otro
+
+        Returns:
+            Tupla (muestras, tiempo transcurrido)
+        """
+        samples: List[Dict[str, Any]] = []
+        remaining = [total_requests] if total_requests else None
+
+        async with self._session() as client:
+            start = time.perf_counter()
+            deadline = start + duration if duration else None
+
+            async def worker():
+                while True:
+                    if deadline and time.perf_counter() >= deadline:
+                        return
+                    if remaining is not None:
+                        if remaining[0] <= 0:
+                            return
+                        remaining[0] -= 1
+                    samples.append(await self._send(client))
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+
+        return samples, elapsed
+
+    async def run_rps(self, rps: float, duration: Optional[float] = None,
+                      total_requests: Optional[int] = None,
+                      max_in_flight: int = 100) -> Tuple[List[Dict[str, Any]], float]:
+        """
+        Lazo abierto: lanzar requests a una tasa fija sin esperar respuestas
+
+        Si hay `max_in_flight` requests pendientes, el arribo se descarta y se
+        cuenta como error de saturación del cliente.
+
+        Returns:
+            Tupla (muestras, tiempo transcurrido)
+        """
+        samples: List[Dict[str, Any]] = []
+        interval = 1.0 / rps
+        pending = set()
+
+        async with self._session() as client:
+            start = time.perf_counter()
+            sent = 0
+            while True:
+                if total_requests and sent >= total_requests:
+                    break
+                scheduled = start + sent * interval
+                if duration and scheduled - start >= duration:
+                    break
+
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                if len(pending) >= max_in_flight:
+                    samples.append({'endpoint': 'client', 'latency': 0.0, 'status': None, 'ok': False,
+                                    'error': 'max_in_flight alcanzado', 'dropped': True})
+                else:
+                    task = asyncio.create_task(self._send(client))
+                    task.add_done_callback(lambda t: (pending.discard(t), samples.append(t.result())))
+                    pending.add(task)
+                sent += 1
+
+            if pending:
+                await asyncio.gather(*pending)
+            elapsed = time.perf_counter() - start
+
+        return samples, elapsed
+
+    def build_results(self, samples: List[Dict[str, Any]], elapsed: float,
+                      run_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Agregar las muestras en el formato de resultados del load test"""
+
+        def aggregate(group: List[Dict[str, Any]]) -> Dict[str, Any]:
+            ok_latencies = [s['latency'] for s in group if s['ok']]
+            server_times = [s['server_processing_time'] for s in group if s.get('server_processing_time') is not None]
+            errors = [s for s in group if not s['ok']]
+
+            status_counts: Dict[str, int] = {}
+            for s in group:
+                key = str(s['status'])
+                status_counts[key] = status_counts.get(key, 0) + 1
+
+            stage_samples: Dict[str, List[float]] = {}
+            for s in group:
+                for stage, seconds in s.get('server_timings', {}).items():
+                    stage_samples.setdefault(stage, []).append(seconds)
+
+            return {
+                'requests': len(group),
+                'successful': len(ok_latencies),
+                'errors': len(errors),
+                'error_rate': len(errors) / len(group) if group else 0.0,
+                'status_codes': status_counts,
+                'latency': summarize(ok_latencies),
+                'latency_histogram': histogram(ok_latencies, LATENCY_BUCKETS),
+                'server_processing_time': summarize(server_times),
+                'server_timings': {stage: summarize(values) for stage, values in stage_samples.items()}
+            }
+
+        endpoints = {}
+        for endpoint in ENDPOINTS:
+            group = [s for s in samples if s['endpoint'] == endpoint]
+            if group:
+                endpoints[endpoint] = aggregate(group)
+
+        summary = aggregate(samples)
+        summary['elapsed'] = elapsed
+        summary['throughput_rps'] = summary['successful'] / elapsed if elapsed > 0 else 0.0
+        summary['dropped'] = sum(1 for s in samples if s.get('dropped'))
+
+        error_examples = {}
+        for s in samples:
+            if not s['ok'] and s.get('error'):
+                error_examples.setdefault(s['endpoint'], s['error'])
+
+        return {
+            'run_info': run_info,
+            'summary': summary,
+            'endpoints': endpoints,
+            'error_examples': error_examples,
+            'requests': samples
+        }
+
+    def generate_report(self, results: Dict[str, Any]) -> str:
+        """Generar reporte de texto del load test"""
+        info = results['run_info']
+        summary = results['summary']
+        report = f"""
+=== LOAD TEST DE LA API ===
+Fecha: {info['timestamp']}
+Destino: {info['target']} | Modo: {info['mode']} | Documentos: {info['documents']}
+Duración: {summary['elapsed']:.1f}s | Requests: {summary['requests']} | Throughput: {summary['throughput_rps']:.2f} req/s
+Errores: {summary['errors']} ({summary['error_rate']:.1%}) | Descartados por el cliente: {summary['dropped']}
+
+"""
+        report += f"{'Endpoint':<26} {'Req':<6} {'Err %':<7} {'p50 (s)':<9} {'p95 (s)':<9} {'p99 (s)':<9} {'Servidor p50':<12}\n"
+        report += "-" * 80 + "\n"
+        for endpoint, data in results['endpoints'].items():
+            latency = data['latency']
+            report += (f"{endpoint:<26} {data['requests']:<6} {data['error_rate'] * 100:<7.1f} "
+                       f"{latency['p50']:<9.3f} {latency['p95']:<9.3f} {latency['p99']:<9.3f} "
+                       f"{data['server_processing_time']['p50']:<12.3f}\n")
+
+        report += "\nHistograma de latencia (requests exitosos):\n"
+        for bucket, count in summary['latency_histogram'].items():
+            label = f"<= {bucket}s" if bucket != '+Inf' else "> " + str(LATENCY_BUCKETS[-1]) + "s"
+            report += f"  {label:<10} {count}\n"
+
+        if summary['server_timings']:
+            report += "\nTiempos por etapa reportados por el servidor (p50 / p95):\n"
+            for stage, data in summary['server_timings'].items():
+                report += f"  {stage:<22} {data['p50']:.3f}s / {data['p95']:.3f}s\n"
+
+        if results['error_examples']:
+            report += "\nEjemplos de errores:\n"
+            for endpoint, error in results['error_examples'].items():
+                report += f"  {endpoint}: {error}\n"
+
+        return report
+
+def main():
+    """Función principal del script"""
+    parser = argparse.ArgumentParser(description='Load test HTTP de los endpoints de procesamiento')
+    parser.add_argument('--input-dir', required=True, help='Directorio con documentos a enviar')
+    parser.add_argument('--url', default='http://localhost:8000', help='URL base de la API')
+    parser.add_argument('--asgi', action='store_true', help='Ejecutar la API en proceso (sin red)')
+    parser.add_argument('--mix', default=None,
+                        help="Mezcla de endpoints, ej: 'process-image=0.5,process-invoice=0.3,process-multiple-images=0.2'")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--concurrency', type=int, default=None, help='Clientes concurrentes (lazo cerrado)')
+    mode.add_argument('--rps', type=float, default=None, help='Requests por segundo objetivo (lazo abierto)')
+    parser.add_argument('--duration', type=float, default=None, help='Duración en segundos')
+    parser.add_argument('--requests', type=int, default=None, help='Cantidad total de requests')
+    parser.add_argument('--warmup', type=int, default=1, help='Requests de calentamiento descartados')
+    parser.add_argument('--max-in-flight', type=int, default=100, help='Máximo de requests pendientes en modo --rps')
+    parser.add_argument('--files-per-request', type=int, default=3, help='Archivos por request en /process-multiple-images')
+    parser.add_argument('--limit', type=int, default=None, help='Número máximo de documentos a cargar')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Timeout por request (segundos)')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla de la secuencia de requests')
+    parser.add_argument('--no-server-timings', action='store_true',
+                        help='No pedir los tiempos por etapa al servidor (?timings=true)')
+    parser.add_argument('--output', default='benchmark_results/load_test.json', help='Archivo JSON de salida')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_dir):
+        logger.error(f"El directorio no existe: {args.input_dir}")
+        sys.exit(1)
+
+    if not args.duration and not args.requests:
+        args.requests = 50
+
+    try:
+        mix = parse_mix(args.mix) if args.mix else None
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    documents = load_documents(args.input_dir, args.limit)
+    if not documents:
+        logger.error(f"No se encontraron documentos en {args.input_dir}")
+        sys.exit(1)
+
+    app = None
+    if args.asgi:
+        from main import app
+
+    tester = LoadTester(
+        documents, mix=mix, base_url=args.url, app=app, timeout=args.timeout,
+        files_per_request=args.files_per_request, seed=args.seed,
+        server_timings=not args.no_server_timings
+    )
+
+    if args.rps:
+        mode_text = f"rps={args.rps}"
+        run = lambda requests: tester.run_rps(args.rps, args.duration, requests, args.max_in_flight)
+    else:
+        concurrency = args.concurrency or 1
+        mode_text = f"concurrency={concurrency}"
+        run = lambda requests: tester.run_concurrency(concurrency, args.duration, requests)
+
+    async def execute():
+        if args.warmup:
+            await tester.run_concurrency(1, total_requests=args.warmup)
+        return await run(args.requests)
+
+    logger.info(f"Iniciando load test ({mode_text}) contra {'ASGI en proceso' if app else args.url}")
+    samples, elapsed = asyncio.run(execute())
+
+    run_info = {
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'target': 'asgi' if app else args.url,
+        'mode': mode_text,
+        'mix': tester.mix,
+        'documents': len(documents),
+        'duration': args.duration,
+        'requests': args.requests,
+        'warmup': args.warmup,
+        'files_per_request': tester.files_per_request,
+        'python': platform.python_version(),
+        'platform': platform.platform()
+    }
+    results = tester.build_results(samples, elapsed, run_info)
+
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False, default=str)
+
+    print(tester.generate_report(results))
+    logger.info(f"Resultados guardados en {args.output}")
+
+if __name__ == "__main__":
+    main()
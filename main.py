@@ -1,8 +1,12 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
+import time
+_import_start = time.perf_counter()
+
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, FileResponse, StreamingResponse
 import uvicorn
 import os
+import asyncio
 from typing import Dict, Any, List
 import logging
 
@@ -20,10 +24,17 @@ except ImportError:
 
 from config import settings
 from models import ProcessingResult, ErrorResponse, StructuredInvoiceResponse, InvoiceFields, MetricsData, BatchMetrics
-from services.advanced_image_processor import AdvancedImageProcessor
+from services.advanced_image_processor import get_image_processor, profiler, parse_sections
+from services.profiling import ProfilingMiddleware
 from services.metrics_calculator import MetricsCalculator
 from services.batch_processor import BatchProcessor
+from services.timing import timing_stats
+from services.telemetry import REGISTRY, PrometheusMiddleware, TEMP_DIR_FILES, TEMP_DIR_BYTES, OUTBOX_ENTRIES, APP_STARTUP_SECONDS, VENDOR_TEMPLATES, directory_usage
+from services.outbox import Outbox, OutboxSender, STATUSES as OUTBOX_STATUSES
+from services.ocr_pool import OCRPool
+from services.health import HealthMonitor, disk_space_check, tesseract_check, poppler_check
 from utils.file_utils import validate_file_type, validate_file_size, save_upload_file, cleanup_file
+from utils.response_utils import FastJSONResponse, json_line, shape_raw_text
 from external_api_client import facturas_client
 from config_external import get_config
 from fastapi import Request
@@ -37,7 +48,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title=settings.API_TITLE,
     description=settings.API_DESCRIPTION,
-    version=settings.API_VERSION
+    version=settings.API_VERSION,
+    default_response_class=FastJSONResponse
 )
 
 # Configurar CORS
@@ -51,16 +63,77 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métricas de requests (conteo, latencia y requests en curso) para /metrics
+app.add_middleware(PrometheusMiddleware)
+
+# Profiler bajo demanda (header X-Profile o /admin/profiling/arm)
+app.add_middleware(ProfilingMiddleware, manager=profiler, token=settings.PROFILING_ADMIN_TOKEN)
+
 # Crear directorio para archivos temporales si no existe
 if not os.path.exists(settings.UPLOAD_DIR):
     os.makedirs(settings.UPLOAD_DIR)
 
-# Inicializar procesador avanzado de imágenes con scikit-image
-image_processor = AdvancedImageProcessor()
+# Uso del directorio temporal: se calcula solo cuando se consulta /metrics
+TEMP_DIR_FILES.set_function(lambda: {(): directory_usage(settings.UPLOAD_DIR)[0]})
+TEMP_DIR_BYTES.set_function(lambda: {(): directory_usage(settings.UPLOAD_DIR)[1]})
+
+# Procesador avanzado de imágenes compartido: los módulos pesados y el modelo de layout
+# se cargan en el precalentamiento (startup) o en el primer uso, no al importar
+image_processor = get_image_processor()
+if image_processor.vendor_templates is not None:
+    VENDOR_TEMPLATES.set_function(lambda: {(): len(image_processor.vendor_templates)})
+
+# Pool de hilos para OCR: el procesamiento no bloquea el event loop
+ocr_pool = OCRPool(settings.OCR_WORKERS, settings.OCR_MAX_WAITING)
 
 # Inicializar calculador de métricas y procesador de lotes
 metrics_calculator = MetricsCalculator()
-batch_processor = BatchProcessor()
+batch_processor = BatchProcessor(image_processor=image_processor)
+
+# Outbox persistente: /process-and-send-factura encola y el sender entrega en segundo plano
+outbox = Outbox(settings.OUTBOX_DB_PATH, settings.OUTBOX_DIR)
+
+async def _deliver_factura(entry: Dict[str, Any]) -> Dict[str, Any]:
+    # Un intento por ciclo: los reintentos los programa el sender con backoff
+    return await facturas_client.enviar_archivo(
+        entry["file_path"],
+        filename=entry["filename"],
+        content_type=entry["content_type"],
+        metadata=entry["metadata"],
+        attempts=1
+    )
+
+outbox_sender = OutboxSender(
+    outbox,
+    _deliver_factura,
+    concurrency=settings.OUTBOX_CONCURRENCY,
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+    backoff_base=settings.OUTBOX_BACKOFF_BASE,
+    backoff_max=settings.OUTBOX_BACKOFF_MAX,
+    retention=settings.OUTBOX_RETENTION_DAYS * 24 * 3600
+)
+OUTBOX_ENTRIES.set_function(lambda: {(status,): count for status, count in outbox.counts().items()})
+
+# Monitor de salud: las dependencias se verifican en segundo plano y /health lee el estado cacheado
+async def _check_external_api():
+    return await facturas_client.verificar_conectividad(), facturas_client.base_url
+
+health_monitor = HealthMonitor(interval=settings.HEALTH_CHECK_INTERVAL)
+health_monitor.register("tesseract", tesseract_check(settings.TESSERACT_PATH or "tesseract"))
+health_monitor.register(
+    "disk", disk_space_check(settings.UPLOAD_DIR, settings.HEALTH_MIN_FREE_DISK_MB * 1024 * 1024)
+)
+health_monitor.register("external_api", _check_external_api, critical=False)  # Los envíos pasan por el outbox
+health_monitor.register("poppler", poppler_check(settings.POPPLER_PATH), critical=False)  # Solo para PDFs
+health_monitor.register(
+    "layout_model",
+    lambda: (image_processor.layout_model is not None,
+             "cargado" if image_processor.layout_model is not None
+             else "precalentamiento en curso" if not image_processor.warmed_up
+             else "no disponible, procesamiento básico"),
+    critical=False
+)
 
 # URL estática configurada
 STATIC_CALLBACK_URL = "https://d3e7dadb0157c65efb1d427e8d21a9b5.serveo.net"
@@ -73,6 +146,7 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "health": "/health",
+            "ready": "/ready (capacidad de OCR y dependencias críticas)",
             "process_image": "/process-image (INTELIGENTE - detecta facturas automáticamente)",
             "process_multiple_images": "/process-multiple-images (INTELIGENTE - múltiples archivos)",
             "process_invoice": "/process-invoice (solo facturas)",
@@ -81,25 +155,55 @@ async def root():
             "process_factura_only": "/process-factura-only (solo procesar, sin enviar)",
             "receive_external_response": "/api/external/response (recibir respuesta de API externa)",
             "receive_external_status": "/api/external/status (recibir estado de API externa)",
+            "external_client_stats": "/api/external/client-stats (latencia y conexiones con la API externa)",
             "callback_urls": "/callback-urls (obtener URLs de callback actuales)",
             "evaluate_metrics": "/evaluate-metrics (evaluar métricas del modelo)",
-            "batch_benchmark": "/batch-benchmark (benchmark de lotes)"
+            "batch_benchmark": "/batch-benchmark (benchmark de lotes)",
+            "stats_timings": "/stats/timings (tiempos por etapa acumulados)",
+            "stats_vendor_templates": "/stats/vendor-templates (plantillas por proveedor y tasa de aciertos)",
+            "stats_duplicates": "/stats/duplicates (facturas duplicadas detectadas por hash perceptual)",
+            "metrics": "/metrics (métricas en formato Prometheus)",
+            "profiling": "/admin/profiling/arm, /admin/profiling/profiles (profiler bajo demanda)"
         }
     }
 
 @app.get("/health")
 async def health_check():
-    """Endpoint para verificar el estado de la API"""
-    # Verificar conectividad con API externa
-    external_api_status = await facturas_client.verificar_conectividad()
+    """Endpoint para verificar el estado de la API (lee el estado cacheado por el monitor de salud)"""
+    snapshot = health_monitor.snapshot()
     
     return {
-        "status": "healthy", 
-        "message": "API funcionando correctamente",
-        "external_api_connected": external_api_status,
-        "external_api_url": facturas_client.base_url
+        "status": "healthy" if snapshot["critical_ok"] else "degraded",
+        "message": "API funcionando correctamente" if snapshot["critical_ok"] else "Dependencias críticas con fallas",
+        "external_api_connected": bool(health_monitor.is_ok("external_api")),
+        "external_api_url": facturas_client.base_url,
+        "dependencies": snapshot
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Si la instancia puede aceptar documentos: dependencias críticas OK y capacidad en el pool de OCR"""
+    snapshot = health_monitor.snapshot()
+    capacity = ocr_pool.capacity()
+    
+    reasons = []
+    if not image_processor.warmed_up:
+        reasons.append("Precalentamiento en curso")
+    if not snapshot["checked"]:
+        reasons.append("Verificación de dependencias en curso")
+    elif not snapshot["critical_ok"]:
+        failing = [name for name, check in snapshot["checks"].items() if check["critical"] and not check["ok"]]
+        reasons.append(f"Dependencias con fallas: {', '.join(failing)}")
+    if not capacity["accepting"]:
+        reasons.append("Pool de OCR saturado")
+    
+    body = {
+        "ready": not reasons,
+        "reasons": reasons,
+        "ocr_pool": capacity
+    }
+    return JSONResponse(status_code=200 if not reasons else 503, content=body)
+
 @app.get("/callback-urls")
 async def get_callback_urls():
     """Endpoint para obtener las URLs de callback actuales"""
@@ -110,20 +214,132 @@ async def get_callback_urls():
         "message": "URLs estáticas configuradas para callbacks"
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Métricas operativas en formato de texto de Prometheus"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _check_admin_token(request: Request):
+    """Validar el token de administración; sin PROFILING_ADMIN_TOKEN los endpoints /admin quedan deshabilitados"""
+    if not settings.PROFILING_ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="Endpoints de administración deshabilitados (PROFILING_ADMIN_TOKEN)")
+    if request.headers.get("X-Admin-Token") != settings.PROFILING_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Token de administración inválido")
+
+@app.post("/admin/profiling/arm")
+async def arm_profiling(request: Request, count: int = Query(1, ge=0, le=100, description="Requests a perfilar (0 = desarmar)")):
+    """Perfilar los próximos N requests que procesen documentos"""
+    _check_admin_token(request)
+    if not profiler.enabled:
+        raise HTTPException(status_code=503, detail="El profiler está deshabilitado (PROFILING_ENABLED)")
+    return {"status": "success", "armed": profiler.arm(count)}
+
+@app.get("/admin/profiling/profiles")
+async def list_profiles(request: Request):
+    """Listar los perfiles guardados"""
+    _check_admin_token(request)
+    return {"status": "success", "armed": profiler.armed(), "profiles": profiler.list_profiles()}
+
+@app.get("/admin/profiling/profiles/{profile_id}")
+async def download_profile(
+    request: Request,
+    profile_id: str,
+    format: str = Query("pstats", description="pstats (cProfile), collapsed (flamegraph) o text (resumen)")
+):
+    """Descargar un perfil"""
+    _check_admin_token(request)
+
+    if format == "text":
+        report = profiler.text_report(profile_id)
+        if report is None:
+            raise HTTPException(status_code=404, detail="Perfil no encontrado")
+        return PlainTextResponse(report)
+
+    if format not in ("pstats", "collapsed"):
+        raise HTTPException(status_code=400, detail="Formato inválido. Usar pstats, collapsed o text")
+
+    path = profiler.profile_path(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    media_type = "application/octet-stream" if format == "pstats" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path))
+
+@app.get("/stats/timings")
+async def get_timing_stats(document_type: str = Query(None, description="Filtrar por tipo de documento, ej. 'pdf:A'")):
+    """
+    Tiempos por etapa acumulados en este proceso, agrupados por tipo de documento
+    (formato del archivo y tipo de factura)
+    """
+    return {
+        "status": "success",
+        "timings": timing_stats.snapshot(document_type)
+    }
+
+@app.get("/stats/vendor-templates")
+async def get_vendor_template_stats():
+    """Plantillas de layout por proveedor: tasa de aciertos, fallbacks y tiempo ahorrado"""
+    if image_processor.vendor_templates is None:
+        return {"status": "disabled"}
+    return {
+        "status": "success",
+        "summary": image_processor.vendor_templates.stats(),
+        "templates": image_processor.vendor_templates.list()
+    }
+
+@app.delete("/admin/vendor-templates/{cuit}")
+async def delete_vendor_template(cuit: str, request: Request):
+    """Descartar la plantilla de un proveedor (se vuelve a aprender con su próxima factura)"""
+    _check_admin_token(request)
+    if image_processor.vendor_templates is None or not image_processor.vendor_templates.delete(cuit):
+        raise HTTPException(status_code=404, detail="Plantilla no encontrada")
+    return {"status": "success", "cuit": cuit}
+
+@app.get("/stats/duplicates")
+async def get_duplicate_stats():
+    """Documentos indexados por hash perceptual, duplicados detectados y parseos reutilizados"""
+    if image_processor.duplicate_index is None:
+        return {"status": "disabled"}
+    return {
+        "status": "success",
+        "summary": image_processor.duplicate_index.stats(),
+        "documents": image_processor.duplicate_index.list()
+    }
+
+@app.delete("/admin/duplicates/{document_id}")
+async def delete_duplicate_entry(document_id: str, request: Request):
+    """Quitar un documento del índice de duplicados (sus copias dejan de marcarse y reutilizarse)"""
+    _check_admin_token(request)
+    if image_processor.duplicate_index is None or not image_processor.duplicate_index.delete(document_id):
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+    return {"status": "success", "document_id": document_id}
+
 @app.post("/process-image")
-async def process_image(file: UploadFile = File(...)):
+async def process_image(
+    file: UploadFile = File(...),
+    timings: bool = Query(False, description="Incluir tiempos por etapa en metadata.timings"),
+    raw_text: str = Query("all", pattern="^(all|once|none)$", description="Copias de raw_text: all, once (sin duplicados) o none"),
+    fields: str = Query(None, description="Secciones a calcular separadas por coma: invoice_fields, raw_text, text_blocks, tables, figures (por defecto todas)")
+):
     """
     Endpoint inteligente para procesar imágenes - detecta automáticamente si es una factura
     y extrae datos estructurados o texto general según corresponda
     
     Args:
         file: Archivo de imagen/PDF a procesar
+        timings: Si incluir los tiempos por etapa del procesamiento
+        fields: Secciones pedidas; las etapas que solo alimentan secciones no pedidas no se ejecutan
+          (ej. fields=invoice_fields evita el OCR por región)
         
     Returns:
         JSON con datos estructurados si es factura, o texto extraído si es imagen general
     """
     file_path = None
     try:
+        try:
+            sections = parse_sections(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
         # Validar tipo de archivo
         if not validate_file_type(file, settings.ALLOWED_EXTENSIONS):
             raise HTTPException(
@@ -149,21 +365,23 @@ async def process_image(file: UploadFile = File(...)):
         logger.info(f"Procesando archivo: {file_path}")
         
         # Procesar imagen con LayoutParser y Tesseract
-        result = image_processor.process_image(file_path)
+        result = await ocr_pool.run(image_processor.process_image, file_path, include_timings=timings, sections=sections)
         
         # Detectar si es una factura y extraer datos estructurados
         invoice_data = result.metadata.get("invoice_parsing", {})
         
-        # Verificar si es una factura (más flexible)
-        is_invoice = (
-            invoice_data.get("success", False) and 
-            invoice_data.get("total_invoices", 0) > 0
-        ) or (
-            # Fallback: si no se detectó factura pero hay texto, intentar parsing directo
-            not invoice_data.get("success", False) and 
-            result.raw_text and 
-            len(result.raw_text.strip()) > 50 and
-            any(keyword in result.raw_text.upper() for keyword in ['FACTURA', 'ORIGINAL', 'COMPROBANTE', 'CUIT', 'DNI'])
+        # Verificar si es una factura (más flexible); solo si se pidieron los campos de factura
+        is_invoice = (sections is None or "invoice_fields" in sections) and (
+            (
+                invoice_data.get("success", False) and 
+                invoice_data.get("total_invoices", 0) > 0
+            ) or (
+                # Fallback: si no se detectó factura pero hay texto, intentar parsing directo
+                not invoice_data.get("success", False) and 
+                result.raw_text and 
+                len(result.raw_text.strip()) > 50 and
+                any(keyword in result.raw_text.upper() for keyword in ['FACTURA', 'ORIGINAL', 'COMPROBANTE', 'CUIT', 'DNI'])
+            )
         )
         
         if is_invoice:
@@ -201,7 +419,7 @@ async def process_image(file: UploadFile = File(...)):
                     # Crear respuesta estructurada para esta factura
                     structured_invoice = {
                         "invoice_index": i + 1,
-                        "invoice_fields": invoice_fields.dict(),
+                        "invoice_fields": invoice_fields.model_dump(),
                         "raw_text": invoice.get("raw_text", ""),
                         "parsing_confidence": invoice.get("parsing_confidence", 0.0),
                         "status": "success"
@@ -209,8 +427,19 @@ async def process_image(file: UploadFile = File(...)):
                     
                     structured_invoices.append(structured_invoice)
             
+            metadata = {
+                "layout_elements_count": result.metadata.get("layout_elements_count", 0),
+                "text_blocks_count": result.metadata.get("text_blocks_count", 0),
+                "tables_count": result.metadata.get("tables_count", 0),
+                "figures_count": result.metadata.get("figures_count", 0),
+                "is_pdf": result.metadata.get("is_pdf", False),
+                "processor": result.metadata.get("processor", "scikit-image")
+            }
+            if "timings" in result.metadata:
+                metadata["timings"] = result.metadata["timings"]
+            
             # Retornar respuesta estructurada para facturas
-            return {
+            response = {
                 "type": "invoice",
                 "success": True,
                 "filename": result.filename,
@@ -219,18 +448,14 @@ async def process_image(file: UploadFile = File(...)):
                 "processing_time": result.processing_time,
                 "total_invoices": len(structured_invoices),
                 "invoices": structured_invoices,
-                "metadata": {
-                    "layout_elements_count": result.metadata.get("layout_elements_count", 0),
-                    "text_blocks_count": result.metadata.get("text_blocks_count", 0),
-                    "tables_count": result.metadata.get("tables_count", 0),
-                    "figures_count": result.metadata.get("figures_count", 0),
-                    "is_pdf": result.metadata.get("is_pdf", False),
-                    "processor": result.metadata.get("processor", "scikit-image")
-                }
+                "metadata": metadata
             }
+            if sections is not None and "raw_text" not in sections:
+                for structured_invoice in structured_invoices:
+                    structured_invoice.pop("raw_text", None)
         else:
             # No es una factura - retornar datos generales de OCR
-            return {
+            response = {
                 "type": "general_text",
                 "success": True,
                 "filename": result.filename,
@@ -238,11 +463,18 @@ async def process_image(file: UploadFile = File(...)):
                 "content_type": result.content_type,
                 "processing_time": result.processing_time,
                 "raw_text": result.raw_text,
-                "text_blocks": [block.dict() for block in result.text_blocks],
-                "tables": [table.dict() for table in result.tables],
-                "figures": [figure.dict() for figure in result.figures],
+                "text_blocks": [block.model_dump() for block in result.text_blocks],
+                "tables": [table.model_dump() for table in result.tables],
+                "figures": [figure.model_dump() for figure in result.figures],
                 "metadata": result.metadata
             }
+            if sections is not None:
+                for section in ("raw_text", "text_blocks", "tables", "figures"):
+                    if section not in sections:
+                        response.pop(section)
+        
+        # Respuesta serializada con orjson sin pasar por jsonable_encoder
+        return FastJSONResponse(shape_raw_text(response, raw_text))
         
     except HTTPException:
         raise
@@ -258,12 +490,16 @@ async def process_image(file: UploadFile = File(...)):
             cleanup_file(file_path)
 
 @app.post("/process-invoice", response_model=StructuredInvoiceResponse)
-async def process_invoice(file: UploadFile = File(...)):
+async def process_invoice(
+    file: UploadFile = File(...),
+    timings: bool = Query(False, description="Incluir tiempos por etapa en metadata.timings")
+):
     """
     Endpoint para procesar facturas y extraer campos específicos
     
     Args:
         file: Archivo de imagen/PDF de factura a procesar
+        timings: Si incluir los tiempos por etapa del procesamiento
         
     Returns:
         JSON con campos estructurados de la factura
@@ -295,7 +531,7 @@ async def process_invoice(file: UploadFile = File(...)):
         logger.info(f"Procesando factura: {file_path}")
         
         # Procesar imagen con LayoutParser y Tesseract
-        result = image_processor.process_image(file_path)
+        result = await ocr_pool.run(image_processor.process_image, file_path, include_timings=timings)
         
         # Extraer datos de la factura
         invoice_data = result.metadata.get("invoice_parsing", {})
@@ -359,13 +595,18 @@ async def process_invoice(file: UploadFile = File(...)):
             cleanup_file(file_path)
 
 @app.post("/process-multiple-images")
-async def process_multiple_images(files: List[UploadFile] = File(...)):
+async def process_multiple_images(
+    files: List[UploadFile] = File(...),
+    timings: bool = Query(False, description="Incluir tiempos por etapa en metadata.timings de cada archivo"),
+    raw_text: str = Query("all", pattern="^(all|once|none)$", description="Copias de raw_text: all, once (sin duplicados) o none")
+):
     """
     Endpoint inteligente para procesar múltiples archivos - detecta automáticamente 
     si son facturas y extrae datos estructurados o texto general según corresponda
     
     Args:
         files: Lista de archivos de imágenes/PDFs a procesar
+        timings: Si incluir los tiempos por etapa de cada archivo
         
     Returns:
         JSON con resultados estructurados para facturas o texto general para otros archivos
@@ -392,8 +633,6 @@ async def process_multiple_images(files: List[UploadFile] = File(...)):
         if len(files) > 10:  # Límite de 10 archivos
             raise HTTPException(status_code=400, detail="Máximo 10 archivos permitidos")
         
-        processor = AdvancedImageProcessor()
-        
         for i, file in enumerate(files):
             file_path = None
             try:
@@ -426,7 +665,7 @@ async def process_multiple_images(files: List[UploadFile] = File(...)):
                 # Procesar archivo
                 logger.info(f"Iniciando procesamiento de archivo: {file_path}")
                 logger.info(f"Tamaño del archivo: {os.path.getsize(file_path)} bytes")
-                result = processor.process_image(file_path)
+                result = await ocr_pool.run(image_processor.process_image, file_path, include_timings=timings)
                 logger.info(f"Procesamiento completado. Status: {result.status}")
                 logger.info(f"Tiempo de procesamiento: {result.processing_time:.2f}s")
                 logger.info(f"Longitud del texto extraído: {len(result.raw_text)}")
@@ -481,7 +720,7 @@ async def process_multiple_images(files: List[UploadFile] = File(...)):
                             # Crear respuesta estructurada para esta factura
                             structured_invoice = {
                                 "invoice_index": j + 1,
-                                "invoice_fields": invoice_fields.dict(),
+                                "invoice_fields": invoice_fields.model_dump(),
                                 "raw_text": invoice.get("raw_text", ""),
                                 "parsing_confidence": invoice.get("parsing_confidence", 0.0),
                                 "status": "success"
@@ -489,6 +728,17 @@ async def process_multiple_images(files: List[UploadFile] = File(...)):
                             
                             structured_invoices.append(structured_invoice)
                     
+                    metadata = {
+                        "layout_elements_count": result.metadata.get("layout_elements_count", 0),
+                        "text_blocks_count": result.metadata.get("text_blocks_count", 0),
+                        "tables_count": result.metadata.get("tables_count", 0),
+                        "figures_count": result.metadata.get("figures_count", 0),
+                        "is_pdf": result.metadata.get("is_pdf", False),
+                        "processor": result.metadata.get("processor", "scikit-image")
+                    }
+                    if "timings" in result.metadata:
+                        metadata["timings"] = result.metadata["timings"]
+                    
                     # Agregar resultado de factura
                     all_results.append({
                         "file_index": i + 1,
@@ -500,14 +750,7 @@ async def process_multiple_images(files: List[UploadFile] = File(...)):
                         "processing_time": result.processing_time,
                         "total_invoices": len(structured_invoices),
                         "invoices": structured_invoices,
-                        "metadata": {
-                            "layout_elements_count": result.metadata.get("layout_elements_count", 0),
-                            "text_blocks_count": result.metadata.get("text_blocks_count", 0),
-                            "tables_count": result.metadata.get("tables_count", 0),
-                            "figures_count": result.metadata.get("figures_count", 0),
-                            "is_pdf": result.metadata.get("is_pdf", False),
-                            "processor": result.metadata.get("processor", "scikit-image")
-                        }
+                        "metadata": metadata
                     })
                 else:
                     # No es una factura - retornar datos generales de OCR
@@ -520,9 +763,9 @@ async def process_multiple_images(files: List[UploadFile] = File(...)):
                         "content_type": result.content_type,
                         "processing_time": result.processing_time,
                         "raw_text": result.raw_text,
-                        "text_blocks": [block.dict() for block in result.text_blocks],
-                        "tables": [table.dict() for table in result.tables],
-                        "figures": [figure.dict() for figure in result.figures],
+                        "text_blocks": [block.model_dump() for block in result.text_blocks],
+                        "tables": [table.model_dump() for table in result.tables],
+                        "figures": [figure.model_dump() for figure in result.figures],
                         "metadata": result.metadata
                     })
                 
@@ -551,7 +794,7 @@ async def process_multiple_images(files: List[UploadFile] = File(...)):
         # Contar facturas totales
         total_invoices = sum(r.get("total_invoices", 0) for r in invoice_results)
         
-        return {
+        response = {
             "success": True,
             "total_files": len(files),
             "successful_files": len(successful_results),
@@ -570,6 +813,7 @@ async def process_multiple_images(files: List[UploadFile] = File(...)):
                 ) / max(total_invoices, 1)
             }
         }
+        return FastJSONResponse(shape_raw_text(response, raw_text))
         
     except Exception as e:
         logger.error(f"Error procesando múltiples archivos: {e}")
@@ -604,8 +848,6 @@ async def process_invoices_structured(files: List[UploadFile] = File(...)):
         if len(files) > 10:  # Límite de 10 archivos
             raise HTTPException(status_code=400, detail="Máximo 10 archivos permitidos")
         
-        processor = AdvancedImageProcessor()
-        
         for i, file in enumerate(files):
             file_path = None
             try:
@@ -622,7 +864,7 @@ async def process_invoices_structured(files: List[UploadFile] = File(...)):
                 file_paths.append(file_path)
                 
                 # Procesar archivo
-                result = processor.process_image(file_path)
+                result = await ocr_pool.run(image_processor.process_image, file_path)
                 
                 # Extraer datos de facturas
                 invoice_data = result.metadata.get("invoice_parsing", {})
@@ -702,6 +944,72 @@ async def process_invoices_structured(files: List[UploadFile] = File(...)):
             if os.path.exists(file_path):
                 cleanup_file(file_path)
 
+@app.post("/process-invoices-stream")
+async def process_invoices_stream(file: UploadFile = File(...)):
+    """
+    Procesar un archivo con varias facturas (PDF agrupado) y enviar cada una en
+    cuanto se parsea, sin esperar al resto
+    
+    La respuesta es JSON Lines (application/x-ndjson): una línea por factura válida
+    y una última línea con el resumen ("done": true).
+    
+    Args:
+        file: Archivo de imagen/PDF con una o más facturas
+    """
+    if not validate_file_type(file, settings.ALLOWED_EXTENSIONS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Tipo de archivo no permitido. Extensiones permitidas: {', '.join(settings.ALLOWED_EXTENSIONS)}"
+        )
+    if not validate_file_size(file, settings.MAX_FILE_SIZE):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Archivo demasiado grande. Tamaño máximo: {settings.MAX_FILE_SIZE / (1024*1024):.1f}MB"
+        )
+    
+    file_path = save_upload_file(file, settings.UPLOAD_DIR)
+    if not file_path:
+        raise HTTPException(status_code=500, detail="Error guardando archivo temporal")
+    
+    try:
+        # Solo OCR: el parseo se hace factura por factura mientras se envía la respuesta
+        result = await ocr_pool.run(image_processor.process_image, file_path, sections=("raw_text",))
+    finally:
+        if os.path.exists(file_path):
+            cleanup_file(file_path)
+    if result.status != "success":
+        raise HTTPException(status_code=500, detail=result.error_message or "Error procesando archivo")
+    
+    async def invoice_lines():
+        invoices = image_processor.invoice_parser.iter_invoices(result.raw_text)
+        total_invoices = 0
+        while True:
+            # parse_invoice es CPU: cada factura se parsea en un hilo
+            invoice = await asyncio.to_thread(next, invoices, None)
+            if invoice is None:
+                break
+            if not (invoice.get("success", False) and invoice.get("extracted_fields")):
+                continue
+            total_invoices += 1
+            extracted_fields = invoice["extracted_fields"]
+            yield json_line({
+                "filename": result.filename,
+                "invoice_index": total_invoices,
+                "invoice_fields": InvoiceFields(
+                    **{name: extracted_fields.get(name) for name in InvoiceFields.model_fields}
+                ).model_dump(),
+                "text_range": invoice.get("text_range"),
+                "parsing_confidence": invoice.get("parsing_confidence", 0.0)
+            })
+        yield json_line({
+            "done": True,
+            "filename": result.filename,
+            "total_invoices": total_invoices,
+            "processing_time": result.processing_time
+        })
+    
+    return StreamingResponse(invoice_lines(), media_type="application/x-ndjson")
+
 @app.post("/evaluate-metrics")
 async def evaluate_metrics(
     file: UploadFile = File(...),
@@ -744,7 +1052,7 @@ async def evaluate_metrics(
         logger.info(f"Evaluando métricas para archivo: {file_path}")
         
         # Procesar imagen
-        result = image_processor.process_image(file_path)
+        result = await ocr_pool.run(image_processor.process_image, file_path)
         
         if result.status != "success":
             raise HTTPException(
@@ -948,15 +1256,19 @@ async def batch_benchmark(
 @app.post("/process-and-send-factura")
 async def process_and_send_factura(file: UploadFile = File(...)):
     """
-    Procesar imagen de factura y enviar datos a API externa de gestión de facturas
+    Procesar imagen de factura y encolarla para enviar a la API externa de gestión de facturas
+    
+    El envío lo hace el sender del outbox en segundo plano (con reintentos y backoff);
+    el estado se consulta en /api/external/outbox/{id}.
     
     Args:
         file: Archivo de imagen/PDF de factura a procesar
         
     Returns:
-        JSON con resultado del procesamiento y respuesta de la API externa
+        JSON con resultado del procesamiento y la entrada del outbox
     """
     file_path = None
+    converted_image_path = None
     try:
         # Validar tipo de archivo
         if not validate_file_type(file, settings.ALLOWED_EXTENSIONS):
@@ -982,8 +1294,8 @@ async def process_and_send_factura(file: UploadFile = File(...)):
         
         logger.info(f"Procesando factura para envío: {file_path}")
         
-        # Procesar imagen con LayoutParser y Tesseract
-        result = image_processor.process_image(file_path)
+        # Procesar imagen: solo se necesitan los campos de factura (sin OCR por región)
+        result = await ocr_pool.run(image_processor.process_image, file_path, sections=("invoice_fields",))
         
         # Extraer datos de la factura
         invoice_data = result.metadata.get("invoice_parsing", {})
@@ -1022,48 +1334,41 @@ async def process_and_send_factura(file: UploadFile = File(...)):
         
         # Determinar qué archivo enviar (imagen convertida si es PDF, original si es imagen)
         if file_path.lower().endswith('.pdf'):
-            # Si es PDF, buscar la imagen convertida
-            converted_image_path = file_path.replace('.pdf', '_converted.jpg')
-            if os.path.exists(converted_image_path):
+            # Si es PDF, el JPEG se genera recién ahora: el procesamiento renderiza en memoria
+            try:
+                converted_image_path = await ocr_pool.run(image_processor.convert_pdf_to_image, file_path)
                 send_file_path = converted_image_path
                 send_content_type = "image/jpeg"
-                send_filename = result.filename.replace('.pdf', '.jpg')
+                send_filename = os.path.splitext(result.filename)[0] + '.jpg'
                 logger.info(f"Enviando imagen convertida: {converted_image_path}")
-            else:
+            except Exception as e:
                 # Fallback: enviar PDF original
                 send_file_path = file_path
                 send_content_type = result.content_type
                 send_filename = result.filename
-                logger.warning("No se encontró imagen convertida, enviando PDF original")
+                logger.warning(f"No se pudo convertir el PDF a imagen ({e}), enviando PDF original")
         else:
             # Si es imagen, enviar original
             send_file_path = file_path
             send_content_type = result.content_type
             send_filename = result.filename
         
-        # Leer el archivo a enviar
-        with open(send_file_path, 'rb') as file_to_send:
-            file_data = file_to_send.read()
-        
-        # Preparar datos para enviar a API externa
-        datos_factura = {
-            "imagen": {
-                "filename": send_filename,
-                "content_type": send_content_type,
-                "data": file_data.hex(),  # Archivo como hex string
-                "size": len(file_data)
-            },
-            "callback_url": f"{base_url}/api/external/response",  # URL dinámica para respuesta
-            "status_url": f"{base_url}/api/external/status"  # URL dinámica para estado
-        }
-        
-        # Enviar a API externa
-        logger.info("Enviando datos a API externa de facturas...")
-        respuesta_externa = await facturas_client.enviar_factura(datos_factura)
+        # Encolar el envío: el archivo pasa al outbox y el sender lo transmite desde disco
+        # (JSON con hex por defecto; con FACTURAS_API_TRANSFER_MODE=multipart o raw vuelve a hex si la API externa no acepta binario)
+        entry = outbox.enqueue(
+            send_file_path,
+            filename=send_filename,
+            content_type=send_content_type,
+            metadata={
+                "callback_url": f"{base_url}/api/external/response",  # URL dinámica para respuesta
+                "status_url": f"{base_url}/api/external/status"  # URL dinámica para estado
+            }
+        )
+        outbox_sender.wake()
         
         return {
             "status": "success",
-            "message": "Factura procesada y enviada correctamente",
+            "message": "Factura procesada y encolada para envío a API externa",
             "procesamiento_local": {
                 "filename": result.filename,
                 "file_size": result.file_size,
@@ -1072,7 +1377,11 @@ async def process_and_send_factura(file: UploadFile = File(...)):
                 "raw_text": invoice.get("raw_text", ""),
                 "confidence": invoice.get("parsing_confidence", 0.0)
             },
-            "respuesta_api_externa": respuesta_externa,
+            "envio": {
+                "outbox_id": entry["id"],
+                "status": entry["status"],
+                "status_url": f"/api/external/outbox/{entry['id']}"
+            },
             "metadata": {
                 "external_api_url": facturas_client.base_url,
                 "external_api_endpoint": facturas_client.endpoint,
@@ -1092,6 +1401,9 @@ async def process_and_send_factura(file: UploadFile = File(...)):
         # Limpiar archivo temporal
         if file_path and os.path.exists(file_path):
             cleanup_file(file_path)
+        # El JPEG del PDF se mueve al outbox; si el encolado falló, queda para limpiar
+        if converted_image_path and os.path.exists(converted_image_path):
+            cleanup_file(converted_image_path)
 
 @app.post("/process-factura-only")
 async def process_factura_only(file: UploadFile = File(...)):
@@ -1131,7 +1443,7 @@ async def process_factura_only(file: UploadFile = File(...)):
         logger.info(f"Procesando factura (solo local): {file_path}")
         
         # Procesar imagen con LayoutParser y Tesseract
-        result = image_processor.process_image(file_path)
+        result = await ocr_pool.run(image_processor.process_image, file_path)
         
         # Extraer datos de la factura
         invoice_data = result.metadata.get("invoice_parsing", {})
@@ -1187,6 +1499,45 @@ async def process_factura_only(file: UploadFile = File(...)):
         if file_path and os.path.exists(file_path):
             cleanup_file(file_path)
 
+@app.get("/api/external/client-stats")
+async def external_client_stats():
+    """Estadísticas del cliente HTTP de la API externa (latencia y reutilización de conexiones)"""
+    return {
+        "status": "success",
+        "external_api_url": facturas_client.base_url,
+        "client": facturas_client.get_stats()
+    }
+
+@app.get("/api/external/outbox")
+async def list_outbox(
+    status: str = Query(None, description="Filtrar por estado: pending, sending, delivered o failed"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Estado del outbox de envíos a la API externa (conteo por estado y últimas entradas)"""
+    if status and status not in OUTBOX_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Estado inválido. Valores: {', '.join(OUTBOX_STATUSES)}")
+    return {
+        "status": "success",
+        "counts": outbox.counts(),
+        "entries": outbox.list(status, limit)
+    }
+
+@app.get("/api/external/outbox/{entry_id}")
+async def get_outbox_entry(entry_id: str):
+    """Estado de entrega de una factura encolada"""
+    entry = outbox.get(entry_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Entrada del outbox no encontrada")
+    return {"status": "success", "entry": entry}
+
+@app.post("/api/external/outbox/{entry_id}/retry")
+async def retry_outbox_entry(entry_id: str):
+    """Reencolar una factura cuyo envío falló definitivamente"""
+    if not outbox.retry(entry_id):
+        raise HTTPException(status_code=404, detail="No hay una entrada fallida con ese id")
+    outbox_sender.wake()
+    return {"status": "success", "entry": outbox.get(entry_id)}
+
 @app.post("/api/external/response")
 async def receive_external_response(request: Request):
     """
@@ -1260,8 +1611,38 @@ async def receive_external_status(request: Request):
 @app.on_event("startup")
 async def startup_event():
     """Evento de inicio de la aplicación"""
+    await facturas_client.start()
+    outbox_sender.start()
+    health_monitor.start()
+    # Precalentamiento en segundo plano: la API acepta conexiones mientras se cargan
+    # Tesseract, scikit-image y el modelo de layout (/ready responde 503 hasta terminar)
+    app.state.warmup_task = asyncio.create_task(_warmup())
     logger.info(f"🚀 API iniciada con URL estática: {STATIC_CALLBACK_URL}")
 
+async def _warmup():
+    start = time.perf_counter()
+    await asyncio.to_thread(image_processor.warmup)
+    APP_STARTUP_SECONDS.set(round(time.perf_counter() - start, 4), "warmup")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Evento de apagado de la aplicación"""
+    warmup_task = getattr(app.state, "warmup_task", None)
+    if warmup_task is not None and not warmup_task.done():
+        # El hilo de precalentamiento termina por su cuenta; se deja de esperarlo
+        warmup_task.cancel()
+        try:
+            await warmup_task
+        except asyncio.CancelledError:
+            pass
+    await health_monitor.stop()
+    await outbox_sender.stop()
+    await facturas_client.close()
+
+_import_elapsed = time.perf_counter() - _import_start
+APP_STARTUP_SECONDS.set(round(_import_elapsed, 4), "import")
+logger.info(f"Aplicación importada en {_import_elapsed:.2f}s")
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -2,57 +2,67 @@
 Procesador avanzado de imágenes usando scikit-image
 Alternativa más moderna a OpenCV con algoritmos mejorados
 Versión compatible con Windows sin Detectron2
+
+Los módulos pesados (scikit-image, pytesseract, que a su vez importa pandas,
+pdf2image y LayoutParser/Detectron2) se importan al primer uso o en warmup(),
+para que importar este módulo (y main.py) sea rápido.
 """
 import numpy as np
-import pytesseract
 from PIL import Image
+import re
 import time
 import logging
-from typing import List, Dict, Any, Tuple
+import threading
+import importlib
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple, Optional, Iterable, FrozenSet
 import os
-from pdf2image import convert_from_path
-
-# Importaciones de scikit-image
-from skimage import filters, morphology, exposure, restoration
-from skimage.filters import threshold_otsu, gaussian
-from skimage.morphology import disk, opening, closing
-from skimage.restoration import denoise_bilateral
-
-# Importación condicional de layoutparser
-try:
-    import layoutparser as lp
-    LAYOUTPARSER_AVAILABLE = True
-except ImportError:
-    LAYOUTPARSER_AVAILABLE = False
-    logging.warning("LayoutParser no está disponible. Usando procesamiento básico.")
-
-# Importación condicional de Detectron2
-try:
-    from layoutparser.models import Detectron2LayoutModel
-    DETECTRON2_AVAILABLE = True
-except ImportError:
-    DETECTRON2_AVAILABLE = False
-    logging.warning("Detectron2 no está disponible. Usando procesamiento alternativo.")
 
 from models import TextBlock, Table, Figure, ProcessingResult, ProcessingStatus
 from config import settings
 from services.invoice_parser import InvoiceParser
+from services.vendor_templates import (
+    VendorTemplateCache, FIELD_OCR_CONFIG, PROBE_OCR_CONFIG, amounts_consistent, extract_value, template_regions
+)
+from services.numeric_ocr import NumericOCRCache, NUMERIC_OCR_CONFIG, find_numeric_zones
+from services.deskew import correct_page
+from services.image_loader import decoded_size, open_grayscale
+from services.tiling import load_grayscale, merge_words, split_strips, strip_height
+from services.token_table import TokenTable
+from services.table_extractor import extract_table
+from services.duplicate_index import DuplicateIndex, VERIFICATION_FIELDS, image_fingerprint
+from services.timing import StageTimer, ocr_psm, ocr_span_name, timing_stats
+from services.profiling import ProfileManager
+from services.telemetry import (
+    OCR_CALLS_TOTAL, OCR_CALL_DURATION, PIPELINE_STAGE_DURATION, DOCUMENTS_PROCESSED_TOTAL, PAGE_CORRECTIONS_TOTAL
+)
 
 logger = logging.getLogger(__name__)
 
-class AdvancedImageProcessor:
-    """Procesador avanzado de imágenes usando scikit-image"""
+# Submódulos de scikit-image que usa preprocess_image_advanced (se importan en warmup)
+PREPROCESSING_MODULES = ("skimage.exposure", "skimage.filters", "skimage.morphology", "skimage.restoration")
+
+_tesseract_lock = threading.Lock()
+_tesseract_version: Optional[str] = None
+
+def ensure_tesseract() -> str:
+    """
+    Importar y configurar pytesseract una sola vez por proceso
     
-    def __init__(self):
-        """Inicializar el procesador avanzado"""
-        self.layout_model = None
-        self.invoice_parser = InvoiceParser()
-        self._setup_tesseract()
-        self._load_layout_model()
+    Returns:
+        Versión de Tesseract (la verificación se cachea si fue exitosa)
+        
+    Raises:
+        Exception: Si Tesseract no está instalado o no se encuentra
+    """
+    global _tesseract_version
+    if _tesseract_version is not None:
+        return _tesseract_version
     
-    def _setup_tesseract(self):
-        """Configurar Tesseract OCR"""
-        try:
+    with _tesseract_lock:
+        if _tesseract_version is None:
+            import pytesseract
+            
             if settings.TESSERACT_PATH:
                 pytesseract.pytesseract.tesseract_cmd = settings.TESSERACT_PATH
                 
@@ -66,22 +76,131 @@ class AdvancedImageProcessor:
                 else:
                     logger.warning(f"Directorio tessdata no encontrado: {tessdata_dir}")
             
-            pytesseract.get_tesseract_version()
-            logger.info("Tesseract OCR configurado correctamente")
-            
-        except Exception as e:
-            logger.error(f"Error configurando Tesseract: {str(e)}")
-            raise
+            _tesseract_version = str(pytesseract.get_tesseract_version())
+            logger.info(f"Tesseract OCR configurado correctamente (versión {_tesseract_version})")
+    return _tesseract_version
+
+@lru_cache(maxsize=None)
+def layout_model_class():
+    """Clase Detectron2LayoutModel de LayoutParser, o None si no está disponible"""
+    try:
+        import layoutparser  # noqa: F401
+    except ImportError:
+        logger.warning("LayoutParser no está disponible. Usando procesamiento básico.")
+        return None
+    try:
+        from layoutparser.models import Detectron2LayoutModel
+    except ImportError:
+        logger.warning("Detectron2 no está disponible. Usando procesamiento alternativo.")
+        return None
+    return Detectron2LayoutModel
+
+# Secciones del resultado que se pueden pedir a process_image; las etapas que solo
+# alimentan secciones no pedidas no se ejecutan
+OUTPUT_SECTIONS = ("invoice_fields", "raw_text", "text_blocks", "tables", "figures")
+
+def parse_sections(value: Optional[str]) -> Optional[FrozenSet[str]]:
+    """
+    Interpretar una lista de secciones separadas por coma (ej. 'invoice_fields,raw_text')
+    
+    Returns:
+        Conjunto de secciones, o None si no se especificó ninguna (todas)
+        
+    Raises:
+        ValueError: Si alguna sección no existe
+    """
+    if not value or not value.strip():
+        return None
+    sections = frozenset(part.strip() for part in value.split(',') if part.strip())
+    unknown = sections - set(OUTPUT_SECTIONS)
+    if unknown:
+        raise ValueError(f"Secciones desconocidas: {', '.join(sorted(unknown))}. Valores: {', '.join(OUTPUT_SECTIONS)}")
+    return sections
+
+# Profiler bajo demanda compartido por todas las instancias
+profiler = ProfileManager(
+    settings.PROFILING_DIR,
+    max_bytes=settings.PROFILING_MAX_BYTES,
+    sample_interval=settings.PROFILING_SAMPLE_INTERVAL,
+    enabled=settings.PROFILING_ENABLED
+)
+
+class AdvancedImageProcessor:
+    """Procesador avanzado de imágenes usando scikit-image"""
+    
+    def __init__(self, vendor_templates: Optional[VendorTemplateCache] = None,
+                 numeric_zones: bool = False, numeric_ocr_cache: Optional[NumericOCRCache] = None,
+                 duplicate_index: Optional[DuplicateIndex] = None, reuse_duplicates: bool = False):
+        """
+        Inicializar el procesador avanzado (Tesseract y el modelo de layout se cargan al primer uso)
+        
+        Args:
+            vendor_templates: Caché de plantillas por proveedor (None = siempre OCR de página completa)
+            numeric_zones: Releer con lista blanca numérica las zonas de CUIT, fecha e importes
+                y pasarlas al parser como valores sugeridos
+            numeric_ocr_cache: Caché de resultados del OCR de zonas numéricas (None = sin caché)
+            duplicate_index: Índice de hashes perceptuales para marcar probables duplicados
+                (None = sin detección)
+            reuse_duplicates: Reutilizar el parseo de un duplicado si el importe total, el
+                número de comprobante, el punto de venta y la fecha releídos en sus zonas coinciden
+        """
+        self.layout_model = None
+        self.invoice_parser = InvoiceParser()
+        self.vendor_templates = vendor_templates
+        self.numeric_zones = numeric_zones
+        self.numeric_ocr_cache = numeric_ocr_cache
+        self.duplicate_index = duplicate_index
+        self.reuse_duplicates = reuse_duplicates
+        self._layout_lock = threading.Lock()
+        self._layout_loaded = False
+        self.warmed_up = False
+    
+    def warmup(self) -> Dict[str, float]:
+        """
+        Cargar por adelantado lo que se difiere al primer uso: Tesseract, scikit-image,
+        pdf2image y el modelo de layout. Pensado para ejecutarse en segundo plano al
+        arrancar; los errores se registran pero no se propagan.
+        
+        Returns:
+            Segundos de cada paso
+        """
+        steps = {
+            "tesseract": ensure_tesseract,
+            "skimage": lambda: [importlib.import_module(name) for name in PREPROCESSING_MODULES],
+            "pdf2image": lambda: importlib.import_module("pdf2image"),
+            "layout_model": self._get_layout_model
+        }
+        timings = {}
+        for name, step in steps.items():
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                logger.error(f"Warmup: error en '{name}': {e}")
+            timings[name] = time.perf_counter() - start
+        self.warmed_up = True
+        logger.info("Warmup del procesador completado: " + ", ".join(f"{k}={v:.2f}s" for k, v in timings.items()))
+        return timings
+    
+    def _get_layout_model(self):
+        """Modelo de layout, cargado una sola vez (None si no está disponible)"""
+        if not self._layout_loaded:
+            with self._layout_lock:
+                if not self._layout_loaded:
+                    self._load_layout_model()
+                    self._layout_loaded = True
+        return self.layout_model
     
     def _load_layout_model(self):
         """Cargar el modelo de LayoutParser (si está disponible)"""
-        if not DETECTRON2_AVAILABLE or not LAYOUTPARSER_AVAILABLE:
+        model_class = layout_model_class()
+        if model_class is None:
             logger.warning("Detectron2 o LayoutParser no están disponibles. Usando procesamiento básico.")
             self.layout_model = None
             return
             
         try:
-            self.layout_model = Detectron2LayoutModel(
+            self.layout_model = model_class(
                 config_path=settings.LAYOUT_MODEL_CONFIG["model_name"],
                 threshold=settings.LAYOUT_MODEL_CONFIG["confidence_threshold"],
                 label_map={0: "Text", 1: "Title", 2: "List", 3: "Table", 4: "Figure"}
@@ -92,107 +211,98 @@ class AdvancedImageProcessor:
             logger.error(f"Error cargando modelo de LayoutParser: {str(e)}")
             self.layout_model = None
     
+    def render_pdf_page(self, pdf_path: str, grayscale: bool = True, dpi: int = 150) -> Image.Image:
+        """
+        Renderizar la primera página del PDF en memoria
+        
+        Args:
+            pdf_path: Ruta al PDF
+            grayscale: Renderizar directamente en escala de grises (pdftoppm -gray)
+            dpi: Resolución del render
+            
+        Returns:
+            Página como imagen PIL ('L' si grayscale, 'RGB' si no)
+        """
+        from pdf2image import convert_from_path
+        
+        logger.info(f"Renderizando PDF: {pdf_path}")
+        
+        # Usar Poppler local si está disponible con DPI optimizado para velocidad
+        poppler_path = settings.POPPLER_PATH
+        options = dict(first_page=1, last_page=1, dpi=dpi, grayscale=grayscale)
+        
+        if poppler_path and os.path.exists(poppler_path):
+            logger.info(f"Usando Poppler local: {poppler_path}")
+            images = convert_from_path(pdf_path, poppler_path=poppler_path, **options)
+        else:
+            logger.info("Usando Poppler del sistema")
+            images = convert_from_path(pdf_path, **options)
+        
+        if not images:
+            raise ValueError("No se pudo convertir el PDF a imagen")
+        page = images[0]
+        if grayscale and page.mode != 'L':
+            page = page.convert('L')
+        return page
+    
     def convert_pdf_to_image(self, pdf_path: str) -> str:
-        """Convertir PDF a imagen"""
+        """
+        Convertir la primera página del PDF a JPEG en disco
+        
+        El procesamiento no lo usa (renderiza en grises en memoria); se genera solo
+        cuando hay que reenviar el PDF como imagen, p. ej. en /process-and-send-factura.
+        
+        Returns:
+            Ruta del JPEG generado junto al PDF
+        """
         try:
-            logger.info(f"Convirtiendo PDF: {pdf_path}")
-            
-            # Usar Poppler local si está disponible con DPI optimizado para velocidad
-            poppler_path = settings.POPPLER_PATH
-            logger.info(f"Poppler path configurado: {poppler_path}")
+            page = self.render_pdf_page(pdf_path, grayscale=False)
+            image_path = os.path.splitext(pdf_path)[0] + '_converted.jpg'
+            page.save(image_path, 'JPEG', quality=95)
             
-            if poppler_path and os.path.exists(poppler_path):
-                logger.info("Usando Poppler local")
-                images = convert_from_path(pdf_path, first_page=1, last_page=1, dpi=150, poppler_path=poppler_path)
-            else:
-                logger.info("Usando Poppler del sistema")
-                try:
-                    images = convert_from_path(pdf_path, first_page=1, last_page=1, dpi=150)
-                except Exception as e:
-                    logger.error(f"Error con Poppler del sistema: {e}")
-                    # Intentar sin especificar poppler_path
-                    images = convert_from_path(pdf_path, first_page=1, last_page=1, dpi=150, poppler_path=None)
-
-            if not images:
-                raise ValueError("No se pudo convertir el PDF a imagen")
-
-            image_path = pdf_path.replace('.pdf', '_converted.jpg')
-            images[0].save(image_path, 'JPEG', quality=95)
-
             logger.info(f"PDF convertido a imagen: {image_path}")
             return image_path
-
+            
         except Exception as e:
             logger.error(f"Error convirtiendo PDF: {str(e)}")
             logger.error("Verifica que Poppler esté instalado y en el PATH")
             raise
 
-    def preprocess_image_advanced(self, image_path: str) -> np.ndarray:
+    def preprocess_image_advanced(self, image_path: str, timer: Optional[StageTimer] = None) -> np.ndarray:
         """
         Preprocesamiento avanzado usando scikit-image
         
         Args:
-            image_path: Ruta a la imagen
+            image_path: Ruta a la imagen o al PDF (se procesa la primera página)
+            timer: Medidor de tiempos por etapa (opcional)
             
         Returns:
             Imagen preprocesada como array de numpy
         """
+        timer = timer or StageTimer()
         try:
-            # Verificar si es un PDF y convertirlo
+            # PDF: la página se renderiza en grises directamente en memoria, sin JPEG intermedio
             if image_path.lower().endswith('.pdf'):
-                image_path = self.convert_pdf_to_image(image_path)
+                with timer.span("pdf_conversion"):
+                    page = self.render_pdf_page(image_path)
+                return self.preprocess_page(page, timer)
             
-            # Cargar imagen
-            image = Image.open(image_path)
-            if image.mode != 'L':
-                image = image.convert('L')
+            load_start = time.perf_counter()
             
-            # Mantener tamaño original de la imagen para preservar calidad
-            logger.info(f"Procesando imagen con tamaño original: {image.size}")
+            # Imágenes muy grandes: se decodifican a grises y se preprocesan por franjas
+            # (los JPEG se reducen en el decodificador hasta la resolución que necesita el OCR)
+            max_side = settings.OCR_TARGET_MAX_SIDE
+            width, height = decoded_size(image_path, max_side)
             
-            # Convertir a array de numpy
-            image_array = np.array(image, dtype=np.float64)
-            
-            # Preprocesamiento simple para preservar texto
-            if settings.SKIMAGE_CONFIG.get("use_simple_preprocessing", False):
-                # Preprocesamiento mínimo - solo normalización
-                image_array = exposure.rescale_intensity(image_array)
-                processed_image = (image_array * 255).astype(np.uint8)
-                logger.info("Usando preprocesamiento simple para preservar texto")
+            # Cargar imagen
+            if width * height > settings.TILED_MIN_PIXELS:
+                logger.info(f"Imagen grande ({width}x{height}): procesamiento por franjas")
+                image = Image.fromarray(load_grayscale(image_path, max_side))
             else:
-                # Preprocesamiento completo
-                # Normalizar imagen (rápido)
-                image_array = exposure.rescale_intensity(image_array)
-                
-                # Aplicar filtro bilateral solo si está habilitado
-                if settings.SKIMAGE_CONFIG.get("enable_bilateral", True):
-                    image_array = denoise_bilateral(
-                        image_array, 
-                        sigma_color=settings.SKIMAGE_CONFIG["bilateral_sigma_color"], 
-                        sigma_spatial=settings.SKIMAGE_CONFIG["bilateral_sigma_spatial"]
-                    )
-                
-                # Mejorar contraste solo si está habilitado
-                if settings.SKIMAGE_CONFIG.get("enable_adaptive_hist", True):
-                    image_array = exposure.equalize_adapthist(image_array, clip_limit=0.03)
-                
-                # Aplicar filtro gaussiano suave (siempre, es rápido)
-                image_array = gaussian(image_array, sigma=settings.SKIMAGE_CONFIG["gaussian_sigma"])
-                
-                # Aplicar umbralización de Otsu (rápido)
-                threshold = threshold_otsu(image_array)
-                binary = image_array > threshold
-                
-                # Operaciones morfológicas solo si están habilitadas
-                if settings.SKIMAGE_CONFIG.get("enable_morphology", True):
-                    selem = disk(settings.SKIMAGE_CONFIG["morphology_disk_size"])
-                    binary = opening(binary, selem)
-                    binary = closing(binary, selem)
-                
-                # Convertir de vuelta a uint8
-                processed_image = (binary * 255).astype(np.uint8)
+                image = open_grayscale(image_path, max_side)
+            timer.add("image_load", time.perf_counter() - load_start)
             
-            return processed_image
+            return self.preprocess_page(image, timer)
             
         except Exception as e:
             logger.error(f"Error en preprocesamiento avanzado: {str(e)}")
@@ -203,15 +313,181 @@ class AdvancedImageProcessor:
             except:
                 raise ValueError(f"No se pudo procesar la imagen: {image_path}")
     
+    def preprocess_page(self, image: Image.Image, timer: Optional[StageTimer] = None) -> np.ndarray:
+        """
+        Enderezar y preprocesar una página ya cargada en escala de grises
+        
+        Args:
+            image: Página en escala de grises ('L')
+            timer: Medidor de tiempos por etapa (opcional)
+            
+        Returns:
+            Imagen preprocesada como array de numpy
+        """
+        timer = timer or StageTimer()
+        preprocessing_start = time.perf_counter()
+        
+        # Enderezar la página antes del layout y del OCR (estimado sobre una copia reducida)
+        if settings.DESKEW_ENABLED:
+            with timer.span("deskew"):
+                image = self.correct_orientation(image, timer)
+        
+        # Mantener tamaño original de la imagen para preservar calidad
+        logger.info(f"Procesando imagen con tamaño original: {image.size}")
+        
+        if image.width * image.height > settings.TILED_MIN_PIXELS:
+            processed_image = self._preprocess_strips(np.asarray(image))
+        else:
+            # Convertir a array de numpy
+            processed_image = self._preprocess_array(np.array(image, dtype=np.float64))
+        
+        timer.add("preprocessing", time.perf_counter() - preprocessing_start)
+        return processed_image
+    
+    def _preprocess_array(self, image_array: np.ndarray, in_range: Any = 'image') -> np.ndarray:
+        """
+        Normalización, filtros y umbralización de una imagen (o franja) en float64
+        
+        Args:
+            image_array: Imagen en escala de grises como float64
+            in_range: Rango de intensidad para normalizar ('image' = el de la propia
+                imagen; las franjas usan el de la página completa)
+            
+        Returns:
+            Imagen preprocesada como uint8
+        """
+        from skimage import exposure
+        from skimage.filters import threshold_otsu, gaussian
+        from skimage.morphology import disk, opening, closing
+        from skimage.restoration import denoise_bilateral
+        
+        # Preprocesamiento simple para preservar texto
+        if settings.SKIMAGE_CONFIG.get("use_simple_preprocessing", False):
+            # Preprocesamiento mínimo - solo normalización
+            image_array = exposure.rescale_intensity(image_array, in_range=in_range)
+            processed_image = (image_array * 255).astype(np.uint8)
+            logger.info("Usando preprocesamiento simple para preservar texto")
+        else:
+            # Preprocesamiento completo
+            # Normalizar imagen (rápido)
+            image_array = exposure.rescale_intensity(image_array, in_range=in_range)
+            
+            # Aplicar filtro bilateral solo si está habilitado
+            if settings.SKIMAGE_CONFIG.get("enable_bilateral", True):
+                image_array = denoise_bilateral(
+                    image_array, 
+                    sigma_color=settings.SKIMAGE_CONFIG["bilateral_sigma_color"], 
+                    sigma_spatial=settings.SKIMAGE_CONFIG["bilateral_sigma_spatial"]
+                )
+            
+            # Mejorar contraste solo si está habilitado
+            if settings.SKIMAGE_CONFIG.get("enable_adaptive_hist", True):
+                image_array = exposure.equalize_adapthist(image_array, clip_limit=0.03)
+            
+            # Aplicar filtro gaussiano suave (siempre, es rápido)
+            image_array = gaussian(image_array, sigma=settings.SKIMAGE_CONFIG["gaussian_sigma"])
+            
+            # Aplicar umbralización de Otsu (rápido)
+            threshold = threshold_otsu(image_array)
+            binary = image_array > threshold
+            
+            # Operaciones morfológicas solo si están habilitadas
+            if settings.SKIMAGE_CONFIG.get("enable_morphology", True):
+                selem = disk(settings.SKIMAGE_CONFIG["morphology_disk_size"])
+                binary = opening(binary, selem)
+                binary = closing(binary, selem)
+            
+            # Convertir de vuelta a uint8
+            processed_image = (binary * 255).astype(np.uint8)
+        return processed_image
+    
+    def _preprocess_strips(self, gray: np.ndarray) -> np.ndarray:
+        """
+        Preprocesar por franjas solapadas: el float64 y los filtros se aplican a una
+        franja por vez, y de cada una se copian solo las filas de las que es dueña
+        """
+        height, width = gray.shape
+        overlap = settings.TILE_OVERLAP
+        strips = split_strips(height, strip_height(width, settings.TILE_MAX_PIXELS, overlap), overlap)
+        in_range = (float(gray.min()), float(gray.max()))
+        processed = np.empty_like(gray)
+        for strip in strips:
+            result = self._preprocess_array(gray[strip.top:strip.bottom].astype(np.float64), in_range)
+            processed[strip.own_top:strip.own_bottom] = result[strip.own_top - strip.top:strip.own_bottom - strip.top]
+        logger.info(f"Preprocesamiento por franjas: {len(strips)} franjas de hasta {strips[0].bottom} filas")
+        return processed
+    
+    def correct_orientation(self, image: Image.Image, timer: Optional[StageTimer] = None) -> Image.Image:
+        """
+        Corregir orientación (OSD) e inclinación (perfil de proyección) de la página
+        
+        Args:
+            image: Página en escala de grises
+            timer: Medidor de tiempos por etapa (opcional)
+            
+        Returns:
+            Página corregida (la misma imagen si no hizo falta corregirla)
+        """
+        detect = None
+        if settings.DESKEW_OSD_ENABLED:
+            detect = lambda small: self.detect_orientation(small, timer)
+        
+        corrected, correction = correct_page(
+            image,
+            max_side=settings.DESKEW_MAX_SIDE,
+            max_angle=settings.DESKEW_MAX_ANGLE,
+            min_angle=settings.DESKEW_MIN_ANGLE,
+            detect_orientation=detect,
+            min_confidence=settings.DESKEW_OSD_MIN_CONFIDENCE
+        )
+        if correction["orientation"]:
+            PAGE_CORRECTIONS_TOTAL.inc("orientation")
+        if correction["skew"]:
+            PAGE_CORRECTIONS_TOTAL.inc("skew")
+        if correction["orientation"] or correction["skew"]:
+            logger.info(f"Página corregida: rotación {correction['orientation']}°, inclinación {correction['skew']}°")
+        return corrected
+    
+    def detect_orientation(self, image: Image.Image, timer: Optional[StageTimer] = None) -> Tuple[int, float]:
+        """
+        Orientación de la página con el OSD de Tesseract (--psm 0)
+        
+        Returns:
+            (rotación horaria necesaria en grados, confianza); (0, 0.0) si OSD no
+            está disponible o no encontró texto suficiente
+        """
+        try:
+            import pytesseract
+            ensure_tesseract()
+        except Exception as e:
+            logger.debug(f"OSD no disponible: {e}")
+            return 0, 0.0
+        
+        try:
+            ocr_start = time.perf_counter()
+            osd = pytesseract.image_to_osd(image, config="--psm 0", output_type=pytesseract.Output.DICT)
+            ocr_elapsed = time.perf_counter() - ocr_start
+        except Exception as e:
+            # Tesseract falla con "Too few characters" en páginas con poco texto
+            OCR_CALLS_TOTAL.inc("0", "error")
+            logger.debug(f"OSD sin resultado: {e}")
+            return 0, 0.0
+        OCR_CALLS_TOTAL.inc("0", "success")
+        OCR_CALL_DURATION.observe(ocr_elapsed, "0")
+        if timer is not None:
+            timer.add("ocr.psm_0", ocr_elapsed)
+        return int(osd.get("rotate", 0)) % 360, float(osd.get("orientation_conf", 0.0))
+    
     def detect_layout(self, image: np.ndarray) -> List[Dict[str, Any]]:
         """Detectar layout usando LayoutParser o método alternativo"""
         layout_elements = []
         
         try:
-            if self.layout_model is not None and DETECTRON2_AVAILABLE:
+            layout_model = self._get_layout_model()
+            if layout_model is not None:
                 # Usar LayoutParser si está disponible
                 pil_image = Image.fromarray(image)
-                layout = self.layout_model.detect(pil_image)
+                layout = layout_model.detect(pil_image)
                 
                 for element in layout:
                     bbox = element.coordinates
@@ -270,8 +546,33 @@ class AdvancedImageProcessor:
         
         return layout_elements
     
-    def extract_text_from_region(self, image: np.ndarray, bbox: List[int]) -> Tuple[str, float]:
-        """Extraer texto de una región específica con múltiples intentos"""
+    def extract_text_from_region(self, image: np.ndarray, bbox: List[int],
+                                 timer: Optional[StageTimer] = None) -> Tuple[str, float]:
+        """
+        Extraer texto de una región específica con múltiples intentos
+        
+        Args:
+            image: Imagen preprocesada
+            bbox: Región [x1, y1, x2, y2]
+            timer: Medidor de tiempos; cada llamada OCR se registra como 'ocr.psm_N'
+        """
+        text, confidence, _ = self.extract_words_from_region(image, bbox, timer)
+        return text, confidence
+    
+    def extract_words_from_region(self, image: np.ndarray, bbox: List[int],
+                                  timer: Optional[StageTimer] = None,
+                                  configs: Optional[List[str]] = None) -> Tuple[str, float, TokenTable]:
+        """
+        Como extract_text_from_region, pero también devuelve las palabras del mejor
+        resultado con su posición en la imagen, en una TokenTable (se recorre como
+        diccionarios con text, conf, bbox [x1, y1, x2, y2] y line)
+        
+        Args:
+            configs: Configuraciones de Tesseract a probar (por defecto, los 5 PSM)
+        """
+        import pytesseract
+        ensure_tesseract()
+        
         try:
             x1, y1, x2, y2 = bbox
             
@@ -279,10 +580,10 @@ class AdvancedImageProcessor:
             roi = image[y1:y2, x1:x2]
             
             if roi.size == 0:
-                return "", 0.0
+                return "", 0.0, TokenTable.empty()
             
             # Intentar diferentes configuraciones de OCR
-            ocr_configs = [
+            ocr_configs = configs or [
                 settings.OCR_CONFIG["config"],  # Configuración principal
                 "--psm 6 --oem 3",              # PSM 6 (bloque uniforme)
                 "--psm 8 --oem 3",              # PSM 8 (palabra única)
@@ -292,48 +593,112 @@ class AdvancedImageProcessor:
             
             best_text = ""
             best_confidence = 0.0
+            best_words = TokenTable.empty()
             
             for config in ocr_configs:
+                psm = ocr_psm(config)
                 try:
                     # Aplicar OCR con configuración específica
+                    ocr_start = time.perf_counter()
                     data = pytesseract.image_to_data(
                         roi, 
                         lang=settings.OCR_CONFIG["lang"],
                         config=config,
                         output_type=pytesseract.Output.DICT
                     )
+                    ocr_elapsed = time.perf_counter() - ocr_start
+                    OCR_CALLS_TOTAL.inc(psm, "success")
+                    OCR_CALL_DURATION.observe(ocr_elapsed, psm)
+                    if timer is not None:
+                        timer.add(ocr_span_name(config), ocr_elapsed)
                     
                     # Extraer texto y calcular confianza
-                    text_parts = []
-                    confidences = []
-                    
-                    for i in range(len(data['text'])):
-                        if int(data['conf'][i]) > 0:
-                            text_parts.append(data['text'][i])
-                            confidences.append(int(data['conf'][i]) / 100.0)
-                    
-                    text = ' '.join(text_parts).strip()
-                    avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+                    words = TokenTable.from_tesseract(data, offset=(x1, y1))
+                    text = words.joined_text()
+                    avg_confidence = words.mean_confidence()
                     
                     # Mantener el mejor resultado
                     if len(text) > len(best_text) or (len(text) == len(best_text) and avg_confidence > best_confidence):
                         best_text = text
                         best_confidence = avg_confidence
+                        best_words = words
                         
                 except Exception as e:
+                    OCR_CALLS_TOTAL.inc(psm, "error")
                     logger.warning(f"Error con configuración OCR {config}: {str(e)}")
                     continue
             
-            return best_text, best_confidence
+            return best_text, best_confidence, best_words
             
         except Exception as e:
             logger.error(f"Error extrayendo texto de región: {str(e)}")
-            return "", 0.0
+            return "", 0.0, TokenTable.empty()
     
-    def process_image(self, image_path: str) -> ProcessingResult:
-        """Procesar imagen completa con scikit-image"""
+    def process_image(self, image_path: str, include_timings: bool = False,
+                      sections: Optional[Iterable[str]] = None) -> ProcessingResult:
+        """
+        Procesar imagen completa con scikit-image
+        
+        Args:
+            image_path: Ruta a la imagen o PDF
+            include_timings: Si agregar los tiempos por etapa en metadata["timings"]
+                (siempre se registran en el log y en el agregado de timing_stats)
+            sections: Secciones a calcular (ver OUTPUT_SECTIONS; None = todas). Sin
+                text_blocks/tables/figures no se hace OCR por región; sin invoice_fields
+                no se parsean facturas; sin invoice_fields ni raw_text no se hace OCR
+                de página completa
+        """
+        sections = frozenset(OUTPUT_SECTIONS if sections is None else sections)
+        # Se perfila solo si el request lo pidió (ver services/profiling.py)
+        with profiler.maybe_profile(os.path.basename(image_path)):
+            return self._process_image(image_path, include_timings, sections)
+    
+    def extract_words_from_strips(self, image: np.ndarray, timer: Optional[StageTimer] = None,
+                                  configs: Optional[List[str]] = None) -> Tuple[str, float, TokenTable]:
+        """
+        OCR de página completa por franjas solapadas, para imágenes muy grandes
+        
+        Tesseract recibe una franja por vez (su memoria no depende del alto de la
+        página) y las palabras del solapamiento se conservan solo en la franja dueña
+        de su centro vertical.
+        
+        Returns:
+            (texto, confianza promedio, palabras con posición en la página)
+        """
+        height, width = image.shape[:2]
+        overlap = settings.TILE_OVERLAP
+        strips = split_strips(height, strip_height(width, settings.TILE_MAX_PIXELS, overlap), overlap)
+        strip_words = []
+        for strip in strips:
+            _, _, words = self.extract_words_from_region(image, [0, strip.top, width, strip.bottom], timer, configs)
+            strip_words.append(words)
+        
+        words = TokenTable.from_words(merge_words(strip_words, strips))
+        text = words.joined_text()
+        confidence = words.mean_confidence()
+        logger.info(f"OCR por franjas: {len(strips)} franjas, {len(words)} palabras")
+        return text, confidence, words
+    
+    def _process_image(self, image_path: str, include_timings: bool, sections: FrozenSet[str]) -> ProcessingResult:
+        """Implementación de process_image"""
         start_time = time.time()
-        converted_image_path = None
+        timer = StageTimer()
+        
+        # Tipos de región de layout que hay que pasar por OCR según las secciones pedidas
+        region_types = set()
+        if "text_blocks" in sections:
+            region_types.update(["Text", "Title", "List"])
+        if "tables" in sections:
+            region_types.add("Table")
+        needs_layout = bool(region_types) or "figures" in sections
+        # Las plantillas por proveedor reemplazan el OCR de página completa cuando solo se piden campos
+        use_templates = self.vendor_templates is not None and "invoice_fields" in sections and not needs_layout
+        # Las posiciones de las palabras de la página completa sirven para extraer los items por fila,
+        # aprender plantillas, ubicar zonas numéricas y guardar la zona del total de los documentos
+        # indexados como posibles duplicados
+        use_words = "invoice_fields" in sections
+        template_outcome, template_cuit = None, None
+        duplicate_info = None
         
         try:
             logger.info(f"=== INICIANDO PROCESAMIENTO ===")
@@ -345,23 +710,23 @@ class AdvancedImageProcessor:
             
             # Preprocesamiento avanzado
             logger.info("Aplicando preprocesamiento avanzado...")
-            processed_image = self.preprocess_image_advanced(image_path)
+            processed_image = self.preprocess_image_advanced(image_path, timer)
             logger.info("Preprocesamiento completado")
             
-            if image_path.lower().endswith('.pdf'):
-                converted_image_path = image_path.replace('.pdf', '_converted.jpg')
-                logger.info(f"PDF detectado, imagen convertida: {converted_image_path}")
-            
-            # Detectar layout
-            logger.info("Detectando layout...")
-            layout_elements = self.detect_layout(processed_image)
-            logger.info(f"Layout detectado: {len(layout_elements)} elementos")
+            # Detectar layout (solo si se pidieron bloques, tablas o figuras)
+            layout_elements = []
+            if needs_layout:
+                logger.info("Detectando layout...")
+                with timer.span("layout"):
+                    layout_elements = self.detect_layout(processed_image)
+                logger.info(f"Layout detectado: {len(layout_elements)} elementos")
             
             # Extraer bloques de texto
             text_blocks = []
+            region_ocr_start = time.perf_counter()
             for elem in layout_elements:
-                if elem["type"] in ["Text", "Title", "List"]:
-                    text, confidence = self.extract_text_from_region(processed_image, elem["bbox"])
+                if elem["type"] in ["Text", "Title", "List"] and elem["type"] in region_types:
+                    text, confidence = self.extract_text_from_region(processed_image, elem["bbox"], timer)
                     if text.strip():
                         text_blocks.append(TextBlock(
                             text=text,
@@ -370,23 +735,33 @@ class AdvancedImageProcessor:
                             block_type=elem["type"].lower()
                         ))
             
-            # Extraer tablas (implementación simplificada)
+            # Extraer tablas: filas y columnas por la posición de las palabras
             tables = []
-            table_elements = [elem for elem in layout_elements if elem["type"] == "Table"]
+            table_elements = [elem for elem in layout_elements if elem["type"] == "Table" and "Table" in region_types]
             for table_elem in table_elements:
-                text, confidence = self.extract_text_from_region(processed_image, table_elem["bbox"])
-                if text.strip():
+                text, confidence, tokens = self.extract_words_from_region(processed_image, table_elem["bbox"], timer)
+                table = extract_table(tokens)
+                if table is not None and table.rows:
+                    tables.append(Table(
+                        rows=table.rows,
+                        headers=table.headers or None,
+                        bbox=table_elem["bbox"],
+                        confidence=confidence
+                    ))
+                elif text.strip():
+                    # Sin posiciones de palabras: filas del texto partidas por espacios
                     rows = [row.strip().split() for row in text.split('\n') if row.strip()]
-                    if rows:
-                        tables.append(Table(
-                            rows=rows,
-                            bbox=table_elem["bbox"],
-                            confidence=confidence
-                        ))
+                    tables.append(Table(
+                        rows=rows,
+                        bbox=table_elem["bbox"],
+                        confidence=confidence
+                    ))
+            if region_types:
+                timer.add("region_ocr", time.perf_counter() - region_ocr_start)
             
             # Extraer figuras
             figures = []
-            figure_elements = [elem for elem in layout_elements if elem["type"] == "Figure"]
+            figure_elements = [elem for elem in layout_elements if elem["type"] == "Figure" and "figures" in sections]
             for fig_elem in figure_elements:
                 figures.append(Figure(
                     bbox=fig_elem["bbox"],
@@ -394,13 +769,54 @@ class AdvancedImageProcessor:
                     confidence=fig_elem["confidence"]
                 ))
             
-            # Extraer texto completo (fallback si no hay elementos detectados)
-            logger.info("Extrayendo texto completo...")
-            full_text, full_confidence = self.extract_text_from_region(processed_image, [0, 0, processed_image.shape[1], processed_image.shape[0]])
-            logger.info(f"Texto extraído: {len(full_text)} caracteres")
+            # Probable duplicado de un documento ya procesado (hash perceptual de la página)
+            fingerprint, duplicate, reused_result = None, None, None
+            if self.duplicate_index is not None:
+                with timer.span("duplicate_check"):
+                    fingerprint = image_fingerprint(processed_image)
+                    duplicate = self.duplicate_index.find(fingerprint)
+                if duplicate is not None:
+                    duplicate_info = {"result": "duplicate", "document_id": duplicate["id"],
+                                      "original_filename": duplicate["filename"], "distance": duplicate["distance"]}
+                    # El parseo guardado sirve si solo se piden campos y texto, y las zonas de verificación coinciden
+                    verifiable = (duplicate["invoice_data"] is not None
+                                  and all(field in duplicate["zones"] for field in VERIFICATION_FIELDS))
+                    if self.reuse_duplicates and verifiable and "invoice_fields" in sections and not needs_layout:
+                        with timer.span("duplicate_verification"):
+                            reused_result = self._verify_duplicate(processed_image, duplicate, timer)
+                        duplicate_info["result"] = "reused" if reused_result is not None else "fallback"
+                    self.duplicate_index.record_duplicate(
+                        duplicate["id"], reused=reused_result is not None, verified=duplicate_info["result"] != "fallback"
+                    )
+                    logger.info(f"Probable duplicado de {duplicate['filename']} (distancia {duplicate['distance']}): "
+                                f"{duplicate_info['result']}")
+            
+            # Proveedor con plantilla: se leen solo las regiones de sus campos
+            template_result = None
+            if use_templates and len(self.vendor_templates) and reused_result is None:
+                with timer.span("vendor_template"):
+                    template_outcome, template_cuit, template_result = self._apply_vendor_template(processed_image, timer)
+            
+            # Extraer texto completo (para raw_text, el parser de facturas y como fallback
+            # si no hay elementos de layout detectados)
+            full_text, full_confidence, words = "", 0.0, []
+            needs_full_text = template_result is None and reused_result is None and (bool(sections & {"raw_text", "invoice_fields"}) or (
+                "text_blocks" in sections and not layout_elements
+            ))
+            if needs_full_text:
+                logger.info("Extrayendo texto completo...")
+                full_page = [0, 0, processed_image.shape[1], processed_image.shape[0]]
+                with timer.span("full_page_ocr"):
+                    if processed_image.size > settings.TILED_MIN_PIXELS:
+                        full_text, full_confidence, words = self.extract_words_from_strips(processed_image, timer)
+                    elif use_words:
+                        full_text, full_confidence, words = self.extract_words_from_region(processed_image, full_page, timer)
+                    else:
+                        full_text, full_confidence = self.extract_text_from_region(processed_image, full_page, timer)
+                logger.info(f"Texto extraído: {len(full_text)} caracteres")
             
             # Si no se detectaron elementos de layout, crear un bloque de texto con todo el contenido
-            if not layout_elements and full_text.strip():
+            if "text_blocks" in sections and not layout_elements and full_text.strip():
                 logger.info("No se detectaron elementos de layout, creando bloque de texto completo")
                 text_blocks.append(TextBlock(
                     text=full_text.strip(),
@@ -410,9 +826,27 @@ class AdvancedImageProcessor:
                 ))
             
             # Parsear campos específicos de la factura (soporta múltiples facturas)
-            logger.info("Analizando facturas...")
-            invoice_data = self.invoice_parser.parse_multiple_invoices(full_text)
-            logger.info(f"Análisis de facturas: {invoice_data}")
+            if reused_result is not None:
+                invoice_data, full_text, full_confidence = reused_result
+            elif template_result is not None:
+                invoice_data, full_text, full_confidence = template_result
+            elif "invoice_fields" in sections:
+                hints = {}
+                if self.numeric_zones and words:
+                    with timer.span("numeric_zones"):
+                        hints = self._numeric_hints(processed_image, words, timer)
+                logger.info("Analizando facturas...")
+                with timer.span("invoice_parsing"):
+                    invoice_data = self.invoice_parser.parse_multiple_invoices(full_text, hints, words or None)
+                logger.info(f"Análisis de facturas: {invoice_data}")
+                if use_templates:
+                    learned_cuit = self._learn_vendor_template(invoice_data, words, processed_image.shape, timer)
+                    if learned_cuit:
+                        # Tras un fallback la plantilla se reaprende; se informa el fallback
+                        template_outcome = "fallback" if template_outcome == "fallback" else "learned"
+                        template_cuit = learned_cuit
+            else:
+                invoice_data = {'success': False, 'skipped': True, 'invoices': [], 'total_invoices': 0}
             
             # Asegurar que el raw_text se preserve en cada factura
             if invoice_data.get('success') and invoice_data.get('invoices'):
@@ -422,8 +856,36 @@ class AdvancedImageProcessor:
             
             processing_time = time.time() - start_time
             logger.info(f"Tiempo total de procesamiento: {processing_time:.2f}s")
+            logger.info(f"Tiempos por etapa: {timer.format()}")
             content_type = "application/pdf" if image_path.lower().endswith('.pdf') else "image/jpeg"
             
+            timing_stats.record(self._document_type(image_path, invoice_data), timer)
+            for stage, seconds in timer.timings.items():
+                if not stage.startswith("ocr."):
+                    PIPELINE_STAGE_DURATION.observe(seconds, stage)
+            DOCUMENTS_PROCESSED_TOTAL.inc("success")
+            metadata = {
+                "layout_elements_count": len(layout_elements),
+                "text_blocks_count": len(text_blocks),
+                "tables_count": len(tables),
+                "figures_count": len(figures),
+                "is_pdf": image_path.lower().endswith('.pdf'),
+                "processor": "scikit-image",
+                "invoice_parsing": invoice_data,
+                "sections": sorted(sections)
+            }
+            if use_templates:
+                metadata["vendor_template"] = {"result": template_outcome, "cuit": template_cuit}
+            if self.duplicate_index is not None:
+                # Los documentos nuevos (o duplicados que no verificaron) se indexan
+                if reused_result is None and invoice_data.get('success'):
+                    document_id = self._index_document(fingerprint, filename, invoice_data, full_text,
+                                                       full_confidence, words, processed_image.shape)
+                    duplicate_info = duplicate_info or {"result": "new", "document_id": document_id}
+                metadata["duplicate"] = duplicate_info or {"result": "new", "document_id": None}
+            if include_timings:
+                metadata["timings"] = timer.as_dict()
+            
             return ProcessingResult(
                 filename=filename,
                 file_size=file_size,
@@ -434,20 +896,13 @@ class AdvancedImageProcessor:
                 tables=tables,
                 figures=figures,
                 raw_text=full_text,
-                metadata={
-                    "layout_elements_count": len(layout_elements),
-                    "text_blocks_count": len(text_blocks),
-                    "tables_count": len(tables),
-                    "figures_count": len(figures),
-                    "is_pdf": image_path.lower().endswith('.pdf'),
-                    "processor": "scikit-image",
-                    "invoice_parsing": invoice_data
-                }
+                metadata=metadata
             )
             
         except Exception as e:
             processing_time = time.time() - start_time
             logger.error(f"Error procesando imagen: {str(e)}")
+            DOCUMENTS_PROCESSED_TOTAL.inc("error")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
             
@@ -457,12 +912,204 @@ class AdvancedImageProcessor:
                 content_type="application/pdf" if image_path.lower().endswith('.pdf') else "image/jpeg",
                 processing_time=processing_time,
                 status=ProcessingStatus.ERROR,
+                metadata={"timings": timer.as_dict()} if include_timings else {},
                 error_message=str(e)
             )
-        finally:
-            if converted_image_path and os.path.exists(converted_image_path):
-                try:
-                    os.remove(converted_image_path)
-                    logger.info(f"Imagen convertida eliminada: {converted_image_path}")
-                except Exception as e:
-                    logger.warning(f"No se pudo eliminar imagen convertida: {str(e)}")
+    
+    def _apply_vendor_template(self, image: np.ndarray, timer: StageTimer) -> Tuple[
+            str, Optional[str], Optional[Tuple[Dict[str, Any], str, float]]]:
+        """
+        Leer la factura con la plantilla de su proveedor
+        
+        Se hace OCR de la zona donde los proveedores conocidos tienen el CUIT; si alguno
+        tiene plantilla, se lee cada región de sus campos con una sola configuración
+        de Tesseract. La plantilla se descarta para este documento si algún valor no
+        tiene su formato, si el CUIT releído en la región de la plantilla no es el
+        encontrado o si subtotal + IVA no coincide con el importe total.
+        
+        Returns:
+            (resultado, cuit, (invoice_data, texto, confianza) si la plantilla validó);
+            resultado es 'hit', 'miss' (ningún CUIT con plantilla) o 'fallback'
+        """
+        start = time.perf_counter()
+        height, width = image.shape[:2]
+        probe = self.vendor_templates.probe_region(width, height)
+        probe_text = self.extract_words_from_region(image, probe, timer, [PROBE_OCR_CONFIG])[0] if probe else ""
+        cuit = self.vendor_templates.find_vendor(probe_text)
+        if cuit is None:
+            self.vendor_templates.record_miss()
+            return "miss", None, None
+        
+        template = self.vendor_templates.get(cuit)
+        fields: Dict[str, Any] = dict(template.get("constants", {}), cuit_vendedor=cuit)
+        texts, confidences, items = [probe_text], [], []
+        for name, bbox, kind in template_regions(template, width, height):
+            if name == "cuit_vendedor":
+                # La zona de búsqueda une las de todos los proveedores: el CUIT debe estar en la de este
+                text, _ = self._read_numeric_zone(image, bbox, timer)
+                if extract_value(name, text) != cuit:
+                    self.vendor_templates.record_fallback(cuit, f"CUIT releído en su región no coincide ({text!r})")
+                    return "fallback", cuit, None
+                continue
+            if kind == "numeric":
+                text, confidence = self._read_numeric_zone(image, bbox, timer)
+            else:
+                text, confidence, tokens = self.extract_words_from_region(image, bbox, timer, [FIELD_OCR_CONFIG[kind]])
+            texts.append(text)
+            confidences.append(confidence)
+            if name == "items":
+                items = self.invoice_parser.parse_items(text, tokens)
+                continue
+            value = extract_value(name, text)
+            if value is None:
+                self.vendor_templates.record_fallback(cuit, f"'{name}' ilegible en su región ({text!r})")
+                return "fallback", cuit, None
+            fields[name] = value
+        
+        if template.get("items") and not items:
+            self.vendor_templates.record_fallback(cuit, "sin items en la región de la tabla")
+            return "fallback", cuit, None
+        if items:
+            fields["items"] = items
+        
+        if not amounts_consistent(fields):
+            self.vendor_templates.record_fallback(cuit, "subtotal + IVA no coincide con el importe total")
+            return "fallback", cuit, None
+        
+        text = "\n".join(t for t in texts if t)
+        invoice = self.invoice_parser.build_invoice(fields, text)
+        
+        saved = self.vendor_templates.record_hit(cuit, time.perf_counter() - start)
+        logger.info(f"Factura leída con la plantilla de {cuit}: {len(fields)} campos, ~{saved:.2f}s ahorrados")
+        invoice_data = {'success': True, 'invoices': [invoice], 'total_invoices': 1, 'raw_text': text}
+        confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        return "hit", cuit, (invoice_data, text, confidence)
+    
+    def _read_numeric_zone(self, image: np.ndarray, bbox: List[int], timer: StageTimer) -> Tuple[str, float]:
+        """OCR de una zona numérica con lista blanca y PSM de una línea (cacheado por contenido)"""
+        key = None
+        if self.numeric_ocr_cache is not None:
+            x1, y1, x2, y2 = bbox
+            key = NumericOCRCache.key(image[y1:y2, x1:x2], NUMERIC_OCR_CONFIG)
+            cached = self.numeric_ocr_cache.get(key)
+            if cached is not None:
+                return cached
+        text, confidence, _ = self.extract_words_from_region(image, bbox, timer, [NUMERIC_OCR_CONFIG])
+        if key is not None:
+            self.numeric_ocr_cache.put(key, (text, confidence))
+        return text, confidence
+    
+    def _numeric_hints(self, image: np.ndarray, words: List[Dict[str, Any]], timer: StageTimer) -> Dict[str, str]:
+        """Valores de los campos numéricos releídos en sus zonas (solo los que tienen el formato esperado)"""
+        hints = {}
+        for field, bbox in find_numeric_zones(words, image.shape[1]).items():
+            value = extract_value(field, self._read_numeric_zone(image, bbox, timer)[0])
+            if value:
+                hints[field] = value
+        logger.info(f"Valores de zonas numéricas: {hints}")
+        return hints
+    
+    def _verify_duplicate(self, image: np.ndarray, duplicate: Dict[str, Any],
+                          timer: StageTimer) -> Optional[Tuple[Dict[str, Any], str, float]]:
+        """
+        Releer el importe total, el número de comprobante, el punto de venta y la fecha
+        en las zonas donde estaban en el documento indexado (se comparan los dígitos)
+        
+        Returns:
+            (invoice_data, texto, confianza) guardados si todos coinciden, o None
+        """
+        height, width = image.shape[:2]
+        for field in VERIFICATION_FIELDS:
+            zone = duplicate["zones"][field]
+            x1, y1, x2, y2 = zone["bbox"]
+            bbox = [int(x1 * width), int(y1 * height), int(round(x2 * width)), int(round(y2 * height))]
+            value = extract_value(field, self._read_numeric_zone(image, bbox, timer)[0]) or ""
+            if re.sub(r'\D', '', value) != re.sub(r'\D', '', zone["value"]):
+                logger.info(f"Duplicado no verificado: {field} {value or None} (esperado {zone['value']})")
+                return None
+        return duplicate["invoice_data"], duplicate["raw_text"], duplicate["confidence"]
+    
+    def _index_document(self, fingerprint: Tuple[int, int], filename: str, invoice_data: Dict[str, Any], text: str,
+                        confidence: float, words: List[Dict[str, Any]], shape: Tuple[int, ...]) -> str:
+        """
+        Agregar el documento al índice de duplicados, con las zonas de verificación que se
+        pudieron ubicar (el parseo y el texto solo se guardan si se reutilizan)
+        """
+        invoices = invoice_data.get('invoices') or [{}]
+        extracted_fields = invoices[0].get('extracted_fields', {})
+        zones = {}
+        if words and invoice_data.get('total_invoices') == 1:
+            height, width = shape[:2]
+            found = find_numeric_zones(words, width)
+            for field in VERIFICATION_FIELDS:
+                if extracted_fields.get(field) and field in found:
+                    x1, y1, x2, y2 = found[field]
+                    zones[field] = {"value": str(extracted_fields[field]),
+                                    "bbox": [x1 / width, y1 / height, x2 / width, y2 / height]}
+        if not self.reuse_duplicates:
+            invoice_data, text = None, None
+        return self.duplicate_index.add(fingerprint, filename, invoice_data, text, confidence,
+                                        extracted_fields.get('importe_total'), zones)
+    
+    def _learn_vendor_template(self, invoice_data: Dict[str, Any], words: List[Dict[str, Any]],
+                               shape: Tuple[int, ...], timer: StageTimer) -> Optional[str]:
+        """Aprender la plantilla del proveedor de una factura parseada con la página completa"""
+        if not words or invoice_data.get('total_invoices') != 1:
+            return None
+        fields = invoice_data['invoices'][0].get('extracted_fields', {})
+        cuit = fields.get('cuit_vendedor')
+        if not cuit:
+            return None
+        baseline = timer.timings.get("full_page_ocr", 0.0) + timer.timings.get("invoice_parsing", 0.0)
+        template = self.vendor_templates.learn(cuit, words, fields, (shape[1], shape[0]), baseline)
+        return cuit if template else None
+    
+    @staticmethod
+    def _document_type(image_path: str, invoice_data: Dict[str, Any]) -> str:
+        """Clave de agregación de tiempos: formato del archivo y tipo de factura (ej. 'pdf:A')"""
+        kind = "pdf" if image_path.lower().endswith('.pdf') else "image"
+        invoices = invoice_data.get("invoices") or []
+        tipo = invoices[0].get("extracted_fields", {}).get("tipo_factura") if invoices else None
+        return f"{kind}:{tipo or 'general'}"
+
+_shared_processor: Optional[AdvancedImageProcessor] = None
+_shared_processor_lock = threading.Lock()
+
+def create_image_processor(vendor_templates_db_path: Optional[str] = None,
+                           duplicate_index_db_path: Optional[str] = None) -> AdvancedImageProcessor:
+    """
+    Crear un procesador según la configuración
+    
+    Args:
+        vendor_templates_db_path: Base de plantillas (None = VENDOR_TEMPLATES_DB_PATH, ":memory:" = no persistir)
+        duplicate_index_db_path: Base del índice de duplicados (None = DUPLICATE_INDEX_DB_PATH)
+    """
+    vendor_templates = None
+    if settings.VENDOR_TEMPLATES_ENABLED:
+        vendor_templates = VendorTemplateCache(
+            vendor_templates_db_path or settings.VENDOR_TEMPLATES_DB_PATH,
+            min_fields=settings.VENDOR_TEMPLATE_MIN_FIELDS
+        )
+    duplicate_index = None
+    if settings.DUPLICATE_DETECTION_ENABLED:
+        duplicate_index = DuplicateIndex(
+            duplicate_index_db_path or settings.DUPLICATE_INDEX_DB_PATH,
+            max_distance=settings.DUPLICATE_MAX_DISTANCE,
+            max_entries=settings.DUPLICATE_INDEX_MAX_ENTRIES
+        )
+    return AdvancedImageProcessor(
+        vendor_templates,
+        numeric_zones=settings.NUMERIC_ZONE_OCR_ENABLED,
+        numeric_ocr_cache=NumericOCRCache(settings.NUMERIC_OCR_CACHE_SIZE),
+        duplicate_index=duplicate_index,
+        reuse_duplicates=settings.DUPLICATE_REUSE_PARSE
+    )
+
+def get_image_processor() -> AdvancedImageProcessor:
+    """Instancia compartida del procesador (no guarda estado por documento, es segura entre hilos)"""
+    global _shared_processor
+    if _shared_processor is None:
+        with _shared_processor_lock:
+            if _shared_processor is None:
+                _shared_processor = create_image_processor()
+    return _shared_processor
@@ -10,7 +10,7 @@ import asyncio
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
 
-from services.advanced_image_processor import AdvancedImageProcessor
+from services.advanced_image_processor import AdvancedImageProcessor, get_image_processor
 from services.invoice_parser import InvoiceParser
 from services.metrics_calculator import MetricsCalculator, MetricsResult
 from utils.file_utils import validate_file_type, validate_file_size
@@ -20,9 +20,9 @@ logger = logging.getLogger(__name__)
 class BatchProcessor:
     """Procesador de lotes para evaluar el rendimiento del modelo"""
     
-    def __init__(self, max_workers: int = 4):
+    def __init__(self, max_workers: int = 4, image_processor: Optional[AdvancedImageProcessor] = None):
         self.max_workers = max_workers
-        self.image_processor = AdvancedImageProcessor()
+        self.image_processor = image_processor or get_image_processor()
         self.invoice_parser = InvoiceParser()
         self.metrics_calculator = MetricsCalculator()
     
@@ -0,0 +1,274 @@
+"""
+Detección de facturas duplicadas por hash perceptual
+
+La misma factura en papel llega escaneada dos veces, o fotografiada de nuevo, y
+los bytes del archivo nunca coinciden. De cada página preprocesada se calculan
+dos hashes perceptuales de 64 bits sobre una copia reducida en grises:
+
+- dHash: signo del gradiente horizontal en una grilla de 9x8.
+- pHash: coeficientes de baja frecuencia de la DCT de 32x32 contra su mediana.
+
+Un documento cuyos dos hashes están a distancia de Hamming menor o igual al
+umbral de uno ya indexado se marca como probable duplicado. Como facturas
+distintas de un mismo proveedor comparten el layout, antes de reutilizar el
+parseo guardado se releen con un OCR barato las zonas del importe total, el
+número de comprobante, el punto de venta y la fecha de emisión.
+
+El parseo y el texto de cada documento solo se guardan si la reutilización está
+activa; para detectar duplicados alcanzan los hashes y las zonas de verificación.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from services.telemetry import CACHE_REQUESTS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+CACHE_NAME = "duplicate_index"
+
+# Lado mayor de la copia reducida de la que se calculan los hashes
+HASH_SOURCE_SIDE = 256
+DCT_SIZE = 32
+HASH_SIZE = 8
+# Diferencia mínima de gris para el bit del dHash: las celdas vecinas de papel en blanco
+# empatan y el ruido del escáner decidiría el bit al azar en cada escaneo
+DHASH_MARGIN = 3
+
+# Campos que se releen en su zona antes de reutilizar el parseo de un duplicado
+VERIFICATION_FIELDS = ('importe_total', 'numero_factura', 'punto_venta', 'fecha_emision')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS duplicate_documents (
+    id TEXT PRIMARY KEY,
+    dhash TEXT NOT NULL,
+    phash TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    invoice_data TEXT,
+    raw_text TEXT,
+    confidence REAL NOT NULL,
+    total TEXT,
+    zones TEXT,
+    duplicates INTEGER NOT NULL DEFAULT 0,
+    reused INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_seen_at REAL NOT NULL
+);
+"""
+
+Fingerprint = Tuple[int, int]
+
+def _dct_matrix(size: int) -> np.ndarray:
+    """Matriz de la DCT-II ortonormal"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+_DCT = _dct_matrix(DCT_SIZE)
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+def dhash(small: Image.Image) -> int:
+    """Hash de diferencias: 64 bits del gradiente horizontal"""
+    pixels = np.asarray(small.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR), dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1] + DHASH_MARGIN)
+
+def phash(small: Image.Image) -> int:
+    """Hash perceptual: 64 bits de las frecuencias bajas de la DCT contra su mediana (sin la componente continua)"""
+    pixels = np.asarray(small.resize((DCT_SIZE, DCT_SIZE), Image.BILINEAR), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    return _bits_to_int(low > np.median(low.ravel()[1:]))
+
+def image_fingerprint(gray: np.ndarray) -> Fingerprint:
+    """(dHash, pHash) de una página en escala de grises"""
+    small = Image.fromarray(gray)
+    if max(small.size) > HASH_SOURCE_SIDE:
+        small = small.copy()
+        small.thumbnail((HASH_SOURCE_SIDE, HASH_SOURCE_SIDE), Image.BILINEAR)
+    return dhash(small), phash(small)
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+class DuplicateIndex:
+    """Índice de hashes perceptuales de documentos procesados, persistido en SQLite"""
+
+    def __init__(self, db_path: str = ":memory:", max_distance: int = 4, max_entries: int = 50000):
+        """
+        Args:
+            db_path: Ruta de la base SQLite (":memory:" para no persistir)
+            max_distance: Distancia de Hamming máxima (en cada hash) para considerar duplicado
+            max_entries: Documentos indexados como máximo (se descartan los más antiguos)
+        """
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+            rows = self._conn.execute(
+                "SELECT id, dhash, phash FROM duplicate_documents ORDER BY created_at"
+            ).fetchall()
+        # Hashes en memoria para comparar contra todo el índice de una vez
+        self._ids: List[str] = [row["id"] for row in rows]
+        self._hashes = np.array([(int(row["dhash"], 16), int(row["phash"], 16)) for row in rows],
+                                dtype=np.uint64).reshape(-1, 2)
+        self.misses = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def find(self, fingerprint: Fingerprint) -> Optional[Dict[str, Any]]:
+        """
+        Documento indexado más parecido dentro del umbral
+
+        Returns:
+            Entrada con 'distance' (la mayor de las dos distancias), o None
+        """
+        with self._lock:
+            if not self._ids:
+                match = None
+            else:
+                distances = np.bitwise_count(self._hashes ^ np.array(fingerprint, dtype=np.uint64)).max(axis=1)
+                best = int(np.argmin(distances))
+                match = (self._ids[best], int(distances[best])) if distances[best] <= self.max_distance else None
+        if match is None:
+            with self._lock:
+                self.misses += 1
+            CACHE_REQUESTS_TOTAL.inc(CACHE_NAME, "miss")
+            return None
+
+        entry = self.get(match[0])
+        entry["distance"] = match[1]
+        return entry
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM duplicate_documents WHERE id = ?", (document_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "filename": row["filename"],
+            "invoice_data": json.loads(row["invoice_data"]) if row["invoice_data"] else None,
+            "raw_text": row["raw_text"],
+            "confidence": row["confidence"],
+            "total": row["total"],
+            "zones": json.loads(row["zones"]) if row["zones"] else {}
+        }
+
+    def add(self, fingerprint: Fingerprint, filename: str, invoice_data: Optional[Dict[str, Any]],
+            raw_text: Optional[str], confidence: float, total: Optional[str] = None,
+            zones: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+        """
+        Indexar un documento procesado
+
+        Args:
+            invoice_data: Parseo a reutilizar en los duplicados (None = no guardar los datos de la factura)
+            raw_text: Texto a reutilizar en los duplicados (None = no guardarlo)
+            total: Importe total parseado
+            zones: {campo: {"value": valor parseado, "bbox": [x1, y1, x2, y2] relativo al tamaño
+                de la página}} de los VERIFICATION_FIELDS, para verificar duplicados antes de
+                reutilizar el parseo
+
+        Returns:
+            Id del documento
+        """
+        document_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO duplicate_documents (id, dhash, phash, filename, invoice_data, raw_text, confidence, "
+                "total, zones, created_at, last_seen_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (document_id, f"{fingerprint[0]:016x}", f"{fingerprint[1]:016x}", filename,
+                 json.dumps(invoice_data, default=str) if invoice_data is not None else None, raw_text,
+                 confidence, total,
+                 json.dumps(zones) if zones else None, now, now)
+            )
+            self._ids.append(document_id)
+            self._hashes = np.vstack([self._hashes, np.array([fingerprint], dtype=np.uint64)])
+
+            excess = len(self._ids) - self.max_entries
+            if excess > 0:
+                self._conn.executemany("DELETE FROM duplicate_documents WHERE id = ?",
+                                       [(old,) for old in self._ids[:excess]])
+                self._ids = self._ids[excess:]
+                self._hashes = self._hashes[excess:]
+        return document_id
+
+    def record_duplicate(self, document_id: str, reused: bool, verified: bool = True):
+        """
+        Registrar un probable duplicado de un documento indexado
+
+        Args:
+            reused: Si se reutilizó el parseo guardado
+            verified: False si la verificación de las zonas no coincidió (se procesó completo)
+        """
+        CACHE_REQUESTS_TOTAL.inc(CACHE_NAME, "hit" if reused else "duplicate" if verified else "fallback")
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE duplicate_documents SET duplicates = duplicates + ?, reused = reused + ?, last_seen_at = ? "
+                "WHERE id = ?", (int(verified), int(reused), time.time(), document_id)
+            )
+
+    def delete(self, document_id: str) -> bool:
+        with self._lock, self._conn:
+            deleted = self._conn.execute("DELETE FROM duplicate_documents WHERE id = ?", (document_id,)).rowcount
+            if document_id in self._ids:
+                index = self._ids.index(document_id)
+                self._ids.pop(index)
+                self._hashes = np.delete(self._hashes, index, axis=0)
+        return bool(deleted)
+
+    def list(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Documentos con más duplicados detectados"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, filename, duplicates, reused, total, created_at FROM duplicate_documents "
+                "WHERE duplicates > 0 ORDER BY duplicates DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [{
+            "id": row["id"],
+            "filename": row["filename"],
+            "duplicates": row["duplicates"],
+            "reused": row["reused"],
+            "total": row["total"],
+            "created_at": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row["created_at"]))
+        } for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """Documentos indexados, duplicados detectados y parseos reutilizados"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) AS documents, COALESCE(SUM(duplicates), 0) AS duplicates, "
+                "COALESCE(SUM(reused), 0) AS reused FROM duplicate_documents"
+            ).fetchone()
+            misses = self.misses
+        lookups = row["duplicates"] + misses
+        return {
+            "documents": row["documents"],
+            "duplicates": row["duplicates"],
+            "reused": row["reused"],
+            "misses": misses,
+            "duplicate_rate": round(row["duplicates"] / lookups, 4) if lookups else None
+        }
@@ -0,0 +1,156 @@
+"""
+Monitor de salud de las dependencias
+
+Las verificaciones (API externa, Tesseract, Poppler, modelo de layout, espacio en
+disco) se ejecutan en segundo plano cada `interval` segundos y su resultado queda
+en memoria, de modo que /health y /ready responden en tiempo constante sin
+esperar timeouts de dependencias caídas.
+"""
+import time
+import shutil
+import subprocess
+import asyncio
+import logging
+import inspect
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+from services.telemetry import HEALTH_CHECK_STATUS
+
+logger = logging.getLogger(__name__)
+
+# Una verificación devuelve (ok, detalle); puede ser sincrónica (se ejecuta en un hilo) o async
+CheckResult = Tuple[bool, Any]
+CheckFunction = Callable[[], Union[CheckResult, Awaitable[CheckResult]]]
+
+class HealthMonitor:
+    """Ejecución periódica de verificaciones con resultado cacheado"""
+
+    def __init__(self, interval: float = 30.0, timeout: float = 10.0):
+        """
+        Args:
+            interval: Segundos entre rondas de verificación
+            timeout: Tiempo máximo de cada verificación
+        """
+        self.interval = interval
+        self.timeout = timeout
+        self._checks: Dict[str, Tuple[CheckFunction, bool]] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[float] = None
+
+    def register(self, name: str, check: CheckFunction, critical: bool = True):
+        """
+        Registrar una verificación
+
+        Args:
+            name: Nombre de la dependencia
+            check: Función que devuelve (ok, detalle)
+            critical: Si su falla impide atender requests (afecta a /ready)
+        """
+        self._checks[name] = (check, critical)
+
+    async def _run_check(self, name: str, check: CheckFunction, critical: bool) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(check):
+                ok, detail = await asyncio.wait_for(check(), self.timeout)
+            else:
+                ok, detail = await asyncio.wait_for(asyncio.to_thread(check), self.timeout)
+        except asyncio.TimeoutError:
+            ok, detail = False, f"Timeout ({self.timeout:.0f}s)"
+        except Exception as e:
+            ok, detail = False, str(e)
+
+        previous = self._results.get(name)
+        if (previous is None and not ok) or (previous is not None and previous["ok"] != ok):
+            log = logger.info if ok else logger.warning
+            log(f"Health check '{name}': {'OK' if ok else 'FALLA'} ({detail})")
+        HEALTH_CHECK_STATUS.set(1 if ok else 0, name)
+        return {
+            "ok": ok,
+            "critical": critical,
+            "detail": detail,
+            "checked_at": time.time(),
+            "duration_seconds": round(time.perf_counter() - start, 4)
+        }
+
+    async def run_checks(self):
+        """Ejecutar todas las verificaciones en paralelo y actualizar el estado cacheado"""
+        names = list(self._checks)
+        results = await asyncio.gather(*(self._run_check(name, *self._checks[name]) for name in names))
+        self._results.update(zip(names, results))
+        self.last_run = time.time()
+
+    def start(self):
+        """Iniciar el monitor (llamar en el arranque de la aplicación)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Monitor de salud iniciado (cada {self.interval:.0f}s)")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_checks()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en el monitor de salud: {e}")
+            await asyncio.sleep(self.interval)
+
+    def is_ok(self, name: str) -> Optional[bool]:
+        """Último resultado de una verificación (None si todavía no se ejecutó)"""
+        result = self._results.get(name)
+        return result["ok"] if result else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado cacheado de todas las verificaciones"""
+        now = time.time()
+        checks = {}
+        for name, result in self._results.items():
+            checks[name] = dict(result, age_seconds=round(now - result["checked_at"], 1))
+            del checks[name]["checked_at"]
+        return {
+            "checked": self.last_run is not None,
+            "last_run_age_seconds": round(now - self.last_run, 1) if self.last_run else None,
+            "critical_ok": all(r["ok"] for r in self._results.values() if r["critical"]),
+            "checks": checks
+        }
+
+def disk_space_check(path: str, min_free_bytes: int) -> Callable[[], CheckResult]:
+    """Verificación de espacio libre en el disco de `path`"""
+    def check() -> CheckResult:
+        usage = shutil.disk_usage(path)
+        return usage.free >= min_free_bytes, {
+            "path": path,
+            "free_mb": round(usage.free / (1024 * 1024), 1),
+            "min_free_mb": round(min_free_bytes / (1024 * 1024), 1)
+        }
+    return check
+
+def command_check(command: Optional[str], *args: str) -> CheckResult:
+    """Ejecutar `command args` y devolver la primera línea de la salida como detalle"""
+    if not command:
+        return False, "No encontrado"
+    completed = subprocess.run([command, *args], capture_output=True, text=True, timeout=10)
+    output = (completed.stdout or completed.stderr).strip().splitlines()
+    return completed.returncode == 0, output[0] if output else command
+
+def tesseract_check(tesseract_cmd: str) -> Callable[[], CheckResult]:
+    """Verificación del binario de Tesseract (sin la caché de pytesseract.get_tesseract_version)"""
+    return lambda: command_check(shutil.which(tesseract_cmd), "--version")
+
+def poppler_check(poppler_path: Optional[str]) -> Callable[[], CheckResult]:
+    """Verificación de pdftoppm (Poppler) en POPPLER_PATH o en el PATH del sistema"""
+    def check() -> CheckResult:
+        command = shutil.which("pdftoppm", path=poppler_path) if poppler_path else None
+        return command_check(command or shutil.which("pdftoppm"), "-v")
+    return check
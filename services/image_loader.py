@@ -0,0 +1,52 @@
+"""
+Carga de imágenes en escala de grises para el OCR
+
+Las fotos de celular llegan como JPEG de 12 MP o más, muy por encima de la
+resolución que necesita el OCR (OCR_TARGET_MAX_SIDE, una A4 a 300 DPI). Los JPEG
+se decodifican con Image.draft('L', ...), que convierte a grises y reduce a 1/2,
+1/4 u 1/8 en el dominio DCT, antes de producir los píxeles: se elige la mayor
+reducción que deja el lado mayor por encima del objetivo. El resto de los
+formatos se decodifica completo y se convierte a grises.
+"""
+from typing import Optional, Tuple
+
+from PIL import Image
+
+DRAFT_SCALES = (8, 4, 2)
+
+def draft_scale(size: Tuple[int, int], max_side: Optional[int]) -> int:
+    """Mayor reducción de JPEG (1, 2, 4 u 8) que deja el lado mayor en al menos max_side"""
+    if not max_side:
+        return 1
+    longest = max(size)
+    return next((scale for scale in DRAFT_SCALES if longest // scale >= max_side), 1)
+
+def apply_draft(image: Image.Image, max_side: Optional[int]) -> Image.Image:
+    """
+    Pedir al decodificador JPEG grises y la reducción que corresponda (antes de cargar)
+
+    Para otros formatos no hace nada. Devuelve la misma imagen, con el tamaño que
+    tendrá al decodificarse.
+    """
+    if image.format != "JPEG":
+        return image
+    scale = draft_scale(image.size, max_side)
+    width, height = image.size
+    # PIL toma la mayor escala que entra en el tamaño pedido: se pide exactamente 1/scale
+    image.draft('L', (width // scale, height // scale))
+    return image
+
+def decoded_size(image_path: str, max_side: Optional[int]) -> Tuple[int, int]:
+    """(ancho, alto) que tendrá la imagen al cargarla, leyendo solo el encabezado"""
+    with Image.open(image_path) as image:
+        return apply_draft(image, max_side).size
+
+def open_grayscale(image_path: str, max_side: Optional[int]) -> Image.Image:
+    """Abrir y decodificar la imagen en escala de grises ('L')"""
+    image = apply_draft(Image.open(image_path), max_side)
+    if image.mode != 'L':
+        converted = image.convert('L')
+        image.close()
+        return converted
+    image.load()
+    return image
@@ -1,10 +1,45 @@
 import re
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any, Sequence, Tuple
 from datetime import datetime
+from itertools import chain
+
+from services.telemetry import INVOICE_FIELDS_EXTRACTED_TOTAL
+from services.token_table import Word, as_token_table
+from services.table_extractor import extract_table, table_items
 
 logger = logging.getLogger(__name__)
 
+# Patrones que indican el inicio de una nueva factura completa
+INVOICE_START_PATTERNS = [
+    r'ORIGINAL\s+[A-Za-z\s]+S[AR]L?\s+Le\s+PAGTURA\s+Punto de Venta:',
+    r'ORIGINAL\s+[A-Za-z\s]+S[AR]L?\s+Le\s+PAGTURA\s+Comp\.',
+    r'ORIGINAL\s+[A-Za-z\s]+S[AR]L?\s+coo\.\d+\s+PAGTURA',
+    r'FACTURA\s+[ABC]\s+Punto de Venta:',
+    r'Comprobante\s+[ABC]\s+Punto de Venta:',
+    # Patrones adicionales para diferentes formatos
+    r'ORIGINAL\s+[ABC]?\s+[A-Za-z\s]+S[AR]L?',
+    r'FACTURA\s+[ABC]\s+\d+',
+    r'Comprobante\s+[ABC]\s+\d+'
+]
+
+# Todos los patrones en una sola pasada. La alternativa va dentro de un lookahead para
+# que cada posición donde empieza alguno de ellos sea un inicio, aunque esté dentro del
+# texto que cubre otro (igual que recorrer el texto una vez por patrón)
+INVOICE_START_PATTERN = re.compile(
+    '(?=' + '|'.join(f'(?:{pattern})' for pattern in INVOICE_START_PATTERNS) + ')',
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Inicios a esta distancia o menos (en caracteres) se consideran la misma factura
+INVOICE_MIN_DISTANCE = 500
+
+# Clasificación de las palabras de una fila de la tabla de items
+_INTEGER_TOKEN = re.compile(r'^\d+$')
+_AMOUNT_TOKEN = re.compile(r'^\$?\d[\d.,]*$')
+_PERCENT_TOKEN = re.compile(r'^\d+(?:[.,]\d+)?%$')
+UNIT_WORDS = {'unidad', 'unidades', 'un', 'u', 'kg', 'hs', 'hora', 'horas', 'mes', 'meses', 'lts', 'mts', 'm2'}
+
 class InvoiceParser:
     """Parser inteligente para extraer campos específicos de facturas"""
     
@@ -159,19 +194,40 @@ class InvoiceParser:
             ]
         }
     
-    def parse_invoice(self, text: str) -> Dict[str, Any]:
-        """Extrae campos específicos de una factura"""
+    def parse_invoice(self, text: str, hints: Optional[Dict[str, str]] = None,
+                      tokens: Optional[Sequence[Word]] = None) -> Dict[str, Any]:
+        """
+        Extrae campos específicos de una factura
+        
+        Args:
+            text: Texto OCR de la factura
+            hints: Valores ya leídos para algunos campos (p. ej. por OCR de zonas numéricas);
+                reemplazan al valor de las expresiones regulares solo si este falta o
+                coincide con el hint (ver _hint_agrees)
+            tokens: Palabras OCR con posición (TokenTable); si se pasan, los items se
+                extraen fila por fila y el texto se usa solo si no se encuentra ninguno
+        """
         try:
             # Limpiar el texto
             cleaned_text = self._clean_text(text)
             
             # Extraer campos
             extracted_fields = {}
+            hints = hints or {}
             
             for field_name, patterns in self.patterns.items():
                 value = self._extract_field(cleaned_text, patterns, field_name)
+                hint = hints.get(field_name)
+                if hint and (not value or self._hint_agrees(hint, value)):
+                    extracted_fields[field_name] = hint
+                    INVOICE_FIELDS_EXTRACTED_TOTAL.inc(field_name, "hint")
+                    continue
+                if hint:
+                    logger.warning(f"Hint de {field_name} descartado: '{hint}' no coincide con '{value}'")
+                    INVOICE_FIELDS_EXTRACTED_TOTAL.inc(field_name, "hint_rejected")
                 if value:
                     extracted_fields[field_name] = value
+                    INVOICE_FIELDS_EXTRACTED_TOTAL.inc(field_name, "regex")
             
             # Lógica especial para tipo_factura si no se detecta
             if 'tipo_factura' not in extracted_fields:
@@ -181,71 +237,13 @@ class InvoiceParser:
                     logger.info("Tipo de factura no detectado, asumiendo 'A' por defecto")
             
             # Procesar items por separado
-            items = self._extract_items(cleaned_text)
+            items = self._extract_items_from_tokens(tokens) if tokens else []
+            if not items:
+                items = self._extract_items(cleaned_text)
             if items:
                 extracted_fields['items'] = items
             
-            # Calcular deuda impositiva (importe_total - subtotal)
-            logger.info(f"Campos extraídos para cálculo: {list(extracted_fields.keys())}")
-            
-            if 'importe_total' in extracted_fields and 'subtotal' in extracted_fields:
-                try:
-                    # Limpiar y convertir valores numéricos
-                    importe_total_str = extracted_fields['importe_total'].replace('$', '').strip()
-                    subtotal_str = extracted_fields['subtotal'].replace('$', '').strip()
-                    
-                    # Función para convertir cualquier formato a float
-                    def parse_number(number_str):
-                        # Remover espacios
-                        number_str = number_str.strip()
-                        
-                        # Detectar formato automáticamente
-                        if '.' in number_str and ',' in number_str:
-                            # Tiene ambos separadores
-                            # Determinar cuál es el separador decimal
-                            last_dot = number_str.rfind('.')
-                            last_comma = number_str.rfind(',')
-                            
-                            if last_comma > last_dot:
-                                # Coma está después del último punto: 26.667,60 (formato argentino)
-                                return float(number_str.replace('.', '').replace(',', '.'))
-                            else:
-                                # Punto está después de la última coma: 26,667.60 (formato americano)
-                                return float(number_str.replace(',', ''))
-                        elif ',' in number_str:
-                            # Solo coma: 26667,60 (formato argentino)
-                            return float(number_str.replace(',', '.'))
-                        elif '.' in number_str:
-                            # Solo punto: 26667.60 (formato americano)
-                            return float(number_str)
-                        else:
-                            # Sin separadores: 26667
-                            return float(number_str)
-                    
-                    importe_total = parse_number(importe_total_str)
-                    subtotal = parse_number(subtotal_str)
-                    deuda_impositiva = importe_total - subtotal
-                    
-                    # Formatear con comas como separador de miles (formato argentino)
-                    extracted_fields['deuda_impositiva'] = f"{deuda_impositiva:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-                    
-                    logger.info(f"Cálculo deuda impositiva: {importe_total} - {subtotal} = {deuda_impositiva}")
-                    logger.info(f"Strings procesados: importe_total='{importe_total_str}' -> {importe_total}, subtotal='{subtotal_str}' -> {subtotal}")
-                except (ValueError, AttributeError) as e:
-                    logger.error(f"Error calculando deuda impositiva: {e}")
-                    logger.error(f"Valores problemáticos: importe_total='{extracted_fields.get('importe_total')}', subtotal='{extracted_fields.get('subtotal')}'")
-                    extracted_fields['deuda_impositiva'] = "0.00"
-            else:
-                logger.warning("No se encontraron importe_total o subtotal para calcular deuda impositiva")
-                logger.warning(f"Campos disponibles: {list(extracted_fields.keys())}")
-                extracted_fields['deuda_impositiva'] = "0.00"
-            
-            return {
-                'success': True,
-                'extracted_fields': extracted_fields,
-                'raw_text': text,
-                'parsing_confidence': self._calculate_confidence(extracted_fields)
-            }
+            return self.build_invoice(extracted_fields, text)
             
         except Exception as e:
             logger.error(f"Error parseando factura: {e}")
@@ -256,6 +254,91 @@ class InvoiceParser:
                 'extracted_fields': {}
             }
     
+    @staticmethod
+    def _hint_agrees(hint: str, value: str) -> bool:
+        """
+        Si un hint puede reemplazar al valor leído por regex
+
+        Los dígitos del valor tienen que aparecer en el hint: el mismo valor con otro
+        formato, o uno cortado por una letra leída en lugar de un dígito ('12.1' de
+        '12.1OO,0O'). Un hint con otros dígitos (la zona de otra etiqueta) se descarta.
+        """
+        value_digits = re.sub(r'\D', '', value)
+        return bool(value_digits) and value_digits in re.sub(r'\D', '', hint)
+    
+    def build_invoice(self, extracted_fields: Dict[str, Any], text: str) -> Dict[str, Any]:
+        """
+        Completar los campos derivados (deuda impositiva) y armar el resultado de una
+        factura. Lo usan parse_invoice y el procesamiento con plantillas de proveedor,
+        que obtiene los campos por región sin pasar por las expresiones regulares.
+        """
+        # Calcular deuda impositiva (importe_total - subtotal)
+        logger.info(f"Campos extraídos para cálculo: {list(extracted_fields.keys())}")
+        
+        if 'importe_total' in extracted_fields and 'subtotal' in extracted_fields:
+            try:
+                # Limpiar y convertir valores numéricos
+                importe_total_str = extracted_fields['importe_total'].replace('$', '').strip()
+                subtotal_str = extracted_fields['subtotal'].replace('$', '').strip()
+                
+                # Función para convertir cualquier formato a float
+                def parse_number(number_str):
+                    # Remover espacios
+                    number_str = number_str.strip()
+                    
+                    # Detectar formato automáticamente
+                    if '.' in number_str and ',' in number_str:
+                        # Tiene ambos separadores
+                        # Determinar cuál es el separador decimal
+                        last_dot = number_str.rfind('.')
+                        last_comma = number_str.rfind(',')
+                        
+                        if last_comma > last_dot:
+                            # Coma está después del último punto: 26.667,60 (formato argentino)
+                            return float(number_str.replace('.', '').replace(',', '.'))
+                        else:
+                            # Punto está después de la última coma: 26,667.60 (formato americano)
+                            return float(number_str.replace(',', ''))
+                    elif ',' in number_str:
+                        # Solo coma: 26667,60 (formato argentino)
+                        return float(number_str.replace(',', '.'))
+                    elif '.' in number_str:
+                        # Solo punto: 26667.60 (formato americano)
+                        return float(number_str)
+                    else:
+                        # Sin separadores: 26667
+                        return float(number_str)
+                
+                importe_total = parse_number(importe_total_str)
+                subtotal = parse_number(subtotal_str)
+                deuda_impositiva = importe_total - subtotal
+                
+                # Formatear con comas como separador de miles (formato argentino)
+                extracted_fields['deuda_impositiva'] = f"{deuda_impositiva:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+                
+                logger.info(f"Cálculo deuda impositiva: {importe_total} - {subtotal} = {deuda_impositiva}")
+                logger.info(f"Strings procesados: importe_total='{importe_total_str}' -> {importe_total}, subtotal='{subtotal_str}' -> {subtotal}")
+            except (ValueError, AttributeError) as e:
+                logger.error(f"Error calculando deuda impositiva: {e}")
+                logger.error(f"Valores problemáticos: importe_total='{extracted_fields.get('importe_total')}', subtotal='{extracted_fields.get('subtotal')}'")
+                extracted_fields['deuda_impositiva'] = "0.00"
+        else:
+            logger.warning("No se encontraron importe_total o subtotal para calcular deuda impositiva")
+            logger.warning(f"Campos disponibles: {list(extracted_fields.keys())}")
+            extracted_fields['deuda_impositiva'] = "0.00"
+        
+        return {
+            'success': True,
+            'extracted_fields': extracted_fields,
+            'raw_text': text,
+            'parsing_confidence': self._calculate_confidence(extracted_fields)
+        }
+    
+    def parse_items(self, text: str, tokens: Optional[Sequence[Word]] = None) -> List[Dict[str, str]]:
+        """Extraer solo los items de un texto (p. ej. el de la región de la tabla), o de sus palabras OCR"""
+        items = self._extract_items_from_tokens(tokens) if tokens else []
+        return items or self._extract_items(self._clean_text(text))
+    
     def _clean_text(self, text: str) -> str:
         """Limpia el texto para mejor parsing"""
         # Normalizar espacios y saltos de línea
@@ -398,6 +481,92 @@ class InvoiceParser:
         logger.info(f"Total items extraídos: {len(items)}")
         return items
     
+    def _extract_items_from_tokens(self, tokens: Sequence[Word]) -> List[Dict[str, str]]:
+        """
+        Extrae los items de las palabras OCR por su posición
+        
+        Si hay fila de encabezado, las palabras se ubican en las columnas de la tabla
+        por geometría (ver services/table_extractor.py). Si no, cada línea de
+        Tesseract es una fila candidata y sus palabras, de izquierda a derecha, siguen
+        el orden de columnas de la tabla de items: código, descripción, cantidad,
+        unidad, precio unitario, % bonificación, importe bonificado y subtotal. En
+        ambos casos una fila no puede mezclarse con la siguiente, como pasa con las
+        expresiones regulares sobre el texto aplanado.
+        """
+        table = as_token_table(tokens)
+        geometric = extract_table(table)
+        candidates = table_items(geometric) if geometric is not None else []
+        source = "columnas"
+        if not any(self._is_valid_item(dict(item, descripcion=self._clean_item_description(item['descripcion'])))
+                   for item in candidates):
+            candidates = [self._item_from_row(row) for row in table.row_texts()]
+            source = "fila"
+        
+        items = []
+        processed_items = set()
+        for item in candidates:
+            if item is None:
+                continue
+            item['descripcion'] = self._clean_item_description(item['descripcion'])
+            if not self._is_valid_item(item):
+                continue
+            item_key = f"{item['codigo']}_{item['descripcion'][:30]}_{item['cantidad']}_{item['precio_unitario']}"
+            if item_key not in processed_items:
+                processed_items.add(item_key)
+                items.append(item)
+        logger.info(f"Items extraídos por {source}: {len(items)} de {len(table)} palabras")
+        return items
+    
+    def _item_from_row(self, row: List[str]) -> Optional[Dict[str, str]]:
+        """Interpretar las palabras de una fila como item (código descripción cantidad unidad importes)"""
+        if len(row) < 4 or not _INTEGER_TOKEN.match(row[0]):
+            return None
+        
+        # Descripción: palabras desde el código hasta la primera con forma de número o unidad
+        position = 1
+        description = []
+        while position < len(row) and not (_AMOUNT_TOKEN.match(row[position]) or row[position].lower() in UNIT_WORDS):
+            description.append(row[position])
+            position += 1
+        
+        cantidad = None
+        if position < len(row) and _INTEGER_TOKEN.match(row[position]):
+            cantidad = row[position]
+            position += 1
+        unidad = None
+        if position < len(row) and row[position].lower() in UNIT_WORDS:
+            unidad = row[position].lower()
+            position += 1
+        if cantidad is None:
+            if unidad is None:
+                return None
+            cantidad = '1'  # Unidad sin cantidad visible (error de OCR): asumir 1
+            if description and description[-1].lower() == 'y':
+                description.pop()  # "y unidad": la cantidad leída como 'y'
+        
+        # Importes y porcentaje de bonificación; la fila termina en la primera palabra que no lo es
+        amounts, bonificacion, after_percent = [], None, []
+        for token in row[position:]:
+            if _PERCENT_TOKEN.match(token) and bonificacion is None:
+                bonificacion = token
+            elif _AMOUNT_TOKEN.match(token):
+                (after_percent if bonificacion else amounts).append(token.lstrip('$'))
+            else:
+                break
+        if not amounts:
+            return None
+        
+        return {
+            'codigo': row[0],
+            'descripcion': self._clean_item_description(' '.join(description)),
+            'cantidad': cantidad,
+            'unidad_medida': unidad or 'unidad',
+            'precio_unitario': amounts[0],
+            'bonificacion': bonificacion or '0%',
+            'importe_bonificacion': after_percent[0] if len(after_percent) > 1 else '0.00',
+            'subtotal': (after_percent[-1] if after_percent else amounts[-1] if len(amounts) > 1 else '0.00')
+        }
+    
     def _process_item_match_generic(self, match, pattern_idx):
         """Procesa un match de item según el patrón usado"""
         try:
@@ -510,7 +679,7 @@ class InvoiceParser:
         return (item.get('codigo') and 
                 descripcion and 
                 len(descripcion) > 2 and  # Descripción debe tener al menos 3 caracteres
-                not descripcion.lower() in ['unidad', 'item', 'producto', 'servicio', 'cantidad', 'medida', 'precio', 'total', 'bonificación', 'subtotal'],  # Evitar palabras genéricas
+                not descripcion.lower() in ['unidad', 'item', 'producto', 'servicio', 'cantidad', 'medida', 'precio', 'total', 'bonificación', 'subtotal'] and  # Evitar palabras genéricas
                 item.get('precio_unitario') and
                 item.get('cantidad') and
                 # Verificar que el código sea un número válido
@@ -579,49 +748,25 @@ class InvoiceParser:
         confidence = (found_critical * 0.4 + found_additional * 0.15) / len(extracted_fields)
         return min(confidence, 1.0)
     
-    def parse_multiple_invoices(self, text: str) -> Dict[str, Any]:
-        """Extrae múltiples facturas del texto y las procesa por separado"""
+    def parse_multiple_invoices(self, text: str, hints: Optional[Dict[str, str]] = None,
+                                tokens: Optional[Sequence[Word]] = None) -> Dict[str, Any]:
+        """
+        Extrae múltiples facturas del texto y las procesa por separado
+        
+        Args:
+            hints: Valores sugeridos por campo (ver parse_invoice); solo se usan si el
+                texto tiene una única factura, porque no se sabe a cuál corresponden
+            tokens: Palabras OCR del texto (ver parse_invoice); igual que los hints, solo
+                con una única factura
+        """
         try:
-            # Detectar separadores entre facturas
-            invoice_separators = self._detect_invoice_separators(text)
+            invoices = list(self.iter_invoices(text, hints, tokens))
             
-            if len(invoice_separators) <= 1:
-                # Solo hay una factura, procesar normalmente
-                single_result = self.parse_invoice(text)
-                
-                # Verificar si realmente se detectó una factura válida
-                if single_result.get('success', False) and single_result.get('extracted_fields'):
-                    return {
-                        'success': True,
-                        'invoices': [single_result],
-                        'total_invoices': 1,
-                        'raw_text': text
-                    }
-                else:
-                    # No se detectó una factura válida
-                    return {
-                        'success': False,
-                        'invoices': [],
-                        'total_invoices': 0,
-                        'raw_text': text,
-                        'error': 'No se detectó una factura válida en el texto'
-                    }
-            
-            # Procesar múltiples facturas
-            invoices = []
-            valid_invoices = []
-            
-            for i, (start, end) in enumerate(invoice_separators):
-                invoice_text = text[start:end].strip()
-                if invoice_text:
-                    result = self.parse_invoice(invoice_text)
-                    result['invoice_number'] = i + 1
-                    result['text_range'] = {'start': start, 'end': end}
-                    invoices.append(result)
-                    
-                    # Solo contar como válida si tiene campos extraídos
-                    if result.get('success', False) and result.get('extracted_fields'):
-                        valid_invoices.append(result)
+            # Solo contar como válidas las facturas con campos extraídos
+            valid_invoices = [
+                result for result in invoices
+                if result.get('success', False) and result.get('extracted_fields')
+            ]
             
             # Solo considerar exitoso si hay al menos una factura válida
             if valid_invoices:
@@ -637,7 +782,8 @@ class InvoiceParser:
                     'invoices': [],
                     'total_invoices': 0,
                     'raw_text': text,
-                    'error': 'No se detectaron facturas válidas en el texto'
+                    'error': ('No se detectó una factura válida en el texto' if len(invoices) <= 1
+                              else 'No se detectaron facturas válidas en el texto')
                 }
             
         except Exception as e:
@@ -649,52 +795,55 @@ class InvoiceParser:
                 'invoices': []
             }
     
-    def _detect_invoice_separators(self, text: str) -> List[tuple]:
-        """Detecta los límites de cada factura en el texto"""
-        separators = []
+    def iter_invoices(self, text: str, hints: Optional[Dict[str, str]] = None,
+                      tokens: Optional[Sequence[Word]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Parsear las facturas del texto a medida que se cierran sus límites
         
-        # Patrones más específicos que indican el inicio de una nueva factura
-        # Buscar patrones que aparecen al inicio de una factura completa
-        invoice_start_patterns = [
-            r'ORIGINAL\s+[A-Za-z\s]+S[AR]L?\s+Le\s+PAGTURA\s+Punto de Venta:',
-            r'ORIGINAL\s+[A-Za-z\s]+S[AR]L?\s+Le\s+PAGTURA\s+Comp\.',
-            r'ORIGINAL\s+[A-Za-z\s]+S[AR]L?\s+coo\.\d+\s+PAGTURA',
-            r'FACTURA\s+[ABC]\s+Punto de Venta:',
-            r'Comprobante\s+[ABC]\s+Punto de Venta:',
-            # Patrones adicionales para diferentes formatos
-            r'ORIGINAL\s+[ABC]?\s+[A-Za-z\s]+S[AR]L?',
-            r'FACTURA\s+[ABC]\s+\d+',
-            r'Comprobante\s+[ABC]\s+\d+'
-        ]
-        
-        # Encontrar todas las posiciones de inicio
-        start_positions = []
-        for pattern in invoice_start_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE | re.MULTILINE)
-            for match in matches:
-                start_positions.append(match.start())
+        La factura N se entrega en cuanto aparece el inicio de la N+1, sin esperar a
+        recorrer el resto del texto. Con una sola factura se parsea el texto completo
+        con los hints y las palabras OCR; con varias, cada factura lleva invoice_number
+        y text_range.
+        """
+        segments = self._iter_invoice_segments(text)
+        first = next(segments, None)
+        second = next(segments, None)
+        if second is None:
+            # Solo hay una factura (o ningún separador claro), procesar normalmente
+            yield self.parse_invoice(text, hints, tokens)
+            return
         
-        # Ordenar posiciones y eliminar duplicados
-        start_positions = sorted(set(start_positions))
-        
-        # Filtrar posiciones que están muy cerca (menos de 500 caracteres)
-        # Esto evita duplicados de la misma factura
-        filtered_positions = []
-        for pos in start_positions:
-            if not filtered_positions or pos - filtered_positions[-1] > 500:
-                filtered_positions.append(pos)
-        
-        if not filtered_positions:
-            # Si no se encuentran separadores claros, tratar como una sola factura
-            return [(0, len(text))]
-        
-        # Crear rangos entre posiciones
-        for i in range(len(filtered_positions)):
-            start = filtered_positions[i]
-            end = filtered_positions[i + 1] if i + 1 < len(filtered_positions) else len(text)
-            separators.append((start, end))
-        
-        return separators
+        number = 0
+        for start, end in chain((first, second), segments):
+            invoice_text = text[start:end].strip()
+            if invoice_text:
+                number += 1
+                result = self.parse_invoice(invoice_text)
+                result['invoice_number'] = number
+                result['text_range'] = {'start': start, 'end': end}
+                yield result
+    
+    def _iter_invoice_segments(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Recorrer el texto una sola vez y entregar el rango (inicio, fin) de cada
+        factura en cuanto aparece el inicio de la siguiente
+        """
+        previous = None
+        for match in INVOICE_START_PATTERN.finditer(text):
+            position = match.start()
+            # Inicios a menos de INVOICE_MIN_DISTANCE caracteres son la misma factura
+            if previous is not None and position - previous <= INVOICE_MIN_DISTANCE:
+                continue
+            if previous is not None:
+                yield previous, position
+            previous = position
+        if previous is not None:
+            yield previous, len(text)
+    
+    def _detect_invoice_separators(self, text: str) -> List[tuple]:
+        """Detecta los límites de cada factura en el texto"""
+        # Si no se encuentran separadores claros, tratar como una sola factura
+        return list(self._iter_invoice_segments(text)) or [(0, len(text))]
     
     def get_supported_fields(self) -> List[str]:
         """Retorna la lista de campos que puede extraer"""
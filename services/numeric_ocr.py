@@ -0,0 +1,123 @@
+"""
+OCR de zonas numéricas con lista blanca de caracteres
+
+CUIT, fechas, importes y números de comprobante se leen del OCR genérico
+(spa+eng) de la página completa y después se buscan con expresiones regulares,
+donde una 'O' o una 'l' leídas en lugar de '0' o '1' hacen fallar el patrón.
+Las zonas numéricas (el valor a continuación de la etiqueta del campo, o la
+región numérica de una plantilla de proveedor) se releen con una lista blanca
+de dígitos y puntuación en modo de una sola línea, que Tesseract decodifica más
+rápido y con menos confusiones. Los resultados se guardan en una caché LRU por
+contenido de la región, de modo que una zona idéntica (reintentos, documentos
+repetidos, plantilla descartada y releída con la página completa) no se vuelve
+a pasar por Tesseract.
+"""
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from services.telemetry import CACHE_REQUESTS_TOTAL
+from services.vendor_templates import FIELD_LABELS, group_lines, has_label, normalize_word
+
+CACHE_NAME = "numeric_ocr"
+
+NUMERIC_WHITELIST = "0123456789.,-/$"
+NUMERIC_OCR_CONFIG = f"--psm 7 --oem 3 -c tessedit_char_whitelist={NUMERIC_WHITELIST}"
+
+# Campos cuyas zonas se ubican por etiqueta (el CUIT del comprador comparte la etiqueta 'CUIT' con el vendedor)
+NUMERIC_ZONE_FIELDS = ('cuit_vendedor', 'fecha_emision', 'punto_venta', 'numero_factura', 'subtotal', 'iva', 'importe_total')
+
+_DIGIT = re.compile(r'\d')
+
+def find_numeric_zones(words: List[Dict[str, Any]], width: int) -> Dict[str, List[int]]:
+    """
+    Ubicar la zona del valor de cada campo numérico a partir de las palabras OCR
+
+    La zona empieza después de la etiqueta del campo (ej. 'Total:') y abarca las
+    palabras siguientes con dígitos, salteando símbolos y porcentajes ('$', '21%').
+    Se toma la primera línea, en orden de lectura, con etiqueta y valor.
+
+    Returns:
+        {campo: [x1, y1, x2, y2]} en píxeles
+    """
+    lines = group_lines(words)
+    zones = {}
+    for field in NUMERIC_ZONE_FIELDS:
+        labels = FIELD_LABELS[field]
+        for line in lines:
+            normalized = [normalize_word(w["text"]) for w in line]
+            label_index = next((i for i, word in enumerate(normalized) if has_label(word, labels)), None)
+            if label_index is None:
+                continue
+            values = []
+            for word in line[label_index + 1:]:
+                text = word["text"]
+                if '%' in text or not _DIGIT.search(text):
+                    if values:
+                        break
+                    continue
+                values.append(word)
+            if not values:
+                continue
+            height = max(w["bbox"][3] for w in values) - min(w["bbox"][1] for w in values)
+            pad = max(1, height // 3)
+            zones[field] = [
+                max(0, values[0]["bbox"][0] - pad),
+                max(0, min(w["bbox"][1] for w in values) - pad),
+                min(width, values[-1]["bbox"][2] + pad),
+                max(w["bbox"][3] for w in values) + pad
+            ]
+            break
+    return zones
+
+class NumericOCRCache:
+    """Caché LRU de resultados de OCR por contenido de la región y configuración"""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(roi: np.ndarray, config: str) -> Tuple:
+        digest = hashlib.blake2b(np.ascontiguousarray(roi).tobytes(), digest_size=16).hexdigest()
+        return digest, roi.shape, config
+
+    def get(self, key: Tuple) -> Optional[Tuple[str, float]]:
+        """(texto, confianza) cacheados, o None"""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        CACHE_REQUESTS_TOTAL.inc(CACHE_NAME, "miss" if result is None else "hit")
+        return result
+
+    def put(self, key: Tuple, result: Tuple[str, float]):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None
+            }
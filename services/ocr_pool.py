@@ -0,0 +1,83 @@
+"""
+Pool acotado de hilos para el procesamiento OCR
+
+process_image es código sincrónico (Tesseract, scikit-image) y ejecutarlo dentro
+de los endpoints async bloquea el event loop: mientras se procesa un documento no
+se atienden ni los health checks. El pool lo ejecuta en hilos con un límite de
+concurrencia y lleva la cuenta de trabajos en curso y en espera, que /ready usa
+para informar si la instancia tiene capacidad.
+"""
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import anyio
+from anyio import to_thread
+
+from services.telemetry import OCR_POOL_BUSY, OCR_POOL_WAITING
+
+class OCRPool:
+    """Ejecución de trabajos OCR en hilos con concurrencia limitada"""
+
+    def __init__(self, workers: int, max_waiting: Optional[int] = None):
+        """
+        Args:
+            workers: Trabajos OCR simultáneos como máximo
+            max_waiting: Trabajos en espera a partir de los cuales la instancia deja
+                de estar lista (/ready responde 503). Por defecto, igual a workers
+        """
+        self.workers = max(1, workers)
+        self.max_waiting = self.workers if max_waiting is None else max(0, max_waiting)
+        self._limiter: Optional[anyio.CapacityLimiter] = None
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._waiting = 0
+
+    def _get_limiter(self) -> anyio.CapacityLimiter:
+        # El limiter se crea dentro del event loop que lo usa
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.workers)
+        return self._limiter
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Ejecutar func(*args, **kwargs) en un hilo del pool (propaga las contextvars)"""
+        with self._lock:
+            self._waiting += 1
+        OCR_POOL_WAITING.inc()
+        started = False
+
+        def job():
+            nonlocal started
+            started = True
+            with self._lock:
+                self._waiting -= 1
+                self._busy += 1
+            OCR_POOL_WAITING.dec()
+            OCR_POOL_BUSY.inc()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                OCR_POOL_BUSY.dec()
+
+        try:
+            return await to_thread.run_sync(job, limiter=self._get_limiter())
+        finally:
+            if not started:
+                # Cancelado antes de obtener un hilo
+                with self._lock:
+                    self._waiting -= 1
+                OCR_POOL_WAITING.dec()
+
+    def capacity(self) -> Dict[str, Any]:
+        """Estado del pool: hilos ocupados, trabajos en espera y si admite más trabajo"""
+        with self._lock:
+            busy, waiting = self._busy, self._waiting
+        return {
+            "workers": self.workers,
+            "busy": busy,
+            "waiting": waiting,
+            "available": max(0, self.workers - busy),
+            "max_waiting": self.max_waiting,
+            "accepting": waiting < self.max_waiting or busy < self.workers
+        }
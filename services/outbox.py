@@ -0,0 +1,363 @@
+"""
+Outbox persistente para los envíos a la API externa de facturas
+
+Las facturas procesadas se registran en una base SQLite local junto con una copia
+del archivo a enviar, y el request responde sin esperar a la API externa. Un
+sender en segundo plano toma las entradas pendientes en lotes, las envía con
+concurrencia acotada y reprograma los fallos con backoff exponencial. Las
+entradas sobreviven a reinicios: las que quedaron 'sending' se reencolan al
+arrancar.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import shutil
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+from services.telemetry import OUTBOX_DELIVERIES_TOTAL, OUTBOX_DELIVERY_LAG
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ("pending", "sending", "delivered", "failed")
+
+# Errores 4xx que vale la pena reintentar; el resto se marca como fallo definitivo
+# (el 415 ya lo resuelve el cliente reenviando en modo hex)
+RETRYABLE_CLIENT_ERRORS = {408, 425, 429}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    response TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    delivered_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at);
+"""
+
+def _format_time(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+class Outbox:
+    """Cola persistente (SQLite) de archivos a enviar"""
+
+    def __init__(self, db_path: str, storage_dir: str):
+        """
+        Args:
+            db_path: Ruta de la base SQLite
+            storage_dir: Directorio donde se guardan los archivos encolados
+        """
+        self.db_path = db_path
+        self.storage_dir = storage_dir
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        os.makedirs(storage_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "status": row["status"],
+            "filename": row["filename"],
+            "content_type": row["content_type"],
+            "file_path": row["file_path"],
+            "metadata": json.loads(row["metadata"]),
+            "attempts": row["attempts"],
+            "last_error": row["last_error"],
+            "response": json.loads(row["response"]) if row["response"] else None,
+            "created_at": _format_time(row["created_at"]),
+            "updated_at": _format_time(row["updated_at"]),
+            "next_attempt_at": _format_time(row["next_attempt_at"]) if row["status"] == "pending" else None,
+            "delivered_at": _format_time(row["delivered_at"]),
+            "enqueued_at": row["created_at"]
+        }
+
+    def enqueue(self, file_path: str, filename: str, content_type: str,
+                metadata: Optional[Dict[str, Any]] = None, move: bool = True) -> Dict[str, Any]:
+        """
+        Encolar un archivo para enviar
+
+        Args:
+            file_path: Archivo a enviar (se mueve al directorio del outbox, o se copia si move=False)
+            filename: Nombre con el que se informa el archivo
+            content_type: Tipo de contenido del archivo
+            metadata: Campos adicionales del envío (callback_url, status_url, ...)
+            move: Mover el archivo en lugar de copiarlo
+
+        Returns:
+            Entrada creada
+        """
+        entry_id = uuid.uuid4().hex
+        stored_path = os.path.join(self.storage_dir, entry_id + os.path.splitext(file_path)[1].lower())
+        if move:
+            shutil.move(file_path, stored_path)
+        else:
+            shutil.copyfile(file_path, stored_path)
+
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO outbox (id, status, filename, content_type, file_path, metadata, "
+                "next_attempt_at, created_at, updated_at) VALUES (?, 'pending', ?, ?, ?, ?, ?, ?, ?)",
+                (entry_id, filename, content_type, stored_path, json.dumps(metadata or {}), now, now, now)
+            )
+        logger.info(f"Factura encolada para envío: {entry_id} ({filename})")
+        return self.get(entry_id)
+
+    def claim(self, limit: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Tomar hasta `limit` entradas pendientes vencidas y marcarlas 'sending' (una transacción)"""
+        now = time.time() if now is None else now
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT * FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT ?", (now, limit)
+            ).fetchall()
+            if rows:
+                self._conn.executemany(
+                    "UPDATE outbox SET status = 'sending', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    [(now, row["id"]) for row in rows]
+                )
+        entries = [self._entry(row) for row in rows]
+        for entry in entries:
+            entry["status"] = "sending"
+            entry["attempts"] += 1
+        return entries
+
+    def mark_delivered(self, entry_id: str, response: Optional[Dict[str, Any]]):
+        """Registrar el envío exitoso y borrar la copia del archivo"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT file_path FROM outbox WHERE id = ?", (entry_id,)).fetchone()
+            self._conn.execute(
+                "UPDATE outbox SET status = 'delivered', response = ?, last_error = NULL, "
+                "updated_at = ?, delivered_at = ? WHERE id = ?",
+                (json.dumps(response), now, now, entry_id)
+            )
+        if row and os.path.exists(row["file_path"]):
+            os.remove(row["file_path"])
+
+    def mark_retry(self, entry_id: str, error: str, next_attempt_at: float):
+        """Volver a 'pending' con el próximo intento programado"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET status = 'pending', last_error = ?, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                (error, next_attempt_at, time.time(), entry_id)
+            )
+
+    def mark_failed(self, entry_id: str, error: str, response: Optional[Dict[str, Any]] = None):
+        """Marcar la entrada como fallida definitivamente (se conserva el archivo para reintentar a mano)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET status = 'failed', last_error = ?, response = ?, updated_at = ? WHERE id = ?",
+                (error, json.dumps(response) if response else None, time.time(), entry_id)
+            )
+
+    def retry(self, entry_id: str) -> bool:
+        """Reencolar una entrada fallida para enviarla de inmediato"""
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'failed'", (now, now, entry_id)
+            )
+        return cursor.rowcount > 0
+
+    def recover(self) -> int:
+        """Reencolar las entradas que quedaron 'sending' por un reinicio"""
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE outbox SET status = 'pending', next_attempt_at = ?, updated_at = ? WHERE status = 'sending'",
+                (now, now)
+            )
+        if cursor.rowcount:
+            logger.info(f"Outbox: {cursor.rowcount} envíos interrumpidos reencolados")
+        return cursor.rowcount
+
+    def purge_delivered(self, older_than: float) -> int:
+        """Borrar las entradas entregadas hace más de `older_than` segundos"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM outbox WHERE status = 'delivered' AND delivered_at < ?", (time.time() - older_than,)
+            )
+        return cursor.rowcount
+
+    def get(self, entry_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM outbox WHERE id = ?", (entry_id,)).fetchone()
+        return self._entry(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Entradas más recientes, opcionalmente filtradas por estado"""
+        query = "SELECT * FROM outbox"
+        params: tuple = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, params + (limit,)).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """Cantidad de entradas por estado"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        counts = {status: 0 for status in STATUSES}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def next_due(self) -> Optional[float]:
+        """Momento del próximo intento pendiente (None si no hay pendientes)"""
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'").fetchone()
+        return row[0]
+
+class OutboxSender:
+    """Entrega en segundo plano de las entradas del outbox"""
+
+    def __init__(self, outbox: Outbox, send: Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]],
+                 concurrency: int = 4, batch_size: int = 10, max_attempts: int = 8,
+                 backoff_base: float = 2.0, backoff_max: float = 300.0, poll_interval: float = 5.0,
+                 retention: float = 7 * 24 * 3600):
+        """
+        Args:
+            outbox: Cola persistente
+            send: Corrutina que envía una entrada; devuelve la respuesta de la API externa
+                o un diccionario con 'error' (y 'status_code' si fue un error HTTP)
+            concurrency: Envíos simultáneos como máximo
+            batch_size: Entradas tomadas por lote
+            max_attempts: Intentos antes de marcar la entrada como fallida
+            backoff_base: Demora base del backoff exponencial (segundos)
+            backoff_max: Demora máxima entre intentos (segundos)
+            poll_interval: Intervalo máximo entre revisiones de la cola (segundos)
+            retention: Tiempo que se conservan las entradas entregadas (segundos)
+        """
+        self.outbox = outbox
+        self.send = send
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_purge = 0.0
+
+    def backoff(self, attempts: int) -> float:
+        """Demora antes del próximo intento: exponencial con jitter y tope"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** max(0, attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def start(self):
+        """Iniciar el sender (llamar en el arranque de la aplicación)"""
+        if self._task is None or self._task.done():
+            # El Event y el Semaphore deben pertenecer al loop en ejecución
+            self._wake = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self.outbox.recover()
+            self._task = asyncio.create_task(self._run())
+            logger.info("Sender del outbox iniciado")
+
+    async def stop(self):
+        """Detener el sender; los envíos en curso se reencolan en el próximo arranque"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Sender del outbox detenido")
+
+    def wake(self):
+        """Avisar que hay entradas nuevas para enviar sin esperar al próximo ciclo"""
+        self._wake.set()
+
+    async def run_once(self) -> int:
+        """Enviar un lote de entradas vencidas; devuelve cuántas se procesaron"""
+        batch = self.outbox.claim(self.batch_size)
+        if batch:
+            await asyncio.gather(*(self._deliver(entry) for entry in batch))
+        return len(batch)
+
+    async def _run(self):
+        while True:
+            try:
+                if await self.run_once():
+                    continue
+                if time.time() - self._last_purge > 3600:
+                    self._last_purge = time.time()
+                    self.outbox.purge_delivered(self.retention)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en el sender del outbox: {e}")
+
+            next_due = self.outbox.next_due()
+            timeout = self.poll_interval
+            if next_due is not None:
+                timeout = max(0.0, min(timeout, next_due - time.time()))
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, entry: Dict[str, Any]):
+        async with self._semaphore:
+            try:
+                result = await self.send(entry)
+            except Exception as e:
+                result = {"error": f"Error inesperado: {str(e)}"}
+
+        if result is not None and "error" not in result:
+            self.outbox.mark_delivered(entry["id"], result)
+            OUTBOX_DELIVERIES_TOTAL.inc("delivered")
+            OUTBOX_DELIVERY_LAG.observe(time.time() - entry["enqueued_at"])
+            logger.info(f"Outbox: factura {entry['id']} entregada (intento {entry['attempts']})")
+            return
+
+        error = (result or {}).get("error", "Respuesta vacía de la API externa")
+        status_code = (result or {}).get("status_code")
+        permanent = status_code is not None and 400 <= status_code < 500 and status_code not in RETRYABLE_CLIENT_ERRORS
+
+        if permanent or entry["attempts"] >= self.max_attempts:
+            self.outbox.mark_failed(entry["id"], error, result)
+            OUTBOX_DELIVERIES_TOTAL.inc("failed")
+            logger.error(f"Outbox: factura {entry['id']} no entregada tras {entry['attempts']} intentos: {error}")
+            return
+
+        delay = self.backoff(entry["attempts"])
+        self.outbox.mark_retry(entry["id"], error, time.time() + delay)
+        OUTBOX_DELIVERIES_TOTAL.inc("retry")
+        logger.warning(f"Outbox: error enviando factura {entry['id']} ({error}), reintento en {delay:.1f}s")
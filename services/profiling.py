@@ -0,0 +1,260 @@
+"""
+Profiler bajo demanda para requests en producción
+
+Un request se perfila si trae el header X-Profile o si se armó el profiler para
+los próximos N requests (POST /admin/profiling/arm). Durante process_image (que
+incluye el parser de facturas) se ejecutan cProfile y un muestreador de stacks;
+el resultado se guarda en un directorio de tamaño acotado como .pstats (para
+pstats/snakeviz) y .collapsed (stacks colapsados para flamegraph.pl/speedscope).
+"""
+import os
+import re
+import io
+import sys
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID_PATTERN = re.compile(r'^[0-9A-Za-z_-]+$')
+
+# Estado de perfilado del request actual (lo inicializa ProfilingMiddleware)
+_request_profile: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_profile", default=None)
+
+class StackSampler:
+    """Muestreador estadístico de stacks de un hilo (formato colapsado)"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+
+            stack = ";".join(reversed(frames))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Stacks en formato 'frame;frame;frame conteo' (uno por línea)"""
+        return "\n".join(f"{stack} {count}" for stack, count in sorted(self.stacks.items())) + "\n"
+
+class ProfileManager:
+    """Captura y almacenamiento acotado de perfiles"""
+
+    def __init__(self, directory: str, max_bytes: int = 100 * 1024 * 1024,
+                 sample_interval: float = 0.005, enabled: bool = True):
+        """
+        Args:
+            directory: Directorio donde se guardan los perfiles
+            max_bytes: Tamaño máximo del directorio; se borran los perfiles más viejos
+            sample_interval: Intervalo del muestreador de stacks en segundos
+            enabled: Si el profiler puede activarse
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.sample_interval = sample_interval
+        self.enabled = enabled
+        self._armed = 0
+        self._lock = threading.Lock()
+        # cProfile no admite perfiles simultáneos en todas las versiones de Python
+        self._profiling_lock = threading.Lock()
+
+    def arm(self, count: int) -> int:
+        """Perfilar los próximos `count` requests que procesen documentos"""
+        with self._lock:
+            self._armed = max(0, count)
+            return self._armed
+
+    def armed(self) -> int:
+        return self._armed
+
+    def _consume_armed(self) -> bool:
+        with self._lock:
+            if self._armed <= 0:
+                return False
+            self._armed -= 1
+            return True
+
+    def _should_profile(self) -> bool:
+        state = _request_profile.get()
+        if not self.enabled or state is None:
+            return False
+        if not state['requested'] and not state['armed_checked']:
+            state['armed_checked'] = True
+            state['requested'] = self._consume_armed()
+        return state['requested']
+
+    @contextmanager
+    def maybe_profile(self, label: str):
+        """Perfilar el bloque si el request actual lo pidió (no-op en caso contrario)"""
+        if not self._should_profile():
+            yield
+            return
+
+        if not self._profiling_lock.acquire(blocking=False):
+            logger.info(f"Profiler ocupado, no se perfila: {label}")
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), self.sample_interval)
+        start = time.perf_counter()
+        try:
+            sampler.start()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                sampler.stop()
+            elapsed = time.perf_counter() - start
+            profile_id = self._save(label, profiler, sampler, elapsed)
+            state = _request_profile.get()
+            if state is not None and profile_id:
+                state['ids'].append(profile_id)
+        finally:
+            self._profiling_lock.release()
+
+    def _save(self, label: str, profiler: cProfile.Profile, sampler: StackSampler, elapsed: float) -> Optional[str]:
+        """Guardar el perfil y aplicar el límite de tamaño"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+            base = os.path.join(self.directory, profile_id)
+
+            profiler.dump_stats(f"{base}.pstats")
+            with open(f"{base}.collapsed", 'w', encoding='utf-8') as f:
+                f.write(sampler.collapsed())
+            with open(f"{base}.json", 'w', encoding='utf-8') as f:
+                json.dump({
+                    'id': profile_id,
+                    'label': label,
+                    'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'duration_seconds': elapsed,
+                    'samples': sampler.samples,
+                    'sample_interval': self.sample_interval
+                }, f, indent=2, ensure_ascii=False)
+
+            logger.info(f"Perfil guardado: {profile_id} ({label}, {elapsed:.2f}s)")
+            self._enforce_limit()
+            return profile_id
+        except Exception as e:
+            logger.error(f"Error guardando perfil: {e}")
+            return None
+
+    def _enforce_limit(self):
+        """Borrar los perfiles más viejos hasta quedar por debajo de max_bytes"""
+        groups: Dict[str, List[str]] = {}
+        for name in os.listdir(self.directory):
+            groups.setdefault(os.path.splitext(name)[0], []).append(os.path.join(self.directory, name))
+
+        sizes = {pid: sum(os.path.getsize(p) for p in paths) for pid, paths in groups.items()}
+        total = sum(sizes.values())
+        oldest_first = sorted(groups, key=lambda pid: min(os.path.getmtime(p) for p in groups[pid]))
+        for profile_id in oldest_first:
+            if total <= self.max_bytes or len(groups) <= 1:
+                break
+            for path in groups.pop(profile_id):
+                os.remove(path)
+            total -= sizes[profile_id]
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Perfiles guardados, del más nuevo al más viejo"""
+        if not os.path.isdir(self.directory):
+            return []
+
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    profiles.append(json.load(f))
+            except (OSError, json.JSONDecodeError):
+                continue
+        return profiles
+
+    def profile_path(self, profile_id: str, extension: str) -> Optional[str]:
+        """Ruta de un archivo de perfil (None si el id no es válido o no existe)"""
+        if not PROFILE_ID_PATTERN.match(profile_id) or extension not in ('pstats', 'collapsed', 'json'):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.{extension}")
+        return path if os.path.exists(path) else None
+
+    def text_report(self, profile_id: str, sort_by: str = 'cumulative', limit: int = 40) -> Optional[str]:
+        """Resumen de texto de pstats (funciones más costosas)"""
+        path = self.profile_path(profile_id, 'pstats')
+        if path is None:
+            return None
+        stream = io.StringIO()
+        pstats.Stats(path, stream=stream).sort_stats(sort_by).print_stats(limit)
+        return stream.getvalue()
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI que marca los requests a perfilar y devuelve los ids
+    de perfil generados en el header X-Profile-Id
+    """
+
+    def __init__(self, app, manager: ProfileManager, token: str = ""):
+        self.app = app
+        self.manager = manager
+        self.token = token
+
+    def _requested(self, scope) -> bool:
+        # Sin token configurado el header no tiene efecto (solo se perfila armando el profiler)
+        if not self.token:
+            return False
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile":
+                return value.decode("latin-1").strip() == self.token
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.manager.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        state = {'requested': self._requested(scope), 'armed_checked': False, 'ids': []}
+        token = _request_profile.set(state)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and state['ids']:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", ",".join(state['ids']).encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_profile.reset(token)
@@ -0,0 +1,261 @@
+"""
+Extracción de tablas por geometría de las palabras OCR
+
+Las tablas se armaban partiendo el texto OCR por espacios y los items salían de
+expresiones regulares sobre el texto aplanado. Acá se usan las posiciones de las
+palabras (TokenTable):
+
+- Filas: las palabras se ordenan por su borde superior y una palabra abre una
+  fila nueva cuando su solapamiento vertical con las anteriores es menor que la
+  mitad de su alto (un orden y un máximo acumulado, sin comparar pares).
+- Columnas: si hay una fila de encabezado ('Código', 'Producto / Servicio',
+  'Cantidad', 'Precio unit.', '% Bonif', 'Subtotal', ...) cada columna queda
+  entre los puntos medios de los huecos entre las palabras de encabezado de
+  campos vecinos; si no, las columnas son los huecos en x que no cubre ninguna
+  palabra.
+- Las palabras se asignan a su fila y columna de una sola vez (searchsorted) y
+  las celdas se arman en un único recorrido en orden (fila, columna, x), así que
+  el costo es lineal en la cantidad de palabras después del ordenamiento.
+"""
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.token_table import TokenTable, Word, as_token_table
+from services.vendor_templates import normalize_word
+
+# Campos de ItemFactura, en el orden habitual de las columnas
+ITEM_COLUMNS = ('codigo', 'descripcion', 'cantidad', 'unidad_medida', 'precio_unitario',
+                'bonificacion', 'importe_bonificacion', 'subtotal')
+NUMERIC_COLUMNS = ('cantidad', 'precio_unitario', 'bonificacion', 'importe_bonificacion', 'subtotal')
+
+# Solapamiento vertical mínimo (fracción del alto de la palabra) para seguir en la misma fila
+MIN_ROW_OVERLAP = 0.5
+# Hueco mínimo entre columnas sin encabezado, en altos de palabra
+MIN_COLUMN_GAP = 1.5
+# Campos de encabezado distintos necesarios para reconocer la fila de encabezado
+MIN_HEADER_FIELDS = 3
+
+# Palabras normalizadas de la fila que cierran la tabla de items
+TOTAL_LABELS = ('subtotal', 'importe', 'total', 'iva', 'percepción', 'percepcion', 'otros')
+UNIT_WORDS = {'unidad', 'unidades', 'un', 'u', 'kg', 'hs', 'hora', 'horas', 'mes', 'meses', 'lts', 'mts', 'm2'}
+
+_NUMERIC_CELL = re.compile(r'[\d%]')
+_INTEGER = re.compile(r'^\d+$')
+_WHOLE_QUANTITY = re.compile(r'^(\d+)[.,]0+$')
+
+class GeometricTable(NamedTuple):
+    """Tabla armada por posición: celdas de texto por fila y columna"""
+    headers: List[str]
+    fields: List[Optional[str]]  # Campo de ItemFactura de cada columna (None sin encabezado reconocido)
+    rows: List[List[str]]
+    bbox: List[int]
+
+def cluster_rows(bbox: np.ndarray, min_overlap: float = MIN_ROW_OVERLAP) -> np.ndarray:
+    """
+    Fila de cada palabra (0 = la de más arriba)
+
+    Args:
+        bbox: (N, 4) [x1, y1, x2, y2]
+    """
+    if not len(bbox):
+        return np.zeros(0, dtype=np.int64)
+    order = np.argsort(bbox[:, 1], kind='stable')
+    top, bottom = bbox[order, 1], bbox[order, 3]
+    height = np.maximum(bottom - top, 1)
+    reach = np.maximum.accumulate(bottom)
+    # Solapamiento de cada palabra con todo lo anterior (ordenado por borde superior)
+    overlap = np.empty(len(order), dtype=np.float64)
+    overlap[0] = height[0]
+    overlap[1:] = reach[:-1] - top[1:]
+    starts = overlap < min_overlap * height
+    starts[0] = True
+    rows = np.empty(len(order), dtype=np.int64)
+    rows[order] = np.cumsum(starts) - 1
+    return rows
+
+def gap_columns(bbox: np.ndarray, min_gap: float) -> np.ndarray:
+    """Borde izquierdo de cada columna: huecos en x de al menos min_gap píxeles que no cubre ninguna palabra"""
+    order = np.argsort(bbox[:, 0], kind='stable')
+    left, right = bbox[order, 0], bbox[order, 2]
+    reach = np.maximum.accumulate(right)
+    starts = np.concatenate([[True], left[1:] - reach[:-1] >= min_gap])
+    return left[starts]
+
+def header_field(word: str, previous: str = "", following: str = "") -> Optional[str]:
+    """Campo de ItemFactura que nombra una palabra de encabezado (con sus vecinas para 'Imp. Bonif.')"""
+    if word in ('imp', 'importe') and following.startswith('bonif'):
+        return 'importe_bonificacion'
+    if word.startswith('bonif'):
+        return 'importe_bonificacion' if previous in ('imp', 'importe') else 'bonificacion'
+    if word.startswith('subtotal') or word in ('importe', 'total'):
+        return 'subtotal'
+    if word.startswith('precio') or word.startswith('unit'):
+        return 'precio_unitario'
+    if word.startswith('cant'):
+        return 'cantidad'
+    if word in ('u', 'medida', 'unidad', 'umedida'):
+        return 'unidad_medida'
+    if word.startswith('cód') or word.startswith('cod'):
+        return 'codigo'
+    if word in ('producto', 'productos', 'servicio', 'servicios', 'descripción', 'descripcion', 'detalle', 'concepto'):
+        return 'descripcion'
+    return None
+
+def _header_fields(texts: List[str]) -> List[Optional[str]]:
+    """Campo de cada palabra de la fila de encabezado ('%' es la bonificación)"""
+    normalized = [normalize_word(text) for text in texts]
+    fields = []
+    for index, word in enumerate(normalized):
+        if texts[index].strip() == '%':
+            fields.append('bonificacion')
+            continue
+        previous = normalized[index - 1] if index else ""
+        following = normalized[index + 1] if index + 1 < len(normalized) else ""
+        fields.append(header_field(word, previous, following))
+    return fields
+
+def _header_columns(tokens: TokenTable, words: np.ndarray) -> Optional[Tuple[List[str], List[str], np.ndarray]]:
+    """
+    Columnas definidas por la fila de encabezado
+
+    Returns:
+        (campos, textos de encabezado, bordes entre columnas), o None si la fila no nombra
+        al menos MIN_HEADER_FIELDS campos distintos
+    """
+    texts = tokens.text[words].tolist()
+    fields = _header_fields(texts)
+    if len({field for field in fields if field}) < MIN_HEADER_FIELDS:
+        return None
+
+    # Las palabras sin campo ('/', 'de') pertenecen al campo de la anterior
+    columns: List[List[int]] = []
+    column_fields: List[str] = []
+    for position, field in enumerate(fields):
+        field = field or (column_fields[-1] if column_fields else None)
+        if field is None:
+            continue
+        if not column_fields or column_fields[-1] != field:
+            column_fields.append(field)
+            columns.append([])
+        columns[-1].append(position)
+
+    boxes = tokens.bbox[words]
+    left = np.array([boxes[column, 0].min() for column in columns])
+    right = np.array([boxes[column, 2].max() for column in columns])
+    boundaries = (right[:-1] + left[1:]) / 2
+    headers = [' '.join(texts[i] for i in column) for column in columns]
+    return column_fields, headers, boundaries
+
+def _cells(tokens: TokenTable, words: np.ndarray, rows: np.ndarray, columns: np.ndarray,
+           row_count: int, column_count: int) -> List[List[str]]:
+    """Texto de cada celda: palabras ordenadas por fila, columna y x, unidas en un solo recorrido"""
+    order = np.lexsort((tokens.bbox[words, 0], columns, rows))
+    cells = [[""] * column_count for _ in range(row_count)]
+    texts = tokens.text[words].tolist()
+    for index in order.tolist():
+        row, column = rows[index], columns[index]
+        cells[row][column] = f"{cells[row][column]} {texts[index]}" if cells[row][column] else texts[index]
+    return cells
+
+def extract_table(tokens: Sequence[Word]) -> Optional[GeometricTable]:
+    """
+    Armar la tabla de las palabras OCR de una región (o de la página completa)
+
+    Con fila de encabezado, la tabla empieza después de ella y termina en la
+    primera fila de totales ('Subtotal:', 'Importe Total', 'IVA', ...); las
+    columnas son las del encabezado. Sin encabezado, se usan todas las filas y las
+    columnas salen de los huecos en x.
+    """
+    tokens = as_token_table(tokens)
+    if not len(tokens):
+        return None
+    all_rows = cluster_rows(tokens.bbox)
+    row_count = int(all_rows.max()) + 1
+    row_order = np.argsort(all_rows, kind='stable')
+    row_words = np.split(row_order, np.flatnonzero(np.diff(all_rows[row_order])) + 1)
+    row_words = [words[np.argsort(tokens.bbox[words, 0], kind='stable')] for words in row_words]
+
+    header = None
+    for header_row, words in enumerate(row_words):
+        header = _header_columns(tokens, words)
+        if header is not None:
+            break
+
+    height = float(np.median(tokens.bbox[:, 3] - tokens.bbox[:, 1]))
+    if header is not None:
+        fields, headers, boundaries = header
+        first, last = header_row + 1, row_count
+        for row in range(first, row_count):
+            first_word = normalize_word(tokens.text[row_words[row][0]])
+            if first_word.startswith(TOTAL_LABELS):
+                last = row
+                break
+        if last <= first:
+            return GeometricTable(headers, list(fields), [], [])
+        words = np.concatenate(row_words[first:last])
+        centers = (tokens.bbox[words, 0] + tokens.bbox[words, 2]) / 2
+        columns = np.searchsorted(boundaries, centers)
+    else:
+        headers, first, last = [], 0, row_count
+        words = np.concatenate(row_words)
+        starts = gap_columns(tokens.bbox[words], MIN_COLUMN_GAP * height)
+        columns = np.searchsorted(starts, tokens.bbox[words, 0], side='right') - 1
+        fields = [None] * len(starts)
+
+    rows = all_rows[words] - first
+    cells = _cells(tokens, words, rows, columns, last - first, len(fields))
+    boxes = tokens.bbox[words]
+    bbox = [int(boxes[:, 0].min()), int(boxes[:, 1].min()), int(boxes[:, 2].max()), int(boxes[:, 3].max())]
+    return GeometricTable(headers, list(fields), cells, bbox)
+
+def table_items(table: GeometricTable) -> List[Dict[str, str]]:
+    """
+    Items de una tabla con encabezado reconocido
+
+    Las filas sin código ni valores numéricos continúan la descripción del item
+    anterior (descripciones en dos renglones). Los textos no numéricos caídos en
+    una columna numérica pasan a la unidad o a la descripción.
+    """
+    if 'precio_unitario' not in table.fields and 'subtotal' not in table.fields:
+        return []
+    items = []
+    for row in table.rows:
+        values: Dict[str, str] = {}
+        spill = []
+        for field, cell in zip(table.fields, row):
+            if not cell.strip('$ '):
+                continue
+            if field in NUMERIC_COLUMNS and not _NUMERIC_CELL.search(cell):
+                spill.append(cell)
+                continue
+            values[field] = f"{values[field]} {cell}" if field in values else cell
+        for text in spill:
+            if text.lower() in UNIT_WORDS and 'unidad_medida' not in values:
+                values['unidad_medida'] = text.lower()
+            else:
+                values['descripcion'] = f"{values.get('descripcion', '')} {text}".strip()
+
+        if not any(field in values for field in NUMERIC_COLUMNS) and 'codigo' not in values:
+            if items and values.get('descripcion'):
+                items[-1]['descripcion'] += f" {values['descripcion']}"
+            continue
+
+        cantidad = values.get('cantidad', '1').replace(' ', '')
+        whole = _WHOLE_QUANTITY.match(cantidad)
+        # Una descripción larga puede invadir la columna del código
+        codigo, _, overflow = values.get('codigo', '').partition(' ')
+        if 'codigo' not in table.fields:
+            codigo = str(len(items) + 1)
+        items.append({
+            'codigo': codigo,
+            'descripcion': f"{overflow} {values.get('descripcion', '')}".strip(),
+            'cantidad': whole.group(1) if whole else cantidad,
+            'unidad_medida': values.get('unidad_medida', 'unidad').lower(),
+            'precio_unitario': values.get('precio_unitario', '').replace('$', '').strip(),
+            'bonificacion': values.get('bonificacion', '0%').replace(' ', ''),
+            'importe_bonificacion': values.get('importe_bonificacion', '0.00').replace('$', '').strip(),
+            'subtotal': values.get('subtotal', '0.00').replace('$', '').strip()
+        })
+    return [item for item in items if _INTEGER.match(item['codigo'])]
@@ -0,0 +1,361 @@
+"""
+Métricas operativas en formato de texto de Prometheus
+
+Registro mínimo de contadores, gauges e histogramas con etiquetas, pensado
+para el camino crítico: cada observación es una búsqueda en un diccionario
+bajo un lock, sin dependencias externas. El endpoint /metrics expone
+REGISTRY.render().
+"""
+import os
+import time
+import bisect
+import threading
+from contextvars import ContextVar
+from typing import Dict, Tuple, Sequence, Callable, Optional, List, Any
+
+# Buckets (segundos) para latencias de requests y etapas del pipeline
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Buckets para la serialización de respuestas (segundos y bytes)
+SERIALIZATION_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Scope ASGI del request en curso (lo inicializa PrometheusMiddleware)
+_current_scope: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_scope", default=None)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    """Base de las métricas: nombre, ayuda, etiquetas y lock"""
+
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Sequence[str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: se esperaban etiquetas {self.labelnames}")
+        return tuple(str(label) for label in labels)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    """Contador monótono"""
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+class Gauge(_Metric):
+    """Valor que sube y baja; opcionalmente calculado al momento de exponer"""
+
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set(self, value: float, *labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def set_function(self, function: Callable[[], Dict[Tuple[str, ...], float]]):
+        """Calcular los valores solo cuando se exponen las métricas (fuera del camino crítico)"""
+        self._function = function
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                values = dict(self._function())
+            except Exception:
+                values = {}
+            with self._lock:
+                self._values = values
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+class Histogram(_Metric):
+    """Histograma acumulado con buckets fijos"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # etiquetas -> [conteos por bucket..., +Inf], suma
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def time(self, *labels: str) -> "_HistogramTimer":
+        """Context manager que observa la duración del bloque"""
+        return _HistogramTimer(self, labels)
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class _HistogramTimer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram: Histogram, labels: Sequence[str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+class MetricsRegistry:
+    """Conjunto de métricas expuestas en /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica duplicada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Texto en formato de exposición de Prometheus (versión 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+def _endpoint_label(scope: Optional[Dict[str, Any]]) -> str:
+    route = scope.get("route") if scope else None
+    return getattr(route, "path", None) or "unmatched"
+
+def current_endpoint() -> str:
+    """Plantilla de la ruta del request en curso (para etiquetar métricas fuera del middleware)"""
+    return _endpoint_label(_current_scope.get())
+
+def directory_usage(path: str) -> Tuple[int, int]:
+    """Cantidad de archivos y bytes en un directorio (no recursivo)"""
+    files = 0
+    total_bytes = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    files += 1
+                    total_bytes += entry.stat(follow_symlinks=False).st_size
+    except OSError:
+        pass
+    return files, total_bytes
+
+class PrometheusMiddleware:
+    """
+    Middleware ASGI que cuenta requests, mide su latencia y los requests en curso
+
+    La etiqueta de endpoint es la plantilla de la ruta (ej. '/process-image'), no
+    la URL concreta, para mantener acotada la cardinalidad.
+    """
+
+    def __init__(self, app, excluded_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.excluded_paths = set(excluded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        token = _current_scope.set(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_scope.reset(token)
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            endpoint = _endpoint_label(scope)
+            HTTP_REQUESTS_TOTAL.inc(endpoint, method, str(status_code[0]))
+            HTTP_REQUEST_DURATION.observe(elapsed, endpoint, method)
+
+# Registro global y métricas de la aplicación
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS_TOTAL = REGISTRY.counter(
+    "http_requests_total", "Requests HTTP atendidos", ("endpoint", "method", "status")
+)
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "Latencia de los requests HTTP", ("endpoint", "method")
+)
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "Requests HTTP en curso"
+)
+OCR_CALLS_TOTAL = REGISTRY.counter(
+    "ocr_calls_total", "Llamadas a Tesseract por configuración PSM", ("psm", "outcome")
+)
+OCR_CALL_DURATION = REGISTRY.histogram(
+    "ocr_call_duration_seconds", "Duración de las llamadas a Tesseract por configuración PSM", ("psm",)
+)
+PIPELINE_STAGE_DURATION = REGISTRY.histogram(
+    "pipeline_stage_duration_seconds", "Duración de cada etapa del procesamiento por documento", ("stage",)
+)
+DOCUMENTS_PROCESSED_TOTAL = REGISTRY.counter(
+    "documents_processed_total", "Documentos procesados por resultado", ("status",)
+)
+CACHE_REQUESTS_TOTAL = REGISTRY.counter(
+    "cache_requests_total", "Consultas a cachés internas por resultado (hit/miss/fallback)", ("cache", "result")
+)
+PAGE_CORRECTIONS_TOTAL = REGISTRY.counter(
+    "page_corrections_total", "Páginas corregidas antes del OCR por tipo de corrección (orientation/skew)", ("correction",)
+)
+INVOICE_FIELDS_EXTRACTED_TOTAL = REGISTRY.counter(
+    "invoice_fields_extracted_total", "Campos de factura extraídos por origen (hint de zona numérica, regex o hint descartado)",
+    ("field", "source")
+)
+VENDOR_TEMPLATE_TIME_SAVED = REGISTRY.counter(
+    "vendor_template_time_saved_seconds_total", "Tiempo de OCR ahorrado (estimado) por las plantillas de proveedor"
+)
+VENDOR_TEMPLATES = REGISTRY.gauge(
+    "vendor_templates", "Plantillas de layout de proveedores aprendidas"
+)
+TEMP_DIR_FILES = REGISTRY.gauge(
+    "temp_dir_files", "Archivos en el directorio temporal de uploads"
+)
+TEMP_DIR_BYTES = REGISTRY.gauge(
+    "temp_dir_bytes", "Bytes ocupados en el directorio temporal de uploads"
+)
+EXTERNAL_API_REQUEST_DURATION = REGISTRY.histogram(
+    "external_api_request_duration_seconds", "Latencia de los envíos a la API externa de facturas",
+    ("operation", "outcome")
+)
+EXTERNAL_API_BYTES_SENT = REGISTRY.counter(
+    "external_api_bytes_sent_total", "Bytes enviados en el cuerpo de los requests a la API externa", ("operation",)
+)
+OUTBOX_DELIVERIES_TOTAL = REGISTRY.counter(
+    "outbox_deliveries_total", "Intentos de entrega del outbox por resultado (delivered/retry/failed)", ("outcome",)
+)
+OUTBOX_DELIVERY_LAG = REGISTRY.histogram(
+    "outbox_delivery_lag_seconds", "Tiempo entre el encolado de una factura y su entrega a la API externa"
+)
+OUTBOX_ENTRIES = REGISTRY.gauge(
+    "outbox_entries", "Entradas del outbox por estado", ("status",)
+)
+HEALTH_CHECK_STATUS = REGISTRY.gauge(
+    "health_check_status", "Resultado del último health check por dependencia (1 = OK)", ("check",)
+)
+APP_STARTUP_SECONDS = REGISTRY.gauge(
+    "app_startup_seconds", "Duración del arranque por fase (import de la aplicación, precalentamiento)", ("phase",)
+)
+OCR_POOL_BUSY = REGISTRY.gauge(
+    "ocr_pool_busy", "Trabajos OCR en ejecución en el pool de hilos"
+)
+OCR_POOL_WAITING = REGISTRY.gauge(
+    "ocr_pool_waiting", "Trabajos OCR esperando un hilo libre del pool"
+)
+RESPONSE_SERIALIZATION_DURATION = REGISTRY.histogram(
+    "response_serialization_seconds", "Tiempo de serialización JSON de las respuestas", ("endpoint",),
+    buckets=SERIALIZATION_BUCKETS
+)
+RESPONSE_BYTES = REGISTRY.histogram(
+    "response_bytes", "Tamaño del cuerpo JSON de las respuestas", ("endpoint",), buckets=SIZE_BUCKETS
+)
@@ -0,0 +1,90 @@
+"""
+Procesamiento por franjas de imágenes muy grandes
+
+Un PNG de 50 MB (MAX_FILE_SIZE) puede decodificarse a cientos de MB, y el
+preprocesamiento en float64 multiplica eso por 8; Tesseract, a su vez, carga la
+página completa. Por encima de TILED_MIN_PIXELS la página se procesa en franjas
+horizontales que se solapan:
+
+- Se lee el encabezado con la carga diferida de PIL para decidir el modo sin
+  decodificar, y la imagen se decodifica una sola vez a escala de grises de
+  1 byte por píxel (los JPEG directamente en el decodificador, con draft('L')).
+  PNG es un único flujo zlib, así que no se puede decodificar una franja sin las
+  filas anteriores: la copia en grises es el piso de memoria.
+- El preprocesamiento (float64) y el OCR se hacen franja por franja, de modo que
+  su memoria depende del tamaño de la franja y no de la página.
+- Cada franja es "dueña" de las filas entre la mitad de los solapamientos con
+  sus vecinas; una palabra se conserva solo en la franja dueña de su centro
+  vertical, así el texto del solapamiento no se duplica.
+"""
+from typing import Dict, Any, List, NamedTuple, Optional
+
+import numpy as np
+from PIL import Image
+
+from services.image_loader import apply_draft
+
+class Strip(NamedTuple):
+    """Franja [top, bottom) de la página; es dueña de las filas [own_top, own_bottom)"""
+    top: int
+    bottom: int
+    own_top: int
+    own_bottom: int
+
+    def owns(self, bbox: List[int]) -> bool:
+        """Si el centro vertical de bbox [x1, y1, x2, y2] cae en las filas de la franja"""
+        center = (bbox[1] + bbox[3]) / 2
+        return self.own_top <= center < self.own_bottom
+
+def strip_height(width: int, max_pixels: int, overlap: int) -> int:
+    """Alto de franja para que cada una tenga como máximo max_pixels (y al menos 4 solapamientos)"""
+    return max(4 * overlap, max_pixels // max(width, 1))
+
+def split_strips(height: int, strip_height: int, overlap: int) -> List[Strip]:
+    """Franjas horizontales de strip_height filas que se solapan en overlap filas"""
+    if height <= strip_height:
+        return [Strip(0, height, 0, height)]
+    step = strip_height - overlap
+    tops = list(range(0, height - overlap, step))
+    strips = []
+    for index, top in enumerate(tops):
+        bottom = min(top + strip_height, height)
+        own_top = 0 if index == 0 else top + overlap // 2
+        own_bottom = height if index == len(tops) - 1 else top + step + overlap // 2
+        strips.append(Strip(top, bottom, own_top, own_bottom))
+    return strips
+
+def load_grayscale(image_path: str, max_side: Optional[int] = None, block_rows: int = 1024) -> np.ndarray:
+    """
+    Decodificar la imagen a escala de grises uint8 (1 byte por píxel)
+
+    La conversión se hace por bloques de filas directamente sobre el array de
+    salida, sin una copia completa en grises de PIL además de la de numpy.
+
+    Args:
+        max_side: Lado mayor objetivo para la reducción de JPEG (ver services/image_loader.py)
+    """
+    with Image.open(image_path) as image:
+        apply_draft(image, max_side)  # Los JPEG se decodifican directamente en grises
+        width, height = image.size
+        array = np.empty((height, width), dtype=np.uint8)
+        for top in range(0, height, block_rows):
+            block = image.crop((0, top, width, min(top + block_rows, height)))
+            if block.mode != 'L':
+                block = block.convert('L')
+            array[top:top + block.height] = np.asarray(block)
+        return array
+
+def merge_words(strip_words: List[List[Dict[str, Any]]], strips: List[Strip]) -> List[Dict[str, Any]]:
+    """
+    Unir las palabras de cada franja descartando las duplicadas del solapamiento
+
+    Las líneas de Tesseract se numeran por franja, así que la clave de línea se
+    antepone con el índice de la franja para que no se mezclen entre franjas.
+    """
+    merged = []
+    for index, (words, strip) in enumerate(zip(strip_words, strips)):
+        for word in words:
+            if strip.owns(word["bbox"]):
+                merged.append(dict(word, line=(index,) + tuple(word["line"])))
+    return merged
@@ -0,0 +1,131 @@
+"""
+Medición de tiempos por etapa del procesamiento
+
+StageTimer registra la duración de cada etapa de un documento (spans que se
+pueden anidar, p. ej. cada llamada OCR dentro de la etapa de OCR por región) y
+TimingAggregator acumula esos tiempos en memoria por tipo de documento.
+"""
+import re
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+from utils.stats_utils import summarize
+
+_PSM_PATTERN = re.compile(r'--psm\s+(\d+)')
+
+def ocr_psm(config: str) -> str:
+    """PSM de una configuración de Tesseract ('6', '13', ... o 'default')"""
+    match = _PSM_PATTERN.search(config or '')
+    return match.group(1) if match else "default"
+
+def ocr_span_name(config: str) -> str:
+    """Nombre del span de una llamada OCR según su PSM (ej. 'ocr.psm_6')"""
+    psm = ocr_psm(config)
+    return f"ocr.psm_{psm}" if psm != "default" else "ocr.default"
+
+class StageTimer:
+    """Acumulador de tiempos por etapa para un único documento"""
+
+    __slots__ = ('timings', 'calls')
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+
+    def add(self, stage: str, seconds: float):
+        """Sumar una duración a la etapa (una etapa puede ejecutarse varias veces)"""
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    @contextmanager
+    def span(self, stage: str):
+        """Medir el bloque de código como una ejecución de la etapa"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def as_dict(self) -> Dict[str, float]:
+        """Tiempos por etapa redondeados para la respuesta"""
+        return {stage: round(seconds, 6) for stage, seconds in self.timings.items()}
+
+    def format(self) -> str:
+        """Resumen de una línea para los logs"""
+        return " ".join(
+            f"{stage}={seconds:.3f}s" + (f"(x{self.calls[stage]})" if self.calls[stage] > 1 else "")
+            for stage, seconds in self.timings.items()
+        )
+
+class TimingAggregator:
+    """Agregado en memoria de tiempos por tipo de documento y etapa"""
+
+    def __init__(self, max_samples: int = 1000):
+        """
+        Args:
+            max_samples: Muestras guardadas por etapa para calcular percentiles
+        """
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._documents: Dict[str, int] = {}
+
+    def record(self, document_type: str, timer: StageTimer):
+        """Registrar los tiempos de un documento procesado"""
+        with self._lock:
+            self._documents[document_type] = self._documents.get(document_type, 0) + 1
+            stages = self._stats.setdefault(document_type, {})
+            for stage, seconds in timer.timings.items():
+                entry = stages.get(stage)
+                if entry is None:
+                    entry = stages[stage] = {
+                        'calls': 0, 'total_seconds': 0.0, 'samples': deque(maxlen=self.max_samples)
+                    }
+                entry['calls'] += timer.calls[stage]
+                entry['total_seconds'] += seconds
+                entry['samples'].append(seconds)
+
+    def snapshot(self, document_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Obtener los tiempos agregados
+
+        Args:
+            document_type: Filtrar por tipo de documento (ej. 'pdf:A')
+
+        Returns:
+            Diccionario tipo de documento -> {'documents', 'stages'}
+        """
+        with self._lock:
+            selected = {
+                key: (self._documents[key], {stage: dict(entry, samples=list(entry['samples']))
+                                             for stage, entry in stages.items()})
+                for key, stages in self._stats.items()
+                if document_type is None or key == document_type
+            }
+
+        result = {}
+        for key, (documents, stages) in selected.items():
+            result[key] = {
+                'documents': documents,
+                'stages': {
+                    stage: {
+                        'calls': entry['calls'],
+                        'total_seconds': entry['total_seconds'],
+                        'per_document': summarize(entry['samples'])
+                    }
+                    for stage, entry in stages.items()
+                }
+            }
+        return result
+
+    def reset(self):
+        """Borrar los tiempos acumulados"""
+        with self._lock:
+            self._stats.clear()
+            self._documents.clear()
+
+# Instancia global del agregador
+timing_stats = TimingAggregator()
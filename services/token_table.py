@@ -0,0 +1,131 @@
+"""
+Tabla de palabras OCR en arreglos paralelos
+
+image_to_data de Tesseract devuelve, por palabra, el texto, la confianza, la
+posición y los números de bloque/párrafo/línea. Unir las palabras con espacios
+descarta todo eso y el parser tiene que recuperar las filas de la tabla de items
+con expresiones regulares sobre el texto aplanado. TokenTable guarda las
+palabras como columnas de NumPy (una fila por palabra), se arma directamente
+desde el diccionario de image_to_data con operaciones vectorizadas y permite
+agrupar por línea sin recorrer diccionarios.
+
+Para no cambiar a quienes ya consumen las palabras (plantillas de proveedor,
+zonas numéricas, franjas, índice de duplicados), la tabla se comporta como una
+secuencia de diccionarios {"text", "conf", "bbox", "line"} con tipos de Python.
+"""
+from typing import Dict, Any, Iterable, Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+
+Word = Dict[str, Any]
+
+class TokenTable:
+    """Palabras OCR: texto, confianza (0-1), bbox [x1, y1, x2, y2] e ids de línea"""
+
+    __slots__ = ("text", "conf", "bbox", "line_ids")
+
+    def __init__(self, text: Sequence[str], conf: np.ndarray, bbox: np.ndarray, line_ids: np.ndarray):
+        self.text = np.asarray(text, dtype=object).reshape(-1)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        self.bbox = np.asarray(bbox, dtype=np.int32).reshape(-1, 4)
+        # (bloque, párrafo, línea) de Tesseract; con franjas se antepone el índice de la franja
+        line_ids = np.asarray(line_ids, dtype=np.int32)
+        self.line_ids = line_ids.reshape(len(self.text), -1) if line_ids.size else line_ids.reshape(0, 3)
+
+    @classmethod
+    def empty(cls) -> "TokenTable":
+        return cls([], np.zeros(0), np.zeros((0, 4)), np.zeros((0, 3)))
+
+    @classmethod
+    def from_tesseract(cls, data: Dict[str, List[Any]], offset: Tuple[int, int] = (0, 0)) -> "TokenTable":
+        """
+        Armar la tabla desde la salida de image_to_data (Output.DICT)
+
+        Args:
+            offset: (x, y) de la región dentro de la página, para llevar las posiciones a la página
+
+        Se descartan las entradas con confianza <= 0 (niveles de página, bloque y línea, y palabras vacías).
+        """
+        conf = np.asarray(data['conf'], dtype=np.float64).astype(np.int64)
+        keep = conf > 0
+        left = np.asarray(data['left'], dtype=np.int32)[keep] + offset[0]
+        top = np.asarray(data['top'], dtype=np.int32)[keep] + offset[1]
+        bbox = np.stack([left, top, left + np.asarray(data['width'], dtype=np.int32)[keep],
+                         top + np.asarray(data['height'], dtype=np.int32)[keep]], axis=1)
+        line_ids = np.stack([np.asarray(data[key], dtype=np.int32)[keep]
+                             for key in ('block_num', 'par_num', 'line_num')], axis=1)
+        text = np.asarray(data['text'], dtype=object)[keep]
+        return cls(text, conf[keep] / 100.0, bbox, line_ids)
+
+    @classmethod
+    def from_words(cls, words: Iterable[Word]) -> "TokenTable":
+        """Armar la tabla desde palabras en diccionarios (formato de extract_words_from_region)"""
+        words = list(words)
+        if not words:
+            return cls.empty()
+        width = max(len(tuple(word["line"])) for word in words)
+        # Las claves de línea más cortas se completan a la izquierda para formar una matriz
+        line_ids = [(-1,) * (width - len(tuple(word["line"]))) + tuple(word["line"]) for word in words]
+        return cls([word["text"] for word in words], [word["conf"] for word in words],
+                   [word["bbox"] for word in words], line_ids)
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def __getitem__(self, index: int) -> Word:
+        return {
+            "text": self.text[index],
+            "conf": float(self.conf[index]),
+            "bbox": self.bbox[index].tolist(),
+            "line": tuple(self.line_ids[index].tolist())
+        }
+
+    def __iter__(self) -> Iterator[Word]:
+        boxes = self.bbox.tolist()
+        lines = [tuple(line) for line in self.line_ids.tolist()]
+        for text, conf, bbox, line in zip(self.text.tolist(), self.conf.tolist(), boxes, lines):
+            yield {"text": text, "conf": conf, "bbox": bbox, "line": line}
+
+    def select(self, indices: Union[np.ndarray, List[int]]) -> "TokenTable":
+        """Subtabla con las palabras indicadas (índices o máscara booleana)"""
+        return TokenTable(self.text[indices], self.conf[indices], self.bbox[indices], self.line_ids[indices])
+
+    def joined_text(self) -> str:
+        """Texto de las palabras unidas con espacios (el formato de extract_text_from_region)"""
+        return ' '.join(self.text.tolist()).strip()
+
+    def mean_confidence(self) -> float:
+        return float(self.conf.mean()) if len(self) else 0.0
+
+    def rows(self) -> List[np.ndarray]:
+        """
+        Índices de las palabras de cada línea de Tesseract, en orden de lectura
+
+        Las líneas se ordenan por la primera fila de píxeles que ocupan (y después por
+        su borde izquierdo) y las palabras de cada línea de izquierda a derecha.
+        """
+        if not len(self):
+            return []
+        _, line_index = np.unique(self.line_ids, axis=0, return_inverse=True)
+        line_index = line_index.reshape(-1)
+        count = int(line_index.max()) + 1
+        line_top = np.full(count, np.iinfo(np.int32).max, dtype=np.int32)
+        line_left = np.full(count, np.iinfo(np.int32).max, dtype=np.int32)
+        np.minimum.at(line_top, line_index, self.bbox[:, 1])
+        np.minimum.at(line_left, line_index, self.bbox[:, 0])
+
+        line_rank = np.empty(count, dtype=np.int64)
+        line_rank[np.lexsort((line_left, line_top))] = np.arange(count)
+        order = np.lexsort((self.bbox[:, 0], line_rank[line_index]))
+        bounds = np.flatnonzero(np.diff(line_rank[line_index][order])) + 1
+        return np.split(order, bounds)
+
+    def row_texts(self) -> List[List[str]]:
+        """Palabras de cada línea, en orden de lectura"""
+        return [self.text[row].tolist() for row in self.rows()]
+
+def as_token_table(words: Union[TokenTable, Iterable[Word], None]) -> TokenTable:
+    """La misma tabla, o una nueva armada desde palabras en diccionarios"""
+    if isinstance(words, TokenTable):
+        return words
+    return TokenTable.from_words(words or [])
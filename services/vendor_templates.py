@@ -0,0 +1,408 @@
+"""
+Caché de plantillas de layout por proveedor (CUIT del vendedor)
+
+La mayor parte del volumen viene de proveedores recurrentes cuyo formato de
+factura no cambia. Cuando una factura se parsea bien con el OCR de página
+completa, se guarda una plantilla con la ubicación de cada campo y de la tabla
+de items, relativa al tamaño de la página. En los documentos siguientes del
+mismo proveedor se hace OCR solo de esas regiones, con una configuración
+adecuada a cada campo, en lugar del OCR de página completa con varios PSM. Si
+los valores leídos no validan (formato de cada campo, CUIT releído en su propia
+región y subtotal + IVA = importe total), el procesador vuelve al camino
+completo y la plantilla se vuelve a aprender.
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from services.telemetry import CACHE_REQUESTS_TOTAL, VENDOR_TEMPLATE_TIME_SAVED
+
+logger = logging.getLogger(__name__)
+
+CACHE_NAME = "vendor_template"
+
+CUIT_PATTERN = re.compile(r'\d{2}-\d{8}-\d')
+AMOUNT_PATTERN = r'\d[\d.,]*\d'
+
+# Formato de los valores numéricos; un valor leído en su región que no lo cumple invalida la plantilla
+FIELD_FORMATS = {
+    'cuit_vendedor': CUIT_PATTERN.pattern,
+    'cuit_comprador': CUIT_PATTERN.pattern,
+    'fecha_emision': r'\d{1,2}[/\-.]\d{1,2}[/\-.]\d{2,4}',
+    'subtotal': AMOUNT_PATTERN,
+    'iva': AMOUNT_PATTERN,
+    'importe_total': AMOUNT_PATTERN,
+    'numero_factura': r'\d{3,}',
+    'punto_venta': r'\d{3,5}'
+}
+
+# Diferencia admitida entre subtotal + IVA y el importe total (redondeo de cada importe)
+AMOUNT_TOLERANCE = 0.02
+
+# Sin estas regiones no se puede validar una lectura por plantilla
+REQUIRED_FIELDS = ('cuit_vendedor', 'subtotal', 'importe_total')
+
+TEXT_FIELDS = ('razon_social_vendedor', 'razon_social_comprador', 'condicion_iva_comprador', 'condicion_venta')
+
+# Los importes y números se repiten en la página (un importe de item puede coincidir
+# con el IVA): solo se aprende su ubicación si la línea tiene una etiqueta del campo
+FIELD_LABELS = {
+    'cuit_vendedor': ('cuit',),
+    'cuit_comprador': ('dni', 'cuit'),
+    'fecha_emision': ('fecha', 'emision', 'emisión'),
+    'subtotal': ('subtotal', 'neto'),
+    'iva': ('iva',),
+    'importe_total': ('total',),  # 'Importe Total'; no 'Importe Otros Tributos'
+    'numero_factura': ('nro', 'numero', 'número', 'nº', 'comp'),
+    'punto_venta': ('punto', 'venta', 'pv')
+}
+
+# Configuración de Tesseract por tipo de región: los campos son una sola línea (las
+# regiones numéricas se leen con lista blanca, ver services/numeric_ocr.py)
+FIELD_OCR_CONFIG = {
+    "text": "--psm 7 --oem 3",
+    "items": "--psm 6 --oem 3"
+}
+
+# Zona del CUIT de los proveedores conocidos (puede abarcar varias líneas)
+PROBE_OCR_CONFIG = "--psm 6 --oem 3"
+
+# Campos que no se ubican en la página pero son constantes por proveedor
+CONSTANT_FIELDS = ('tipo_factura',)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vendor_templates (
+    cuit TEXT PRIMARY KEY,
+    template TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    fallbacks INTEGER NOT NULL DEFAULT 0,
+    time_saved_seconds REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_used_at REAL
+);
+"""
+
+Word = Dict[str, Any]
+BBox = List[int]
+
+def normalize_word(text: str) -> str:
+    """Palabra en minúsculas, sin puntuación (para comparar valores y etiquetas)"""
+    return re.sub(r'[^0-9a-záéíóúñ]', '', text.lower())
+
+def has_label(word: str, labels: Tuple[str, ...]) -> bool:
+    """Si la palabra normalizada es una de las etiquetas ('subtotal' no cuenta como 'total')"""
+    return any(word.startswith(label) for label in labels)
+
+def _union(boxes: List[BBox]) -> BBox:
+    return [min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)]
+
+def group_lines(words: List[Word]) -> List[List[Word]]:
+    """Agrupar palabras por línea de Tesseract, en orden de lectura"""
+    lines: Dict[Any, List[Word]] = {}
+    for word in words:
+        lines.setdefault(word["line"], []).append(word)
+    ordered = [sorted(line, key=lambda w: w["bbox"][0]) for line in lines.values()]
+    return sorted(ordered, key=lambda line: (min(w["bbox"][1] for w in line), line[0]["bbox"][0]))
+
+def locate_value(lines: List[List[Word]], value: str,
+                 labels: Tuple[str, ...] = ()) -> Optional[Tuple[int, int, int]]:
+    """
+    Ubicar un valor en las palabras OCR
+
+    Returns:
+        (línea, primera palabra, última palabra) de la primera aparición; si se pasan
+        etiquetas, la línea debe contener alguna antes del valor
+    """
+    target = normalize_word(value)
+    if len(target) < 3:
+        return None
+    for line_index, line in enumerate(lines):
+        normalized = [normalize_word(w["text"]) for w in line]
+        for start in range(len(line)):
+            joined = ""
+            for end in range(start, len(line)):
+                joined += normalized[end]
+                if target in joined:
+                    break
+            else:
+                continue
+            if target in joined[len(normalized[start]):]:
+                continue  # El valor empieza en una palabra posterior
+            if labels and not any(has_label(word, labels) for word in normalized[:end + 1]):
+                continue
+            return line_index, start, end
+    return None
+
+def value_slot(line: List[Word], start: int, end: int, width: int) -> BBox:
+    """
+    Región donde se espera el valor en otros documentos del proveedor: el espacio
+    entre la palabra anterior y la siguiente de la línea, para tolerar valores más
+    largos o más cortos
+    """
+    box = _union([w["bbox"] for w in line[start:end + 1]])
+    height = box[3] - box[1]
+    left = line[start - 1]["bbox"][2] + 1 if start > 0 else max(0, box[0] - 2 * height)
+    right = line[end + 1]["bbox"][0] - 1 if end + 1 < len(line) else min(width, box[2] + (box[2] - box[0]))
+    pad = max(1, height // 3)
+    return [left, max(0, box[1] - pad), right, box[3] + pad]
+
+def build_template(cuit: str, words: List[Word], extracted_fields: Dict[str, Any],
+                   page_size: Tuple[int, int]) -> Dict[str, Any]:
+    """
+    Construir la plantilla de un proveedor a partir de las palabras del OCR de
+    página completa y de los campos que el parser extrajo de ese texto
+
+    Args:
+        cuit: CUIT del vendedor
+        words: Palabras OCR con text, bbox [x1, y1, x2, y2] y line
+        extracted_fields: Campos de la factura (parse_invoice)
+        page_size: (ancho, alto) de la imagen procesada
+    """
+    width, height = page_size
+    lines = group_lines(words)
+    fields = {}
+    field_lines = {}
+
+    for name, value in extracted_fields.items():
+        if name not in FIELD_FORMATS and name not in TEXT_FIELDS:
+            continue
+        location = locate_value(lines, str(value), FIELD_LABELS.get(name, ()))
+        if location is None:
+            continue
+        line_index, start, end = location
+        slot = value_slot(lines[line_index], start, end, width)
+        fields[name] = {
+            "bbox": [slot[0] / width, slot[1] / height, slot[2] / width, slot[3] / height],
+            "kind": "numeric" if name in FIELD_FORMATS else "text"
+        }
+        field_lines[name] = line_index
+
+    # Tabla de items: desde la primera línea con items hasta el siguiente campo (o el final de la página)
+    items_region = None
+    item_lines = set()
+    for item in extracted_fields.get('items') or []:
+        # La descripción llega limpia (sin preposiciones): se ubica el precio en una línea con su primera palabra
+        description = [normalize_word(w) for w in item.get('descripcion', '').split() if len(w) >= 3]
+        location = locate_value(lines, item.get('precio_unitario', ''), tuple(description[:1]))
+        if description and location is not None:
+            item_lines.add(location[0])
+    if item_lines:
+        top = min(w["bbox"][1] for w in lines[min(item_lines)])
+        last_bottom = max(w["bbox"][3] for w in lines[max(item_lines)])
+        below = [fields[name]["bbox"][1] * height for name, index in field_lines.items() if index > max(item_lines)]
+        bottom = min(below) if below else height
+        items_region = [0.0, max(0, top - 2) / height, 1.0, max(bottom, last_bottom) / height]
+
+    return {
+        "cuit": cuit,
+        "page_size": [width, height],
+        "fields": fields,
+        "items": items_region,
+        "constants": {name: extracted_fields[name] for name in CONSTANT_FIELDS if name in extracted_fields}
+    }
+
+def extract_value(field: str, text: str) -> Optional[str]:
+    """Valor de un campo en el texto de su región (None si no tiene el formato esperado)"""
+    if field in FIELD_FORMATS:
+        match = re.search(FIELD_FORMATS[field], text)
+        return match.group(0) if match else None
+    value = re.sub(r'[^a-zA-ZÁÉÍÓÚÑáéíóúñ\s\.]', '', text)
+    value = re.sub(r'\s+', ' ', value).strip(' .')
+    return value[:50].strip() if len(value) > 2 else None
+
+def parse_amount(text: str) -> Optional[float]:
+    """Importe como número (26.667,60, 26,667.60, 26667,60 o 26667.60); None si no se puede leer"""
+    text = text.replace('$', '').strip()
+    if '.' in text and ',' in text:
+        # El último separador es el decimal
+        text = text.replace('.', '').replace(',', '.') if text.rfind(',') > text.rfind('.') else text.replace(',', '')
+    else:
+        text = text.replace(',', '.')
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def amounts_consistent(fields: Dict[str, Any]) -> bool:
+    """Si subtotal + IVA coincide con el importe total (sin IVA, p. ej. factura C, debe ser igual al subtotal)"""
+    subtotal = parse_amount(str(fields.get('subtotal', '')))
+    total = parse_amount(str(fields.get('importe_total', '')))
+    iva = parse_amount(str(fields['iva'])) if fields.get('iva') else 0.0
+    if subtotal is None or total is None or iva is None:
+        return False
+    return abs(subtotal + iva - total) <= AMOUNT_TOLERANCE
+
+def template_regions(template: Dict[str, Any], width: int, height: int) -> List[Tuple[str, BBox, str]]:
+    """Regiones a leer con la plantilla: (campo o 'items', bbox en píxeles, tipo: numeric/text/items)"""
+    def to_pixels(box):
+        return [int(box[0] * width), int(box[1] * height), int(round(box[2] * width)), int(round(box[3] * height))]
+
+    regions = [
+        (name, to_pixels(field["bbox"]), field["kind"])
+        for name, field in template["fields"].items()
+    ]
+    if template.get("items"):
+        regions.append(("items", to_pixels(template["items"]), "items"))
+    return sorted(regions, key=lambda region: (region[1][1], region[1][0]))
+
+class VendorTemplateCache:
+    """Plantillas de layout por CUIT, persistidas en SQLite y cacheadas en memoria"""
+
+    def __init__(self, db_path: str = ":memory:", min_fields: int = 4):
+        """
+        Args:
+            db_path: Ruta de la base SQLite (":memory:" para no persistir)
+            min_fields: Campos ubicados como mínimo para guardar una plantilla
+        """
+        self.db_path = db_path
+        self.min_fields = min_fields
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+            rows = self._conn.execute("SELECT cuit, template FROM vendor_templates").fetchall()
+        self._templates: Dict[str, Dict[str, Any]] = {row["cuit"]: json.loads(row["template"]) for row in rows}
+        self.misses = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def get(self, cuit: str) -> Optional[Dict[str, Any]]:
+        return self._templates.get(cuit)
+
+    def probe_region(self, width: int, height: int) -> Optional[BBox]:
+        """Región donde buscar el CUIT del vendedor: unión de las ubicaciones conocidas"""
+        boxes = [t["fields"]["cuit_vendedor"]["bbox"] for t in list(self._templates.values())
+                 if "cuit_vendedor" in t["fields"]]
+        if not boxes:
+            return None
+        box = _union(boxes)
+        return [int(box[0] * width), int(box[1] * height), int(round(box[2] * width)), int(round(box[3] * height))]
+
+    def find_vendor(self, text: str) -> Optional[str]:
+        """Primer CUIT del texto que tiene plantilla"""
+        for match in CUIT_PATTERN.finditer(text):
+            if match.group(0) in self._templates:
+                return match.group(0)
+        return None
+
+    def learn(self, cuit: str, words: List[Word], extracted_fields: Dict[str, Any],
+              page_size: Tuple[int, int], baseline_seconds: float) -> Optional[Dict[str, Any]]:
+        """
+        Guardar (o reemplazar) la plantilla del proveedor
+
+        Args:
+            baseline_seconds: Duración del OCR de página completa y el parsing de este
+                documento; se usa para estimar el tiempo ahorrado en los hits
+
+        Returns:
+            Plantilla guardada, o None si se ubicaron menos de min_fields campos, falta
+            alguno de REQUIRED_FIELDS o los importes ubicados no cierran
+        """
+        template = build_template(cuit, words, extracted_fields, page_size)
+        located = template["fields"]
+        if len(located) < self.min_fields or any(name not in located for name in REQUIRED_FIELDS):
+            logger.info(f"Plantilla de {cuit} no guardada: {len(located)} campos ubicados")
+            return None
+        if not amounts_consistent({name: extracted_fields[name] for name in located}):
+            logger.info(f"Plantilla de {cuit} no guardada: subtotal + IVA ubicados no coinciden con el total")
+            return None
+        previous = self._templates.get(cuit)
+        if previous:
+            # Promedio móvil para no depender de un único documento
+            baseline_seconds = 0.7 * previous["baseline_seconds"] + 0.3 * baseline_seconds
+        template["baseline_seconds"] = baseline_seconds
+
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO vendor_templates (cuit, template, created_at, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(cuit) DO UPDATE SET template = excluded.template, updated_at = excluded.updated_at",
+                (cuit, json.dumps(template), now, now)
+            )
+            self._templates[cuit] = template
+        logger.info(f"Plantilla de proveedor {'actualizada' if previous else 'aprendida'}: {cuit} "
+                    f"({', '.join(template['fields'])}{', items' if template['items'] else ''})")
+        return template
+
+    def record_hit(self, cuit: str, seconds: float) -> float:
+        """Registrar un documento leído con la plantilla; devuelve el tiempo ahorrado estimado"""
+        template = self._templates.get(cuit) or {}
+        saved = max(0.0, template.get("baseline_seconds", 0.0) - seconds)
+        CACHE_REQUESTS_TOTAL.inc(CACHE_NAME, "hit")
+        VENDOR_TEMPLATE_TIME_SAVED.inc(amount=saved)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE vendor_templates SET hits = hits + 1, time_saved_seconds = time_saved_seconds + ?, "
+                "last_used_at = ? WHERE cuit = ?", (saved, time.time(), cuit)
+            )
+        return saved
+
+    def record_fallback(self, cuit: str, reason: str):
+        """Registrar una plantilla cuyos valores no validaron (se usa la página completa)"""
+        CACHE_REQUESTS_TOTAL.inc(CACHE_NAME, "fallback")
+        logger.info(f"Plantilla de {cuit} descartada para este documento: {reason}")
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE vendor_templates SET fallbacks = fallbacks + 1, last_used_at = ? WHERE cuit = ?",
+                (time.time(), cuit)
+            )
+
+    def record_miss(self):
+        """Registrar un documento sin plantilla para su proveedor"""
+        CACHE_REQUESTS_TOTAL.inc(CACHE_NAME, "miss")
+        with self._lock:
+            self.misses += 1
+
+    def delete(self, cuit: str) -> bool:
+        with self._lock, self._conn:
+            deleted = self._conn.execute("DELETE FROM vendor_templates WHERE cuit = ?", (cuit,)).rowcount
+            self._templates.pop(cuit, None)
+        return bool(deleted)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Plantillas con sus contadores de uso"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM vendor_templates ORDER BY hits DESC").fetchall()
+        return [{
+            "cuit": row["cuit"],
+            "fields": sorted(json.loads(row["template"])["fields"]),
+            "has_items": json.loads(row["template"])["items"] is not None,
+            "hits": row["hits"],
+            "fallbacks": row["fallbacks"],
+            "time_saved_seconds": round(row["time_saved_seconds"], 3),
+            "updated_at": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row["updated_at"]))
+        } for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """Tasa de aciertos y tiempo ahorrado"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) AS templates, COALESCE(SUM(hits), 0) AS hits, "
+                "COALESCE(SUM(fallbacks), 0) AS fallbacks, COALESCE(SUM(time_saved_seconds), 0) AS saved "
+                "FROM vendor_templates"
+            ).fetchone()
+            misses = self.misses
+        lookups = row["hits"] + row["fallbacks"] + misses
+        return {
+            "templates": row["templates"],
+            "hits": row["hits"],
+            "fallbacks": row["fallbacks"],
+            "misses": misses,
+            "hit_rate": round(row["hits"] / lookups, 4) if lookups else None,
+            "time_saved_seconds": round(row["saved"], 3)
+        }
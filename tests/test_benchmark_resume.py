@@ -0,0 +1,131 @@
+"""
+Script para probar el almacén por documento y la reanudación del benchmark del dataset
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmark_dataset import DatasetBenchmark, DocumentResultStore
+from compare_benchmarks import BenchmarkComparator
+from services.batch_processor import BatchProcessor
+
+class CountingBatchProcessor(BatchProcessor):
+    """BatchProcessor sin OCR que cuenta cuántas veces se procesa cada archivo"""
+
+    def __init__(self):
+        self.calls = []
+
+    def _process_single_file(self, file_path, ground_truth_data=None):
+        self.calls.append(os.path.basename(file_path))
+        return {
+            'file_path': file_path,
+            'filename': os.path.basename(file_path),
+            'success': True,
+            'processing_time': 1.0,
+            'confidence_score': 0.5,
+            'metrics': None
+        }
+
+def _create_benchmark(max_workers=2):
+    benchmark = DatasetBenchmark.__new__(DatasetBenchmark)
+    benchmark.max_workers = max_workers
+    benchmark.batch_processor = CountingBatchProcessor()
+    return benchmark
+
+def test_each_document_processed_once():
+    """Cada documento se procesa una vez aunque aparezca en varios lotes"""
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for i in range(6):
+            path = os.path.join(tmp, f"factura_{i}.png")
+            with open(path, 'wb') as f:
+                f.write(b'x' * (i + 1))
+            files.append(path)
+
+        benchmark = _create_benchmark()
+        store = DocumentResultStore(os.path.join(tmp, "store.jsonl"))
+        results = benchmark.process_documents(files, {}, store)
+
+        print(f"Llamadas de procesamiento: {len(benchmark.batch_processor.calls)}")
+        assert sorted(benchmark.batch_processor.calls) == sorted(os.path.basename(f) for f in files)
+
+        for batch_size in (2, 4, 6):
+            view = benchmark.build_batch_view(files[:batch_size], results)
+            print(f"Lote {batch_size}: {view['batch_info']}")
+            assert view['batch_info']['total_files'] == batch_size
+            assert view['performance_metrics']['success_rate'] == 1.0
+            # Tiempo real del pool, no la suma de los processing_time (1 s cada uno) repartida
+            assert not view['batch_info']['time_estimated']
+            assert view['batch_info']['total_processing_time'] < 0.5
+
+def test_resume_skips_stored_documents():
+    """Al reanudar solo se procesan los documentos que faltan en el almacén"""
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for i in range(4):
+            path = os.path.join(tmp, f"factura_{i}.png")
+            with open(path, 'wb') as f:
+                f.write(b'x')
+            files.append(path)
+
+        store_file = os.path.join(tmp, "store.jsonl")
+
+        # Primera ejecución "interrumpida" tras dos documentos
+        first = _create_benchmark()
+        first.process_documents(files[:2], {}, DocumentResultStore(store_file))
+
+        # Simular una escritura incompleta al final del archivo
+        with open(store_file, 'a', encoding='utf-8') as f:
+            f.write('{"key": "factura_2.png", "fingerp')
+
+        second = _create_benchmark()
+        results = second.process_documents(files, {}, DocumentResultStore(store_file))
+
+        print(f"Procesados al reanudar: {second.batch_processor.calls}")
+        assert sorted(second.batch_processor.calls) == ['factura_2.png', 'factura_3.png']
+        assert len(results) == 4
+
+        # Con documentos reutilizados el tiempo del lote es estimado y no entra en la comparación
+        view = second.build_batch_view(files, results)
+        assert view['batch_info']['time_estimated'] and view['batch_info']['total_processing_time'] == 2.0
+        assert BenchmarkComparator()._normalize_batch(view, "lote")['throughput'] is None
+
+def test_results_from_other_versions_are_not_reused():
+    """Resultados de otra versión del código o de una ejecución terminada no se reportan como nuevos"""
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset_dir = os.path.join(tmp, "dataset")
+        os.makedirs(dataset_dir)
+        files = []
+        for i in range(3):
+            path = os.path.join(dataset_dir, f"factura_{i}.png")
+            with open(path, 'wb') as f:
+                f.write(b'x')
+            files.append(path)
+
+        store_file = os.path.join(tmp, "store.jsonl")
+        old = _create_benchmark()
+        old.process_documents(files, {}, DocumentResultStore(store_file, version="anterior"))
+
+        current = _create_benchmark()
+        current.process_documents(files, {}, DocumentResultStore(store_file, version="actual"))
+        print(f"Procesados con otra versión: {current.batch_processor.calls}")
+        assert len(current.batch_processor.calls) == 3
+
+        # Una ejecución completa archiva el almacén: la siguiente vuelve a medir todo
+        output_dir = os.path.join(tmp, "resultados")
+        for _ in range(2):
+            benchmark = _create_benchmark()
+            benchmark.completion_times = {}
+            benchmark.run_dataset_benchmark(dataset_dir, batch_sizes=[3], output_dir=output_dir)
+            assert len(benchmark.batch_processor.calls) == 3
+        assert not os.path.exists(os.path.join(output_dir, "dataset_document_results.jsonl"))
+        assert os.path.exists(os.path.join(output_dir, "dataset_document_results.jsonl.completed"))
+
+if __name__ == "__main__":
+    test_each_document_processed_once()
+    test_resume_skips_stored_documents()
+    test_results_from_other_versions_are_not_reused()
@@ -0,0 +1,152 @@
+"""
+Script para probar el comparador de benchmarks (gate de regresión)
+"""
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmark_dataset import DatasetBenchmark
+from compare_benchmarks import BenchmarkComparator
+from services.batch_processor import BatchProcessor
+
+def _batch_result(throughput, latencies, field_accuracy=0.8):
+    """Crear un resultado con el formato de BatchProcessor"""
+    return {
+        'batch_info': {'total_files': len(latencies)},
+        'performance_metrics': {
+            'throughput': throughput,
+            'success_rate': 1.0,
+            'accuracy_metrics': {'avg_field_accuracy': field_accuracy, 'avg_cer': 0.3, 'avg_wer': 0.4}
+        },
+        'individual_results': [{'success': True, 'processing_time': t} for t in latencies]
+    }
+
+class FakeBatchProcessor(BatchProcessor):
+    """BatchProcessor sin OCR con latencia fija por documento"""
+
+    def __init__(self, processing_time):
+        self.processing_time = processing_time
+
+    def _process_single_file(self, file_path, ground_truth_data=None):
+        return {
+            'file_path': file_path,
+            'filename': os.path.basename(file_path),
+            'success': True,
+            'processing_time': self.processing_time,
+            'confidence_score': 0.5,
+            'metrics': None
+        }
+
+def _write_benchmark_results(dataset_dir, output_dir, processing_time):
+    """Generar un directorio benchmark_results/ real con benchmark_dataset.py y un load_test.json"""
+    benchmark = DatasetBenchmark.__new__(DatasetBenchmark)
+    benchmark.max_workers = 2
+    benchmark.batch_processor = FakeBatchProcessor(processing_time)
+    benchmark.run_dataset_benchmark(dataset_dir, batch_sizes=[2, 4, 6, 8], output_dir=output_dir, resume=False)
+
+    load_test = {
+        'summary': {'throughput_rps': 5.0},
+        'requests': [{'ok': True, 'latency': processing_time / 10} for _ in range(5)]
+    }
+    with open(os.path.join(output_dir, "load_test.json"), 'w', encoding='utf-8') as f:
+        json.dump(load_test, f)
+
+def _runs(comparator, results):
+    runs = []
+    for i, result in enumerate(results):
+        runs.extend(comparator._normalize(result, f"run_{i}"))
+    return runs
+
+def test_detects_latency_regression():
+    """Una subida clara y repetida de latencia se marca como regresión"""
+    comparator = BenchmarkComparator(max_latency_increase=0.10)
+    old = _runs(comparator, [_batch_result(0.5, [2.0, 2.1, 1.9, 2.0, 2.05]) for _ in range(3)])
+    new = _runs(comparator, [_batch_result(0.3, [3.0, 3.2, 2.9, 3.1, 3.05]) for _ in range(3)])
+
+    comparison = comparator.compare(old, new)
+    print(comparator.generate_report(comparison))
+    assert not comparison['passed']
+    assert comparison['latency']['regression']
+    assert comparison['throughput']['regression']
+
+def test_noise_is_not_regression():
+    """Variaciones dentro del umbral no fallan el gate"""
+    comparator = BenchmarkComparator()
+    old = _runs(comparator, [_batch_result(0.50, [2.0, 2.2, 1.8, 2.1]), _batch_result(0.52, [2.1, 1.9, 2.0, 2.0])])
+    new = _runs(comparator, [_batch_result(0.49, [2.05, 2.1, 1.9, 2.0]), _batch_result(0.51, [2.0, 2.0, 2.1, 1.95])])
+
+    comparison = comparator.compare(old, new)
+    print(comparator.generate_report(comparison))
+    assert comparison['passed']
+
+def test_accuracy_gate_and_stage_format():
+    """La caída de precisión solo falla si se configura un umbral; se soporta el formato por etapas"""
+    comparator = BenchmarkComparator(max_accuracy_drop=0.05)
+    old = _runs(comparator, [_batch_result(0.5, [2.0, 2.0, 2.0], field_accuracy=0.80)])
+    new = _runs(comparator, [_batch_result(0.5, [2.0, 2.0, 2.0], field_accuracy=0.70)])
+    comparison = comparator.compare(old, new)
+    assert not comparison['passed']
+    assert abs(comparison['accuracy']['field_accuracy']['delta'] + 0.10) < 1e-9
+
+    stages = {
+        'run_info': {},
+        'stages': {},
+        'documents': {'a.png': {'seconds': {'preprocessing': [0.1, 0.1, 0.1], 'full_page_ocr': [1.0, 1.1, 0.9]}}}
+    }
+    run = comparator._normalize(stages, 'stages.json')[0]
+    print(f"Corrida por etapas: {run}")
+    assert run['kind'] == 'stages'
+    assert len(run['latencies']) == 3
+    assert set(run['stages']) == {'preprocessing', 'full_page_ocr'}
+
+def test_benchmark_results_directory():
+    """Un directorio de benchmark_dataset.py cuenta como una corrida por tipo y no se mezclan tipos"""
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset_dir = os.path.join(tmp, "dataset")
+        os.makedirs(dataset_dir)
+        for i in range(8):
+            with open(os.path.join(dataset_dir, f"factura_{i}.png"), 'wb') as f:
+                f.write(b'x')
+
+        old_dir = os.path.join(tmp, "old")
+        new_dir = os.path.join(tmp, "new")
+        _write_benchmark_results(dataset_dir, old_dir, 1.0)
+        _write_benchmark_results(dataset_dir, new_dir, 1.0)
+        print(f"Archivos de resultados: {sorted(os.listdir(old_dir))}")
+        assert "dataset_benchmark_results.json" in os.listdir(old_dir)
+
+        comparator = BenchmarkComparator()
+        old = comparator.load_runs([old_dir])
+        new = comparator.load_runs([new_dir])
+        print(f"Corridas cargadas: {[run['source'] for run in old]}")
+
+        # Ni el consolidado ni los lotes prefijo cuentan como réplicas
+        groups = comparator.group_by_kind(old)
+        assert sorted(groups) == ['batch', 'load_test']
+        assert len(groups['batch']) == 1 and len(groups['load_test']) == 1
+        assert groups['batch'][0]['source'].endswith("dataset_batch_8_results.json")
+        assert groups['batch'][0]['documents'] == 8
+
+        try:
+            comparator.compare(old, new)
+            assert False, "Se esperaba ValueError al mezclar tipos de corrida"
+        except ValueError:
+            pass
+
+        new_groups = comparator.group_by_kind(new)
+        for kind in groups:
+            comparison = comparator.compare(groups[kind], new_groups[kind])
+            print(comparator.generate_report(comparison))
+            assert comparison['kind'] == kind
+            assert comparison['latency']['old_samples'] == (8 if kind == 'batch' else 5)
+
+if __name__ == "__main__":
+    test_detects_latency_regression()
+    test_noise_is_not_regression()
+    test_accuracy_gate_and_stage_format()
+    test_benchmark_results_directory()
@@ -0,0 +1,89 @@
+"""
+Script para probar la corrección de orientación e inclinación de la página
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.advanced_image_processor import AdvancedImageProcessor
+from services.deskew import correct_page, estimate_skew
+from services.telemetry import PAGE_CORRECTIONS_TOTAL
+from services.timing import StageTimer
+
+def _page():
+    """Página sintética: renglones de 'palabras' negras sobre fondo blanco"""
+    rng = np.random.default_rng(1)
+    page = Image.new("L", (1700, 2200), color=255)
+    draw = ImageDraw.Draw(page)
+    for y in range(150, 2000, 60):
+        x = 120
+        while x < 1500:
+            width = int(rng.integers(40, 180))
+            draw.rectangle([x, y, x + width, y + 22], fill=0)
+            x += width + 25
+    return page
+
+def _rotate(page, angle):
+    return page.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+def test_estimate_skew():
+    """El perfil de proyección recupera la inclinación en ambos sentidos"""
+    page = _page()
+    for angle in (7.0, -4.5):
+        small = _rotate(page, angle)
+        small.thumbnail((1200, 1200))
+        skew = estimate_skew(np.asarray(small))
+        print(f"Inclinación {angle}° -> estimada {skew}°")
+        assert abs(skew - angle) <= 0.3
+
+    assert estimate_skew(np.full((400, 300), 255, dtype=np.uint8)) == 0.0  # Página en blanco
+    noise = np.random.default_rng(0).integers(0, 255, (300, 200), dtype=np.uint8)
+    assert estimate_skew(noise) == 0.0  # Sin renglones no se rota
+
+def test_correct_page_orientation():
+    """La orientación de OSD se aplica solo con confianza suficiente"""
+    page = _page()
+    upside_down = page.transpose(Image.ROTATE_180)
+
+    corrected, correction = correct_page(upside_down, detect_orientation=lambda small: (180, 6.0))
+    assert correction == {"orientation": 180, "skew": 0.0}
+    assert np.array_equal(np.asarray(corrected), np.asarray(page))
+
+    corrected, correction = correct_page(upside_down, detect_orientation=lambda small: (180, 0.5))
+    assert correction["orientation"] == 0 and corrected is upside_down
+
+    # Una página apenas inclinada no se rota
+    _, correction = correct_page(_rotate(page, 0.1))
+    assert correction["skew"] == 0.0
+
+def test_preprocess_deskews_page():
+    """El preprocesamiento endereza la página antes de devolverla"""
+    processor = AdvancedImageProcessor()
+    before = PAGE_CORRECTIONS_TOTAL.get("skew")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "foto.png")
+        _rotate(_page(), 6.0).save(path)
+
+        timer = StageTimer()
+        processed = processor.preprocess_image_advanced(path, timer)
+
+    small = Image.fromarray(processed)
+    small.thumbnail((1200, 1200))
+    residual = estimate_skew(np.asarray(small))
+    print(f"Inclinación residual: {residual}° | tiempos: {timer.format()}")
+    assert abs(residual) <= 0.3
+    assert "deskew" in timer.timings
+    assert PAGE_CORRECTIONS_TOTAL.get("skew") == before + 1
+
+if __name__ == "__main__":
+    test_estimate_skew()
+    test_correct_page_orientation()
+    test_preprocess_deskews_page()
+    print("[OK] Corrección de orientación e inclinación verificada")
@@ -0,0 +1,182 @@
+"""
+Script para probar la detección de facturas duplicadas por hash perceptual
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.advanced_image_processor import AdvancedImageProcessor
+from services.duplicate_index import DuplicateIndex, VERIFICATION_FIELDS, hamming, image_fingerprint
+from services.numeric_ocr import NUMERIC_OCR_CONFIG
+
+LINES = [
+    (30, ["FACTURA", "A", "Comercial", "Sur", "SRL"]),
+    (72, ["Punto", "de", "Venta:", "0004", "Comp.", "Nro:", "00001234"]),
+    (114, ["CUIT:", "30-71234567-8"]),
+    (156, ["Fecha:", "01/02/2024"]),
+    (198, ["Subtotal:", "$", "10.000,00"]),
+    (240, ["IVA", "21%:", "$", "2.100,00"]),
+    (282, ["Importe", "Total:", "$", "12.100,00"])
+]
+
+def _words():
+    words = []
+    for index, (y, texts) in enumerate(LINES):
+        x = 20
+        for text in texts:
+            words.append({"text": text, "conf": 0.9, "bbox": [x, y, x + 12 * len(text), y + 24], "line": (1, index, 1)})
+            x += 12 * len(text) + 14
+    return words
+
+def _scan(shift=0, noise=0.0, seed=0, words=None):
+    """Página con un rectángulo por palabra; shift/noise simulan un reescaneo"""
+    page = Image.new("L", (480, 360), color=235)
+    draw = ImageDraw.Draw(page)
+    for word in words or _words():
+        x1, y1, x2, y2 = word["bbox"]
+        draw.rectangle([x1 + shift, y1 + shift, x2 + shift, y2 + shift], fill=40)
+    pixels = np.asarray(page, dtype=np.float64)
+    pixels += np.random.default_rng(seed).normal(0, noise, pixels.shape)
+    return np.clip(pixels, 0, 255).astype(np.uint8)
+
+def test_fingerprint_tolerates_rescans():
+    """Un reescaneo queda cerca y otra factura queda lejos"""
+    original = image_fingerprint(_scan())
+    rescan = image_fingerprint(_scan(shift=2, noise=8.0, seed=1))
+    other_words = [dict(w, bbox=[w["bbox"][0] + 150 * (i % 2), w["bbox"][1], w["bbox"][2] + 150 * (i % 2), w["bbox"][3]])
+                   for i, w in enumerate(_words())]
+    other = image_fingerprint(_scan(words=other_words))
+
+    near = [hamming(a, b) for a, b in zip(original, rescan)]
+    far = [hamming(a, b) for a, b in zip(original, other)]
+    print(f"Distancias reescaneo: {near} | otra factura: {far}")
+    assert max(near) <= 4
+    assert max(far) > 4
+
+def test_index_persists_and_evicts():
+    """El índice encuentra el documento más cercano, persiste y descarta los más antiguos"""
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "documents.db")
+        index = DuplicateIndex(db_path, max_distance=4, max_entries=2)
+        zones = {"importe_total": {"value": "100,00", "bbox": [0.1, 0.2, 0.3, 0.4]}}
+        first = index.add((0x0F0F, 0xFF00), "a.png", {"success": True}, "texto a", 0.9, "100,00", zones)
+        index.add((0xFFFF_0000_0000_0000, 0x1234), "b.png", {"success": True}, "texto b", 0.9)
+
+        match = index.find((0x0F0E, 0xFF01))
+        assert match["id"] == first and match["distance"] == 1
+        assert match["zones"] == zones and match["raw_text"] == "texto a"
+        assert index.find((0xF0F0, 0x00FF)) is None
+        index.close()
+
+        index = DuplicateIndex(db_path, max_distance=4, max_entries=2)
+        assert len(index) == 2 and index.find((0x0F0F, 0xFF00))["id"] == first
+        index.add((0xAAAA, 0xAAAA), "c.png", {"success": True}, "texto c", 0.9)
+        assert len(index) == 2 and index.find((0x0F0F, 0xFF00)) is None  # El más antiguo se descartó
+        index.close()
+
+def test_processor_reuses_verified_duplicate():
+    """Un duplicado con las mismas zonas de verificación reutiliza el parseo; si alguna difiere se procesa completo"""
+    words = _words()
+    index = DuplicateIndex()
+    processor = AdvancedImageProcessor(duplicate_index=index, reuse_duplicates=True)
+    # Lectura de la lista blanca numérica por palabra (el centro de la zona la identifica)
+    readings = {"0004": "0004", "00001234": "00001234", "01/02/2024": "01/02/2024", "12.100,00": "$ 12.100,00"}
+    calls = []
+
+    def extract_words_from_region(image, bbox, timer=None, configs=None):
+        calls.append(tuple(configs or ()))
+        if configs == [NUMERIC_OCR_CONFIG]:
+            center = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+            word = min((w for w in words if w["text"] in readings),
+                       key=lambda w: abs((w["bbox"][0] + w["bbox"][2]) / 2 - center[0]) +
+                       abs((w["bbox"][1] + w["bbox"][3]) / 2 - center[1]))
+            return readings[word["text"]], 0.95, []
+        return " ".join(w["text"] for w in words), 0.9, words
+
+    processor.extract_words_from_region = extract_words_from_region
+
+    with tempfile.TemporaryDirectory() as directory:
+        def process(pixels, name):
+            path = os.path.join(directory, name)
+            Image.fromarray(pixels).save(path)
+            return processor.process_image(path, sections=("invoice_fields",))
+
+        result = process(_scan(), "original.png")
+        assert result.metadata["duplicate"]["result"] == "new"
+        original_id = result.metadata["duplicate"]["document_id"]
+
+        calls.clear()
+        result = process(_scan(shift=2, noise=8.0, seed=1), "reescaneo.png")
+        duplicate = result.metadata["duplicate"]
+        print(f"Reescaneo: {duplicate} | llamadas OCR: {calls}")
+        assert duplicate["result"] == "reused" and duplicate["document_id"] == original_id
+        assert duplicate["original_filename"] == "original.png"
+        assert calls == [(NUMERIC_OCR_CONFIG,)] * 4  # Solo la verificación de las cuatro zonas
+        fields = result.metadata["invoice_parsing"]["invoices"][0]["extracted_fields"]
+        assert fields["importe_total"] == "12.100,00"
+
+        # Mismo layout y mismo total pero otro número de comprobante: no se reutiliza y el documento se indexa
+        readings["00001234"] = "00001235"
+        calls.clear()
+        result = process(_scan(shift=1, noise=6.0, seed=2), "otra.png")
+        assert result.metadata["duplicate"]["result"] == "fallback"
+        assert () in calls  # OCR de página completa
+
+    stats = index.stats()
+    print(f"Estadísticas: {stats}")
+    assert stats["documents"] == 2 and stats["reused"] == 1
+
+def test_reuse_needs_all_zones():
+    """Un documento indexado sin todas las zonas de verificación no se reutiliza"""
+    words = [w for w in _words() if w["line"] != (1, 1, 1)]  # Sin punto de venta ni número
+    index = DuplicateIndex()
+    processor = AdvancedImageProcessor(duplicate_index=index, reuse_duplicates=True)
+    processor.extract_words_from_region = lambda image, bbox, timer=None, configs=None: (
+        " ".join(w["text"] for w in words), 0.9, words
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ("original.png", "reescaneo.png"):
+            path = os.path.join(directory, name)
+            Image.fromarray(_scan(words=words)).save(path)
+            result = processor.process_image(path, sections=("invoice_fields",))
+    assert result.metadata["duplicate"]["result"] == "duplicate"
+    assert index.stats()["reused"] == 0
+    index.close()
+
+def test_without_reuse_only_hashes_and_zones_are_stored():
+    """Sin reutilización el índice no guarda el parseo ni el texto del documento"""
+    words = _words()
+    index = DuplicateIndex()
+    processor = AdvancedImageProcessor(duplicate_index=index)
+    processor.extract_words_from_region = lambda image, bbox, timer=None, configs=None: (
+        " ".join(w["text"] for w in words), 0.9, words
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "original.png")
+        Image.fromarray(_scan()).save(path)
+        result = processor.process_image(path, sections=("invoice_fields",))
+        document = index.get(result.metadata["duplicate"]["document_id"])
+        print(f"Documento indexado: {document}")
+        assert document["invoice_data"] is None and document["raw_text"] is None
+        assert set(document["zones"]) == set(VERIFICATION_FIELDS)
+
+        # Al activar la reutilización, los documentos indexados sin parseo no se reutilizan
+        processor.reuse_duplicates = True
+        result = processor.process_image(path, sections=("invoice_fields",))
+    assert result.metadata["duplicate"]["result"] == "duplicate"
+    index.close()
+
+if __name__ == "__main__":
+    test_fingerprint_tolerates_rescans()
+    test_index_persists_and_evicts()
+    test_processor_reuses_verified_duplicate()
+    test_reuse_needs_all_zones()
+    test_without_reuse_only_hashes_and_zones_are_stored()
+    print("[OK] Detección de duplicados verificada")
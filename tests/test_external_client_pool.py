@@ -0,0 +1,88 @@
+"""
+Script para probar la reutilización de conexiones del cliente de la API externa
+"""
+import sys
+import json
+import asyncio
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from external_api_client import FacturasAPIClient
+
+class _Handler(BaseHTTPRequestHandler):
+    """API externa mínima con keep-alive (HTTP/1.1)"""
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._reply(200, {"status": "ok"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        data = json.loads(self.rfile.read(length) or b"{}")
+        self._reply(201, {"received": data.get("numero_factura")})
+
+    def log_message(self, format, *args):
+        pass
+
+def _start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def test_connection_reuse():
+    """Los envíos consecutivos reutilizan la misma conexión del pool"""
+    server = _start_server()
+    config = {
+        "base_url": f"http://127.0.0.1:{server.server_address[1]}",
+        "endpoint": "/api/gestion/facturas/cargar-imagenes/",
+        "timeout": 5,
+        "retry_attempts": 1,
+        "headers": {"User-Agent": "FacturaProcessor/1.0"}
+    }
+    client = FacturasAPIClient(config)
+
+    async def run():
+        await client.start()
+        try:
+            assert await client.verificar_conectividad()
+            for i in range(5):
+                response = await client.enviar_factura({"numero_factura": str(i)})
+                assert response == {"received": str(i)}
+        finally:
+            await client.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    stats = client.get_stats()
+    print(f"Estadísticas: {stats}")
+    assert stats["requests"] == 6
+    assert stats["new_connections"] == 1
+    assert stats["reused_connections"] == 5
+    assert stats["latency"]["enviar_factura"]["count"] == 5
+    assert not stats["client_active"]
+
+def test_unreachable_api():
+    """Sin API externa, la verificación de conectividad falla sin excepción"""
+    client = FacturasAPIClient({"base_url": "http://127.0.0.1:9", "timeout": 1, "health_timeout": 1})
+    assert asyncio.run(client.verificar_conectividad()) is False
+    assert client.get_stats()["errors"] == 1
+
+if __name__ == "__main__":
+    test_connection_reuse()
+    test_unreachable_api()
+    print("[OK] Cliente persistente de la API externa verificado")
@@ -0,0 +1,155 @@
+"""
+Script para probar los modos de transferencia de archivos a la API externa
+"""
+import os
+import sys
+import json
+import asyncio
+import tempfile
+import threading
+import tracemalloc
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from external_api_client import FacturasAPIClient
+
+class _Handler(BaseHTTPRequestHandler):
+    """API externa mínima que informa cómo recibió el archivo"""
+    protocol_version = "HTTP/1.1"
+    binary_status = None  # Respuesta a los envíos binarios (None = se aceptan)
+
+    def _reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        content_type = self.headers.get("Content-Type", "")
+
+        if content_type.startswith("application/json"):
+            data = json.loads(body)
+            self._reply(201, {"mode": "hex", "size": len(bytes.fromhex(data["imagen"]["data"])),
+                              "callback_url": data.get("callback_url")})
+        elif self.binary_status is not None:
+            self._reply(self.binary_status, {"detail": "Cuerpo no soportado"})
+        elif content_type.startswith("multipart/form-data"):
+            self._reply(201, {"mode": "multipart", "received": len(body)})
+        else:
+            self._reply(201, {"mode": "raw", "size": len(body), "filename": self.headers.get("X-Filename"),
+                              "callback_url": self.headers.get("X-Callback-Url")})
+
+    def log_message(self, format, *args):
+        pass
+
+def _run(binary_status, sends, transfer_mode=None):
+    handler = type("Handler", (_Handler,), {"binary_status": binary_status})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config = {
+        "base_url": f"http://127.0.0.1:{server.server_address[1]}",
+        "endpoint": "/cargar/",
+        "timeout": 10,
+        "retry_attempts": 2,
+        "retry_delay": 0.01
+    }
+    if transfer_mode:
+        config["transfer_mode"] = transfer_mode
+    client = FacturasAPIClient(config)
+
+    async def run():
+        try:
+            return [await send(client) for send in sends]
+        finally:
+            await client.close()
+
+    try:
+        return asyncio.run(run()), client
+    finally:
+        server.shutdown()
+
+def test_transfer_modes():
+    """multipart y raw envían el archivo binario; hex mantiene el formato original"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "factura.jpg")
+        with open(path, 'wb') as f:
+            f.write(os.urandom(512 * 1024))
+        metadata = {"callback_url": "http://cb/api/external/response"}
+
+        def send(mode):
+            return lambda client: client.enviar_archivo(path, "factura.jpg", "image/jpeg", metadata, transfer_mode=mode)
+
+        (multipart, raw, hex_result), client = _run(None, [send("multipart"), send("raw"), send("hex")])
+        print(multipart, raw, hex_result)
+
+        assert multipart["mode"] == "multipart" and multipart["received"] > 512 * 1024
+        assert raw == {"mode": "raw", "size": 512 * 1024, "filename": "factura.jpg",
+                       "callback_url": metadata["callback_url"]}
+        assert hex_result["mode"] == "hex" and hex_result["size"] == 512 * 1024
+
+        bytes_sent = client.get_stats()["bytes_sent"]
+        print(f"Bytes enviados: {bytes_sent}")
+        assert bytes_sent["enviar_factura"] / bytes_sent["enviar_archivo_multipart"] > 1.9
+        assert bytes_sent["enviar_archivo_raw"] == 512 * 1024
+
+def test_default_is_hex():
+    """Sin FACTURAS_API_TRANSFER_MODE se mantiene el JSON original"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "factura.png")
+        with open(path, 'wb') as f:
+            f.write(b"\x89PNG" + os.urandom(1024))
+
+        send = lambda client: client.enviar_archivo(path, "factura.png", "image/png", {"callback_url": "x"})
+        (result,), client = _run(None, [send])
+        assert result["mode"] == "hex" and client.get_stats()["transfer_fallbacks"] == 0
+
+def test_fallback_to_hex():
+    """Si la API externa rechaza el modo binario (415, 400 o 422) se reenvía en hex y se recuerda el modo"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "factura.png")
+        with open(path, 'wb') as f:
+            f.write(b"\x89PNG" + os.urandom(1024))
+
+        send = lambda client: client.enviar_archivo(path, "factura.png", "image/png", {"callback_url": "x"})
+        for status in (415, 400, 422):
+            (first, second), client = _run(status, [send, send], transfer_mode="multipart")
+
+            assert first["mode"] == "hex" and second["mode"] == "hex"
+            stats = client.get_stats()
+            assert stats["transfer_fallbacks"] == 1
+            assert stats["transfer_mode"] == "hex"
+            assert stats["requests"] == 3  # El 400/422 no se reintenta en binario
+
+def test_multipart_memory():
+    """El envío multipart no carga el archivo en memoria (a diferencia de hex)"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "factura.jpg")
+        with open(path, 'wb') as f:
+            f.write(os.urandom(4 * 1024 * 1024))
+
+        peaks = {}
+        for mode in ("multipart", "hex"):
+            async def send(client, mode=mode):
+                tracemalloc.start()
+                try:
+                    return await client.enviar_archivo(path, "factura.jpg", "image/jpeg", transfer_mode=mode)
+                finally:
+                    peaks[mode] = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+            _run(None, [send])
+
+        print(f"Memoria pico: {peaks}")
+        assert peaks["hex"] / peaks["multipart"] > 2
+
+if __name__ == "__main__":
+    test_transfer_modes()
+    test_default_is_hex()
+    test_fallback_to_hex()
+    test_multipart_memory()
+    print("[OK] Modos de transferencia verificados")
@@ -0,0 +1,108 @@
+"""
+Script para probar el monitor de salud y el pool de OCR
+"""
+import sys
+import time
+import asyncio
+import tempfile
+import threading
+from pathlib import Path
+from contextvars import ContextVar
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.health import HealthMonitor, disk_space_check, command_check
+from services.ocr_pool import OCRPool
+
+def test_monitor_caches_results():
+    """Las verificaciones corren en segundo plano; leer el estado no espera a las dependencias"""
+    monitor = HealthMonitor(interval=60, timeout=0.2)
+
+    async def slow_api():
+        await asyncio.sleep(5)
+        return True, "nunca"
+
+    with tempfile.TemporaryDirectory() as directory:
+        monitor.register("disk", disk_space_check(directory, 1))
+        monitor.register("tesseract", lambda: command_check(None))
+        monitor.register("external_api", slow_api, critical=False)
+
+        async def run():
+            monitor.start()
+            assert not monitor.snapshot()["checked"]
+            for _ in range(100):
+                if monitor.snapshot()["checked"]:
+                    break
+                await asyncio.sleep(0.01)
+
+            start = time.perf_counter()
+            snapshot = monitor.snapshot()
+            elapsed = time.perf_counter() - start
+            await monitor.stop()
+            return snapshot, elapsed
+
+        snapshot, elapsed = asyncio.run(run())
+
+    print(f"Estado: {snapshot}")
+    assert elapsed < 0.01
+    checks = snapshot["checks"]
+    assert checks["disk"]["ok"] and checks["disk"]["detail"]["free_mb"] > 0
+    assert not checks["tesseract"]["ok"] and checks["tesseract"]["detail"] == "No encontrado"
+    assert not checks["external_api"]["ok"] and "Timeout" in checks["external_api"]["detail"]
+    assert not snapshot["critical_ok"]
+    assert monitor.is_ok("disk") and monitor.is_ok("otro") is None
+
+def test_non_critical_failures():
+    """Las fallas de dependencias no críticas no afectan a critical_ok"""
+    monitor = HealthMonitor()
+    monitor.register("disk", lambda: (True, "ok"))
+    monitor.register("poppler", lambda: (False, "No encontrado"), critical=False)
+    asyncio.run(monitor.run_checks())
+    assert monitor.snapshot()["critical_ok"]
+
+def test_ocr_pool_capacity():
+    """El pool limita la concurrencia, informa ocupación y propaga las contextvars"""
+    pool = OCRPool(workers=2, max_waiting=1)
+    request_id: ContextVar[str] = ContextVar("request_id", default="")
+    release = threading.Event()
+    seen = []
+    active = [0, 0]
+    lock = threading.Lock()
+
+    def job(index):
+        with lock:
+            active[0] += 1
+            active[1] = max(active[1], active[0])
+        seen.append(request_id.get())
+        release.wait(5)
+        with lock:
+            active[0] -= 1
+        return index
+
+    async def run():
+        request_id.set("req-1")
+        tasks = [asyncio.create_task(pool.run(job, i)) for i in range(3)]
+        for _ in range(100):
+            if pool.capacity()["busy"] == 2:
+                break
+            await asyncio.sleep(0.01)
+        capacity = pool.capacity()
+        release.set()
+        results = await asyncio.gather(*tasks)
+        return capacity, results
+
+    capacity, results = asyncio.run(run())
+    print(f"Capacidad con el pool lleno: {capacity}")
+    assert capacity["busy"] == 2 and capacity["waiting"] == 1
+    assert not capacity["accepting"]
+    assert results == [0, 1, 2]
+    assert active[1] == 2
+    assert seen == ["req-1"] * 3
+    assert pool.capacity() == dict(capacity, busy=0, waiting=0, available=2, accepting=True)
+
+if __name__ == "__main__":
+    test_monitor_caches_results()
+    test_non_critical_failures()
+    test_ocr_pool_capacity()
+    print("[OK] Monitor de salud y pool de OCR verificados")
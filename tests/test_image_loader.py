@@ -0,0 +1,71 @@
+"""
+Script para probar la carga reducida de JPEG con draft('L')
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import settings
+from services.advanced_image_processor import AdvancedImageProcessor
+from services.image_loader import decoded_size, draft_scale, open_grayscale
+
+def _photo(path, size=(2400, 1600)):
+    """Foto en color con un gradiente (comprime como una foto real)"""
+    width, height = size
+    x = np.linspace(0, 255, width, dtype=np.float64)
+    y = np.linspace(0, 255, height, dtype=np.float64)[:, None]
+    rgb = np.stack([np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width)),
+                    np.full((height, width), 128.0)], axis=-1).astype(np.uint8)
+    Image.fromarray(rgb).save(path)
+
+def test_draft_scale():
+    """Se elige la mayor reducción que no baja del lado objetivo"""
+    assert draft_scale((4000, 3000), 3508) == 1
+    assert draft_scale((8000, 6000), 3508) == 2
+    assert draft_scale((2400, 1600), 500) == 4
+    assert draft_scale((24000, 16000), 500) == 8
+    assert draft_scale((8000, 6000), 0) == 1
+
+def test_open_grayscale():
+    """Los JPEG se decodifican reducidos y en grises; los PNG a tamaño completo"""
+    with tempfile.TemporaryDirectory() as directory:
+        jpeg = os.path.join(directory, "foto.jpg")
+        png = os.path.join(directory, "scan.png")
+        _photo(jpeg)
+        _photo(png)
+
+        assert decoded_size(jpeg, 500) == (600, 400)
+        image = open_grayscale(jpeg, 500)
+        print(f"JPEG 2400x1600 -> {image.size} {image.mode}")
+        assert image.size == (600, 400) and image.mode == 'L'
+        assert open_grayscale(jpeg, None).size == (2400, 1600)
+
+        image = open_grayscale(png, 500)
+        assert image.size == (2400, 1600) and image.mode == 'L'
+
+def test_preprocess_uses_target_resolution():
+    """El preprocesamiento trabaja sobre el JPEG reducido"""
+    processor = AdvancedImageProcessor()
+    previous = settings.OCR_TARGET_MAX_SIDE, settings.DESKEW_ENABLED
+    settings.OCR_TARGET_MAX_SIDE, settings.DESKEW_ENABLED = 1000, False
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            jpeg = os.path.join(directory, "foto.jpg")
+            _photo(jpeg)
+            processed = processor.preprocess_image_advanced(jpeg)
+    finally:
+        settings.OCR_TARGET_MAX_SIDE, settings.DESKEW_ENABLED = previous
+    assert processed.shape == (800, 1200)
+
+if __name__ == "__main__":
+    test_draft_scale()
+    test_open_grayscale()
+    test_preprocess_uses_target_resolution()
+    print("[OK] Carga reducida de JPEG verificada")
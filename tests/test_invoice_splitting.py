@@ -0,0 +1,113 @@
+"""
+Script para probar la separación de facturas en una sola pasada
+"""
+import re
+import sys
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.invoice_parser import INVOICE_START_PATTERNS, InvoiceParser
+
+INVOICE = """ORIGINAL HighTech Innovations SRL FACTURA A 0004 Comp. Nro: {number} Punto de Venta: 0004 Fecha de Emisión: 27/04/2025 Razón Social: HighTech Innovations SRL CUIT: 30-99999999-7 Ingresos Brutos: 26791555947 Fecha de Inicio de Actividades: 01/01/2020 Domicilio Comercial:Avenida Rivadavia 1200 Condición frente al IVA: Responsable Inscripto Fecha de Vto. para el pago: 30/04/2025 DNI: 20-12345678-9 Apellido y Nombre / Razón Social: Ricardo Herrera Domicilio: Calle Montevideo 1200 Condición de venta: Contado 1 Análisis de datos 4 unidad 4.000,00 19% 3.040,00 12.960,00 IVA: $2.721,60 Subtotal: $12.960,00 Importe Total: ${total} Fecha de Vto. de CAE: 01/05/2025 Pág. 1/1 Comprobante Autorizado"""
+
+def _bundle(count):
+    return "\n".join(INVOICE.format(number=21696565 + i, total=f"15.{681 + i},60") for i in range(count))
+
+def _separators_per_pattern(text):
+    """Separación anterior: un re.finditer por patrón, ordenar y filtrar"""
+    positions = sorted({match.start() for pattern in INVOICE_START_PATTERNS
+                        for match in re.finditer(pattern, text, re.IGNORECASE | re.MULTILINE)})
+    filtered = []
+    for pos in positions:
+        if not filtered or pos - filtered[-1] > 500:
+            filtered.append(pos)
+    if not filtered:
+        return [(0, len(text))]
+    return [(start, filtered[i + 1] if i + 1 < len(filtered) else len(text)) for i, start in enumerate(filtered)]
+
+def test_single_scan_matches_per_pattern_scan():
+    """La pasada combinada encuentra los mismos límites que un finditer por patrón"""
+    parser = InvoiceParser()
+    texts = [_bundle(1), _bundle(5), "texto sin facturas", "Comprobante B 0001 " + "x" * 600 + " FACTURA C 12"]
+    for text in texts:
+        assert parser._detect_invoice_separators(text) == _separators_per_pattern(text)
+
+def test_invoices_are_emitted_as_they_close():
+    """Cada factura se parsea en cuanto aparece el inicio de la siguiente"""
+    parser = InvoiceParser()
+    parsed = []
+    parse_invoice = parser.parse_invoice
+
+    def counting_parse(text, hints=None):
+        parsed.append(text)
+        return parse_invoice(text, hints)
+
+    parser.parse_invoice = counting_parse
+    invoices = parser.iter_invoices(_bundle(12))
+    first = next(invoices)
+    assert len(parsed) == 1 and first["invoice_number"] == 1
+    assert first["extracted_fields"]["importe_total"] == "15.681,60"
+
+    rest = list(invoices)
+    assert len(parsed) == 12 and [r["invoice_number"] for r in rest] == list(range(2, 13))
+
+    result = parser.parse_multiple_invoices(_bundle(12))
+    print(f"Facturas: {result['total_invoices']}")
+    assert result["success"] and result["total_invoices"] == 12
+    assert result["invoices"][11]["extracted_fields"]["importe_total"] == "15.692,60"
+
+def test_single_invoice_keeps_hints():
+    """Con una sola factura se parsea el texto completo con los hints"""
+    parser = InvoiceParser()
+    # El hint tiene los mismos dígitos que el valor de la regex, en otro formato
+    result = parser.parse_multiple_invoices("Resumen previo\n" + _bundle(1), {"importe_total": "15681.60"})
+    assert result["success"] and result["total_invoices"] == 1
+    invoice = result["invoices"][0]
+    assert "invoice_number" not in invoice and invoice["raw_text"].startswith("Resumen previo")
+    assert invoice["extracted_fields"]["importe_total"] == "15681.60"
+
+def test_stream_endpoint_sends_each_invoice():
+    """/process-invoices-stream envía una línea por factura y un resumen al final"""
+    import io
+    import json
+    from fastapi.testclient import TestClient
+    from PIL import Image
+    import main
+    from models import ProcessingResult
+
+    class TextProcessor:
+        """Procesador sin OCR: devuelve el texto de un PDF con 4 facturas"""
+        invoice_parser = InvoiceParser()
+
+        def process_image(self, image_path, include_timings=False, sections=None):
+            assert sections == ("raw_text",)  # El parseo lo hace el endpoint, factura por factura
+            return ProcessingResult(filename="lote.png", file_size=1, content_type="image/png",
+                                    processing_time=0.1, status="success", raw_text=_bundle(4))
+
+    previous = main.image_processor
+    main.image_processor = TextProcessor()
+    try:
+        buffer = io.BytesIO()
+        Image.new("L", (10, 10), color=255).save(buffer, format="PNG")
+        response = TestClient(main.app).post(
+            "/process-invoices-stream", files={"file": ("lote.png", buffer.getvalue(), "image/png")}
+        )
+    finally:
+        main.image_processor = previous
+
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    print(f"Líneas: {len(lines)} | resumen: {lines[-1]}")
+    assert [line["invoice_index"] for line in lines[:-1]] == [1, 2, 3, 4]
+    assert lines[3]["invoice_fields"]["importe_total"] == "15.684,60"
+    assert lines[-1]["done"] and lines[-1]["total_invoices"] == 4
+
+if __name__ == "__main__":
+    test_single_scan_matches_per_pattern_scan()
+    test_invoices_are_emitted_as_they_close()
+    test_single_invoice_keeps_hints()
+    test_stream_endpoint_sends_each_invoice()
+    print("[OK] Separación de facturas en una pasada verificada")
@@ -0,0 +1,63 @@
+"""
+Script para probar la carga diferida de dependencias pesadas del procesador
+"""
+import sys
+import json
+import tempfile
+import textwrap
+import subprocess
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+ROOT_DIR = Path(__file__).parent.parent
+
+def _modules_loaded_after(code: str):
+    script = (
+        f"import sys; sys.path.insert(0, {str(ROOT_DIR)!r}); {code}; import json; "
+        "print(json.dumps(sorted(m for m in ('pytesseract', 'pandas', 'skimage', 'pdf2image') if m in sys.modules)))"
+    )
+    # Directorio temporal: la instancia compartida crea la base de plantillas de proveedores
+    with tempfile.TemporaryDirectory() as directory:
+        completed = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                   timeout=120, cwd=directory)
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def test_import_does_not_load_heavy_modules():
+    """Importar el procesador y crear la instancia compartida no carga OCR ni scikit-image"""
+    loaded = _modules_loaded_after(
+        "from services.advanced_image_processor import get_image_processor; "
+        "p = get_image_processor(); assert p is get_image_processor() and not p.warmed_up"
+    )
+    print(f"Módulos pesados cargados: {loaded}")
+    assert loaded == []
+
+def test_warmup_loads_and_reports_timings():
+    """El precalentamiento carga los módulos diferidos y no propaga errores (p. ej. sin Tesseract)"""
+    loaded = _modules_loaded_after(
+        "from services.advanced_image_processor import AdvancedImageProcessor; "
+        "p = AdvancedImageProcessor(); t = p.warmup(); "
+        "assert p.warmed_up and set(t) == {'tesseract', 'skimage', 'pdf2image', 'layout_model'}"
+    )
+    print(f"Módulos cargados tras el precalentamiento: {loaded}")
+    assert "skimage" in loaded and "pytesseract" in loaded
+
+def test_shutdown_cancels_warmup():
+    """El precalentamiento en segundo plano queda en app.state y se cancela al apagar"""
+    _modules_loaded_after(textwrap.dedent("""\
+        import asyncio, time, main
+        main.image_processor.warmup = lambda: time.sleep(0.5)
+        async def run():
+            async with main.app.router.lifespan_context(main.app):
+                task = main.app.state.warmup_task
+                assert not task.done()
+            return task
+        assert asyncio.run(run()).cancelled()"""))
+
+if __name__ == "__main__":
+    test_import_does_not_load_heavy_modules()
+    test_warmup_loads_and_reports_timings()
+    test_shutdown_cancels_warmup()
+    print("[OK] Carga diferida del procesador verificada")
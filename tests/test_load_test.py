@@ -0,0 +1,94 @@
+"""
+Script para probar el generador de carga en modo ASGI (sin red)
+"""
+import sys
+import asyncio
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import FastAPI, File, UploadFile
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from load_test import LoadTester, parse_mix
+from compare_benchmarks import BenchmarkComparator
+
+def _echo_app(events: Optional[List[str]] = None) -> FastAPI:
+    """API mínima con la misma forma de respuesta que los endpoints reales"""
+    app = FastAPI()
+
+    @app.on_event("startup")
+    async def startup():
+        if events is not None:
+            events.append("startup")
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        if events is not None:
+            events.append("shutdown")
+
+    @app.post("/process-image")
+    async def process_image(file: UploadFile = File(...)):
+        await file.read()
+        return {"processing_time": 0.2, "metadata": {"timings": {"preprocessing": 0.05, "ocr": 0.1}}}
+
+    @app.post("/process-invoice")
+    async def process_invoice(file: UploadFile = File(...)):
+        return {"processing_time": 0.3, "metadata": {}}
+
+    @app.post("/process-multiple-images")
+    async def process_multiple_images(files: List[UploadFile] = File(...)):
+        return {"results": [{"processing_time": 0.1} for _ in files]}
+
+    return app
+
+DOCUMENTS = [("factura_1.png", b"\x89PNG fake", "image/png")]
+
+def test_parse_mix():
+    """Los pesos de la mezcla se normalizan"""
+    mix = parse_mix("process-image=3,process-invoice=1")
+    assert mix == {'process-image': 0.75, 'process-invoice': 0.25}
+
+def test_concurrency_mode():
+    """Lazo cerrado: se envían exactamente los requests pedidos y se leen tiempos del servidor"""
+    tester = LoadTester(DOCUMENTS, app=_echo_app(), files_per_request=2)
+    samples, elapsed = asyncio.run(tester.run_concurrency(4, total_requests=20))
+    results = tester.build_results(samples, elapsed, {'timestamp': '-', 'target': 'asgi', 'mode': 'test', 'documents': 1})
+    print(tester.generate_report(results))
+
+    summary = results['summary']
+    assert summary['requests'] == 20
+    assert summary['errors'] == 0
+    assert sum(summary['latency_histogram'].values()) == 20
+
+    if 'process-multiple-images' in results['endpoints']:
+        assert abs(results['endpoints']['process-multiple-images']['server_processing_time']['p50'] - 0.2) < 1e-9
+    if 'process-image' in results['endpoints']:
+        assert results['endpoints']['process-image']['server_timings']['ocr']['p50'] == 0.1
+
+    runs = BenchmarkComparator()._normalize(results, 'load_test.json')
+    assert runs[0]['kind'] == 'load_test'
+    assert len(runs[0]['latencies']) == 20
+
+def test_rps_mode():
+    """Lazo abierto: la cantidad de arribos respeta el total pedido"""
+    tester = LoadTester(DOCUMENTS, mix={'process-invoice': 1.0}, app=_echo_app())
+    samples, elapsed = asyncio.run(tester.run_rps(200, total_requests=10))
+    assert len(samples) == 10
+    assert all(s['ok'] for s in samples)
+
+def test_asgi_runs_lifespan():
+    """En modo ASGI la corrida se hace dentro del arranque y apagado de la app"""
+    events = []
+    tester = LoadTester(DOCUMENTS, mix={'process-image': 1.0}, app=_echo_app(events))
+    samples, _ = asyncio.run(tester.run_concurrency(2, total_requests=4))
+    assert len(samples) == 4
+    assert events == ["startup", "shutdown"]
+
+if __name__ == "__main__":
+    test_parse_mix()
+    test_concurrency_mode()
+    test_rps_mode()
+    test_asgi_runs_lifespan()
+    print("[OK] Load test verificado")
@@ -0,0 +1,148 @@
+"""
+Script para probar el OCR de zonas numéricas con lista blanca y su caché
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.advanced_image_processor import AdvancedImageProcessor
+from services.invoice_parser import InvoiceParser
+from services.numeric_ocr import NumericOCRCache, NUMERIC_OCR_CONFIG, find_numeric_zones
+
+# Texto del OCR genérico, con letras leídas en lugar de dígitos
+LINES = [
+    (20, ["FACTURA", "A", "Comercial", "Sur", "SRL"]),
+    (60, ["CUIT:", "30-7l234567-8"]),
+    (100, ["Fecha:", "O1/02/2024"]),
+    (140, ["Subtotal:", "$", "1O.000,00"]),
+    (180, ["IVA", "21%:", "$", "2.100,00"]),
+    (220, ["Importe", "Total:", "$", "12.1OO,0O"])
+]
+
+# Lo que devuelve Tesseract con la lista blanca numérica en cada línea
+NUMERIC_READINGS = {60: "30-71234567-8", 100: "01/02/2024", 140: "10.000,00", 180: "2.100,00", 220: "12.100,00"}
+
+def _words():
+    words = []
+    for index, (y, texts) in enumerate(LINES):
+        x = 10
+        for text in texts:
+            words.append({"text": text, "conf": 0.8, "bbox": [x, y, x + 10 * len(text), y + 20], "line": (1, index, 1)})
+            x += 10 * len(text) + 10
+    return words
+
+def test_find_numeric_zones():
+    """Cada zona abarca el valor que sigue a la etiqueta, sin el '$' ni el porcentaje del IVA"""
+    words = _words()
+    zones = find_numeric_zones(words, 400)
+    print(f"Zonas: {zones}")
+    assert set(zones) == {"cuit_vendedor", "fecha_emision", "subtotal", "iva", "importe_total"}
+
+    by_text = {(w["line"], w["text"]): w["bbox"] for w in words}
+    # 'Total' no se confunde con 'Subtotal'
+    assert zones["importe_total"][1] < by_text[(1, 5, 1), "12.1OO,0O"][1] < zones["importe_total"][3]
+    assert zones["subtotal"][0] > by_text[(1, 3, 1), "$"][2] - 10
+    # El IVA empieza después de '21%:'
+    assert zones["iva"][0] > by_text[(1, 4, 1), "21%:"][2] - 10
+
+# Bloque de totales de AFIP: 'Importe Otros Tributos' no es el importe total
+TOTALS_BLOCK = [
+    (20, ["Subtotal:", "$", "35.460,00"]),
+    (60, ["Importe", "Otros", "Tributos:", "$", "0,00"]),
+    (100, ["Importe", "Total:", "$", "42.906,60"])
+]
+
+def test_afip_totals_block():
+    """La zona del total es la de 'Importe Total' y un hint de otra zona no pisa a la regex"""
+    words = []
+    for index, (y, texts) in enumerate(TOTALS_BLOCK):
+        x = 10
+        for text in texts:
+            words.append({"text": text, "conf": 0.8, "bbox": [x, y, x + 10 * len(text), y + 20], "line": (1, index, 1)})
+            x += 10 * len(text) + 10
+    zones = find_numeric_zones(words, 400)
+    print(f"Zonas del bloque de totales: {zones}")
+    assert zones["importe_total"][1] > 90
+    assert zones["subtotal"][1] < 30
+
+    text = " ".join(text for _, texts in TOTALS_BLOCK for text in texts)
+    parser = InvoiceParser()
+    fields = parser.parse_invoice(text, {"importe_total": "0,00"})["extracted_fields"]
+    assert fields["importe_total"] == "42.906,60"
+    fields = parser.parse_invoice(text, {"importe_total": "$42.906,60"})["extracted_fields"]
+    assert fields["importe_total"] == "$42.906,60"
+
+def test_cache_lru():
+    """La caché devuelve resultados por contenido y descarta los menos usados"""
+    cache = NumericOCRCache(max_entries=2)
+    a, b, c = (np.full((10, 30), value, dtype=np.uint8) for value in (0, 1, 2))
+    cache.put(cache.key(a, NUMERIC_OCR_CONFIG), ("1", 0.9))
+    cache.put(cache.key(b, NUMERIC_OCR_CONFIG), ("2", 0.9))
+    assert cache.get(cache.key(a.copy(), NUMERIC_OCR_CONFIG)) == ("1", 0.9)
+    assert cache.get(cache.key(a, "--psm 6")) is None
+    cache.put(cache.key(c, NUMERIC_OCR_CONFIG), ("3", 0.9))
+    assert cache.get(cache.key(b, NUMERIC_OCR_CONFIG)) is None  # El menos usado se descartó
+    assert len(cache) == 2
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+def test_parser_hints():
+    """Los valores sugeridos reemplazan a la búsqueda por regex"""
+    text = " ".join(text for _, texts in LINES for text in texts)
+    parser = InvoiceParser()
+    without = parser.parse_invoice(text)["extracted_fields"]
+    with_hints = parser.parse_invoice(text, {"importe_total": "12.100,00", "subtotal": "10.000,00"})["extracted_fields"]
+    print(f"Sin hints: {without.get('importe_total')} | con hints: {with_hints['importe_total']}")
+    assert without.get("importe_total") != "12.100,00"
+    assert with_hints["importe_total"] == "12.100,00"
+    assert with_hints["deuda_impositiva"] == "2.100,00"
+
+def test_processor_numeric_zones():
+    """El procesador relee las zonas con lista blanca, usa los valores y cachea las lecturas"""
+    words = _words()
+    processor = AdvancedImageProcessor(numeric_zones=True, numeric_ocr_cache=NumericOCRCache())
+    calls = []
+
+    def extract_words_from_region(image, bbox, timer=None, configs=None):
+        calls.append(tuple(configs or ()))
+        if configs == [NUMERIC_OCR_CONFIG]:
+            center = (bbox[1] + bbox[3]) / 2
+            y = min(NUMERIC_READINGS, key=lambda line_y: abs(line_y + 10 - center))
+            return NUMERIC_READINGS[y], 0.95, []
+        return " ".join(w["text"] for w in words), 0.8, words
+
+    processor.extract_words_from_region = extract_words_from_region
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "factura.png")
+        rng = np.random.default_rng(0)
+        Image.fromarray(rng.integers(0, 255, (260, 400), dtype=np.uint8)).save(path)
+
+        result = processor.process_image(path, include_timings=True, sections=("invoice_fields",))
+        fields = result.metadata["invoice_parsing"]["invoices"][0]["extracted_fields"]
+        print(f"Campos: {fields}")
+        assert fields["cuit_vendedor"] == "30-71234567-8"
+        assert fields["fecha_emision"] == "01/02/2024"
+        assert fields["importe_total"] == "12.100,00"
+        assert "numeric_zones" in result.metadata["timings"]
+        assert calls.count((NUMERIC_OCR_CONFIG,)) == 5
+
+        # El mismo documento otra vez: las zonas salen de la caché
+        calls.clear()
+        processor.process_image(path, sections=("invoice_fields",))
+        assert calls.count((NUMERIC_OCR_CONFIG,)) == 0
+        assert processor.numeric_ocr_cache.stats()["hits"] == 5
+
+if __name__ == "__main__":
+    test_find_numeric_zones()
+    test_afip_totals_block()
+    test_cache_lru()
+    test_parser_hints()
+    test_processor_numeric_zones()
+    print("[OK] OCR de zonas numéricas verificado")
@@ -0,0 +1,149 @@
+"""
+Script para probar el outbox persistente de envíos a la API externa
+"""
+import os
+import sys
+import asyncio
+import tempfile
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.outbox import Outbox, OutboxSender
+
+def _outbox(directory: str) -> Outbox:
+    return Outbox(os.path.join(directory, "outbox.db"), os.path.join(directory, "files"))
+
+def _enqueue(outbox: Outbox, directory: str, name: str):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(b"contenido " + name.encode())
+    return outbox.enqueue(path, name, "image/png", {"callback_url": "http://cb"})
+
+def test_delivery_retry_and_failure():
+    """Entrega exitosa, reintento con backoff y fallo definitivo por error 4xx"""
+    with tempfile.TemporaryDirectory() as directory:
+        outbox = _outbox(directory)
+        ok = _enqueue(outbox, directory, "ok.png")
+        flaky = _enqueue(outbox, directory, "flaky.png")
+        rejected = _enqueue(outbox, directory, "rejected.png")
+        assert not os.path.exists(os.path.join(directory, "ok.png"))  # movido al outbox
+
+        calls = {}
+
+        async def send(entry):
+            calls[entry["filename"]] = calls.get(entry["filename"], 0) + 1
+            with open(entry["file_path"], 'rb') as f:
+                assert f.read() == b"contenido " + entry["filename"].encode()
+            if entry["filename"] == "flaky.png" and calls["flaky.png"] == 1:
+                return {"error": "Timeout al comunicarse con API externa"}
+            if entry["filename"] == "rejected.png":
+                return {"error": "Error HTTP 400", "status_code": 400}
+            return {"id": entry["filename"]}
+
+        sender = OutboxSender(outbox, send, backoff_base=0.01, backoff_max=0.01)
+
+        async def run():
+            assert await sender.run_once() == 3
+            await asyncio.sleep(0.02)
+            assert await sender.run_once() == 1
+            assert await sender.run_once() == 0
+
+        asyncio.run(run())
+
+        assert calls == {"ok.png": 1, "flaky.png": 2, "rejected.png": 1}
+        assert outbox.get(ok["id"])["status"] == "delivered"
+        assert outbox.get(ok["id"])["response"] == {"id": "ok.png"}
+        assert not os.path.exists(ok["file_path"])
+
+        flaky_entry = outbox.get(flaky["id"])
+        assert flaky_entry["status"] == "delivered" and flaky_entry["attempts"] == 2
+
+        rejected_entry = outbox.get(rejected["id"])
+        assert rejected_entry["status"] == "failed" and rejected_entry["last_error"] == "Error HTTP 400"
+        assert os.path.exists(rejected_entry["file_path"])
+
+        assert outbox.retry(rejected["id"])
+        assert outbox.get(rejected["id"])["status"] == "pending"
+        print(f"Estados: {outbox.counts()}")
+        outbox.close()
+
+def test_max_attempts_and_concurrency():
+    """La concurrencia respeta el límite y se deja de reintentar tras max_attempts"""
+    with tempfile.TemporaryDirectory() as directory:
+        outbox = _outbox(directory)
+        for i in range(8):
+            _enqueue(outbox, directory, f"factura_{i}.png")
+
+        in_flight = [0, 0]
+
+        async def send(entry):
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+            await asyncio.sleep(0.01)
+            in_flight[0] -= 1
+            return {"error": "Error inesperado: conexión rechazada"}
+
+        sender = OutboxSender(outbox, send, concurrency=3, batch_size=8, max_attempts=2,
+                              backoff_base=0.001, backoff_max=0.001)
+
+        async def run():
+            while await sender.run_once() or outbox.counts()["pending"]:
+                await asyncio.sleep(0.005)
+
+        asyncio.run(run())
+
+        assert in_flight[1] == 3
+        assert outbox.counts()["failed"] == 8
+        assert all(entry["attempts"] == 2 for entry in outbox.list("failed"))
+        outbox.close()
+
+def test_recover_after_restart():
+    """Las entradas que quedaron 'sending' se reencolan al reabrir el outbox"""
+    with tempfile.TemporaryDirectory() as directory:
+        outbox = _outbox(directory)
+        entry = _enqueue(outbox, directory, "factura.png")
+        assert [e["id"] for e in outbox.claim(10)] == [entry["id"]]
+        outbox.close()
+
+        outbox = _outbox(directory)
+        assert outbox.get(entry["id"])["status"] == "sending"
+        assert outbox.recover() == 1
+        assert outbox.get(entry["id"])["status"] == "pending"
+        outbox.close()
+
+def test_background_sender():
+    """El sender en segundo plano entrega lo encolado sin esperar al ciclo de polling"""
+    with tempfile.TemporaryDirectory() as directory:
+        outbox = _outbox(directory)
+        delivered = []
+
+        async def send(entry):
+            delivered.append(entry["id"])
+            return {"status": "ok"}
+
+        sender = OutboxSender(outbox, send, poll_interval=60)
+
+        async def run():
+            sender.start()
+            entry = _enqueue(outbox, directory, "factura.png")
+            sender.wake()
+            for _ in range(100):
+                if delivered:
+                    break
+                await asyncio.sleep(0.01)
+            await sender.stop()
+            return entry
+
+        entry = asyncio.run(run())
+        assert delivered == [entry["id"]]
+        assert outbox.get(entry["id"])["status"] == "delivered"
+        outbox.close()
+
+if __name__ == "__main__":
+    test_delivery_retry_and_failure()
+    test_max_attempts_and_concurrency()
+    test_recover_after_restart()
+    test_background_sender()
+    print("[OK] Outbox de envíos verificado")
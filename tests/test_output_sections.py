@@ -0,0 +1,121 @@
+"""
+Script para probar la selección de secciones del resultado (fields=) en el procesador
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from PIL import Image
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.advanced_image_processor import AdvancedImageProcessor, parse_sections, OUTPUT_SECTIONS
+from services.invoice_parser import InvoiceParser
+from services.token_table import TokenTable
+
+TEXT = "FACTURA A N° 0001-00001234 CUIT: 20-12345678-6 Fecha: 01/02/2024 TOTAL: $ 1.210,00"
+
+def _processor():
+    """Procesador sin Tesseract: el OCR de cada región devuelve un texto fijo y se cuenta"""
+    processor = AdvancedImageProcessor.__new__(AdvancedImageProcessor)
+    processor.layout_model = None
+    processor.invoice_parser = InvoiceParser()
+    processor.vendor_templates = None
+    processor.numeric_zones = False
+    processor.numeric_ocr_cache = None
+    processor.duplicate_index = None
+    processor.reuse_duplicates = False
+    processor.ocr_calls = []
+
+    def extract_words_from_region(image, bbox, timer=None, configs=None):
+        processor.ocr_calls.append(tuple(bbox))
+        return TEXT, 0.9, TokenTable.empty()
+
+    processor.extract_words_from_region = extract_words_from_region
+    return processor
+
+def _process(sections):
+    processor = _processor()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "factura.png")
+        Image.new("L", (200, 400), color=255).save(path)
+        result = processor.process_image(path, include_timings=True, sections=sections)
+    return processor, result
+
+def test_parse_sections():
+    """Se aceptan listas separadas por coma y se rechazan secciones desconocidas"""
+    assert parse_sections(None) is None
+    assert parse_sections(" ") is None
+    assert parse_sections("invoice_fields, raw_text") == {"invoice_fields", "raw_text"}
+    try:
+        parse_sections("invoice_fields,imagenes")
+        assert False, "Se esperaba ValueError"
+    except ValueError as e:
+        assert "imagenes" in str(e)
+
+def test_all_sections():
+    """Sin secciones pedidas se ejecutan todas las etapas"""
+    processor, result = _process(None)
+    assert result.metadata["sections"] == sorted(OUTPUT_SECTIONS)
+    assert len(processor.ocr_calls) == 6  # 5 regiones del layout alternativo + página completa
+    assert result.text_blocks and result.raw_text == TEXT
+    assert "layout" in result.metadata["timings"]
+
+def test_invoice_fields_only():
+    """Con solo invoice_fields no se detecta layout ni se hace OCR por región"""
+    processor, result = _process(("invoice_fields",))
+    print(f"Llamadas OCR: {processor.ocr_calls} | tiempos: {result.metadata['timings']}")
+    assert len(processor.ocr_calls) == 1
+    assert not result.text_blocks and not result.tables
+    assert "layout" not in result.metadata["timings"]
+    assert "region_ocr" not in result.metadata["timings"]
+    assert "invoice_parsing" in result.metadata["timings"]
+    assert result.metadata["invoice_parsing"].get("invoices")
+
+def test_raw_text_only():
+    """Con solo raw_text no se parsean facturas"""
+    processor, result = _process(("raw_text",))
+    assert len(processor.ocr_calls) == 1
+    assert result.raw_text == TEXT
+    assert result.metadata["invoice_parsing"]["skipped"]
+    assert "invoice_parsing" not in result.metadata["timings"]
+
+def test_endpoint_raw_text_only():
+    """Con fields=raw_text el endpoint devuelve texto aunque el texto parezca una factura"""
+    import io
+    from fastapi.testclient import TestClient
+    import main
+
+    previous = main.image_processor
+    main.image_processor = _processor()
+    try:
+        buffer = io.BytesIO()
+        Image.new("L", (200, 400), color=255).save(buffer, format="PNG")
+        response = TestClient(main.app).post(
+            "/process-image?fields=raw_text", files={"file": ("factura.png", buffer.getvalue(), "image/png")}
+        )
+    finally:
+        main.image_processor = previous
+    data = response.json()
+    assert response.status_code == 200, data
+    assert data["type"] == "general_text"
+    assert data["raw_text"] == TEXT
+    assert "invoices" not in data and "text_blocks" not in data
+
+def test_text_blocks_only():
+    """Con solo text_blocks no se hace OCR de página completa"""
+    processor, result = _process(("text_blocks",))
+    assert len(processor.ocr_calls) == 5
+    assert len(result.text_blocks) == 5
+    assert "full_page_ocr" not in result.metadata["timings"]
+
+if __name__ == "__main__":
+    test_parse_sections()
+    test_all_sections()
+    test_invoice_fields_only()
+    test_raw_text_only()
+    test_endpoint_raw_text_only()
+    test_text_blocks_only()
+    print("[OK] Selección de secciones verificada")
@@ -0,0 +1,79 @@
+"""
+Script para probar el render de PDF en grises en memoria (sin JPEG intermedio)
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pdf2image
+from PIL import Image
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.advanced_image_processor import AdvancedImageProcessor
+
+def _page(mode):
+    rng = np.random.default_rng(0)
+    gray = rng.integers(0, 255, (300, 200), dtype=np.uint8)
+    return Image.fromarray(gray).convert(mode)
+
+def test_render_requests_grayscale():
+    """El render pide a Poppler la página en grises y la devuelve en memoria"""
+    calls = []
+    original = pdf2image.convert_from_path
+
+    def convert_from_path(pdf_path, **options):
+        calls.append(options)
+        return [_page('L' if options.get("grayscale") else 'RGB')]
+
+    pdf2image.convert_from_path = convert_from_path
+    try:
+        processor = AdvancedImageProcessor()
+        page = processor.render_pdf_page("factura.pdf")
+        color = processor.render_pdf_page("factura.pdf", grayscale=False)
+    finally:
+        pdf2image.convert_from_path = original
+
+    assert page.mode == 'L' and color.mode == 'RGB'
+    assert calls[0]["grayscale"] is True and calls[0]["first_page"] == calls[0]["last_page"] == 1
+
+def test_process_pdf_without_jpeg():
+    """process_image no escribe ningún JPEG para los PDF"""
+    processor = AdvancedImageProcessor()
+    rendered = []
+
+    def render_pdf_page(pdf_path, grayscale=True, dpi=150):
+        rendered.append(grayscale)
+        return _page('L' if grayscale else 'RGB')
+
+    def extract_text_from_region(image, bbox, timer=None):
+        assert image.shape == (300, 200)
+        return "FACTURA A", 0.9
+
+    processor.render_pdf_page = render_pdf_page
+    processor.extract_text_from_region = extract_text_from_region
+
+    with tempfile.TemporaryDirectory() as directory:
+        pdf_path = os.path.join(directory, "factura.pdf")
+        Path(pdf_path).write_bytes(b"%PDF-1.4\n")
+        result = processor.process_image(pdf_path, include_timings=True, sections=("raw_text",))
+        print(f"Archivos: {os.listdir(directory)} | tiempos: {result.metadata['timings']}")
+        assert os.listdir(directory) == ["factura.pdf"]
+        assert result.raw_text == "FACTURA A"
+        assert "pdf_conversion" in result.metadata["timings"]
+        assert rendered == [True]
+
+        # El JPEG se genera solo a pedido (para reenviar la factura)
+        jpeg_path = processor.convert_pdf_to_image(pdf_path)
+        assert rendered == [True, False]
+        assert jpeg_path == os.path.join(directory, "factura_converted.jpg")
+        with Image.open(jpeg_path) as image:
+            assert image.format == "JPEG" and image.size == (200, 300)
+
+if __name__ == "__main__":
+    test_render_requests_grayscale()
+    test_process_pdf_without_jpeg()
+    print("[OK] Render de PDF en memoria verificado")
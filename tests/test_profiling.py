@@ -0,0 +1,115 @@
+"""
+Script para probar el profiler bajo demanda
+"""
+import sys
+import time
+import asyncio
+import tempfile
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.profiling import ProfileManager, ProfilingMiddleware
+
+def _busy(seconds: float = 0.03):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(1000))
+
+def _app(manager: ProfileManager, token: str = "") -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/process")
+    async def process():
+        with manager.maybe_profile("documento.png"):
+            _busy()
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True}
+
+    app.add_middleware(ProfilingMiddleware, manager=manager, token=token)
+    return app
+
+def _get(app: FastAPI, paths, headers=None):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [await client.get(path, headers=headers or {}) for path in paths]
+    return asyncio.run(run())
+
+def test_header_and_arm():
+    """Se perfila con el header o con el profiler armado; los requests sin proceso no consumen"""
+    with tempfile.TemporaryDirectory() as directory:
+        manager = ProfileManager(directory, sample_interval=0.001)
+        app = _app(manager, token="secreto")
+
+        responses = _get(app, ["/process"])
+        assert "x-profile-id" not in responses[0].headers
+
+        responses = _get(app, ["/process"], headers={"X-Profile": "secreto"})
+        profile_id = responses[0].headers["x-profile-id"]
+        assert manager.profile_path(profile_id, "pstats")
+        assert manager.profile_path(profile_id, "collapsed")
+        assert "_busy" in manager.text_report(profile_id)
+
+        manager.arm(2)
+        responses = _get(app, ["/health", "/process", "/process", "/process"])
+        captured = [r.headers.get("x-profile-id") for r in responses]
+        print(f"Perfiles capturados: {captured}")
+        assert captured[0] is None
+        assert captured[1] and captured[2]
+        assert captured[3] is None
+        assert len(manager.list_profiles()) == 3
+
+def test_token_and_path_validation():
+    """Sin token el header no tiene efecto; con token debe coincidir; los ids con rutas se rechazan"""
+    with tempfile.TemporaryDirectory() as directory:
+        manager = ProfileManager(directory)
+        assert "x-profile-id" not in _get(_app(manager), ["/process"], headers={"X-Profile": "1"})[0].headers
+
+        app = _app(manager, token="secreto")
+
+        assert "x-profile-id" not in _get(app, ["/process"], headers={"X-Profile": "1"})[0].headers
+        assert "x-profile-id" in _get(app, ["/process"], headers={"X-Profile": "secreto"})[0].headers
+        assert manager.profile_path("../config", "pstats") is None
+
+def test_size_limit():
+    """El directorio de perfiles no supera el tamaño máximo (se conserva el último)"""
+    with tempfile.TemporaryDirectory() as directory:
+        manager = ProfileManager(directory, max_bytes=1)
+        app = _app(manager, token="secreto")
+        _get(app, ["/process", "/process", "/process"], headers={"X-Profile": "secreto"})
+        assert len(manager.list_profiles()) == 1
+
+def test_admin_endpoints_need_token():
+    """Sin PROFILING_ADMIN_TOKEN los endpoints /admin responden 503; con token, exigen X-Admin-Token"""
+    from fastapi.testclient import TestClient
+    from config import settings
+    import main
+
+    client = TestClient(main.app)
+    paths = [("get", "/admin/profiling/profiles"), ("post", "/admin/profiling/arm"),
+             ("delete", "/admin/vendor-templates/30-71234567-8"), ("delete", "/admin/duplicates/abc")]
+    previous = settings.PROFILING_ADMIN_TOKEN
+    try:
+        settings.PROFILING_ADMIN_TOKEN = ""
+        assert [getattr(client, method)(path).status_code for method, path in paths] == [503] * 4
+        settings.PROFILING_ADMIN_TOKEN = "secreto"
+        assert [getattr(client, method)(path).status_code for method, path in paths] == [403] * 4
+        response = client.get("/admin/profiling/profiles", headers={"X-Admin-Token": "secreto"})
+        assert response.status_code == 200
+    finally:
+        settings.PROFILING_ADMIN_TOKEN = previous
+
+if __name__ == "__main__":
+    test_header_and_arm()
+    test_token_and_path_validation()
+    test_size_limit()
+    test_admin_endpoints_need_token()
+    print("[OK] Profiler bajo demanda verificado")
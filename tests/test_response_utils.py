@@ -0,0 +1,111 @@
+"""
+Script para probar la serialización rápida de respuestas y el recorte de raw_text
+"""
+import sys
+import json
+import time
+import asyncio
+from pathlib import Path
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from models import TextBlock
+from services.telemetry import PrometheusMiddleware, RESPONSE_BYTES, RESPONSE_SERIALIZATION_DURATION
+from utils.response_utils import FastJSONResponse, shape_raw_text, ORJSON_AVAILABLE
+
+def _payload(text: str = "FACTURA A CUIT 20-12345678-6 " * 200):
+    return {
+        "raw_text": text,
+        "metadata": {
+            "invoice_parsing": {
+                "raw_text": text,
+                "invoices": [{"raw_text": text, "extracted_fields": {"importe_total": "1.210,00"}}]
+            }
+        }
+    }
+
+def test_shape_raw_text():
+    """'once' deja una sola copia de cada texto, 'none' las quita y 'all' no modifica"""
+    payload = shape_raw_text(_payload(), "once")
+    assert "raw_text" in payload
+    assert "raw_text" not in payload["metadata"]["invoice_parsing"]
+    assert "raw_text" not in payload["metadata"]["invoice_parsing"]["invoices"][0]
+
+    # Los textos distintos (una factura por segmento) se conservan
+    multi = {"invoices": [{"raw_text": "factura 1"}, {"raw_text": "factura 2"}], "raw_text": "factura 1"}
+    shape_raw_text(multi, "once")
+    assert multi == {"invoices": [{}, {"raw_text": "factura 2"}], "raw_text": "factura 1"}
+
+    assert "raw_text" not in json.dumps(shape_raw_text(_payload(), "none"))
+    assert shape_raw_text(_payload(), "all") == _payload()
+
+    full = len(json.dumps(_payload()))
+    once = len(json.dumps(shape_raw_text(_payload(), "once")))
+    print(f"Bytes: all={full}, once={once}")
+    assert once < full / 2.5
+
+def test_fast_json_response():
+    """Serializa modelos Pydantic y tipos numpy y registra tiempo y bytes por endpoint"""
+    app = FastAPI(default_response_class=FastJSONResponse)
+
+    @app.get("/resultado")
+    async def resultado():
+        return FastJSONResponse({
+            "blocks": [TextBlock(text="Total", confidence=0.9, bbox=[0, 0, 10, 10], block_type="text")],
+            "confidence": np.float32(0.5),
+            "bbox": np.array([1, 2, 3]),
+            "texto": "Razón social: Ñandú S.A."
+        })
+
+    @app.get("/dict")
+    async def as_dict():
+        return {"ok": True}
+
+    app.add_middleware(PrometheusMiddleware)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/resultado"), await client.get("/dict")
+
+    before = RESPONSE_BYTES.count("/resultado")
+    response, plain = asyncio.run(run())
+    data = response.json()
+    assert data["blocks"][0]["text"] == "Total"
+    assert data["confidence"] == 0.5 and data["bbox"] == [1, 2, 3]
+    assert data["texto"] == "Razón social: Ñandú S.A."
+    assert plain.json() == {"ok": True}
+    assert RESPONSE_BYTES.count("/resultado") == before + 1
+    assert RESPONSE_SERIALIZATION_DURATION.count("/dict") >= 1
+
+def test_serialization_speed():
+    """orjson serializa un payload grande de OCR más rápido que el encoder estándar"""
+    if not ORJSON_AVAILABLE:
+        print("orjson no instalado, se omite la comparación")
+        return
+
+    blocks = [{"text": f"palabra {i}", "confidence": 0.87, "bbox": [i, i, i + 10, i + 10], "block_type": "text"}
+              for i in range(20000)]
+    payload = dict(_payload(), text_blocks=blocks)
+
+    def measure(render):
+        start = time.perf_counter()
+        for _ in range(5):
+            render(payload)
+        return (time.perf_counter() - start) / 5
+
+    standard = measure(lambda content: json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode())
+    fast = measure(FastJSONResponse(None).render)
+    print(f"Serialización: json={standard * 1000:.1f}ms, orjson={fast * 1000:.1f}ms")
+    assert fast < standard
+
+if __name__ == "__main__":
+    test_shape_raw_text()
+    test_fast_json_response()
+    test_serialization_speed()
+    print("[OK] Serialización de respuestas verificada")
@@ -0,0 +1,61 @@
+"""
+Script para probar la medición de tiempos por etapa
+"""
+import sys
+import time
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.timing import StageTimer, TimingAggregator, ocr_span_name
+
+def test_ocr_span_name():
+    """Cada configuración OCR se identifica por su PSM"""
+    assert ocr_span_name("--psm 6 --oem 3") == "ocr.psm_6"
+    assert ocr_span_name("--oem 3 --psm 13") == "ocr.psm_13"
+    assert ocr_span_name("") == "ocr.default"
+
+def test_stage_timer():
+    """Las etapas repetidas se acumulan y cuentan"""
+    timer = StageTimer()
+    with timer.span("layout"):
+        time.sleep(0.01)
+    timer.add("ocr.psm_6", 0.5)
+    timer.add("ocr.psm_6", 0.25)
+
+    timings = timer.as_dict()
+    print(f"Tiempos: {timings} | {timer.format()}")
+    assert timings["layout"] >= 0.01
+    assert timings["ocr.psm_6"] == 0.75
+    assert timer.calls["ocr.psm_6"] == 2
+    assert "(x2)" in timer.format()
+
+def test_timing_aggregator():
+    """El agregado separa por tipo de documento"""
+    aggregator = TimingAggregator(max_samples=2)
+    for seconds in (1.0, 2.0, 3.0):
+        timer = StageTimer()
+        timer.add("preprocessing", seconds)
+        aggregator.record("image:A", timer)
+
+    timer = StageTimer()
+    timer.add("pdf_conversion", 0.4)
+    aggregator.record("pdf:general", timer)
+
+    snapshot = aggregator.snapshot()
+    print(f"Agregado: {snapshot}")
+    preprocessing = snapshot["image:A"]["stages"]["preprocessing"]
+    assert snapshot["image:A"]["documents"] == 3
+    assert preprocessing["total_seconds"] == 6.0
+    assert preprocessing["per_document"]["count"] == 2  # muestras acotadas
+    assert list(aggregator.snapshot("pdf:general")) == ["pdf:general"]
+
+    aggregator.reset()
+    assert aggregator.snapshot() == {}
+
+if __name__ == "__main__":
+    test_ocr_span_name()
+    test_stage_timer()
+    test_timing_aggregator()
+    print("[OK] Medición de tiempos por etapa verificada")
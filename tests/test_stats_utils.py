@@ -0,0 +1,46 @@
+"""
+Script para probar las utilidades estadísticas usadas por los benchmarks
+"""
+import sys
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.stats_utils import percentile, summarize, format_bytes, histogram
+
+def test_percentile():
+    """Percentiles con interpolación lineal"""
+    values = [1.0, 2.0, 3.0, 4.0, 5.0]
+    print(f"p50={percentile(values, 50)} p95={percentile(values, 95)}")
+    assert percentile(values, 50) == 3.0
+    assert abs(percentile(values, 95) - 4.8) < 1e-9
+    assert percentile([], 50) == 0.0
+    assert percentile([7.0], 95) == 7.0
+
+def test_summarize():
+    """Resumen de una muestra de tiempos"""
+    summary = summarize([0.5, 1.5, 1.0])
+    print(f"Resumen: {summary}")
+    assert summary['count'] == 3
+    assert summary['p50'] == 1.0
+    assert summary['min'] == 0.5 and summary['max'] == 1.5
+    assert summarize([])['count'] == 0
+
+def test_format_bytes():
+    """Formato legible de tamaños"""
+    print(format_bytes(1536), format_bytes(5 * 1024 * 1024))
+    assert format_bytes(1536) == "1.5KB"
+    assert format_bytes(5 * 1024 * 1024) == "5.0MB"
+
+def test_histogram():
+    """Conteo por buckets con límite superior inclusivo"""
+    counts = histogram([0.05, 0.1, 0.3, 2.0, 90.0], [0.1, 0.5, 1.0])
+    print(f"Histograma: {counts}")
+    assert counts == {'0.1': 2, '0.5': 1, '1.0': 0, '+Inf': 2}
+
+if __name__ == "__main__":
+    test_percentile()
+    test_summarize()
+    test_format_bytes()
+    test_histogram()
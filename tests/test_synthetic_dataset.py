@@ -0,0 +1,62 @@
+"""
+Script para probar el generador de facturas sintéticas
+"""
+import sys
+import json
+import tempfile
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from generate_synthetic_dataset import generate_dataset, format_amount, cuit_check_digit
+
+OPTIONS = {
+    'seed': 7,
+    'min_items': 1,
+    'max_items': 4,
+    'types': ['A', 'B', 'C'],
+    'dpis': [72],
+    'noise': 10.0,
+    'max_skew': 1.0,
+    'multi_invoice_ratio': 0.5,
+    'image_format': 'png',
+    'jpeg_quality': 85
+}
+
+def test_format_amount():
+    """Importes con formato argentino"""
+    assert format_amount(12960) == "12.960,00"
+    assert format_amount(0.5) == "0,50"
+
+def test_cuit_check_digit():
+    """Dígito verificador de CUIT"""
+    assert cuit_check_digit("2012345678") == 6
+
+def test_generate_dataset():
+    """Cada imagen tiene su JSON y el ground truth consolidado es reproducible"""
+    with tempfile.TemporaryDirectory() as first_dir, tempfile.TemporaryDirectory() as second_dir:
+        first = generate_dataset(first_dir, 4, OPTIONS)
+        second = generate_dataset(second_dir, 4, OPTIONS)
+
+        assert first == second
+        assert sorted(first) == [f"factura_{i}.png" for i in range(1, 5)]
+
+        for image_name, entry in first.items():
+            base = Path(first_dir) / Path(image_name).stem
+            assert (Path(first_dir) / image_name).exists()
+            with open(f"{base}.json", 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            assert data['cuit_emisor'] == entry['cuit_vendedor']
+            assert data['importe_total'] == entry['importe_total']
+            assert entry['tipo_factura'] in ('A', 'B', 'C')
+            assert 1 <= len(entry['items']) <= 4
+
+        with open(Path(first_dir) / "ground_truth.json", 'r', encoding='utf-8') as f:
+            assert json.load(f) == first
+
+if __name__ == "__main__":
+    test_format_amount()
+    test_cuit_check_digit()
+    test_generate_dataset()
+    print("[OK] Generador de dataset sintético verificado")
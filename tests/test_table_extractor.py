@@ -0,0 +1,180 @@
+"""
+Script para probar la extracción de tablas de items por posición de las palabras
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import settings
+from services.advanced_image_processor import AdvancedImageProcessor
+from services.invoice_parser import InvoiceParser
+from services import table_extractor
+from services.table_extractor import cluster_rows, extract_table, gap_columns, table_items
+from services.token_table import TokenTable
+
+# Encabezado: (texto, x1); las columnas numéricas se alinean a la derecha de su encabezado
+HEADER = [("Código", 20), ("Producto", 110), ("/", 196), ("Servicio", 206), ("Cantidad", 420), ("U.", 520),
+          ("medida", 546), ("Precio", 640), ("unit.", 706), ("%", 780), ("Bonif", 796), ("Imp.", 870),
+          ("Bonif.", 916), ("Subtotal", 1020)]
+RIGHT_EDGES = {"cantidad": 500, "precio": 750, "bonif": 850, "imp": 975, "subtotal": 1100}
+
+ITEMS = [
+    ("1", "Análisis de datos", "4", "unidad", "4.000,00", "19%", "3.040,00", "12.960,00"),
+    ("2", "Licencia anual software", "1", "unidad", "9.000,00", "0%", "0,00", "9.000,00"),
+    ("3", "Soporte técnico remoto", "10", "horas", "1.500,00", "10%", "1.500,00", "13.500,00")
+]
+
+def _word(text, x1, top, line, char=10):
+    return {"text": text, "conf": 0.9, "bbox": [x1, top, x1 + char * len(text), top + 20], "line": line}
+
+def _right(text, x2, top, line):
+    return _word(text, x2 - 10 * len(text), top, line)
+
+def _page_words():
+    """Factura con tabla de items; Tesseract separa las columnas numéricas en otro bloque"""
+    words = [_word("FACTURA", 20, 10, (1, 1, 1)), _word("A", 120, 10, (1, 1, 1)),
+             _word("CUIT:", 20, 40, (1, 1, 2)), _word("30-71234567-8", 80, 40, (1, 1, 2))]
+    words += [_word(text, x, 100, (2, 1, 1)) for text, x in HEADER]
+    top = 140
+    for index, (codigo, descripcion, cantidad, unidad, precio, bonif, importe, subtotal) in enumerate(ITEMS):
+        jitter = (-3, 2, 0)[index]
+        line = (3, index + 1, 1)
+        numbers = (4, index + 1, 1)
+        words.append(_word(codigo, 30, top + jitter, line))
+        x = 110
+        for part in descripcion.split():
+            words.append(_word(part, x, top + jitter + 1, line))
+            x += 10 * len(part) + 8
+        words.append(_right(cantidad, RIGHT_EDGES["cantidad"], top, numbers))
+        words.append(_word(unidad, 530, top, numbers))
+        words.append(_right(precio, RIGHT_EDGES["precio"], top - 1, numbers))
+        words.append(_right(bonif, RIGHT_EDGES["bonif"], top, numbers))
+        words.append(_right(importe, RIGHT_EDGES["imp"], top + 1, numbers))
+        words.append(_right(subtotal, RIGHT_EDGES["subtotal"], top, numbers))
+        top += 40
+        if index == 0:
+            # Descripción en dos renglones
+            words.append(_word("avanzado", 110, top - 12, line))
+            top += 20
+    words += [_word("Subtotal:", 800, top + 20, (5, 1, 1)), _right("35.460,00", 1100, top + 20, (5, 1, 1)),
+              _word("Importe", 800, top + 60, (5, 1, 2)), _word("Total:", 880, top + 60, (5, 1, 2)),
+              _right("42.906,60", 1100, top + 60, (5, 1, 2))]
+    return words
+
+def test_cluster_rows_and_gap_columns():
+    """Filas por solapamiento vertical (con desalineación) y columnas por huecos en x"""
+    bbox = np.array([[0, 0, 10, 20], [50, 3, 60, 22], [100, -2, 120, 18], [0, 30, 10, 50], [50, 28, 60, 47]])
+    assert cluster_rows(bbox).tolist() == [0, 0, 0, 1, 1]
+    assert gap_columns(bbox, 15).tolist() == [0, 50, 100]
+
+def test_header_table():
+    """Las columnas salen del encabezado y la tabla termina en la fila de totales"""
+    table = extract_table(TokenTable.from_words(_page_words()))
+    print(f"Encabezados: {table.headers}")
+    assert table.fields == ['codigo', 'descripcion', 'cantidad', 'unidad_medida', 'precio_unitario',
+                            'bonificacion', 'importe_bonificacion', 'subtotal']
+    assert table.headers[1] == "Producto / Servicio" and table.headers[6] == "Imp. Bonif."
+    assert len(table.rows) == 4
+    assert table.rows[0] == ["1", "Análisis de datos", "4", "unidad", "4.000,00", "19%", "3.040,00", "12.960,00"]
+    assert table.rows[1][1] == "avanzado" and not any(table.rows[1][2:])
+
+    items = table_items(table)
+    assert [item["codigo"] for item in items] == ["1", "2", "3"]
+    assert items[0]["descripcion"] == "Análisis de datos avanzado"
+    assert items[2] == {
+        'codigo': '3', 'descripcion': 'Soporte técnico remoto', 'cantidad': '10', 'unidad_medida': 'horas',
+        'precio_unitario': '1.500,00', 'bonificacion': '10%', 'importe_bonificacion': '1.500,00',
+        'subtotal': '13.500,00'
+    }
+
+def test_table_without_header():
+    """Sin encabezado las columnas son los huecos en x"""
+    words = [w for w in _page_words() if w["bbox"][1] >= 130 and w["bbox"][1] < 300]
+    table = extract_table(words)
+    assert table.fields == [None] * len(table.fields) and not table_items(table)
+    assert table.rows[0][0] == "1" and table.rows[0][-1] == "12.960,00"
+
+def test_parser_uses_columns():
+    """El parser toma los items de las columnas aunque Tesseract parta las filas en bloques"""
+    parser = InvoiceParser()
+    tokens = TokenTable.from_words(_page_words())
+    items = parser.parse_items(tokens.joined_text(), tokens)
+    print(f"Items: {items}")
+    assert [item["codigo"] for item in items] == ["1", "2", "3"]
+    assert items[0]["descripcion"] == "Análisis datos avanzado"  # Descripción limpia del parser
+    assert items[1]["subtotal"] == "9.000,00"
+
+def test_cost_is_linear():
+    """Con 4 veces más filas el trabajo por palabra crece 4 veces (cuadrático serían 16), contado sin cronometrar"""
+    calls = {"normalize_word": 0, "header_field": 0}
+
+    def counted(name, function):
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    def work(copies):
+        words = []
+        for copy in range(copies):
+            for word in _page_words()[4:-5]:
+                x1, y1, x2, y2 = word["bbox"]
+                shift = 10 + copy * 200 if y1 > 120 else 0
+                if copy and y1 <= 120:
+                    continue
+                words.append(dict(word, bbox=[x1, y1 + shift, x2, y2 + shift]))
+        tokens = TokenTable.from_words(words)
+        for name in calls:
+            calls[name] = 0
+        items = table_items(extract_table(tokens))
+        return sum(calls.values()), len(items), len(tokens)
+
+    originals = {name: getattr(table_extractor, name) for name in calls}
+    try:
+        for name, function in originals.items():
+            setattr(table_extractor, name, counted(name, function))
+        small, small_items, small_words = work(100)
+        large, large_items, large_words = work(400)
+    finally:
+        for name, function in originals.items():
+            setattr(table_extractor, name, function)
+
+    print(f"{small_words} palabras: {small} llamadas | {large_words} palabras: {large} llamadas")
+    assert small_items == 300 and large_items == 1200
+    assert large <= small * 4 * 1.1
+
+def test_processor_builds_tables_by_position():
+    """Las regiones Table del layout se arman por posición, con encabezados"""
+    processor = AdvancedImageProcessor()
+    tokens = TokenTable.from_words(_page_words())
+    processor.detect_layout = lambda image: [{"type": "Table", "bbox": [0, 0, 1120, 400], "confidence": 0.9}]
+    processor.extract_words_from_region = lambda image, bbox, timer=None, configs=None: (
+        tokens.joined_text(), tokens.mean_confidence(), tokens
+    )
+    previous = settings.DESKEW_ENABLED
+    settings.DESKEW_ENABLED = False
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "factura.png")
+            Image.new("L", (1120, 400), color=255).save(path)
+            result = processor.process_image(path, sections=("tables",))
+    finally:
+        settings.DESKEW_ENABLED = previous
+    table = result.tables[0]
+    assert table.headers[0] == "Código" and table.rows[0][1] == "Análisis de datos"
+
+if __name__ == "__main__":
+    test_cluster_rows_and_gap_columns()
+    test_header_table()
+    test_table_without_header()
+    test_parser_uses_columns()
+    test_cost_is_linear()
+    test_processor_builds_tables_by_position()
+    print("[OK] Extracción de tablas por posición verificada")
@@ -0,0 +1,72 @@
+"""
+Script para probar las métricas en formato Prometheus
+"""
+import sys
+import asyncio
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.telemetry import (
+    MetricsRegistry, PrometheusMiddleware, HTTP_REQUESTS_TOTAL, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
+)
+
+def test_render_format():
+    """Contadores, gauges e histogramas en formato de exposición"""
+    registry = MetricsRegistry()
+    counter = registry.counter("demo_total", "Contador de prueba", ("psm",))
+    gauge = registry.gauge("demo_files", "Gauge calculado")
+    histogram = registry.histogram("demo_seconds", "Histograma de prueba", buckets=(0.1, 1.0))
+
+    counter.inc("6")
+    counter.inc("6", amount=2)
+    gauge.set_function(lambda: {(): 3})
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5.0)
+
+    text = registry.render()
+    print(text)
+    assert '# TYPE demo_total counter' in text
+    assert 'demo_total{psm="6"} 3' in text
+    assert 'demo_files 3' in text
+    assert 'demo_seconds_bucket{le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{le="1"} 2' in text
+    assert 'demo_seconds_bucket{le="+Inf"} 3' in text
+    assert 'demo_seconds_count 3' in text
+
+def test_middleware_uses_route_template():
+    """El middleware etiqueta por plantilla de ruta y vuelve a cero los requests en curso"""
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"item_id": item_id}
+
+    app.add_middleware(PrometheusMiddleware)
+
+    before = HTTP_REQUESTS_TOTAL.get("/items/{item_id}", "GET", "200")
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for item_id in range(3):
+                response = await client.get(f"/items/{item_id}")
+                assert response.status_code == 200
+            await client.get("/no-existe")
+
+    asyncio.run(run())
+
+    assert HTTP_REQUESTS_TOTAL.get("/items/{item_id}", "GET", "200") == before + 3
+    assert HTTP_REQUESTS_TOTAL.get("unmatched", "GET", "404") >= 1
+    assert HTTP_REQUEST_DURATION.count("/items/{item_id}", "GET") >= 3
+    assert HTTP_REQUESTS_IN_FLIGHT.get() == 0
+
+if __name__ == "__main__":
+    test_render_format()
+    test_middleware_uses_route_template()
+    print("[OK] Métricas Prometheus verificadas")
@@ -0,0 +1,117 @@
+"""
+Script para probar el procesamiento por franjas de imágenes muy grandes
+"""
+import os
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import settings
+from services.advanced_image_processor import AdvancedImageProcessor
+from services.tiling import Strip, merge_words, split_strips
+
+TILING_SETTINGS = {"TILED_MIN_PIXELS": 1_000_000, "TILE_MAX_PIXELS": 400_000, "TILE_OVERLAP": 60, "DESKEW_ENABLED": False}
+
+class _settings:
+    """Cambiar temporalmente la configuración"""
+
+    def __init__(self, **values):
+        self.values = values
+        self.previous = {}
+
+    def __enter__(self):
+        for name, value in self.values.items():
+            self.previous[name] = getattr(settings, name)
+            setattr(settings, name, value)
+
+    def __exit__(self, *exc):
+        for name, value in self.previous.items():
+            setattr(settings, name, value)
+
+def _save_page(path, width=1000, height=3000):
+    rng = np.random.default_rng(0)
+    Image.fromarray(rng.integers(30, 220, (height, width), dtype=np.uint8)).save(path)
+
+def test_split_strips():
+    """Las franjas cubren la página y las filas propias no se superponen"""
+    for height in (300, 550, 1000, 1010):
+        strips = split_strips(height, 300, 50)
+        assert strips[0].top == 0 and strips[-1].bottom == height
+        assert strips[0].own_top == 0 and strips[-1].own_bottom == height
+        for previous, strip in zip(strips, strips[1:]):
+            assert strip.own_top == previous.own_bottom
+            assert previous.bottom - strip.top == 50  # Solapamiento
+        assert all(strip.bottom - strip.top <= 300 for strip in strips)
+
+def test_merge_words_deduplicates_overlap():
+    """Una palabra del solapamiento se conserva una sola vez"""
+    strips = [Strip(0, 300, 0, 275), Strip(250, 550, 275, 550)]
+    shared = {"text": "Total:", "conf": 0.9, "bbox": [10, 255, 60, 270], "line": (1, 1, 1)}
+    merged = merge_words([[shared], [dict(shared), {"text": "$", "conf": 0.9, "bbox": [70, 400, 80, 420],
+                                                    "line": (1, 1, 1)}]], strips)
+    assert [word["text"] for word in merged] == ["Total:", "$"]
+    assert merged[0]["line"] == (0, 1, 1, 1) and merged[1]["line"] == (1, 1, 1, 1)
+
+def test_tiled_preprocessing_matches_and_bounds_memory():
+    """El preprocesamiento por franjas da el mismo resultado con mucha menos memoria"""
+    processor = AdvancedImageProcessor()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "grande.png")
+        _save_page(path)
+
+        with _settings(DESKEW_ENABLED=False):
+            tracemalloc.start()
+            whole = processor.preprocess_image_advanced(path)
+            whole_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        with _settings(**TILING_SETTINGS):
+            tracemalloc.start()
+            tiled = processor.preprocess_image_advanced(path)
+            tiled_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    print(f"Memoria pico: completa {whole_peak / 1e6:.1f} MB | por franjas {tiled_peak / 1e6:.1f} MB")
+    assert np.array_equal(whole, tiled)
+    assert tiled_peak < whole_peak / 3
+
+def test_tiled_full_page_ocr():
+    """El OCR se hace por franja y el texto del solapamiento no se duplica"""
+    height, width = 3000, 1000
+    page = [{"text": f"renglon{i}", "conf": 0.9, "bbox": [50, y, 300, y + 30], "line": (1, 1, 1)}
+            for i, y in enumerate(range(100, 2900, 70))]
+    processor = AdvancedImageProcessor()
+    processor.ocr_calls = []
+
+    def extract_words_from_region(image, bbox, timer=None, configs=None):
+        processor.ocr_calls.append(tuple(bbox))
+        x1, y1, x2, y2 = bbox
+        words = [dict(w) for w in page if y1 <= w["bbox"][1] and w["bbox"][3] <= y2]
+        return " ".join(w["text"] for w in words), 0.9, words
+
+    processor.extract_words_from_region = extract_words_from_region
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "grande.png")
+        _save_page(path, width, height)
+        with _settings(**TILING_SETTINGS):
+            result = processor.process_image(path, sections=("raw_text",))
+
+    print(f"Franjas OCR: {processor.ocr_calls}")
+    assert len(processor.ocr_calls) == len(split_strips(height, 400, 60))
+    assert all(y2 - y1 <= 400 for _, y1, _, y2 in processor.ocr_calls)
+    assert result.raw_text.split() == [w["text"] for w in page]
+
+if __name__ == "__main__":
+    test_split_strips()
+    test_merge_words_deduplicates_overlap()
+    test_tiled_preprocessing_matches_and_bounds_memory()
+    test_tiled_full_page_ocr()
+    print("[OK] Procesamiento por franjas verificado")
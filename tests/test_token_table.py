@@ -0,0 +1,132 @@
+"""
+Script para probar la tabla de palabras OCR y la extracción de items por fila
+"""
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from PIL import Image
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import settings
+from services.advanced_image_processor import AdvancedImageProcessor
+from services.invoice_parser import InvoiceParser
+from services.token_table import TokenTable
+
+ROWS = [
+    ["FACTURA", "A", "N°", "0001-00001234"],
+    ["Código", "Producto", "/", "Servicio", "Cantidad", "U.", "medida", "Precio", "unit.", "%", "Bonif", "Subtotal"],
+    ["1", "Análisis", "de", "datos", "4", "unidad", "4.000,00", "19%", "3.040,00", "12.960,00"],
+    ["2", "Hosting", "anual", "1", "unidad", "9.000,00"],
+    ["3", "Soporte", "técnico", "y", "unidad", "1.500,00", "0%", "1.500,00"],
+    ["Subtotal:", "$", "23.460,00"],
+    ["Importe", "Total:", "$", "28.386,60"]
+]
+
+def _tesseract_data(rows, level_entries=True):
+    """Diccionario como el de image_to_data: una entrada por palabra y otras de nivel de línea (conf -1)"""
+    data = {key: [] for key in ("text", "conf", "left", "top", "width", "height", "block_num", "par_num", "line_num")}
+
+    def add(text, conf, left, top, width, line):
+        for key, value in zip(data, (text, conf, left, top, width, 20, 1, 1, line)):
+            data[key].append(value)
+
+    for index, row in enumerate(rows):
+        if level_entries:
+            add("", -1, 0, index * 40, 900, index + 1)
+        left = 10
+        for text in row:
+            add(text, 90 if text != "/" else 40, left, index * 40, 11 * len(text), index + 1)
+            left += 11 * len(text) + 9
+    return data
+
+def _old_words(data, x1, y1):
+    """Recorrido anterior de extract_words_from_region, palabra por palabra"""
+    words = []
+    for i in range(len(data['text'])):
+        if int(data['conf'][i]) > 0:
+            left, top = x1 + data['left'][i], y1 + data['top'][i]
+            words.append({
+                "text": data['text'][i],
+                "conf": int(data['conf'][i]) / 100.0,
+                "bbox": [left, top, left + data['width'][i], top + data['height'][i]],
+                "line": (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            })
+    return words
+
+def test_from_tesseract_matches_word_dicts():
+    """La tabla descarta las entradas sin confianza y se recorre como las palabras de antes"""
+    data = _tesseract_data(ROWS)
+    tokens = TokenTable.from_tesseract(data, offset=(5, 100))
+    words = _old_words(data, 5, 100)
+
+    assert len(tokens) == len(words) == sum(len(row) for row in ROWS)
+    assert [w["text"] for w in tokens] == [w["text"] for w in words]
+    assert [w["bbox"] for w in tokens] == [w["bbox"] for w in words]
+    assert [w["line"] for w in tokens] == [w["line"] for w in words]
+    assert tokens[3] == dict(words[3], conf=tokens[3]["conf"]) and abs(tokens[3]["conf"] - 0.9) < 1e-6
+    assert tokens.joined_text() == " ".join(w["text"] for w in words)
+    json.dumps(list(tokens))  # Tipos de Python (las plantillas guardan las posiciones en JSON)
+
+    assert not TokenTable.from_tesseract(_tesseract_data([])) and TokenTable.empty().rows() == []
+
+def test_rows_in_reading_order():
+    """Las líneas se agrupan por id y se ordenan por posición, sin importar el orden de entrada"""
+    tokens = TokenTable.from_tesseract(_tesseract_data(ROWS))
+    shuffled = TokenTable.from_words(list(tokens)[::-1])
+    assert shuffled.row_texts() == ROWS
+
+    # Claves de línea de franjas (con el índice de franja) mezcladas con claves de 3 elementos
+    mixed = [dict(word, line=(1,) + word["line"]) if word["line"][2] > 4 else word for word in tokens]
+    assert TokenTable.from_words(mixed).row_texts() == ROWS
+
+def test_items_by_row():
+    """Los items salen de las filas de la tabla, con los valores por defecto del parser"""
+    parser = InvoiceParser()
+    tokens = TokenTable.from_tesseract(_tesseract_data(ROWS))
+    items = parser.parse_items(tokens.joined_text(), tokens)
+    print(f"Items por fila: {items}")
+    assert [item["codigo"] for item in items] == ["1", "2", "3"]
+    assert items[0] == {
+        'codigo': '1', 'descripcion': 'Análisis datos', 'cantidad': '4', 'unidad_medida': 'unidad',
+        'precio_unitario': '4.000,00', 'bonificacion': '19%', 'importe_bonificacion': '3.040,00',
+        'subtotal': '12.960,00'
+    }
+    assert items[1]["precio_unitario"] == "9.000,00" and items[1]["subtotal"] == "0.00"
+    assert items[2]["descripcion"] == "Soporte técnico" and items[2]["cantidad"] == "1"
+    assert items[2]["bonificacion"] == "0%" and items[2]["subtotal"] == "1.500,00"
+
+    # Sin palabras (o sin filas de items) se usa el texto
+    assert parser.parse_items(" ".join(ROWS[2])) and parser.parse_items(" ".join(ROWS[2]), TokenTable.empty())
+
+def test_processor_parses_items_from_tokens():
+    """El procesador pasa las palabras del OCR de página completa al parser"""
+    processor = AdvancedImageProcessor()
+    tokens = TokenTable.from_tesseract(_tesseract_data(ROWS))
+
+    def extract_words_from_region(image, bbox, timer=None, configs=None):
+        return tokens.joined_text(), tokens.mean_confidence(), tokens
+
+    processor.extract_words_from_region = extract_words_from_region
+    previous = settings.DESKEW_ENABLED
+    settings.DESKEW_ENABLED = False
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "factura.png")
+            Image.new("L", (900, 300), color=255).save(path)
+            result = processor.process_image(path, sections=("invoice_fields",))
+    finally:
+        settings.DESKEW_ENABLED = previous
+    fields = result.metadata["invoice_parsing"]["invoices"][0]["extracted_fields"]
+    assert [item["codigo"] for item in fields["items"]] == ["1", "2", "3"]
+
+if __name__ == "__main__":
+    test_from_tesseract_matches_word_dicts()
+    test_rows_in_reading_order()
+    test_items_by_row()
+    test_processor_parses_items_from_tokens()
+    print("[OK] Tabla de palabras OCR verificada")
@@ -0,0 +1,182 @@
+"""
+Script para probar las plantillas de layout por proveedor (CUIT)
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from PIL import Image
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.advanced_image_processor import AdvancedImageProcessor
+from services.invoice_parser import InvoiceParser
+from services.vendor_templates import VendorTemplateCache, amounts_consistent, build_template, extract_value
+
+CUIT = "30-71234567-8"
+
+def _page(fecha="15/03/2024", total="12.100,00", cantidad="1", numero="00004567",
+          subtotal="10.000,00", iva="2.100,00", cuit=CUIT):
+    """Palabras OCR de una factura del proveedor: (y, [(x, texto), ...]) por línea"""
+    lines = [
+        (20, [(10, "ORIGINAL"), (110, "FACTURA"), (200, "Proveedora"), (320, "Andina"), (400, "SRL")]),
+        (60, [(10, "CUIT:"), (80, cuit)]),
+        (100, [(10, "Fecha"), (70, "de"), (100, "Emisión:"), (200, fecha)]),
+        (140, [(10, "Punto"), (70, "de"), (100, "Venta:"), (170, "00012"), (260, "Comp."), (330, "Nro:"), (390, numero)]),
+        (180, [(10, "Apellido"), (100, "y"), (120, "Nombre"), (190, "/"), (210, "Razón"), (270, "Social:"),
+               (350, "Juan"), (400, "Perez")]),
+        (220, [(10, "Condición"), (110, "frente"), (180, "al"), (210, "IVA:"), (260, "Responsable"),
+               (380, "Inscripto")]),
+        (260, [(10, "Condición"), (110, "de"), (140, "venta:"), (210, "Contado")]),
+        (300, [(10, "1"), (30, "Servicio"), (120, "de"), (150, "consultoria"), (270, cantidad), (290, "unidad"),
+               (360, "10.000,00"), (460, "0%"), (500, "10.000,00")]),
+        (460, [(10, "IVA:"), (110, "$"), (130, iva)]),
+        (500, [(10, "Subtotal:"), (110, "$"), (130, subtotal)]),
+        (580, [(10, "Importe"), (90, "Total:"), (160, "$"), (180, total)])
+    ]
+    words = []
+    for index, (y, line) in enumerate(lines):
+        for x, text in line:
+            words.append({"text": text, "conf": 0.9, "bbox": [x, y, x + 9 * len(text), y + 20], "line": (1, index, 1)})
+    return words
+
+def _processor(cache, page):
+    """Procesador sin Tesseract: el OCR devuelve las palabras de `page` cuyo centro cae en la región"""
+    processor = AdvancedImageProcessor(vendor_templates=cache)
+    processor.ocr_calls = []
+
+    def extract_words_from_region(image, bbox, timer=None, configs=None):
+        processor.ocr_calls.append((tuple(bbox), tuple(configs or ())))
+        x1, y1, x2, y2 = bbox
+        words = [w for w in page if x1 <= (w["bbox"][0] + w["bbox"][2]) / 2 <= x2
+                 and y1 <= (w["bbox"][1] + w["bbox"][3]) / 2 <= y2]
+        words.sort(key=lambda w: (w["line"], w["bbox"][0]))
+        return " ".join(w["text"] for w in words), 0.9, words
+
+    processor.extract_words_from_region = extract_words_from_region
+    return processor
+
+def _process(processor, directory):
+    path = os.path.join(directory, "factura.png")
+    Image.new("L", (600, 620), color=255).save(path)
+    return processor.process_image(path, sections=("invoice_fields",))
+
+def test_build_template_and_values():
+    """La plantilla ubica los campos y la tabla de items; los valores se validan por formato"""
+    text = " ".join(w["text"] for w in _page())
+    fields = InvoiceParser().parse_invoice(text)["extracted_fields"]
+    template = build_template(CUIT, _page(), fields, (600, 620))
+
+    print(f"Campos ubicados: {sorted(template['fields'])}")
+    assert {"cuit_vendedor", "fecha_emision", "importe_total", "subtotal", "razon_social_vendedor"} <= set(template["fields"])
+    assert template["fields"]["importe_total"]["kind"] == "numeric"
+    assert template["constants"] == {"tipo_factura": "A"}
+    # La tabla va desde la línea del item hasta el IVA
+    top, bottom = template["items"][1] * 620, template["items"][3] * 620
+    assert top <= 300 and 320 <= bottom <= 460
+
+    assert extract_value("importe_total", "$ 12.100,00") == "12.100,00"
+    assert extract_value("fecha_emision", "l5/O3/2024") is None
+    assert extract_value("razon_social_vendedor", "FACTURA Proveedora Andina SRL.") == "FACTURA Proveedora Andina SRL"
+
+    assert amounts_consistent({"subtotal": "10.000,00", "iva": "2.100,00", "importe_total": "12.100,00"})
+    assert amounts_consistent({"subtotal": "1,000.00", "importe_total": "1000,00"})
+    assert not amounts_consistent({"subtotal": "10.000,00", "iva": "2.100,00", "importe_total": "12.700,00"})
+
+def test_learn_hit_and_fallback():
+    """Se aprende con la primera factura, la segunda se lee por regiones y una ilegible vuelve a la página completa"""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = VendorTemplateCache(os.path.join(directory, "templates.db"))
+
+        # 1) Sin plantilla: OCR de página completa (5 PSM) y aprendizaje
+        processor = _processor(cache, _page())
+        result = _process(processor, directory)
+        assert result.metadata["vendor_template"] == {"result": "learned", "cuit": CUIT}
+        assert len(cache) == 1
+
+        # 2) Mismo proveedor: solo regiones, una configuración por región, sin página completa
+        processor = _processor(cache, _page(fecha="02/04/2024", total="24.200,00", cantidad="2", numero="00004599",
+                                            subtotal="20.000,00", iva="4.200,00"))
+        result = _process(processor, directory)
+        fields = result.metadata["invoice_parsing"]["invoices"][0]["extracted_fields"]
+        print(f"Campos leídos con la plantilla: {fields}")
+        assert result.metadata["vendor_template"] == {"result": "hit", "cuit": CUIT}
+        assert all(len(configs) == 1 for _, configs in processor.ocr_calls)
+        assert fields["cuit_vendedor"] == CUIT and fields["tipo_factura"] == "A"
+        assert fields["fecha_emision"] == "02/04/2024" and fields["importe_total"] == "24.200,00"
+        assert fields["numero_factura"] == "00004599"
+        assert fields["items"][0]["cantidad"] == "2"
+        assert fields["deuda_impositiva"] == "4.200,00"
+
+        # 3) Total ilegible en su región: fallback a la página completa
+        page = [w for w in _page() if w["text"] != "12.100,00"]
+        processor = _processor(cache, page)
+        result = _process(processor, directory)
+        assert result.metadata["vendor_template"]["result"] == "fallback"
+        assert any(configs == () for _, configs in processor.ocr_calls)
+
+        stats = cache.stats()
+        print(f"Estadísticas: {stats}")
+        assert stats["hits"] == 1 and stats["fallbacks"] == 1
+        assert stats["hit_rate"] == 0.5
+        cache.close()
+
+        # La plantilla persiste entre reinicios
+        cache = VendorTemplateCache(os.path.join(directory, "templates.db"))
+        assert cache.get(CUIT) is not None and cache.list()[0]["hits"] == 1
+        assert cache.delete(CUIT) and len(cache) == 0
+        cache.close()
+
+def test_cuit_and_amounts_must_validate():
+    """El CUIT debe releerse en la región de su plantilla y subtotal + IVA debe dar el total"""
+    other_cuit = "30-99999999-1"
+    with tempfile.TemporaryDirectory() as directory:
+        cache = VendorTemplateCache()
+        _process(_processor(cache, _page()), directory)
+
+        # Importes legibles pero que no cierran (la página completa tampoco cierra: se conserva la plantilla)
+        result = _process(_processor(cache, _page(iva="2.700,00")), directory)
+        assert result.metadata["vendor_template"]["result"] == "fallback"
+
+        result = _process(_processor(cache, _page()), directory)
+        assert result.metadata["vendor_template"] == {"result": "hit", "cuit": CUIT}
+
+        # Otro proveedor con el CUIT una línea más abajo (intercambiado con la fecha)
+        def moved(cuit):
+            page = []
+            for word in _page(cuit=cuit):
+                shift = {60: 40, 100: -40}.get(word["bbox"][1], 0)
+                box = word["bbox"]
+                page.append(dict(word, bbox=[box[0], box[1] + shift, box[2], box[3] + shift]))
+            return page
+
+        result = _process(_processor(cache, moved(other_cuit)), directory)
+        assert result.metadata["vendor_template"] == {"result": "learned", "cuit": other_cuit}
+
+        # El CUIT del primer proveedor aparece en la zona de búsqueda pero no en la región de su plantilla
+        result = _process(_processor(cache, moved(CUIT)), directory)
+        print(f"CUIT fuera de su región: {result.metadata['vendor_template']}")
+        assert result.metadata["vendor_template"]["result"] == "fallback"
+        cache.close()
+
+def test_unknown_vendor_is_a_miss():
+    """Un CUIT sin plantilla cuenta como miss y se procesa con la página completa"""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = VendorTemplateCache()
+        _process(_processor(cache, _page()), directory)
+
+        other = [dict(w, text="30-99999999-1") if w["text"] == CUIT else w for w in _page()]
+        processor = _processor(cache, other)
+        result = _process(processor, directory)
+        assert result.metadata["vendor_template"] == {"result": "learned", "cuit": "30-99999999-1"}
+        assert cache.misses == 1 and len(cache) == 2
+        cache.close()
+
+if __name__ == "__main__":
+    test_build_template_and_values()
+    test_learn_hit_and_fallback()
+    test_cuit_and_amounts_must_validate()
+    test_unknown_vendor_is_a_miss()
+    print("[OK] Plantillas por proveedor verificadas")
@@ -0,0 +1,90 @@
+"""
+Utilidades para armar y serializar las respuestas JSON de la API
+"""
+import json
+import time
+from collections import deque
+from typing import Any
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+from services.telemetry import RESPONSE_SERIALIZATION_DURATION, RESPONSE_BYTES, current_endpoint
+
+# orjson es opcional: sin él se usa el encoder estándar de Starlette
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Modos de raw_text en las respuestas: todas las copias, una sola copia de cada texto o ninguna
+RAW_TEXT_MODES = ("all", "once", "none")
+
+def _default(obj: Any) -> Any:
+    """Tipos que orjson no serializa de forma nativa"""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+class FastJSONResponse(JSONResponse):
+    """
+    Respuesta JSON serializada con orjson (si está instalado)
+
+    Registra el tiempo de serialización y los bytes del cuerpo por endpoint. Si el
+    endpoint devuelve directamente esta respuesta, FastAPI además evita pasar el
+    contenido por jsonable_encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        start = time.perf_counter()
+        if ORJSON_AVAILABLE:
+            body = orjson.dumps(
+                content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            )
+        else:
+            body = super().render(content)
+        endpoint = current_endpoint()
+        RESPONSE_SERIALIZATION_DURATION.observe(time.perf_counter() - start, endpoint)
+        RESPONSE_BYTES.observe(len(body), endpoint)
+        return body
+
+def json_line(content: Any) -> bytes:
+    """Una línea de JSON Lines (para respuestas que se envían de a partes)"""
+    if ORJSON_AVAILABLE:
+        body = orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    else:
+        body = json.dumps(content, default=_default, ensure_ascii=False).encode("utf-8")
+    return body + b"\n"
+
+def shape_raw_text(payload: Any, mode: str = "all") -> Any:
+    """
+    Quitar copias repetidas de raw_text de una respuesta (modifica el payload)
+
+    El mismo texto aparece en result.raw_text, en invoice_parsing.raw_text y en cada
+    factura. Con mode='once' se conserva solo la primera aparición de cada texto
+    (recorriendo de afuera hacia adentro, así queda la del nivel más alto); con
+    mode='none' se quitan todas; con 'all' el payload no se modifica.
+    """
+    if mode == "all":
+        return payload
+
+    seen = set()
+    queue = deque([payload])
+    while queue:
+        node = queue.popleft()
+        if isinstance(node, dict):
+            if "raw_text" in node:
+                text = node["raw_text"]
+                if mode == "none" or (isinstance(text, str) and text in seen):
+                    del node["raw_text"]
+                elif isinstance(text, str):
+                    seen.add(text)
+            queue.extend(value for value in node.values() if isinstance(value, (dict, list)))
+        elif isinstance(node, list):
+            queue.extend(value for value in node if isinstance(value, (dict, list)))
+    return payload
@@ -0,0 +1,86 @@
+"""
+Utilidades estadísticas para benchmarks y métricas de rendimiento
+"""
+import math
+from typing import Dict, Sequence
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Calcular un percentil con interpolación lineal
+
+    Args:
+        values: Valores de la muestra
+        q: Percentil entre 0 y 100
+
+    Returns:
+        Valor del percentil (0.0 si la muestra está vacía)
+    """
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return float(ordered[0])
+
+    position = (len(ordered) - 1) * (q / 100.0)
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return float(ordered[int(position)])
+
+    fraction = position - lower
+    return float(ordered[lower] + (ordered[upper] - ordered[lower]) * fraction)
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    """
+    Resumir una muestra con las estadísticas usadas en los reportes de rendimiento
+
+    Args:
+        values: Valores de la muestra
+
+    Returns:
+        Diccionario con count, mean, min, max, p50, p95 y p99
+    """
+    values = list(values)
+    if not values:
+        return {'count': 0, 'mean': 0.0, 'min': 0.0, 'max': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'min': float(min(values)),
+        'max': float(max(values)),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99)
+    }
+
+def format_bytes(num_bytes: float) -> str:
+    """Formatear un tamaño en bytes de forma legible"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(num_bytes) < 1024.0:
+            return f"{num_bytes:.1f}{unit}"
+        num_bytes /= 1024.0
+    return f"{num_bytes:.1f}TB"
+
+def histogram(values: Sequence[float], buckets: Sequence[float]) -> Dict[str, int]:
+    """
+    Contar valores por bucket (límite superior inclusivo, como en Prometheus)
+
+    Args:
+        values: Valores de la muestra
+        buckets: Límites superiores ordenados de forma ascendente
+
+    Returns:
+        Diccionario límite -> cantidad (no acumulada), con '+Inf' para el resto
+    """
+    counts = {str(bucket): 0 for bucket in buckets}
+    counts['+Inf'] = 0
+    for value in values:
+        for bucket in buckets:
+            if value <= bucket:
+                counts[str(bucket)] += 1
+                break
+        else:
+            counts['+Inf'] += 1
+    return counts